@@ -0,0 +1,80 @@
+import json
+import os
+from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.jobs_helper import JobsHelper
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
+
+# Configuración
+ENVIRONMENT = os.environ["ENVIRONMENT"]
+PROJECT_NAME = os.environ["PROJECT_NAME"]
+OWNER = os.environ["OWNER"]
+DYNAMO_GENERATION_JOBS_TABLE = os.environ["DYNAMO_GENERATION_JOBS_TABLE"]
+
+mark_init("config")
+
+logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+
+# Inicialización de recursos
+jobs_helper = JobsHelper(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_GENERATION_JOBS_TABLE,
+        pk_name="job_id"
+    )
+)
+
+mark_init("clients")
+
+@instrument("jobs-consultar")
+def lambda_handler(event, context):
+    try:
+        path_parameters = event.get("pathParameters") or {}
+        job_id = path_parameters.get("job_id")
+        if not job_id:
+            return {
+                "statusCode": 400,
+                "body": json.dumps({
+                    "success": False,
+                    "message": "Campos requeridos faltantes: ['job_id']",
+                    "error": {
+                        "code": "MISSING_FIELDS",
+                        "details": "Campos requeridos faltantes: ['job_id']"
+                    }
+                })
+            }
+
+        job = jobs_helper.get(job_id)
+        if not job:
+            return {
+                "statusCode": 404,
+                "body": json.dumps({
+                    "success": False,
+                    "message": f"No existe el trabajo {job_id}",
+                    "error": {
+                        "code": "JOB_NOT_FOUND",
+                        "details": job_id
+                    }
+                })
+            }
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "success": True,
+                **JobsHelper.to_public(job)
+            }, default=str)
+        }
+
+    except Exception as e:
+        logger.error(f"Error en la función Lambda: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "success": False,
+                "message": str(e)
+            })
+        }
@@ -0,0 +1,61 @@
+import json
+import os
+from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.jobs_helper import JOB_FINAL_STATUSES, JobsHelper
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
+
+# Configuración
+ENVIRONMENT = os.environ["ENVIRONMENT"]
+PROJECT_NAME = os.environ["PROJECT_NAME"]
+OWNER = os.environ["OWNER"]
+DYNAMO_GENERATION_JOBS_TABLE = os.environ["DYNAMO_GENERATION_JOBS_TABLE"]
+
+mark_init("config")
+
+logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+
+# Inicialización de recursos
+jobs_helper = JobsHelper(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_GENERATION_JOBS_TABLE,
+        pk_name="job_id"
+    )
+)
+
+mark_init("clients")
+
+@instrument("jobs-websocket")
+def lambda_handler(event, context):
+    """
+    Maneja las rutas $connect y $disconnect del API WebSocket de trabajos.
+
+    El cliente se conecta con `?job_id=<id>` y recibe el resultado cuando el worker termina.
+    """
+    request_context = event.get("requestContext", {})
+    route_key = request_context.get("routeKey")
+    connection_id = request_context.get("connectionId")
+
+    try:
+        if route_key == "$connect":
+            job_id = (event.get("queryStringParameters") or {}).get("job_id")
+            if not job_id:
+                return {"statusCode": 400, "body": "Campos requeridos faltantes: ['job_id']"}
+            job = jobs_helper.attach_connection(job_id, connection_id)
+            if job["status"] in JOB_FINAL_STATUSES:
+                # El worker terminó antes de la conexión y ya no la va a notificar; API Gateway no
+                # permite enviar mensajes durante $connect, así que se rechaza con el estado y el
+                # cliente consulta el resultado en GET /jobs/{job_id}
+                logger.info(f"El trabajo {job_id} ya terminó ({job['status']}); se rechaza la conexión {connection_id}")
+                return {"statusCode": 409, "body": json.dumps({"job_id": job_id, "status": job["status"]})}
+            logger.info(f"Conexión {connection_id} asociada al trabajo {job_id}")
+
+        return {"statusCode": 200}
+
+    except Exception as e:
+        logger.error(f"Error en la función Lambda: {str(e)}")
+        return {"statusCode": 500, "body": str(e)}
@@ -2,20 +2,43 @@ import json
 import os
 import boto3
 import re
-from boto3.dynamodb.conditions import Attr
 from datetime import datetime, timedelta
-from aje_libs.common.helpers.bedrock_helper import BedrockHelper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
-from aje_libs.common.helpers.s3_helper import S3Helper
-from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.deadline_helper import (
+    Deadline,
+    DeadlineExceededError,
+    timeout_response
+)
+from aprendizaje_libs.helpers.idempotency_helper import IdempotencyStore, idempotent
+from aprendizaje_libs.helpers.logging_helper import configure_logging, log_payload
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init, stage
+from aprendizaje_libs.helpers.model_router_helper import ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.prescoring_helper import PreScorer, PrescoreReference, bedrock_embedder
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.snapstart_helper import before_snapshot
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    adaptive_retry_config,
+    throttled_response
+)
+from aprendizaje_libs.helpers.tracing_helper import annotate, item_size
+from aprendizaje_libs.helpers.validation_helper import bad_request_response, missing_fields
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
 
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
 OWNER = os.environ["OWNER"]
 DYNAMO_EVALUATION_HISTORY_TABLE = os.environ["DYNAMO_EVALUATION_HISTORY_TABLE"]
+DYNAMO_BEDROCK_GOVERNOR_TABLE = os.environ["DYNAMO_BEDROCK_GOVERNOR_TABLE"]
+DYNAMO_IDEMPOTENCY_TABLE = os.environ["DYNAMO_IDEMPOTENCY_TABLE"]
 
 # Parameter Store
 ssm_agent = SSMParameterHelper(f"/{ENVIRONMENT}/{PROJECT_NAME}/agent")
@@ -28,8 +51,24 @@ PINECONE_MAX_RETRIEVE_DOCUMENTS = int(PARAMETER_VALUE["PINECONE_MAX_RETRIEVE_DOC
 PINECONE_MIN_THRESHOLD = float(PARAMETER_VALUE["PINECONE_MIN_THRESHOLD"])
 EMBEDDINGS_MODEL_ID = PARAMETER_VALUE["EMBEDDINGS_MODEL_ID"]
 EMBEDDINGS_REGION = PARAMETER_VALUE["EMBEDDINGS_REGION"]
+BEDROCK_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("BEDROCK_MAX_CONCURRENCY", 20))
+CHATBOT_MS_PER_OUTPUT_TOKEN = float(PARAMETER_VALUE.get("CHATBOT_MS_PER_OUTPUT_TOKEN", 25))
+CHATBOT_MIN_OUTPUT_TOKENS = int(PARAMETER_VALUE.get("CHATBOT_MIN_OUTPUT_TOKENS", 256))
+MODEL_ROUTES = PARAMETER_VALUE.get("MODEL_ROUTES", {})
+MODEL_REQUEST_FIELDS = PARAMETER_VALUE.get("MODEL_REQUEST_FIELDS", {})
+PROMPT_CACHE_MODELS = PARAMETER_VALUE.get("PROMPT_CACHE_MODELS", [])
+PRESCORE_CONFIG = PARAMETER_VALUE.get("PRESCORE_BANDS", {})
+PRESCORE_ENABLED = bool(PRESCORE_CONFIG.get("enabled", False))
+PRESCORE_BANDS = {key: value for key, value in PRESCORE_CONFIG.items() if key != "enabled"}
+EVALUAR_BATCH_MAX_ITEMS = int(PARAMETER_VALUE.get("EVALUAR_BATCH_MAX_ITEMS", 50))
+EVALUAR_BATCH_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("EVALUAR_BATCH_MAX_CONCURRENCY", 8))
+IDEMPOTENCY_TTL_SECONDS = int(PARAMETER_VALUE.get("IDEMPOTENCY_TTL_SECONDS", 900))
+
+mark_init("config")
 
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+# Nivel, muestreo y límites de los registros según el parámetro del agente
+configure_logging(PARAMETER_VALUE, logger)
 
 # Inicializar DynamoDBHelper
 evaluation_table_helper = DynamoDBHelper(
@@ -38,25 +77,67 @@ evaluation_table_helper = DynamoDBHelper(
     sk_name="date_time"
 )
 
-bedrock_helper = BedrockHelper(region_name=CHATBOT_REGION)
+# Clientes de Bedrock por tramo de read_timeout, ajustados al plazo de cada solicitud
+bedrock_clients = bedrock_client_pool(CHATBOT_REGION)
+# SnapStart: los clientes de Bedrock de cada tramo de timeout se crean antes del snapshot
+before_snapshot(bedrock_clients.warm)
 
-SCORE_PROMPT = """
-    Eres un experto evaluador académico en {nombre_curso}. Tu tarea es asignar un puntaje objetivo entre 0.0 y 1.0 a la respuesta de un estudiante, comparándola con una respuesta modelo, según los siguientes criterios académicos. Debes tener en cuenta también el **contexto** en el que se formula la pregunta.
+# Gobernador de concurrencia compartido entre contenedores, uno por modelo de Bedrock
+governor_table_helper = DynamoDBHelper(
+    table_name=DYNAMO_BEDROCK_GOVERNOR_TABLE,
+    pk_name="governor_key"
+)
 
-    Contexto:
-    {contexto}
+# Modelo y parámetros por tarea; MODEL_ROUTES en el parámetro del agente sobrescribe estos valores
+model_router = ModelRouter(
+    routes=build_routes(
+        MODEL_ROUTES,
+        defaults={
+            "score": {"max_tokens": 10, "temperature": 0.0},
+            "feedback": {"max_tokens": CHATBOT_LLM_MAX_TOKENS, "temperature": 0.7}
+        },
+        default_model_id=CHATBOT_MODEL_ID
+    ),
+    client_pool=bedrock_clients,
+    governor_factory=lambda model_id: BedrockGovernor(
+        store=DynamoDBStateStore(governor_table_helper),
+        key=f"bedrock#{model_id}",
+        max_limit=BEDROCK_MAX_CONCURRENCY
+    ),
+    ms_per_output_token=CHATBOT_MS_PER_OUTPUT_TOKEN,
+    min_output_tokens=CHATBOT_MIN_OUTPUT_TOKENS,
+    request_fields=MODEL_REQUEST_FIELDS,
+    cache_models=PROMPT_CACHE_MODELS
+)
 
-    Pregunta:
-    {pregunta}
+# Pre-puntaje local (solo con PRESCORE_BANDS.enabled): evita la llamada de puntaje para respuestas en
+# blanco, copias de la respuesta modelo y respuestas cuya similitud cae en las bandas calibradas con
+# tools/calibrate_prescore.py
+pre_scorer = PreScorer(
+    embed=bedrock_embedder(
+        boto3.client(
+            "bedrock-runtime",
+            region_name=EMBEDDINGS_REGION,
+            config=adaptive_retry_config(connect_timeout=2, read_timeout=5)
+        ),
+        EMBEDDINGS_MODEL_ID
+    ) if PRESCORE_ENABLED else None,
+    bands=PRESCORE_BANDS,
+    enabled=PRESCORE_ENABLED
+)
 
-    Respuesta del estudiante:
-    {respuesta_usuario}
+# Campos requeridos del cuerpo; constants/request_models.py genera con ellos los modelos de API Gateway
+# (las respuestas del lote se validan una por una para devolver resultados parciales)
+REQUIRED_FIELDS = ["RetoEjecucionId", "UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Complejidad", "Contexto", "Pregunta", "RespuestaModelo", "RespuestaUsuario", "Temas", "Umbral"]
+BATCH_REQUIRED_FIELDS = ["SilaboId", "UnidadId", "SesionId", "NombreCurso", "Complejidad", "Contexto", "Pregunta", "RespuestaModelo", "Temas", "Umbral", "Respuestas"]
+BATCH_ITEM_REQUIRED_FIELDS = ["RetoEjecucionId", "UsuarioId", "RespuestaUsuario"]
 
-    Respuesta modelo esperada:
-    {respuesta_modelo}
+# Marcador de la respuesta del estudiante en los prompts renderizados una sola vez por pregunta
+RESPUESTA_USUARIO_SENTINEL = "\x00respuesta_usuario\x00"
 
-    Temas clave esperados:
-    {temas_formateados}
+# Instrucciones estáticas (bloques de sistema cacheables); los datos de cada respuesta van en los *_USER_PROMPT
+SCORE_SYSTEM_PROMPT = PromptTemplate("""
+    Eres un experto evaluador académico en el curso indicado. Tu tarea es asignar un puntaje objetivo entre 0.0 y 1.0 a la respuesta de un estudiante, comparándola con una respuesta modelo, según los siguientes criterios académicos. Debes tener en cuenta también el **contexto** en el que se formula la pregunta.
 
     Criterios de evaluación:
     1. Precisión conceptual.
@@ -68,21 +149,29 @@ SCORE_PROMPT = """
     Formato de salida:
     - Devuelve **solo** un número decimal entre 0.0 y 1.0 con dos decimales.
     - **No agregues explicaciones, etiquetas, comentarios ni palabras adicionales.**
-"""
+""", name="SCORE_SYSTEM_PROMPT")
 
-FEEDBACK_ALL_PROMPT = """
-    Eres un docente experto en retroalimentación pedagógica. Tu tarea es ayudar a un estudiante que no respondió correctamente una pregunta de evaluación.
+SCORE_USER_PROMPT = PromptTemplate("""
+    Curso: {nombre_curso}
 
-    Contexto de retroalimentación:
-    - Curso: {nombre_curso}
-    - Complejidad: {complejidad}
-    - Contexto del caso o situación: {contexto}
-    - Pregunta original: {pregunta}
-    - Respuesta modelo esperada: {respuesta_modelo}
-    - Respuesta del estudiante: {respuesta_usuario}
-    - Temas clave involucrados: {temas_formateados}
+    Contexto:
+    {contexto}
 
-    El puntaje de su respuesta fue bajo.
+    Pregunta:
+    {pregunta}
+
+    Respuesta del estudiante:
+    {respuesta_usuario}
+
+    Respuesta modelo esperada:
+    {respuesta_modelo}
+
+    Temas clave esperados:
+    {temas_formateados}
+""", name="SCORE_USER_PROMPT")
+
+FEEDBACK_ALL_SYSTEM_PROMPT = PromptTemplate("""
+    Eres un docente experto en retroalimentación pedagógica. Tu tarea es ayudar a un estudiante que no respondió correctamente una pregunta de evaluación.
 
     Tu tarea es:
 
@@ -106,11 +195,9 @@ FEEDBACK_ALL_PROMPT = """
     @Pregunta: [Escribe aquí la nueva pregunta reformulada]
     @Respuesta Modelo: [Escribe aquí la nueva respuesta modelo]
     @Conceptos Claves: [Lista separada por comas, terminando en punto]
-"""
-
-FEEDBACK_PROMPT = """
-    Eres un docente experto en retroalimentación pedagógica. Tu tarea es generar una retroalimentación breve y profesional.
+""", name="FEEDBACK_ALL_SYSTEM_PROMPT")
 
+FEEDBACK_ALL_USER_PROMPT = PromptTemplate("""
     Contexto de retroalimentación:
     - Curso: {nombre_curso}
     - Complejidad: {complejidad}
@@ -120,7 +207,11 @@ FEEDBACK_PROMPT = """
     - Respuesta del estudiante: {respuesta_usuario}
     - Temas clave involucrados: {temas_formateados}
 
-    El puntaje de su respuesta fue alto. 
+    El puntaje de su respuesta fue bajo.
+""", name="FEEDBACK_ALL_USER_PROMPT")
+
+FEEDBACK_SYSTEM_PROMPT = PromptTemplate("""
+    Eres un docente experto en retroalimentación pedagógica. Tu tarea es generar una retroalimentación breve y profesional para un estudiante cuyo puntaje fue alto.
 
     Tu tarea es:
 
@@ -131,189 +222,369 @@ FEEDBACK_PROMPT = """
     Devuelve el resultado con el siguiente formato (sin agregar explicaciones adicionales):
 
     @Retroalimentacion: [Escribe aquí la retroalimentación]
-"""
+""", name="FEEDBACK_SYSTEM_PROMPT")
+
+FEEDBACK_USER_PROMPT = PromptTemplate("""
+    Contexto de retroalimentación:
+    - Curso: {nombre_curso}
+    - Complejidad: {complejidad}
+    - Contexto del caso o situación: {contexto}
+    - Pregunta original: {pregunta}
+    - Respuesta modelo esperada: {respuesta_modelo}
+    - Respuesta del estudiante: {respuesta_usuario}
+    - Temas clave involucrados: {temas_formateados}
+
+    El puntaje de su respuesta fue alto.
+""", name="FEEDBACK_USER_PROMPT")
 
-def get_converse_response(prompt: str, max_tokens: int, temperature: float = 1.0) -> dict:
+# Reintentos del front end: un duplicado espera o recibe el resultado de la solicitud original
+idempotency_store = IdempotencyStore(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_IDEMPOTENCY_TABLE,
+        pk_name="idempotency_key"
+    ),
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
+
+mark_init("clients")
+
+def get_converse_response(prompt: str, task: str, deadline: Deadline = None, max_tokens: int = None, system: str = None) -> dict:
     """
-    Conversa con el modelo de Bedrock usando un prompt de sistema separado y mensajes estructurados.
+    Conversa con el modelo asignado a la tarea en MODEL_ROUTES, usando sus modelos de respaldo si está limitado o lento.
     
     Parámetros:
-    - prompt: texto con las instrucciones del prompt
-    - max_tokens: número máximo de tokens de respuesta
-    - temperature: control de aleatoriedad
+    - prompt: datos de la solicitud (bloque dinámico del usuario)
+    - task: tarea de la ruta de modelos (score, feedback)
+    - deadline: plazo de la solicitud; ajusta max_tokens, el read timeout y los reintentos
+    - max_tokens: sobrescribe el máximo de tokens de la ruta
+    - system: instrucciones estáticas; se envían como bloque de sistema con punto de caché
     """
 
-    logger.info(json.dumps(prompt, indent=2))
+    log_payload(logger, "Prompt", prompt)
+
+    return model_router.converse(task, prompt, deadline=deadline, max_tokens=max_tokens, system=system)
 
-    parameters = {
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": 0.2
+@stage("prompt")
+def render_prompts(body: dict) -> dict:
+    """
+    Renderiza una sola vez los prompts de una pregunta, dejando la respuesta del estudiante como marcador.
+
+    Las evaluaciones por lote comparten pregunta, respuesta modelo y temas, por lo que solo
+    se reemplaza el marcador con cada respuesta.
+    """
+    fields = {
+        "nombre_curso": body["NombreCurso"],
+        "complejidad": body["Complejidad"],
+        "contexto": body["Contexto"],
+        "pregunta": body["Pregunta"],
+        "respuesta_modelo": body["RespuestaModelo"],
+        "respuesta_usuario": RESPUESTA_USUARIO_SENTINEL,
+        "temas_formateados": ', '.join(body["Temas"])
+    }
+    return {
+        "score": SCORE_USER_PROMPT.render(**fields),
+        "feedback_all": FEEDBACK_ALL_USER_PROMPT.render(**fields),
+        "feedback": FEEDBACK_USER_PROMPT.render(**fields)
     }
 
-    response = bedrock_helper.converse(
-        model=CHATBOT_MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        parameters=parameters
-    )
+def evaluar_respuesta(prompts: dict, reference: PrescoreReference, respuesta_usuario: str, umbral: float, deadline: Deadline = None) -> dict:
+    """
+    Asigna el puntaje a una respuesta y genera la retroalimentación correspondiente.
+
+    Parámetros:
+    - prompts: prompts renderizados con render_prompts
+    - reference: respuesta modelo preprocesada con pre_scorer.reference
+    - respuesta_usuario: respuesta del estudiante
+    - umbral: puntaje mínimo para considerar la respuesta correcta
+    - deadline: plazo de la solicitud
+    """
+    prescore = pre_scorer.prescore(reference, respuesta_usuario)
+    prescore_fields = {
+        "prescore_reason": prescore.reason,
+        "prescore_similarity": prescore.similarity
+    }
+
+    if prescore.score is not None:
+        logger.info(f"Puntaje asignado sin llamar al modelo ({prescore.reason}, similitud {prescore.similarity})")
+        score = prescore.score
+    else:
+        prompt = prompts["score"].replace(RESPUESTA_USUARIO_SENTINEL, respuesta_usuario)
+
+        response = get_converse_response(prompt=prompt, task="score", deadline=deadline, system=SCORE_SYSTEM_PROMPT.text)
+        score_response = response['output']['message']['content'][0]['text']
+
+        # Intentar detectar el número sin etiqueta
+        primera_linea = score_response.strip().splitlines()[0]
+        match = re.match(r"^\s*([0-9]*\.?[0-9]+)\s*$", primera_linea)
+
+        if not match:
+            return {
+                "score": 0,
+                "feedback": "No se encontró el puntaje.",
+                "prompt_msg": prompt, # Enviará el prompt utilizado para obtener el score
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cache_read_tokens": 0,
+                "cache_write_tokens": 0,
+                **prescore_fields
+            }
+
+        score = float(match.group(1))
+
+    # Comparar con umbral
+    if score < umbral:
+        template, system_prompt = prompts["feedback_all"], FEEDBACK_ALL_SYSTEM_PROMPT.text
+    else:
+        template, system_prompt = prompts["feedback"], FEEDBACK_SYSTEM_PROMPT.text
+    prompt = template.replace(RESPUESTA_USUARIO_SENTINEL, respuesta_usuario)
+
+    response = get_converse_response(prompt=prompt, task="feedback", deadline=deadline, system=system_prompt)
+    cache_read_tokens, cache_write_tokens = cache_usage(response)
+
+    return {
+        "score": score,
+        "feedback": response['output']['message']['content'][0]['text'],
+        "prompt_msg": prompt,
+        "input_tokens": response['usage']['inputTokens'],
+        "output_tokens": response['usage']['outputTokens'],
+        "cache_read_tokens": cache_read_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        **prescore_fields
+    }
 
-    return response
+def build_evaluation_item(reto_ejecucion_id: str, usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, score: str, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0, respuesta_usuario: str = None, prescore_reason: str = None, prescore_similarity: float = None) -> dict:
+    """
+    Construye el elemento del historial de evaluaciones.
+    """
+    current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # TTL en 5 días (432000 segundos)
+    # TTL en 7 días (604800 segundos)
+    ttl_seconds = 432000
+    ttl_timestamp = int((datetime.now() + timedelta(seconds=ttl_seconds)).timestamp())
+
+    return {
+        "tipo_metodo_id": 674,
+        "reto_ejecucion_id": reto_ejecucion_id,
+        "usuario_id": usuario_id,
+        "date_time": current_datetime,
+        "silabo_id": silabo_id,
+        "unidad_id": unidad_id,
+        "sesion_id": sesion_id,
+        "score": score,
+        "prompt_msg": prompt_msg,
+        "ai_msg": ai_msg,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cache_read_tokens": cache_read_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        # Datos para calibrar las bandas del pre-puntaje (tools/calibrate_prescore.py)
+        "respuesta_usuario": respuesta_usuario,
+        "prescore_reason": prescore_reason,
+        "prescore_similarity": None if prescore_similarity is None else str(prescore_similarity),
+        "ttl": ttl_timestamp
+    }
 
-def upload_evaluar(reto_ejecucion_id: str, usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, score: str, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int):
+@stage("history_write")
+def upload_evaluar(reto_ejecucion_id: str, usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, score: str, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0, respuesta_usuario: str = None, prescore_reason: str = None, prescore_similarity: float = None):
     """
     Sube una evaluación realizada a la tabla DynamoDB con los datos especificados.
     """
     try:
-        current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # TTL en 5 días (432000 segundos)
-        # TTL en 7 días (604800 segundos)
-        ttl_seconds = 432000
-        ttl_timestamp = int((datetime.now() + timedelta(seconds=ttl_seconds)).timestamp())
-
-        item = {
-            "tipo_metodo_id": 674,
-            "reto_ejecucion_id": reto_ejecucion_id,
-            "usuario_id": usuario_id,
-            "date_time": current_datetime,
-            "silabo_id": silabo_id,
-            "unidad_id": unidad_id,
-            "sesion_id": sesion_id,
-            "score": score,
-            "prompt_msg": prompt_msg,
-            "ai_msg": ai_msg,
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "ttl": ttl_timestamp
-        }
-
+        item = build_evaluation_item(
+            reto_ejecucion_id=reto_ejecucion_id,
+            usuario_id=usuario_id,
+            silabo_id=silabo_id,
+            unidad_id=unidad_id,
+            sesion_id=sesion_id,
+            score=score,
+            prompt_msg=prompt_msg,
+            ai_msg=ai_msg,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+            respuesta_usuario=respuesta_usuario,
+            prescore_reason=prescore_reason,
+            prescore_similarity=prescore_similarity
+        )
+        annotate(table=evaluation_table_helper.table_name, item_bytes=item_size(item))
         evaluation_table_helper.put_item(data = item)
-        logger.info(f"Elemento subido con éxito: {item}")
+        log_payload(logger, "Elemento subido con éxito", item)
     except Exception as e:
         logger.error(f"Error al subir el elemento: {e}")
 
+def evaluar_lote(body: dict, deadline: Deadline = None) -> dict:
+    """
+    Evalúa las respuestas de varios estudiantes a una misma pregunta.
+
+    Las respuestas se evalúan en paralelo (hasta EVALUAR_BATCH_MAX_CONCURRENCY) y el
+    historial se guarda con una sola escritura por lote. Cada elemento del resultado
+    indica si su evaluación tuvo éxito; las respuestas que no alcanzaron a evaluarse
+    dentro del plazo se devuelven con el código DEADLINE_EXCEEDED para reintentarlas, y
+    si el historial no se pudo guardar las evaluaciones se devuelven con HISTORY_WRITE_FAILED.
+    """
+    # Import diferido: solo el modo por lote usa el pool de hilos y no se carga en el arranque en frío
+    from aprendizaje_libs.helpers.batch_helper import error_details, map_bounded, save_batch_history
+
+    prompts = render_prompts(body)
+    reference = pre_scorer.reference(body["RespuestaModelo"])
+    respuestas = body["Respuestas"]
+    results = [None] * len(respuestas)
+
+    # La clave del historial es (usuario_id, date_time): se evalúa una respuesta por usuario
+    pending = []
+    usuarios = set()
+    for index, respuesta in enumerate(respuestas):
+        missing = missing_fields(respuesta, BATCH_ITEM_REQUIRED_FIELDS)
+        if missing:
+            error = {"code": "MISSING_FIELDS", "details": f"Campos requeridos faltantes: {missing}"}
+        elif respuesta["UsuarioId"] in usuarios:
+            error = {"code": "DUPLICATE_USER", "details": f"Respuesta duplicada para el usuario {respuesta['UsuarioId']}"}
+        else:
+            usuarios.add(respuesta["UsuarioId"])
+            pending.append(index)
+            continue
+        results[index] = {
+            "RetoEjecucionId": respuesta.get("RetoEjecucionId"),
+            "UsuarioId": respuesta.get("UsuarioId"),
+            "success": False,
+            "error": error
+        }
+
+    outcomes = map_bounded(
+        lambda index: evaluar_respuesta(prompts, reference, respuestas[index]["RespuestaUsuario"], body["Umbral"], deadline),
+        pending,
+        EVALUAR_BATCH_MAX_CONCURRENCY
+    )
+
+    items = {}
+    for index, outcome in zip(pending, outcomes):
+        respuesta = respuestas[index]
+        result = {
+            "RetoEjecucionId": respuesta["RetoEjecucionId"],
+            "UsuarioId": respuesta["UsuarioId"]
+        }
+        if outcome.error:
+            result.update({"success": False, "error": error_details(outcome.error)})
+        else:
+            evaluation = outcome.value
+            items[index] = build_evaluation_item(
+                reto_ejecucion_id=respuesta["RetoEjecucionId"],
+                usuario_id=respuesta["UsuarioId"],
+                silabo_id=body["SilaboId"],
+                unidad_id=body["UnidadId"],
+                sesion_id=body["SesionId"],
+                score=str(evaluation["score"]),
+                prompt_msg=evaluation["prompt_msg"],
+                ai_msg=evaluation["feedback"],
+                input_tokens=evaluation["input_tokens"],
+                output_tokens=evaluation["output_tokens"],
+                cache_read_tokens=evaluation["cache_read_tokens"],
+                cache_write_tokens=evaluation["cache_write_tokens"],
+                respuesta_usuario=respuesta["RespuestaUsuario"],
+                prescore_reason=evaluation["prescore_reason"],
+                prescore_similarity=evaluation["prescore_similarity"]
+            )
+            result.update({
+                "success": True,
+                "score": evaluation["score"],
+                "feedback": evaluation["feedback"],
+                "input_tokens": evaluation["input_tokens"],
+                "output_tokens": evaluation["output_tokens"],
+                "cache_read_tokens": evaluation["cache_read_tokens"],
+                "cache_write_tokens": evaluation["cache_write_tokens"]
+            })
+        results[index] = result
+
+    def write_history(put_items):
+        with stage("history_write"):
+            annotate(table=evaluation_table_helper.table_name, items=len(put_items), item_bytes=sum(item_size(item) for item in put_items))
+            evaluation_table_helper.batch_write_items(put_items=put_items)
+        logger.info(f"{len(put_items)} evaluaciones subidas con éxito")
+
+    history_saved = save_batch_history(write_history, items, results)
+
+    failed = sum(1 for result in results if not result["success"])
+    return {
+        "success": True,
+        "total": len(results),
+        "failed": failed,
+        "history_saved": history_saved,
+        "results": results
+    }
+
+@instrument("metodo-caso-evaluar")
+@idempotent(idempotency_store)
 def lambda_handler(event, context):
     try:
+        deadline = Deadline.from_context(context)
         body = event.get('body', event)
         if isinstance(body, str):
             body = json.loads(body)
 
-        required_fields = ["RetoEjecucionId", "UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Complejidad", "Contexto", "Pregunta", "RespuestaModelo", "RespuestaUsuario", "Temas", "Umbral"]
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
+        if "Respuestas" in body:
+            required_fields = BATCH_REQUIRED_FIELDS
+        else:
+            required_fields = REQUIRED_FIELDS
+        missing = missing_fields(body, required_fields)
+        if missing:
+            return bad_request_response("MISSING_FIELDS", f"Campos requeridos faltantes: {missing}")
+
+        if "Respuestas" in body:
+            if len(body["Respuestas"]) > EVALUAR_BATCH_MAX_ITEMS:
+                return bad_request_response("BATCH_TOO_LARGE", f"El lote excede el máximo de {EVALUAR_BATCH_MAX_ITEMS} respuestas")
             return {
-                "success": False,
-                "message": f"Campos requeridos faltantes: {missing_fields}",
-                "statusCode": 400,
-                "error": {
-                    "code": "MISSING_FIELDS",
-                    "details": f"Campos requeridos faltantes: {missing_fields}"
-                }
+                "statusCode": 200,
+                "body": json.dumps(evaluar_lote(body, deadline))
             }
-        
-        reto_ejecucion_id = body["RetoEjecucionId"]
-        user_id = body["UsuarioId"]
-        syllabus_event_id = body["SilaboId"]
-        unidad_id = body["UnidadId"]
-        sesion_id = body["SesionId"]
-        nombre_curso = body["NombreCurso"]
-        complejidad = body["Complejidad"]
-        contexto = body["Contexto"]
-        pregunta = body["Pregunta"]
-        respuesta_modelo = body["RespuestaModelo"]
-        respuesta_usuario = body["RespuestaUsuario"]
-        temas = body.get("Temas", None)
-        umbral = body["Umbral"]
-        
-        prompt = SCORE_PROMPT.format(
-            nombre_curso = nombre_curso,
-            contexto = contexto,
-            pregunta = pregunta,
-            respuesta_modelo = respuesta_modelo,
-            respuesta_usuario = respuesta_usuario,
-            temas_formateados = ', '.join(temas)
-        )
-        
-        response = get_converse_response(prompt=prompt, max_tokens=10, temperature=0.0)
-        score_response = response['output']['message']['content'][0]['text']
 
-        # Intentar detectar el número sin etiqueta
-        primera_linea = score_response.strip().splitlines()[0]
-        match = re.match(r"^\s*([0-9]*\.?[0-9]+)\s*$", primera_linea)
+        evaluation = evaluar_respuesta(
+            prompts=render_prompts(body),
+            reference=pre_scorer.reference(body["RespuestaModelo"]),
+            respuesta_usuario=body["RespuestaUsuario"],
+            umbral=body["Umbral"],
+            deadline=deadline
+        )
 
-        if match:
-            score = float(match.group(1))
-                
-            # Comparar con umbral
-            if score < umbral:
-                prompt = FEEDBACK_ALL_PROMPT.format(
-                    nombre_curso = nombre_curso,
-                    complejidad = complejidad,
-                    contexto = contexto,
-                    pregunta = pregunta,
-                    respuesta_modelo = respuesta_modelo,
-                    respuesta_usuario = respuesta_usuario,
-                    temas_formateados = ', '.join(temas)
-                )
-
-            else:
-                prompt = FEEDBACK_PROMPT.format(
-                    nombre_curso = nombre_curso,
-                    complejidad = complejidad,
-                    contexto = contexto,
-                    pregunta = pregunta,
-                    respuesta_modelo = respuesta_modelo,
-                    respuesta_usuario = respuesta_usuario,
-                    temas_formateados = ', '.join(temas)
-                )
-
-            response = get_converse_response(prompt = prompt, max_tokens=CHATBOT_LLM_MAX_TOKENS, temperature = 0.7)
-            feedback = response['output']['message']['content'][0]['text']
-            input_tokens = response['usage']['inputTokens']
-            output_tokens = response['usage']['outputTokens']
-        
-            upload_evaluar(
-                reto_ejecucion_id=reto_ejecucion_id,
-                usuario_id=user_id,
-                silabo_id=syllabus_event_id,
-                unidad_id=unidad_id,
-                sesion_id=sesion_id,
-                score=str(score),
-                prompt_msg=prompt,
-                ai_msg=feedback,
-                input_tokens=input_tokens,
-                output_tokens=output_tokens
-            )
-        
-        else:
-            score = 0
-            feedback = "No se encontró el puntaje."
-            input_tokens = 0
-            output_tokens = 0
-
-            upload_evaluar(
-                reto_ejecucion_id=reto_ejecucion_id,
-                usuario_id=user_id,
-                silabo_id=syllabus_event_id,
-                unidad_id=unidad_id,
-                sesion_id=sesion_id,
-                score=str(score),
-                prompt_msg=prompt, # Enviará el prompt utilizado para obtener el score
-                ai_msg=feedback,
-                input_tokens=input_tokens,
-                output_tokens=output_tokens
-            )
+        upload_evaluar(
+            reto_ejecucion_id=body["RetoEjecucionId"],
+            usuario_id=body["UsuarioId"],
+            silabo_id=body["SilaboId"],
+            unidad_id=body["UnidadId"],
+            sesion_id=body["SesionId"],
+            score=str(evaluation["score"]),
+            prompt_msg=evaluation["prompt_msg"],
+            ai_msg=evaluation["feedback"],
+            input_tokens=evaluation["input_tokens"],
+            output_tokens=evaluation["output_tokens"],
+            cache_read_tokens=evaluation["cache_read_tokens"],
+            cache_write_tokens=evaluation["cache_write_tokens"],
+            respuesta_usuario=body["RespuestaUsuario"],
+            prescore_reason=evaluation["prescore_reason"],
+            prescore_similarity=evaluation["prescore_similarity"]
+        )
 
         return {
             "statusCode": 200,
             "body": json.dumps({
                 "success": True,
-                "score": score,
-                "feedback": feedback,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
+                "score": evaluation["score"],
+                "feedback": evaluation["feedback"],
+                "input_tokens": evaluation["input_tokens"],
+                "output_tokens": evaluation["output_tokens"],
+                "cache_read_tokens": evaluation["cache_read_tokens"],
+                "cache_write_tokens": evaluation["cache_write_tokens"]
             })
         }
         
+    except DeadlineExceededError as e:
+        logger.warning(f"Plazo de la solicitud agotado: {str(e)}")
+        return timeout_response(e)
+
+    except BedrockThrottledError as e:
+        logger.warning(f"Bedrock saturado: {str(e)}")
+        return throttled_response(e)
+
     except Exception as e:
         logger.error(f"Error en delete_history: {str(e)}")
         return {
@@ -322,4 +593,4 @@ def lambda_handler(event, context):
                 "success": False,
                 "message": str(e)
             })
-        }
\ No newline at end of file
+        }
@@ -1,20 +1,46 @@
 import json
 import os
-import re
-from boto3.dynamodb.conditions import Key, Attr
 from datetime import datetime, timedelta
-from aje_libs.common.helpers.bedrock_helper import BedrockHelper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
-from aje_libs.common.helpers.s3_helper import S3Helper
-from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.deadline_helper import (
+    Deadline,
+    DeadlineExceededError,
+    timeout_response
+)
+from aprendizaje_libs.helpers.idempotency_helper import IdempotencyStore, idempotent
+from aprendizaje_libs.helpers.jobs_helper import DEFAULT_MAX_RECEIVE_COUNT, JobsHelper, accepted_response, job_messages
+from aprendizaje_libs.helpers.logging_helper import configure_logging, log_payload
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init, stage
+from aprendizaje_libs.helpers.model_router_helper import ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.snapstart_helper import before_snapshot
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    throttled_response
+)
+from aprendizaje_libs.helpers.tracing_helper import annotate, item_size
+from aprendizaje_libs.helpers.validation_helper import bad_request_response, missing_fields
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
 
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
 OWNER = os.environ["OWNER"]
 DYNAMO_CASE_HISTORY_TABLE = os.environ["DYNAMO_CASE_HISTORY_TABLE"]
+DYNAMO_BEDROCK_GOVERNOR_TABLE = os.environ["DYNAMO_BEDROCK_GOVERNOR_TABLE"]
+DYNAMO_IDEMPOTENCY_TABLE = os.environ["DYNAMO_IDEMPOTENCY_TABLE"]
+DYNAMO_GENERATION_JOBS_TABLE = os.environ["DYNAMO_GENERATION_JOBS_TABLE"]
+GENERATION_JOBS_QUEUE_URL = os.environ.get("GENERATION_JOBS_QUEUE_URL")
+WEBSOCKET_CALLBACK_URL = os.environ.get("WEBSOCKET_CALLBACK_URL")
+JOBS_MAX_RECEIVE_COUNT = int(os.environ.get("JOBS_MAX_RECEIVE_COUNT", DEFAULT_MAX_RECEIVE_COUNT))
+JOB_TYPE = "generar_caso"
 
 # Parameter Store
 ssm_agent = SSMParameterHelper(f"/{ENVIRONMENT}/{PROJECT_NAME}/agent")
@@ -27,8 +53,19 @@ PINECONE_MAX_RETRIEVE_DOCUMENTS = int(PARAMETER_VALUE["PINECONE_MAX_RETRIEVE_DOC
 PINECONE_MIN_THRESHOLD = float(PARAMETER_VALUE["PINECONE_MIN_THRESHOLD"])
 EMBEDDINGS_MODEL_ID = PARAMETER_VALUE["EMBEDDINGS_MODEL_ID"]
 EMBEDDINGS_REGION = PARAMETER_VALUE["EMBEDDINGS_REGION"]
+BEDROCK_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("BEDROCK_MAX_CONCURRENCY", 20))
+CHATBOT_MS_PER_OUTPUT_TOKEN = float(PARAMETER_VALUE.get("CHATBOT_MS_PER_OUTPUT_TOKEN", 25))
+CHATBOT_MIN_OUTPUT_TOKENS = int(PARAMETER_VALUE.get("CHATBOT_MIN_OUTPUT_TOKENS", 256))
+MODEL_ROUTES = PARAMETER_VALUE.get("MODEL_ROUTES", {})
+MODEL_REQUEST_FIELDS = PARAMETER_VALUE.get("MODEL_REQUEST_FIELDS", {})
+PROMPT_CACHE_MODELS = PARAMETER_VALUE.get("PROMPT_CACHE_MODELS", [])
+IDEMPOTENCY_TTL_SECONDS = int(PARAMETER_VALUE.get("IDEMPOTENCY_TTL_SECONDS", 900))
+
+mark_init("config")
 
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+# Nivel, muestreo y límites de los registros según el parámetro del agente
+configure_logging(PARAMETER_VALUE, logger)
 
 # Inicialización de recursos
 case_history_table_helper = DynamoDBHelper(
@@ -37,9 +74,48 @@ case_history_table_helper = DynamoDBHelper(
     sk_name="date_time"
 )
 
-bedrock_helper = BedrockHelper(region_name=CHATBOT_REGION)
+jobs_helper = JobsHelper(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_GENERATION_JOBS_TABLE,
+        pk_name="job_id"
+    ),
+    queue_url=GENERATION_JOBS_QUEUE_URL
+)
+
+# Clientes de Bedrock por tramo de read_timeout, ajustados al plazo de cada solicitud
+bedrock_clients = bedrock_client_pool(CHATBOT_REGION)
+# SnapStart: los clientes de Bedrock de cada tramo de timeout se crean antes del snapshot
+before_snapshot(bedrock_clients.warm)
+
+# Gobernador de concurrencia compartido entre contenedores, uno por modelo de Bedrock
+governor_table_helper = DynamoDBHelper(
+    table_name=DYNAMO_BEDROCK_GOVERNOR_TABLE,
+    pk_name="governor_key"
+)
+
+# Modelo y parámetros por tarea; MODEL_ROUTES en el parámetro del agente sobrescribe estos valores
+model_router = ModelRouter(
+    routes=build_routes(
+        MODEL_ROUTES,
+        defaults={
+            "case": {"max_tokens": 2000, "temperature": 0.7}
+        },
+        default_model_id=CHATBOT_MODEL_ID
+    ),
+    client_pool=bedrock_clients,
+    governor_factory=lambda model_id: BedrockGovernor(
+        store=DynamoDBStateStore(governor_table_helper),
+        key=f"bedrock#{model_id}",
+        max_limit=BEDROCK_MAX_CONCURRENCY
+    ),
+    ms_per_output_token=CHATBOT_MS_PER_OUTPUT_TOKEN,
+    min_output_tokens=CHATBOT_MIN_OUTPUT_TOKENS,
+    request_fields=MODEL_REQUEST_FIELDS,
+    cache_models=PROMPT_CACHE_MODELS
+)
 
-CASO_ESCOLAR_PROMPT = """
+# Instrucciones estáticas (bloque de sistema cacheable); los datos de la solicitud van en CASO_USER_PROMPT
+CASO_ESCOLAR_SYSTEM_PROMPT = PromptTemplate("""
     ## Tarea
     Escribe un caso breve para estudiantes de nivel primaria. El caso debe ser claro, cercano y sin soluciones ni juicios.
 
@@ -52,9 +128,9 @@ CASO_ESCOLAR_PROMPT = """
 
     2. Si no se ha proporcionado ningún texto base, **genera un caso original** relacionado con los datos curriculares proporcionados (curso, competencia, capacidad, criterio, nivel de complejidad y temas clave).
 
-    3. Ajusta el nivel de detalle, el lenguaje y el dilema según el nivel de complejidad especificado ({complejidad}), manteniendo una narrativa comprensible y motivadora para estudiantes de primaria.
+    3. Ajusta el nivel de detalle, el lenguaje y el dilema según el nivel de complejidad indicado en los datos curriculares, manteniendo una narrativa comprensible y motivadora para estudiantes de primaria.
 
-    4. El dilema debe girar en torno a los temas clave ({temas_formateados}) e implicar la competencia, capacidad y criterio proporcionados, sin nombrarlos explícitamente.
+    4. El dilema debe girar en torno a los temas clave indicados en los datos curriculares e implicar la competencia, capacidad y criterio proporcionados, sin nombrarlos explícitamente.
 
     5. El caso debe cubrir los siguientes aspectos mediante el análisis:
         - Identificación del problema
@@ -70,17 +146,6 @@ CASO_ESCOLAR_PROMPT = """
 
     7. No incluir nota didáctica ni cierre instructivo.
 
-    ## Datos curriculares
-    - Curso: {nombre_curso}
-    - Competencia: {competencia}
-    - Capacidad: {capacidad}
-    - Criterio: {criterio}
-    - Complejidad: {complejidad}
-    - Temas clave: {temas_formateados}
-
-    ## Texto base del usuario (puede estar vacío)
-    {contexto}
-
     ## Estructura esperada del caso
     1. Título
     2. Resumen
@@ -90,9 +155,9 @@ CASO_ESCOLAR_PROMPT = """
     6. Personajes
     7. Alternativas
     8. Información operativa mínima
-"""
+""", name="CASO_ESCOLAR_SYSTEM_PROMPT")
 
-CASO_AVANZADO_PROMPT = """
+CASO_AVANZADO_SYSTEM_PROMPT = PromptTemplate("""
     ## Tarea
     Escribe un caso estratégico breve, al estilo Harvard/IESE, para análisis individual. El caso debe ser claro, profesional y sin soluciones ni juicios.
 
@@ -105,9 +170,9 @@ CASO_AVANZADO_PROMPT = """
 
     2. Si no se ha proporcionado ningún texto base, **genera un caso estratégico original** relacionado con los datos curriculares (curso, competencia, capacidad, criterio, nivel de complejidad y temas clave).
 
-    3. Ajusta el nivel de detalle, la complejidad del dilema y la profundidad del contexto según el nivel de complejidad especificado ({complejidad}).
+    3. Ajusta el nivel de detalle, la complejidad del dilema y la profundidad del contexto según el nivel de complejidad indicado en los datos curriculares.
 
-    4. El dilema debe girar en torno a los temas clave ({temas_formateados}) e implicar la competencia, capacidad y criterio proporcionados, sin nombrarlos explícitamente.
+    4. El dilema debe girar en torno a los temas clave indicados en los datos curriculares e implicar la competencia, capacidad y criterio proporcionados, sin nombrarlos explícitamente.
 
     5. El caso debe cubrir los siguientes aspectos mediante el análisis:
         - Identificación del problema
@@ -123,6 +188,18 @@ CASO_AVANZADO_PROMPT = """
 
     7. No incluir nota didáctica ni cierre instructivo.
 
+    ## Estructura esperada del caso
+    1. Título
+    2. Resumen
+    3. Contexto
+    4. Datos clave
+    5. Problema central
+    6. Actores
+    7. Alternativas estratégicas
+    8. Información operativa mínima
+""", name="CASO_AVANZADO_SYSTEM_PROMPT")
+
+CASO_USER_PROMPT = PromptTemplate("""
     ## Datos curriculares
     - Curso: {nombre_curso}
     - Competencia: {competencia}
@@ -133,66 +210,41 @@ CASO_AVANZADO_PROMPT = """
 
     ## Texto base del usuario (puede estar vacío)
     {contexto}
+""", name="CASO_USER_PROMPT")
 
-    ## Estructura esperada del caso
-    1. Título
-    2. Resumen
-    3. Contexto
-    4. Datos clave
-    5. Problema central
-    6. Actores
-    7. Alternativas estratégicas
-    8. Información operativa mínima
-"""
-
-SYSTEM_PROMPT2 = """
-Eres un asistente llamado {asistente_nombre} que puede ayudar al usuario con sus preguntas usando **únicamente información confiable**.
-
-Contexto del usuario:
-- Rol del usuario: {usuario_rol}
-- Nombre del usuario: {usuario_nombre}
-- Curso: {curso}
-- Institución: {institucion}
-
-Instrucciones del modelo:
-- Debe proporcionar una respuesta concisa a preguntas sencillas cuando la respuesta se encuentre directamente en los resultados
-  de búsqueda. Sin embargo, en el caso de preguntas de sí/no, proporcione algunos detalles.
-- Si la pregunta requiere un razonamiento complejo, debe buscar información relevante en los resultados de búsqueda y resumir la
-  respuesta basándose en dicha información mediante un razonamiento lógico.
-- Si los resultados de búsqueda no contienen información que pueda responder a la pregunta, indique que no pudo encontrar una
-  respuesta exacta. Si los resultados de búsqueda son completamente irrelevantes, indique que no pudo encontrar una respuesta exacta y resuma los resultados.
-- **NO uses información externa que no esté en los resultados de búsqueda**, excepto para dar explicaciones conceptuales generales del curso **{curso}**.
-- **NO inventes información** ni generes contenido fuera del ámbito educativo salvo que el usuario lo solicite explícitamente.
-- Mantén **siempre un tono formal, claro y enfocado al ámbito académico**.
-"""
-
-def get_converse_response(prompt: str, max_tokens: int, temperature: float = 1.0) -> dict:
+
+# Campos requeridos del cuerpo; constants/request_models.py genera con ellos el modelo de API Gateway
+REQUIRED_FIELDS = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "Contexto", "NombreCurso", "Competencia", "Capacidad", "Criterio", "Complejidad", "Temas"]
+
+# Reintentos del front end: un duplicado espera o recibe el resultado de la solicitud original
+idempotency_store = IdempotencyStore(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_IDEMPOTENCY_TABLE,
+        pk_name="idempotency_key"
+    ),
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
+
+mark_init("clients")
+
+def get_converse_response(prompt: str, task: str, deadline: Deadline = None, max_tokens: int = None, system: str = None) -> dict:
     """
-    Conversa con el modelo de Bedrock usando un prompt de sistema separado y mensajes estructurados.
+    Conversa con el modelo asignado a la tarea en MODEL_ROUTES, usando sus modelos de respaldo si está limitado o lento.
     
     Parámetros:
-    - prompt: texto con las instrucciones del prompt
-    - max_tokens: número máximo de tokens de respuesta
-    - temperature: control de aleatoriedad
+    - prompt: datos de la solicitud (bloque dinámico del usuario)
+    - task: tarea de la ruta de modelos (case)
+    - deadline: plazo de la solicitud; ajusta max_tokens, el read timeout y los reintentos
+    - max_tokens: sobrescribe el máximo de tokens de la ruta
+    - system: instrucciones estáticas; se envían como bloque de sistema con punto de caché
     """
 
-    logger.info(json.dumps(prompt, indent=2))
+    log_payload(logger, "Prompt", prompt)
 
-    parameters = {
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": 0.2
-    }
-
-    response = bedrock_helper.converse(
-        model=CHATBOT_MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        parameters=parameters
-    )
+    return model_router.converse(task, prompt, deadline=deadline, max_tokens=max_tokens, system=system)
 
-    return response
-
-def upload_caso(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int):
+@stage("history_write")
+def upload_caso(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
     """
     Sube un caso a la tabla DynamoDB con los datos especificados.
     """
@@ -214,94 +266,114 @@ def upload_caso(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int,
             "ai_msg": ai_msg,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens,
             "ttl": ttl_timestamp
         }
 
+        annotate(table=case_history_table_helper.table_name, item_bytes=item_size(item))
+
         case_history_table_helper.put_item(data = item)
-        logger.info(f"Elemento subido con éxito: {item}")
+        log_payload(logger, "Elemento subido con éxito", item)
     except Exception as e:
         logger.error(f"Error al subir el elemento: {e}")
 
+def generar_caso(body: dict, deadline: Deadline) -> dict:
+    """
+    Genera el caso y lo guarda en el historial.
+
+    Parámetros:
+    - body: cuerpo validado de la solicitud
+    - deadline: plazo de la generación (síncrona o del worker)
+    """
+    user_id = body["UsuarioId"]
+    syllabus_event_id = body["SilaboId"]
+    unidad_id = body["UnidadId"]
+    sesion_id = body["SesionId"]
+    contexto = body["Contexto"]
+    nombre_curso = body["NombreCurso"]
+    competencia = body["Competencia"]
+    capacidad = body["Capacidad"]
+    criterio = body["Criterio"]
+    complejidad = body["Complejidad"]
+    temas = body.get("Temas", None)
+
+    if complejidad == 'Fácil':
+        system_prompt = CASO_ESCOLAR_SYSTEM_PROMPT.text
+    else:
+        system_prompt = CASO_AVANZADO_SYSTEM_PROMPT.text
+
+    with stage("prompt"):
+        prompt = CASO_USER_PROMPT.render(
+            contexto=contexto,
+            nombre_curso=nombre_curso,
+            competencia=competencia,
+            capacidad=capacidad,
+            criterio=criterio,
+            complejidad=complejidad,
+            temas_formateados=', '.join(temas),
+        )
+
+    response = get_converse_response(prompt=prompt, task="case", deadline=deadline, system=system_prompt)
+    case = response['output']['message']['content'][0]['text']
+    input_tokens = response['usage']['inputTokens']
+    output_tokens = response['usage']['outputTokens']
+    cache_read_tokens, cache_write_tokens = cache_usage(response)
+
+    # Guardar en historial
+    upload_caso(
+        usuario_id=user_id,
+        silabo_id=syllabus_event_id,
+        unidad_id=unidad_id,
+        sesion_id=sesion_id,
+        prompt_msg=prompt,
+        ai_msg=case,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_read_tokens=cache_read_tokens,
+        cache_write_tokens=cache_write_tokens
+    )
+
+    return {
+        "success": True,
+        "case": case,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cache_read_tokens": cache_read_tokens,
+        "cache_write_tokens": cache_write_tokens
+    }
+
+@instrument("metodo-caso-generar_caso")
+@idempotent(idempotency_store)
 def lambda_handler(event, context):
     try:
+        deadline = Deadline.from_context(context)
         body = event.get('body', event)
         if isinstance(body, str):
             body = json.loads(body)
 
-        required_fields = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "Contexto", "NombreCurso", "Competencia", "Capacidad", "Criterio", "Complejidad", "Temas"]
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
-            return {
-                "success": False,
-                "message": f"Campos requeridos faltantes: {missing_fields}",
-                "statusCode": 400,
-                "error": {
-                    "code": "MISSING_FIELDS",
-                    "details": f"Campos requeridos faltantes: {missing_fields}"
-                }
-            }
-        
-        user_id = body["UsuarioId"]
-        syllabus_event_id = body["SilaboId"]
-        unidad_id = body["UnidadId"]
-        sesion_id = body["SesionId"]
-        contexto = body["Contexto"]
-        nombre_curso = body["NombreCurso"]
-        competencia = body["Competencia"]
-        capacidad = body["Capacidad"]
-        criterio = body["Criterio"]
-        complejidad = body["Complejidad"]
-        temas = body.get("Temas", None)
-
-        prompt = ""
-        if complejidad == 'Fácil':
-            prompt = CASO_ESCOLAR_PROMPT.format(
-                contexto=contexto,
-                nombre_curso=nombre_curso,
-                competencia=competencia,
-                capacidad=capacidad,
-                criterio=criterio,
-                complejidad=complejidad,
-                temas_formateados=', '.join(temas),
-            )
-        else:
-            prompt = CASO_AVANZADO_PROMPT.format(
-                contexto=contexto,
-                nombre_curso=nombre_curso,
-                competencia=competencia,
-                capacidad=capacidad,
-                criterio=criterio,
-                complejidad=complejidad,
-                temas_formateados=', '.join(temas),
-            )
-
-        response = get_converse_response(prompt = prompt, max_tokens=2000, temperature=0.7)
-        case = response['output']['message']['content'][0]['text']
-        input_tokens = response['usage']['inputTokens']
-        output_tokens = response['usage']['outputTokens']
-
-        # Guardar en historial
-        upload_caso(
-            usuario_id=user_id,
-            silabo_id=syllabus_event_id,
-            unidad_id=unidad_id,
-            sesion_id=sesion_id,
-            prompt_msg=prompt,
-            ai_msg=case,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens
-        )
+        missing = missing_fields(body, REQUIRED_FIELDS)
+        if missing:
+            return bad_request_response("MISSING_FIELDS", f"Campos requeridos faltantes: {missing}")
+
+        # Modo asíncrono: se registra el trabajo y el worker realiza la generación
+        if body.get("Async"):
+            job_id = jobs_helper.submit(JOB_TYPE, body, usuario_id=body["UsuarioId"])
+            return accepted_response(job_id)
 
         return {
             "statusCode": 200,
-            "body": json.dumps({
-                "success": True,
-                "case": case,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
-            })
+            "body": json.dumps(generar_caso(body, deadline))
         }
     
+    except DeadlineExceededError as e:
+        logger.warning(f"Plazo de la solicitud agotado: {str(e)}")
+        return timeout_response(e)
+
+    except BedrockThrottledError as e:
+        logger.warning(f"Bedrock saturado: {str(e)}")
+        return throttled_response(e)
+
     except Exception as e:
         logger.error(f"Error en la función Lambda: {str(e)}")
         return {
@@ -310,4 +382,20 @@ def lambda_handler(event, context):
                 "success": False,
                 "message": str(e)
             })
-        }
\ No newline at end of file
+        }
+
+@instrument("metodo-caso-generar_caso-worker")
+def worker_handler(event, context):
+    """
+    Procesa los trabajos asíncronos encolados en SQS.
+    """
+    for message in job_messages(event):
+        # El worker no está sujeto al límite de API Gateway, solo al timeout de la Lambda
+        deadline = Deadline.from_context(context, limit_ms=None)
+        jobs_helper.process(
+            message,
+            lambda payload: generar_caso(payload, deadline),
+            lease_ms=deadline.remaining_ms(),
+            callback_url=WEBSOCKET_CALLBACK_URL,
+            max_receive_count=JOBS_MAX_RECEIVE_COUNT
+        )
@@ -1,20 +1,49 @@
 import json
 import os
-import re
-from boto3.dynamodb.conditions import Key, Attr
 from datetime import datetime, timedelta
-from aje_libs.common.helpers.bedrock_helper import BedrockHelper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
-from aje_libs.common.helpers.s3_helper import S3Helper
-from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.challenge_helper import METODO_CASO_FORMAT, render_challenges, structure_challenges
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.deadline_helper import (
+    Deadline,
+    DeadlineExceededError,
+    timeout_response
+)
+from aprendizaje_libs.helpers.idempotency_helper import IdempotencyStore, idempotent
+from aprendizaje_libs.helpers.jobs_helper import DEFAULT_MAX_RECEIVE_COUNT, JobsHelper, accepted_response, job_messages
+from aprendizaje_libs.helpers.logging_helper import configure_logging, log_payload
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init, stage
+from aprendizaje_libs.helpers.model_router_helper import ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.snapstart_helper import before_snapshot
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    throttled_response
+)
+from aprendizaje_libs.helpers.tracing_helper import annotate, item_size
+from aprendizaje_libs.helpers.validation_helper import bad_request_response, missing_fields
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
 
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
 OWNER = os.environ["OWNER"]
 DYNAMO_LEARNING_PATH_HISTORY_TABLE = os.environ["DYNAMO_LEARNING_PATH_HISTORY_TABLE"]
+DYNAMO_BEDROCK_GOVERNOR_TABLE = os.environ["DYNAMO_BEDROCK_GOVERNOR_TABLE"]
+DYNAMO_IDEMPOTENCY_TABLE = os.environ["DYNAMO_IDEMPOTENCY_TABLE"]
+DYNAMO_GENERATION_JOBS_TABLE = os.environ["DYNAMO_GENERATION_JOBS_TABLE"]
+GENERATION_JOBS_QUEUE_URL = os.environ.get("GENERATION_JOBS_QUEUE_URL")
+WEBSOCKET_CALLBACK_URL = os.environ.get("WEBSOCKET_CALLBACK_URL")
+JOBS_MAX_RECEIVE_COUNT = int(os.environ.get("JOBS_MAX_RECEIVE_COUNT", DEFAULT_MAX_RECEIVE_COUNT))
+JOB_TYPE = "generar_ruta_caso"
+# Un reto por etapa (3 a 7) del análisis de casos
+CASO_NUMERO_RETOS = 5
 
 # Parameter Store
 ssm_agent = SSMParameterHelper(f"/{ENVIRONMENT}/{PROJECT_NAME}/agent")
@@ -27,8 +56,21 @@ PINECONE_MAX_RETRIEVE_DOCUMENTS = int(PARAMETER_VALUE["PINECONE_MAX_RETRIEVE_DOC
 PINECONE_MIN_THRESHOLD = float(PARAMETER_VALUE["PINECONE_MIN_THRESHOLD"])
 EMBEDDINGS_MODEL_ID = PARAMETER_VALUE["EMBEDDINGS_MODEL_ID"]
 EMBEDDINGS_REGION = PARAMETER_VALUE["EMBEDDINGS_REGION"]
+BEDROCK_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("BEDROCK_MAX_CONCURRENCY", 20))
+CHATBOT_MS_PER_OUTPUT_TOKEN = float(PARAMETER_VALUE.get("CHATBOT_MS_PER_OUTPUT_TOKEN", 25))
+CHATBOT_MIN_OUTPUT_TOKENS = int(PARAMETER_VALUE.get("CHATBOT_MIN_OUTPUT_TOKENS", 256))
+MODEL_ROUTES = PARAMETER_VALUE.get("MODEL_ROUTES", {})
+MODEL_REQUEST_FIELDS = PARAMETER_VALUE.get("MODEL_REQUEST_FIELDS", {})
+PROMPT_CACHE_MODELS = PARAMETER_VALUE.get("PROMPT_CACHE_MODELS", [])
+CHALLENGE_REPAIR_MAX_TOKENS = int(PARAMETER_VALUE.get("CHALLENGE_REPAIR_MAX_TOKENS", 800))
+CHALLENGE_MAX_REPAIRS = int(PARAMETER_VALUE.get("CHALLENGE_MAX_REPAIRS", 1))
+IDEMPOTENCY_TTL_SECONDS = int(PARAMETER_VALUE.get("IDEMPOTENCY_TTL_SECONDS", 900))
+
+mark_init("config")
 
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+# Nivel, muestreo y límites de los registros según el parámetro del agente
+configure_logging(PARAMETER_VALUE, logger)
 
 # Inicialización de recursos
 learning_path_table_helper = DynamoDBHelper(
@@ -37,9 +79,50 @@ learning_path_table_helper = DynamoDBHelper(
     sk_name="date_time"
 )
 
-bedrock_helper = BedrockHelper(region_name=CHATBOT_REGION)
+jobs_helper = JobsHelper(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_GENERATION_JOBS_TABLE,
+        pk_name="job_id"
+    ),
+    queue_url=GENERATION_JOBS_QUEUE_URL
+)
+
+# Clientes de Bedrock por tramo de read_timeout, ajustados al plazo de cada solicitud
+bedrock_clients = bedrock_client_pool(CHATBOT_REGION)
+# SnapStart: los clientes de Bedrock de cada tramo de timeout se crean antes del snapshot
+before_snapshot(bedrock_clients.warm)
 
-RUTA_PROMPT = """
+# Gobernador de concurrencia compartido entre contenedores, uno por modelo de Bedrock
+governor_table_helper = DynamoDBHelper(
+    table_name=DYNAMO_BEDROCK_GOVERNOR_TABLE,
+    pk_name="governor_key"
+)
+
+# Modelo y parámetros por tarea; MODEL_ROUTES en el parámetro del agente sobrescribe estos valores
+model_router = ModelRouter(
+    routes=build_routes(
+        MODEL_ROUTES,
+        defaults={
+            "path": {"max_tokens": CHATBOT_LLM_MAX_TOKENS, "temperature": 0.7},
+            # Corrección de un solo reto mal formado (challenge_helper)
+            "repair": {"max_tokens": CHALLENGE_REPAIR_MAX_TOKENS, "temperature": 0.7}
+        },
+        default_model_id=CHATBOT_MODEL_ID
+    ),
+    client_pool=bedrock_clients,
+    governor_factory=lambda model_id: BedrockGovernor(
+        store=DynamoDBStateStore(governor_table_helper),
+        key=f"bedrock#{model_id}",
+        max_limit=BEDROCK_MAX_CONCURRENCY
+    ),
+    ms_per_output_token=CHATBOT_MS_PER_OUTPUT_TOKEN,
+    min_output_tokens=CHATBOT_MIN_OUTPUT_TOKENS,
+    request_fields=MODEL_REQUEST_FIELDS,
+    cache_models=PROMPT_CACHE_MODELS
+)
+
+# Instrucciones estáticas (bloque de sistema cacheable); los datos de la solicitud van en RUTA_USER_PROMPT
+RUTA_SYSTEM_PROMPT = PromptTemplate("""
     ## Tarea
     Generar cinco retos formativos alineados con las etapas del análisis de casos individuales, utilizando el caso proporcionado y los datos curriculares. Cada reto debe evaluar una habilidad específica por etapa, usando el caso como base y respetando la estructura detallada.
 
@@ -52,7 +135,7 @@ RUTA_PROMPT = """
 
     @Reto: [Título breve del desafío]  
     @Contexto: [Máx. 60 palabras. Incluya actores, hechos o tensiones clave del caso. En el reto 5 debe incluir decisiones tomadas, actores clave y plazos.]  
-    @Pregunta: [Una sola línea con la pregunta principal contextualizada + subpregunta que aplique directamente uno de los temas clave listados en {temas_formateados}.]  
+    @Pregunta: [Una sola línea con la pregunta principal contextualizada + subpregunta que aplique directamente uno de los temas clave listados en los datos curriculares.]  
     @Respuesta Modelo: [Respuesta clara, analítica y contextual.]  
     @Conceptos Clave: [**Inicie con el mismo tema clave exacto usado en la subpregunta.** Luego, agregue otros conceptos o herramientas complementarias. Separe por comas y termine en punto.]
 
@@ -66,18 +149,6 @@ RUTA_PROMPT = """
     @Respuesta Modelo: La desorganización impide filtrar por género o frecuencia. Un datamart permitiría estructurar por dimensiones, facilitando análisis y toma de decisiones.  
     @Conceptos Clave: Modelado de un datamart/datawarehouse, segmentación de datos, estructura dimensional.
 
-    ## Datos curriculares
-    - Competencia: {competencia}  
-    - Capacidad: {capacidad}  
-    - Criterio: {criterio}  
-    - Complejidad: {complejidad}
-
-    ### Temas Clave
-    {temas_formateados}
-
-    ### Caso:
-    {caso}
-
     ## Instrucciones específicas
 
     1. Inicie con un solo `@Titulo` general para toda la ruta.
@@ -106,59 +177,58 @@ RUTA_PROMPT = """
     `@Reto`, `@Contexto`, `@Pregunta`, `@Respuesta Modelo`, `@Conceptos Clave`.
 
     9. **Trazabilidad obligatoria**:  
-    - La **subpregunta** debe exigir aplicar directamente un tema de `{temas_formateados}`.  
+    - La **subpregunta** debe exigir aplicar directamente uno de los temas clave.  
     - Ese mismo tema debe aparecer como **primer concepto en `@Conceptos Clave`**, sin reformulaciones ni sinónimos.  
     - Esto asegura la coherencia evaluativa entre la subpregunta y los conceptos que se espera que el estudiante aplique.
-"""
-
-SYSTEM_PROMPT2 = """
-Eres un asistente llamado {asistente_nombre} que puede ayudar al usuario con sus preguntas usando **únicamente información confiable**.
-
-Contexto del usuario:
-- Rol del usuario: {usuario_rol}
-- Nombre del usuario: {usuario_nombre}
-- Curso: {curso}
-- Institución: {institucion}
-
-Instrucciones del modelo:
-- Debe proporcionar una respuesta concisa a preguntas sencillas cuando la respuesta se encuentre directamente en los resultados
-  de búsqueda. Sin embargo, en el caso de preguntas de sí/no, proporcione algunos detalles.
-- Si la pregunta requiere un razonamiento complejo, debe buscar información relevante en los resultados de búsqueda y resumir la
-  respuesta basándose en dicha información mediante un razonamiento lógico.
-- Si los resultados de búsqueda no contienen información que pueda responder a la pregunta, indique que no pudo encontrar una
-  respuesta exacta. Si los resultados de búsqueda son completamente irrelevantes, indique que no pudo encontrar una respuesta exacta y resuma los resultados.
-- **NO uses información externa que no esté en los resultados de búsqueda**, excepto para dar explicaciones conceptuales generales del curso **{curso}**.
-- **NO inventes información** ni generes contenido fuera del ámbito educativo salvo que el usuario lo solicite explícitamente.
-- Mantén **siempre un tono formal, claro y enfocado al ámbito académico**.
-"""
-
-def get_converse_response(prompt: str, max_tokens: int, temperature: float = 1.0) -> dict:
+""", name="RUTA_SYSTEM_PROMPT")
+
+RUTA_USER_PROMPT = PromptTemplate("""
+    ## Datos curriculares
+    - Competencia: {competencia}  
+    - Capacidad: {capacidad}  
+    - Criterio: {criterio}  
+    - Complejidad: {complejidad}
+
+    ### Temas Clave
+    {temas_formateados}
+
+    ### Caso:
+    {caso}
+""", name="RUTA_USER_PROMPT")
+
+
+# Campos requeridos del cuerpo; constants/request_models.py genera con ellos el modelo de API Gateway
+REQUIRED_FIELDS = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Competencia", "Capacidad", "Criterio", "Complejidad", "Temas", "Caso"]
+
+# Reintentos del front end: un duplicado espera o recibe el resultado de la solicitud original
+idempotency_store = IdempotencyStore(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_IDEMPOTENCY_TABLE,
+        pk_name="idempotency_key"
+    ),
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
+
+mark_init("clients")
+
+def get_converse_response(prompt: str, task: str, deadline: Deadline = None, max_tokens: int = None, system: str = None) -> dict:
     """
-    Conversa con el modelo de Bedrock usando un prompt de sistema separado y mensajes estructurados.
+    Conversa con el modelo asignado a la tarea en MODEL_ROUTES, usando sus modelos de respaldo si está limitado o lento.
     
     Parámetros:
-    - prompt: texto con las instrucciones del prompt
-    - max_tokens: número máximo de tokens de respuesta
-    - temperature: control de aleatoriedad
+    - prompt: datos de la solicitud (bloque dinámico del usuario)
+    - task: tarea de la ruta de modelos (path o repair)
+    - deadline: plazo de la solicitud; ajusta max_tokens, el read timeout y los reintentos
+    - max_tokens: sobrescribe el máximo de tokens de la ruta
+    - system: instrucciones estáticas; se envían como bloque de sistema con punto de caché
     """
 
-    logger.info(json.dumps(prompt, indent=2))
-
-    parameters = {
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": 0.2
-    }
-
-    response = bedrock_helper.converse(
-        model=CHATBOT_MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        parameters=parameters
-    )
+    log_payload(logger, "Prompt", prompt)
 
-    return response
+    return model_router.converse(task, prompt, deadline=deadline, max_tokens=max_tokens, system=system)
 
-def upload_ruta(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int):
+@stage("history_write")
+def upload_ruta(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
     """
     Sube una ruta a la tabla DynamoDB con los datos especificados.
     """
@@ -180,46 +250,40 @@ def upload_ruta(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int,
             "ai_msg": ai_msg,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens,
             "ttl": ttl_timestamp
         }
 
+        annotate(table=learning_path_table_helper.table_name, item_bytes=item_size(item))
+
         learning_path_table_helper.put_item(data = item)
-        logger.info(f"Elemento subido con éxito: {item}")
+        log_payload(logger, "Elemento subido con éxito", item)
     except Exception as e:
         logger.error(f"Error al subir el elemento: {e}")
 
-def lambda_handler(event, context):
-    try:
-        body = event.get('body', event)
-        if isinstance(body, str):
-            body = json.loads(body)
+def generar_ruta(body: dict, deadline: Deadline) -> dict:
+    """
+    Genera la ruta de retos por etapas del caso y la guarda en el historial.
 
-        required_fields = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Competencia", "Capacidad", "Criterio", "Complejidad", "Temas", "Caso"]
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
-            return {
-                "success": False,
-                "message": f"Campos requeridos faltantes: {missing_fields}",
-                "statusCode": 400,
-                "error": {
-                    "code": "MISSING_FIELDS",
-                    "details": f"Campos requeridos faltantes: {missing_fields}"
-                }
-            }
-        
-        user_id = body["UsuarioId"]
-        syllabus_event_id = body["SilaboId"]
-        unidad_id = body["UnidadId"]
-        sesion_id = body["SesionId"]
-        nombre_curso = body["NombreCurso"]
-        competencia = body["Competencia"]
-        capacidad = body["Capacidad"]
-        criterio = body["Criterio"]
-        complejidad = body["Complejidad"]
-        temas = body.get("Temas", None)
-        caso = body["Caso"]
-
-        prompt = RUTA_PROMPT.format(
+    Parámetros:
+    - body: cuerpo validado de la solicitud
+    - deadline: plazo de la generación (síncrona o del worker)
+    """
+    user_id = body["UsuarioId"]
+    syllabus_event_id = body["SilaboId"]
+    unidad_id = body["UnidadId"]
+    sesion_id = body["SesionId"]
+    nombre_curso = body["NombreCurso"]
+    competencia = body["Competencia"]
+    capacidad = body["Capacidad"]
+    criterio = body["Criterio"]
+    complejidad = body["Complejidad"]
+    temas = body.get("Temas", None)
+    caso = body["Caso"]
+
+    with stage("prompt"):
+        prompt = RUTA_USER_PROMPT.render(
             competencia=competencia,
             capacidad=capacidad,
             criterio=criterio,
@@ -228,32 +292,87 @@ def lambda_handler(event, context):
             caso=caso
         )
 
-        response = get_converse_response(prompt=prompt, max_tokens=CHATBOT_LLM_MAX_TOKENS, temperature=0.7)
-        learning_path = response['output']['message']['content'][0]['text']
-        input_tokens = response['usage']['inputTokens']
-        output_tokens = response['usage']['outputTokens']
-
-        upload_ruta(
-            usuario_id=user_id,
-            silabo_id=syllabus_event_id,
-            unidad_id=unidad_id,
-            sesion_id=sesion_id,
-            prompt_msg=prompt,
-            ai_msg=learning_path,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens
-        )
+    response = get_converse_response(prompt=prompt, task="path", deadline=deadline, system=RUTA_SYSTEM_PROMPT.text)
+    learning_path = response['output']['message']['content'][0]['text']
+    input_tokens = response['usage']['inputTokens']
+    output_tokens = response['usage']['outputTokens']
+    cache_read_tokens, cache_write_tokens = cache_usage(response)
+
+    # Se valida la respuesta; un reto mal formado se corrige con una llamada pequeña que solo genera ese reto
+    structured = structure_challenges(
+        learning_path,
+        METODO_CASO_FORMAT,
+        expected=CASO_NUMERO_RETOS,
+        repair=lambda instructions: get_converse_response(
+            prompt=prompt + "\n\n" + instructions, task="repair", deadline=deadline, system=RUTA_SYSTEM_PROMPT.text
+        ),
+        max_repairs=CHALLENGE_MAX_REPAIRS
+    )
+    if structured.repaired:
+        learning_path = render_challenges(structured.titulo, structured.retos, METODO_CASO_FORMAT)
+    input_tokens += structured.usage["input_tokens"]
+    output_tokens += structured.usage["output_tokens"]
+    cache_read_tokens += structured.usage["cache_read_tokens"]
+    cache_write_tokens += structured.usage["cache_write_tokens"]
+
+    upload_ruta(
+        usuario_id=user_id,
+        silabo_id=syllabus_event_id,
+        unidad_id=unidad_id,
+        sesion_id=sesion_id,
+        prompt_msg=prompt,
+        ai_msg=learning_path,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_read_tokens=cache_read_tokens,
+        cache_write_tokens=cache_write_tokens
+    )
+
+    return {
+        "success": True,
+        "learning_path": learning_path,
+        "titulo": structured.titulo,
+        "retos": structured.retos,
+        "valid": structured.valid,
+        "errors": structured.errors,
+        "repaired": structured.repaired,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cache_read_tokens": cache_read_tokens,
+        "cache_write_tokens": cache_write_tokens
+    }
+
+@instrument("metodo-caso-generar_ruta")
+@idempotent(idempotency_store)
+def lambda_handler(event, context):
+    try:
+        deadline = Deadline.from_context(context)
+        body = event.get('body', event)
+        if isinstance(body, str):
+            body = json.loads(body)
+
+        missing = missing_fields(body, REQUIRED_FIELDS)
+        if missing:
+            return bad_request_response("MISSING_FIELDS", f"Campos requeridos faltantes: {missing}")
+
+        # Modo asíncrono: se registra el trabajo y el worker realiza la generación
+        if body.get("Async"):
+            job_id = jobs_helper.submit(JOB_TYPE, body, usuario_id=body["UsuarioId"])
+            return accepted_response(job_id)
 
         return {
             "statusCode": 200,
-            "body": json.dumps({
-                "success": True,
-                "learning_path": learning_path,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
-            })
+            "body": json.dumps(generar_ruta(body, deadline))
         }
     
+    except DeadlineExceededError as e:
+        logger.warning(f"Plazo de la solicitud agotado: {str(e)}")
+        return timeout_response(e)
+
+    except BedrockThrottledError as e:
+        logger.warning(f"Bedrock saturado: {str(e)}")
+        return throttled_response(e)
+
     except Exception as e:
         logger.error(f"Error en la función Lambda: {str(e)}")
         return {
@@ -262,4 +381,20 @@ def lambda_handler(event, context):
                 "success": False,
                 "message": str(e)
             })
-        }
\ No newline at end of file
+        }
+
+@instrument("metodo-caso-generar_ruta-worker")
+def worker_handler(event, context):
+    """
+    Procesa los trabajos asíncronos encolados en SQS.
+    """
+    for message in job_messages(event):
+        # El worker no está sujeto al límite de API Gateway, solo al timeout de la Lambda
+        deadline = Deadline.from_context(context, limit_ms=None)
+        jobs_helper.process(
+            message,
+            lambda payload: generar_ruta(payload, deadline),
+            lease_ms=deadline.remaining_ms(),
+            callback_url=WEBSOCKET_CALLBACK_URL,
+            max_receive_count=JOBS_MAX_RECEIVE_COUNT
+        )
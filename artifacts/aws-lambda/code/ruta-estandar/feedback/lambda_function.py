@@ -1,17 +1,37 @@
 import json
 import os
-import boto3
-from aje_libs.common.helpers.bedrock_helper import BedrockHelper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
-from aje_libs.common.helpers.s3_helper import S3Helper
-from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.deadline_helper import (
+    Deadline,
+    DeadlineExceededError,
+    timeout_response
+)
+from aprendizaje_libs.helpers.idempotency_helper import IdempotencyStore, idempotent
+from aprendizaje_libs.helpers.logging_helper import configure_logging, log_payload
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init, stage
+from aprendizaje_libs.helpers.model_router_helper import ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.snapstart_helper import before_snapshot
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    throttled_response
+)
+from aprendizaje_libs.helpers.validation_helper import bad_request_response, missing_fields
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
 
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
 OWNER = os.environ["OWNER"]
+DYNAMO_BEDROCK_GOVERNOR_TABLE = os.environ["DYNAMO_BEDROCK_GOVERNOR_TABLE"]
+DYNAMO_IDEMPOTENCY_TABLE = os.environ["DYNAMO_IDEMPOTENCY_TABLE"]
 
 # Parameter Store
 ssm_agent = SSMParameterHelper(f"/{ENVIRONMENT}/{PROJECT_NAME}/agent")
@@ -24,24 +44,58 @@ PINECONE_MAX_RETRIEVE_DOCUMENTS = int(PARAMETER_VALUE["PINECONE_MAX_RETRIEVE_DOC
 PINECONE_MIN_THRESHOLD = float(PARAMETER_VALUE["PINECONE_MIN_THRESHOLD"])
 EMBEDDINGS_MODEL_ID = PARAMETER_VALUE["EMBEDDINGS_MODEL_ID"]
 EMBEDDINGS_REGION = PARAMETER_VALUE["EMBEDDINGS_REGION"]
+BEDROCK_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("BEDROCK_MAX_CONCURRENCY", 20))
+CHATBOT_MS_PER_OUTPUT_TOKEN = float(PARAMETER_VALUE.get("CHATBOT_MS_PER_OUTPUT_TOKEN", 25))
+CHATBOT_MIN_OUTPUT_TOKENS = int(PARAMETER_VALUE.get("CHATBOT_MIN_OUTPUT_TOKENS", 256))
+MODEL_ROUTES = PARAMETER_VALUE.get("MODEL_ROUTES", {})
+MODEL_REQUEST_FIELDS = PARAMETER_VALUE.get("MODEL_REQUEST_FIELDS", {})
+PROMPT_CACHE_MODELS = PARAMETER_VALUE.get("PROMPT_CACHE_MODELS", [])
+IDEMPOTENCY_TTL_SECONDS = int(PARAMETER_VALUE.get("IDEMPOTENCY_TTL_SECONDS", 900))
+
+mark_init("config")
 
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+# Nivel, muestreo y límites de los registros según el parámetro del agente
+configure_logging(PARAMETER_VALUE, logger)
 
 # Inicialización de recursos
-bedrock_helper = BedrockHelper(region_name=CHATBOT_REGION)
-
-FEEDBACK_PROMPT = """
+# Clientes de Bedrock por tramo de read_timeout, ajustados al plazo de cada solicitud
+bedrock_clients = bedrock_client_pool(CHATBOT_REGION)
+# SnapStart: los clientes de Bedrock de cada tramo de timeout se crean antes del snapshot
+before_snapshot(bedrock_clients.warm)
+
+# Gobernador de concurrencia compartido entre contenedores, uno por modelo de Bedrock
+governor_table_helper = DynamoDBHelper(
+    table_name=DYNAMO_BEDROCK_GOVERNOR_TABLE,
+    pk_name="governor_key"
+)
+
+# Modelo y parámetros por tarea; MODEL_ROUTES en el parámetro del agente sobrescribe estos valores
+model_router = ModelRouter(
+    routes=build_routes(
+        MODEL_ROUTES,
+        defaults={
+            "final_feedback": {"max_tokens": CHATBOT_LLM_MAX_TOKENS, "temperature": 0.5}
+        },
+        default_model_id=CHATBOT_MODEL_ID
+    ),
+    client_pool=bedrock_clients,
+    governor_factory=lambda model_id: BedrockGovernor(
+        store=DynamoDBStateStore(governor_table_helper),
+        key=f"bedrock#{model_id}",
+        max_limit=BEDROCK_MAX_CONCURRENCY
+    ),
+    ms_per_output_token=CHATBOT_MS_PER_OUTPUT_TOKEN,
+    min_output_tokens=CHATBOT_MIN_OUTPUT_TOKENS,
+    request_fields=MODEL_REQUEST_FIELDS,
+    cache_models=PROMPT_CACHE_MODELS
+)
+
+# Instrucciones estáticas (bloque de sistema cacheable); los datos de la solicitud van en FEEDBACK_USER_PROMPT
+FEEDBACK_SYSTEM_PROMPT = PromptTemplate("""
 ## Resumen de la tarea:
 DEBES redactar una retroalimentación final en un solo párrafo, de forma DIRECTA, para un estudiante que ha respondido a un reto de evaluación, UTILIZANDO exclusivamente las retroalimentaciones previas para su elaboración.
 
-## Información de contexto:
-- Curso: {nombre_curso}
-- Título del reto: {reto}
-- Nivel de complejidad: {complejidad}
-- Pregunta que respondió el estudiante: {pregunta}
-- Retroalimentaciones previas brindadas según sus respuestas: {feedback}
-- Temas clave implicados en la pregunta y que se deben dominar: {temas_formateados}
-
 ## Instrucciones para el modelo:
 - NO ASUMAS niveles de logro o comprensión que no estén claramente sustentados en la retroalimentación anterior.
 - INTEGRA los errores observados como sugerencias de mejora presentadas de manera constructiva.
@@ -53,53 +107,61 @@ DEBES redactar una retroalimentación final en un solo párrafo, de forma DIRECT
 - La respuesta DEBE redactarse en un solo párrafo, en texto continuo.
 - NO INCLUYAS encabezados, viñetas ni separaciones temáticas.
 - MANTÉN un estilo académico, claro y conciso.
-"""
+""", name="FEEDBACK_SYSTEM_PROMPT")
+
+FEEDBACK_USER_PROMPT = PromptTemplate("""
+## Información de contexto:
+- Curso: {nombre_curso}
+- Título del reto: {reto}
+- Nivel de complejidad: {complejidad}
+- Pregunta que respondió el estudiante: {pregunta}
+- Retroalimentaciones previas brindadas según sus respuestas: {feedback}
+- Temas clave implicados en la pregunta y que se deben dominar: {temas_formateados}
+""", name="FEEDBACK_USER_PROMPT")
+
+# Campos requeridos del cuerpo; constants/request_models.py genera con ellos el modelo de API Gateway
+REQUIRED_FIELDS = ["NombreCurso", "Complejidad", "Reto", "Pregunta", "RespuestaModelo", "Temas", "Feedback"]
+
+# Reintentos del front end: un duplicado espera o recibe el resultado de la solicitud original
+idempotency_store = IdempotencyStore(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_IDEMPOTENCY_TABLE,
+        pk_name="idempotency_key"
+    ),
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
 
-def get_converse_response(prompt: str, max_tokens: int, temperature: float = 1.0) -> dict:
+mark_init("clients")
+
+def get_converse_response(prompt: str, task: str, deadline: Deadline = None, max_tokens: int = None, system: str = None) -> dict:
     """
-    Conversa con el modelo de Bedrock usando un prompt de sistema separado y mensajes estructurados.
+    Conversa con el modelo asignado a la tarea en MODEL_ROUTES, usando sus modelos de respaldo si está limitado o lento.
     
     Parámetros:
-    - prompt: texto con las instrucciones del prompt
-    - max_tokens: número máximo de tokens de respuesta
-    - temperature: control de aleatoriedad
+    - prompt: datos de la solicitud (bloque dinámico del usuario)
+    - task: tarea de la ruta de modelos (final_feedback)
+    - deadline: plazo de la solicitud; ajusta max_tokens, el read timeout y los reintentos
+    - max_tokens: sobrescribe el máximo de tokens de la ruta
+    - system: instrucciones estáticas; se envían como bloque de sistema con punto de caché
     """
 
-    logger.info(json.dumps(prompt, indent=2))
-
-    parameters = {
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": 0.2
-    }
-
-    response = bedrock_helper.converse(
-        model=CHATBOT_MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        parameters=parameters
-    )
+    log_payload(logger, "Prompt", prompt)
 
-    return response
+    return model_router.converse(task, prompt, deadline=deadline, max_tokens=max_tokens, system=system)
 
 
+@instrument("ruta-estandar-feedback")
+@idempotent(idempotency_store)
 def lambda_handler(event, context):
     try:
+        deadline = Deadline.from_context(context)
         body = event.get('body', event)
         if isinstance(body, str):
             body = json.loads(body)
 
-        required_fields = ["NombreCurso", "Complejidad", "Reto", "Pregunta", "RespuestaModelo", "Temas", "Feedback"]
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
-            return {
-                "success": False,
-                "message": f"Campos requeridos faltantes: {missing_fields}",
-                "statusCode": 400,
-                "error": {
-                    "code": "MISSING_FIELDS",
-                    "details": f"Campos requeridos faltantes: {missing_fields}"
-                }
-            }
+        missing = missing_fields(body, REQUIRED_FIELDS)
+        if missing:
+            return bad_request_response("MISSING_FIELDS", f"Campos requeridos faltantes: {missing}")
         
         nombre_curso = body["NombreCurso"]
         complejidad = body["Complejidad"]
@@ -109,19 +171,21 @@ def lambda_handler(event, context):
         temas = body.get("Temas", None)
         feedback = body.get("Feedback", None)
         
-        prompt = FEEDBACK_PROMPT.format(
-            nombre_curso=nombre_curso,
-            reto=reto,
-            complejidad=complejidad,
-            pregunta=pregunta,
-            respuesta_modelo=respuesta_modelo,
-            feedback= ', '.join(feedback),
-            temas_formateados= ', '.join(temas),
-        )
-        response = get_converse_response(prompt = prompt, max_tokens=CHATBOT_LLM_MAX_TOKENS, temperature=0.5)
+        with stage("prompt"):
+            prompt = FEEDBACK_USER_PROMPT.render(
+                nombre_curso=nombre_curso,
+                reto=reto,
+                complejidad=complejidad,
+                pregunta=pregunta,
+                respuesta_modelo=respuesta_modelo,
+                feedback= ', '.join(feedback),
+                temas_formateados= ', '.join(temas),
+            )
+        response = get_converse_response(prompt=prompt, task="final_feedback", deadline=deadline, system=FEEDBACK_SYSTEM_PROMPT.text)
         feedback_response = response['output']['message']['content'][0]['text']
         input_tokens = response['usage']['inputTokens']
         output_tokens = response['usage']['outputTokens']
+        cache_read_tokens, cache_write_tokens = cache_usage(response)
 
         return {
             "statusCode": 200,
@@ -129,10 +193,20 @@ def lambda_handler(event, context):
                 "success": True,
                 "feedback": feedback_response,
                 "input_tokens": input_tokens,
-                "output_tokens": output_tokens
+                "output_tokens": output_tokens,
+                "cache_read_tokens": cache_read_tokens,
+                "cache_write_tokens": cache_write_tokens
             })
         }
         
+    except DeadlineExceededError as e:
+        logger.warning(f"Plazo de la solicitud agotado: {str(e)}")
+        return timeout_response(e)
+
+    except BedrockThrottledError as e:
+        logger.warning(f"Bedrock saturado: {str(e)}")
+        return throttled_response(e)
+
     except Exception as e:
         logger.error(f"Error en get_history: {str(e)}")
         return {
@@ -1,21 +1,47 @@
 import json
 import os
-import re
-from boto3.dynamodb.conditions import Key, Attr
+import boto3
 from datetime import datetime, timedelta
 from aje_libs.bd.helpers.pinecone_helper import PineconeHelper
-from aje_libs.common.helpers.bedrock_helper import BedrockHelper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
-from aje_libs.common.helpers.s3_helper import S3Helper
 from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.challenge_helper import RUTA_ESTANDAR_FORMAT, render_challenges, structure_challenges
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.context_helper import assemble_context
+from aprendizaje_libs.helpers.deadline_helper import (
+    Deadline,
+    DeadlineExceededError,
+    timeout_response
+)
+from aprendizaje_libs.helpers.idempotency_helper import IdempotencyStore, idempotent
+from aprendizaje_libs.helpers.logging_helper import configure_logging, log_payload
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init, stage
+from aprendizaje_libs.helpers.model_router_helper import ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.retrieval_helper import hybrid_rerank
+from aprendizaje_libs.helpers.snapstart_helper import after_restore, before_snapshot
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    throttled_response
+)
+from aprendizaje_libs.helpers.tracing_helper import annotate, item_size
+from aprendizaje_libs.helpers.validation_helper import bad_request_response, missing_fields
+from aprendizaje_libs.helpers.vector_index_helper import LocalVectorStore
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
 
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
 OWNER = os.environ["OWNER"]
 DYNAMO_LEARNING_PATH_HISTORY_TABLE = os.environ["DYNAMO_LEARNING_PATH_HISTORY_TABLE"]
+DYNAMO_BEDROCK_GOVERNOR_TABLE = os.environ["DYNAMO_BEDROCK_GOVERNOR_TABLE"]
+DYNAMO_IDEMPOTENCY_TABLE = os.environ["DYNAMO_IDEMPOTENCY_TABLE"]
 
 # Parameter Store
 ssm_agent = SSMParameterHelper(f"/{ENVIRONMENT}/{PROJECT_NAME}/agent")
@@ -28,6 +54,23 @@ PINECONE_MAX_RETRIEVE_DOCUMENTS = int(PARAMETER_VALUE["PINECONE_MAX_RETRIEVE_DOC
 PINECONE_MIN_THRESHOLD = float(PARAMETER_VALUE["PINECONE_MIN_THRESHOLD"])
 EMBEDDINGS_MODEL_ID = PARAMETER_VALUE["EMBEDDINGS_MODEL_ID"]
 EMBEDDINGS_REGION = PARAMETER_VALUE["EMBEDDINGS_REGION"]
+BEDROCK_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("BEDROCK_MAX_CONCURRENCY", 20))
+CHATBOT_MS_PER_OUTPUT_TOKEN = float(PARAMETER_VALUE.get("CHATBOT_MS_PER_OUTPUT_TOKEN", 25))
+CHATBOT_MIN_OUTPUT_TOKENS = int(PARAMETER_VALUE.get("CHATBOT_MIN_OUTPUT_TOKENS", 256))
+MODEL_ROUTES = PARAMETER_VALUE.get("MODEL_ROUTES", {})
+MODEL_REQUEST_FIELDS = PARAMETER_VALUE.get("MODEL_REQUEST_FIELDS", {})
+PROMPT_CACHE_MODELS = PARAMETER_VALUE.get("PROMPT_CACHE_MODELS", [])
+CHALLENGE_REPAIR_MAX_TOKENS = int(PARAMETER_VALUE.get("CHALLENGE_REPAIR_MAX_TOKENS", 800))
+CHALLENGE_MAX_REPAIRS = int(PARAMETER_VALUE.get("CHALLENGE_MAX_REPAIRS", 1))
+RETRIEVAL_BUDGET_MS = int(PARAMETER_VALUE.get("RETRIEVAL_BUDGET_MS", 3000))
+RAG_CONTEXT_MAX_TOKENS = int(PARAMETER_VALUE.get("RAG_CONTEXT_MAX_TOKENS", 1500))
+RAG_CONTEXT_DIVERSITY = float(PARAMETER_VALUE.get("RAG_CONTEXT_DIVERSITY", 0.3))
+RAG_CANDIDATE_DOCUMENTS = int(PARAMETER_VALUE.get("RAG_CANDIDATE_DOCUMENTS", PINECONE_MAX_RETRIEVE_DOCUMENTS * 4))
+RAG_CANDIDATE_MIN_THRESHOLD = float(PARAMETER_VALUE.get("RAG_CANDIDATE_MIN_THRESHOLD", PINECONE_MIN_THRESHOLD))
+LOCAL_INDEX_BUCKET = PARAMETER_VALUE.get("LOCAL_INDEX_BUCKET")
+LOCAL_INDEX_PREFIX = PARAMETER_VALUE.get("LOCAL_INDEX_PREFIX", "SOFIA_FILE/PLANIFICACION/AV_Vectores")
+LOCAL_INDEX_MAX_VECTORS = int(PARAMETER_VALUE.get("LOCAL_INDEX_MAX_VECTORS", 2000))
+IDEMPOTENCY_TTL_SECONDS = int(PARAMETER_VALUE.get("IDEMPOTENCY_TTL_SECONDS", 900))
 
 # Secrets
 #secret_pinecone = SecretsHelper(f"{ENVIRONMENT}/{PROJECT_NAME}/pinecone-api-key2")
@@ -35,7 +78,11 @@ secret_pinecone = SecretsHelper(f"{ENVIRONMENT}/agent-resources/pinecone-api-key
 PINECONE_INDEX_NAME = secret_pinecone.get_secret_value("PINECONE_INDEX_NAME")
 PINECONE_API_KEY = secret_pinecone.get_secret_value("PINECONE_API_KEY")
 
+mark_init("config")
+
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+# Nivel, muestreo y límites de los registros según el parámetro del agente
+configure_logging(PARAMETER_VALUE, logger)
 
 # Inicialización de recursos
 learning_path_table_helper = DynamoDBHelper(
@@ -44,94 +91,149 @@ learning_path_table_helper = DynamoDBHelper(
     sk_name="date_time"
 )
 
-pinecone_helper = PineconeHelper(
-    index_name=PINECONE_INDEX_NAME,
-    api_key=PINECONE_API_KEY,
+def build_pinecone_helper() -> PineconeHelper:
+    """Crea el cliente de Pinecone con las credenciales vigentes del secreto."""
+    return PineconeHelper(
+        index_name=PINECONE_INDEX_NAME,
+        api_key=PINECONE_API_KEY,
+        embeddings_model_id=EMBEDDINGS_MODEL_ID,
+        embeddings_region=CHATBOT_REGION,
+        max_retrieve_documents=RAG_CANDIDATE_DOCUMENTS,
+        # El umbral denso solo filtra candidatos; el corte final lo hace el reordenamiento híbrido
+        min_threshold=RAG_CANDIDATE_MIN_THRESHOLD
+    )
+
+
+pinecone_helper = build_pinecone_helper()
+
+
+@after_restore
+def refresh_pinecone() -> None:
+    """
+    SnapStart: el secreto pudo rotar desde que se tomó el snapshot y las conexiones HTTP del
+    cliente de Pinecone no sobreviven a la restauración; se vuelve a leer el secreto y se
+    recrea el cliente.
+    """
+    global PINECONE_INDEX_NAME, PINECONE_API_KEY, pinecone_helper
+    PINECONE_INDEX_NAME = secret_pinecone.get_secret_value("PINECONE_INDEX_NAME")
+    PINECONE_API_KEY = secret_pinecone.get_secret_value("PINECONE_API_KEY")
+    pinecone_helper = build_pinecone_helper()
+
+
+# Índices locales por recurso exportados por add_resource; sin bucket configurado se usa solo Pinecone
+local_vector_store = LocalVectorStore(
+    s3_client=boto3.client("s3"),
+    bucket=LOCAL_INDEX_BUCKET,
+    prefix=LOCAL_INDEX_PREFIX,
     embeddings_model_id=EMBEDDINGS_MODEL_ID,
-    embeddings_region=CHATBOT_REGION,
-    max_retrieve_documents=PINECONE_MAX_RETRIEVE_DOCUMENTS,
-    min_threshold=PINECONE_MIN_THRESHOLD
+    max_vectors=LOCAL_INDEX_MAX_VECTORS,
+    min_threshold=RAG_CANDIDATE_MIN_THRESHOLD,
+    max_retrieve_documents=RAG_CANDIDATE_DOCUMENTS
+) if LOCAL_INDEX_BUCKET else None
+
+# Clientes de Bedrock por tramo de read_timeout, ajustados al plazo de cada solicitud
+bedrock_clients = bedrock_client_pool(CHATBOT_REGION)
+# SnapStart: los clientes de Bedrock de cada tramo de timeout se crean antes del snapshot
+before_snapshot(bedrock_clients.warm)
+
+# Gobernador de concurrencia compartido entre contenedores, uno por modelo de Bedrock
+governor_table_helper = DynamoDBHelper(
+    table_name=DYNAMO_BEDROCK_GOVERNOR_TABLE,
+    pk_name="governor_key"
 )
 
-bedrock_helper = BedrockHelper(region_name=CHATBOT_REGION)
+# Modelo y parámetros por tarea; MODEL_ROUTES en el parámetro del agente sobrescribe estos valores
+model_router = ModelRouter(
+    routes=build_routes(
+        MODEL_ROUTES,
+        defaults={
+            "path": {"max_tokens": CHATBOT_LLM_MAX_TOKENS, "temperature": 0.7},
+            # Corrección de un solo reto mal formado (challenge_helper)
+            "repair": {"max_tokens": CHALLENGE_REPAIR_MAX_TOKENS, "temperature": 0.7}
+        },
+        default_model_id=CHATBOT_MODEL_ID
+    ),
+    client_pool=bedrock_clients,
+    governor_factory=lambda model_id: BedrockGovernor(
+        store=DynamoDBStateStore(governor_table_helper),
+        key=f"bedrock#{model_id}",
+        max_limit=BEDROCK_MAX_CONCURRENCY
+    ),
+    ms_per_output_token=CHATBOT_MS_PER_OUTPUT_TOKEN,
+    min_output_tokens=CHATBOT_MIN_OUTPUT_TOKENS,
+    request_fields=MODEL_REQUEST_FIELDS,
+    cache_models=PROMPT_CACHE_MODELS
+)
 
-RUTA_PROMPT = """
+# Instrucciones estáticas (bloque de sistema cacheable); los datos de la solicitud van en RUTA_USER_PROMPT
+RUTA_SYSTEM_PROMPT = PromptTemplate("""
     ### Instrucción
-    Genera una ruta de aprendizaje con {numero_retos} retos centrados en los siguientes temas: {temas_formateados}.
-
-    ### Contexto para uso interno:
-    - Competencia: {competencia}
-    - Capacidad: {capacidad}
-    - Criterio u objetivo de aprendizaje: {criterio}
-    - Nivel de complejidad: {complejidad}
-    - Temas clave: {temas_formateados}
-    - Documentación relevante: {context}
+    Genera una ruta de aprendizaje con el número de retos solicitado, centrados en los temas clave indicados en la solicitud.
+    Usa la competencia, capacidad, criterio, nivel de complejidad y documentación relevante de la solicitud solo como contexto interno.
 
     ### Título de la Ruta de Aprendizaje
     Primero, escribe un **título para la ruta de aprendizaje**, que:
     - Tenga un máximo de **6 palabras**.
-    - Use palabras clave relevantes de estos temas: {temas_formateados}.
+    - Use palabras clave relevantes de los temas clave.
     - No uses frases genéricas como “Ruta de aprendizaje...”
     - Ejemplo válido: "Domina los Gráficos y Datos"
     @Titulo: [Título breve de la ruta de aprendizaje]
 
     ### Retos
     @Reto: [Título breve relacionado con un tema distinto]
-    @Pregunta: [Pregunta abierta relacionada al tema, nivel {complejidad}]
+    @Pregunta: [Pregunta abierta relacionada al tema, en el nivel de complejidad indicado]
     @Respuesta Modelo: [Explicación clara, breve y estructurada]
     @Conceptos Claves: [Lista separada por coma de conceptos clave abordados, terminando en punto]
 
     Proporciona tu respuesta inmediatamente sin ningún preámbulo o información adicional.
-"""
-
-SYSTEM_PROMPT2 = """
-Eres un asistente llamado {asistente_nombre} que puede ayudar al usuario con sus preguntas usando **únicamente información confiable**.
-
-Contexto del usuario:
-- Rol del usuario: {usuario_rol}
-- Nombre del usuario: {usuario_nombre}
-- Curso: {curso}
-- Institución: {institucion}
-
-Instrucciones del modelo:
-- Debe proporcionar una respuesta concisa a preguntas sencillas cuando la respuesta se encuentre directamente en los resultados
-  de búsqueda. Sin embargo, en el caso de preguntas de sí/no, proporcione algunos detalles.
-- Si la pregunta requiere un razonamiento complejo, debe buscar información relevante en los resultados de búsqueda y resumir la
-  respuesta basándose en dicha información mediante un razonamiento lógico.
-- Si los resultados de búsqueda no contienen información que pueda responder a la pregunta, indique que no pudo encontrar una
-  respuesta exacta. Si los resultados de búsqueda son completamente irrelevantes, indique que no pudo encontrar una respuesta exacta y resuma los resultados.
-- **NO uses información externa que no esté en los resultados de búsqueda**, excepto para dar explicaciones conceptuales generales del curso **{curso}**.
-- **NO inventes información** ni generes contenido fuera del ámbito educativo salvo que el usuario lo solicite explícitamente.
-- Mantén **siempre un tono formal, claro y enfocado al ámbito académico**.
-"""
-
-def get_converse_response(prompt: str, max_tokens: int, temperature: float = 1.0) -> dict:
+""", name="RUTA_SYSTEM_PROMPT")
+
+RUTA_USER_PROMPT = PromptTemplate("""
+    ### Solicitud
+    Genera una ruta de aprendizaje con {numero_retos} retos centrados en los siguientes temas: {temas_formateados}.
+
+    ### Contexto para uso interno:
+    - Competencia: {competencia}
+    - Capacidad: {capacidad}
+    - Criterio u objetivo de aprendizaje: {criterio}
+    - Nivel de complejidad: {complejidad}
+    - Temas clave: {temas_formateados}
+    - Documentación relevante: {context}
+""", name="RUTA_USER_PROMPT")
+
+
+# Campos requeridos del cuerpo; constants/request_models.py genera con ellos el modelo de API Gateway
+REQUIRED_FIELDS = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Competencia", "Capacidad", "Criterio", "Temas", "Complejidad", "NumeroRetos"]
+
+# Reintentos del front end: un duplicado espera o recibe el resultado de la solicitud original
+idempotency_store = IdempotencyStore(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_IDEMPOTENCY_TABLE,
+        pk_name="idempotency_key"
+    ),
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
+
+mark_init("clients")
+
+def get_converse_response(prompt: str, task: str, deadline: Deadline = None, max_tokens: int = None, system: str = None) -> dict:
     """
-    Conversa con el modelo de Bedrock usando un prompt de sistema separado y mensajes estructurados.
+    Conversa con el modelo asignado a la tarea en MODEL_ROUTES, usando sus modelos de respaldo si está limitado o lento.
     
     Parámetros:
-    - prompt: texto con las instrucciones del prompt
-    - max_tokens: número máximo de tokens de respuesta
-    - temperature: control de aleatoriedad
+    - prompt: datos de la solicitud (bloque dinámico del usuario)
+    - task: tarea de la ruta de modelos (path o repair)
+    - deadline: plazo de la solicitud; ajusta max_tokens, el read timeout y los reintentos
+    - max_tokens: sobrescribe el máximo de tokens de la ruta
+    - system: instrucciones estáticas; se envían como bloque de sistema con punto de caché
     """
 
-    logger.info(json.dumps(prompt, indent=2))
-
-    parameters = {
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": 0.2
-    }
-
-    response = bedrock_helper.converse(
-        model=CHATBOT_MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        parameters=parameters
-    )
+    log_payload(logger, "Prompt", prompt)
 
-    return response
+    return model_router.converse(task, prompt, deadline=deadline, max_tokens=max_tokens, system=system)
 
-def upload_ruta(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int):
+@stage("history_write")
+def upload_ruta(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
     """
     Sube una ruta a la tabla DynamoDB con los datos especificados.
     """
@@ -153,11 +255,15 @@ def upload_ruta(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int,
             "ai_msg": ai_msg,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens,
             "ttl": ttl_timestamp
         }
 
+        annotate(table=learning_path_table_helper.table_name, item_bytes=item_size(item))
+
         learning_path_table_helper.put_item(data = item)
-        logger.info(f"Elemento subido con éxito: {item}")
+        log_payload(logger, "Elemento subido con éxito", item)
     except Exception as e:
         logger.error(f"Error al subir el elemento: {e}")
 
@@ -170,26 +276,48 @@ def get_documents_context(question, data=None):
 
         # Si data tiene valor, extraer los resource_id y agregarlos al filtro
         filter_conditions = {}
-        if data and 'resources' in data:
-            resource_ids = [str(item["resource_id"]) for item in data["resources"]]
+        resource_ids = []
+        if data and "ResourcesIds" in data:
+            resource_ids = [str(item["resource_id"]) for item in data["ResourcesIds"]]
             filter_conditions["resource_id"] = {"$in": resource_ids}
             
         logger.info(f"Condiciones de filtro: {filter_conditions}")
         
-        # Usar search_by_text en lugar de query_pinecone
-        relevant_data = pinecone_helper.search_by_text(
-            query_text=question,
-            filter_conditions=filter_conditions if filter_conditions else None,
-            return_format="text",
-            text_field="text"
+        # Los recursos con índice local pequeño se consultan en memoria, sin llamar a Pinecone
+        if local_vector_store and local_vector_store.covers(resource_ids):
+            vector_store = local_vector_store
+        else:
+            vector_store = pinecone_helper
+        logger.info(f"Backend de búsqueda vectorial: {type(vector_store).__name__}")
+
+        # Se recuperan RAG_CANDIDATE_DOCUMENTS candidatos y se conservan los mejores según
+        # similitud vectorial y BM25 sobre los términos exactos de la consulta (temas clave)
+        with stage("embedding"):
+            embeddings = pinecone_helper.get_embeddings(question)
+        with stage("vector_query"):
+            candidates = vector_store.query(
+                embeddings=embeddings,
+                filter_conditions=filter_conditions if filter_conditions else None
+            )
+            annotate(backend=type(vector_store).__name__, top_k=RAG_CANDIDATE_DOCUMENTS, resources=len(resource_ids), matches=len(candidates))
+        matches = hybrid_rerank(candidates, query=question, top_n=PINECONE_MAX_RETRIEVE_DOCUMENTS)
+
+        # El contexto se arma uniendo chunks consecutivos, descartando repetidos y
+        # recortando a RAG_CONTEXT_MAX_TOKENS
+        relevant_data = assemble_context(
+            matches,
+            max_tokens=RAG_CONTEXT_MAX_TOKENS,
+            diversity=RAG_CONTEXT_DIVERSITY
         )
         
-        logger.info(f"Datos relevantes: {relevant_data}\n" + '-'*100)
+        log_payload(logger, "Datos relevantes", relevant_data)
         return relevant_data
     except Exception as e:
         logger.error(f"Error al obtener el contexto de documentos: {e}")
         return ""
     
+NO_CONTEXT_MESSAGE = "No se cuenta con material documental. Genera los retos únicamente con base en tu conocimiento general sobre el tema."
+
 def retrieve_context(query_text, resources):
     # Obtener recursos
     if resources:
@@ -199,30 +327,24 @@ def retrieve_context(query_text, resources):
             "ResourcesIds": [{"resource_id": rid} for rid in resources]
         }             
     else:
-        return "No se cuenta con material documental. Genera los retos únicamente con base en tu conocimiento general sobre el tema."
+        return NO_CONTEXT_MESSAGE
 
     # Consultar Pinecone
     text_context = get_documents_context(query_text, data)
     return text_context
 
+@instrument("ruta-estandar-generar_ruta")
+@idempotent(idempotency_store)
 def lambda_handler(event, context):
     try:
+        deadline = Deadline.from_context(context)
         body = event.get('body', event)
         if isinstance(body, str):
             body = json.loads(body)
 
-        required_fields = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Competencia", "Capacidad", "Criterio", "Temas", "Complejidad", "NumeroRetos"]
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
-            return {
-                "success": False,
-                "message": f"Campos requeridos faltantes: {missing_fields}",
-                "statusCode": 400,
-                "error": {
-                    "code": "MISSING_FIELDS",
-                    "details": f"Campos requeridos faltantes: {missing_fields}"
-                }
-            }
+        missing = missing_fields(body, REQUIRED_FIELDS)
+        if missing:
+            return bad_request_response("MISSING_FIELDS", f"Campos requeridos faltantes: {missing}")
         
         user_id = body["UsuarioId"]
         syllabus_event_id = body["SilaboId"]
@@ -242,24 +364,47 @@ def lambda_handler(event, context):
         )
         logger.info(f"Query_text: {query_text}")
 
-        pinecone_context = retrieve_context(query_text, resources)
+        # La recuperación es opcional: si no alcanza el tiempo se genera sin material documental
+        if deadline.has_budget(RETRIEVAL_BUDGET_MS + CHATBOT_MIN_OUTPUT_TOKENS * CHATBOT_MS_PER_OUTPUT_TOKEN):
+            pinecone_context = retrieve_context(query_text, resources)
+        else:
+            logger.warning(f"Recuperación omitida por tiempo restante ({deadline.remaining_ms()} ms)")
+            pinecone_context = NO_CONTEXT_MESSAGE
         
         # Armar el prompt
-        prompt = RUTA_PROMPT.format(
-            competencia = competencia,
-            capacidad = capacidad,
-            criterio = criterio,
-            temas_formateados = ', '.join(temas),
-            complejidad = complejidad,
-            numero_retos = numero_retos,
-            context = pinecone_context
-        )
-        logger.info(f"Ruta prompt: {prompt}")
-
-        response = get_converse_response(prompt=prompt, max_tokens=CHATBOT_LLM_MAX_TOKENS, temperature=0.7)
+        with stage("prompt"):
+            prompt = RUTA_USER_PROMPT.render(
+                competencia = competencia,
+                capacidad = capacidad,
+                criterio = criterio,
+                temas_formateados = ', '.join(temas),
+                complejidad = complejidad,
+                numero_retos = numero_retos,
+                context = pinecone_context
+            )
+
+        response = get_converse_response(prompt=prompt, task="path", deadline=deadline, system=RUTA_SYSTEM_PROMPT.text)
         learning_path = response['output']['message']['content'][0]['text']
         input_tokens = response['usage']['inputTokens']
         output_tokens = response['usage']['outputTokens']
+        cache_read_tokens, cache_write_tokens = cache_usage(response)
+
+        # Se valida la respuesta; un reto mal formado se corrige con una llamada pequeña que solo genera ese reto
+        structured = structure_challenges(
+            learning_path,
+            RUTA_ESTANDAR_FORMAT,
+            expected=int(numero_retos),
+            repair=lambda instructions: get_converse_response(
+                prompt=prompt + "\n\n" + instructions, task="repair", deadline=deadline, system=RUTA_SYSTEM_PROMPT.text
+            ),
+            max_repairs=CHALLENGE_MAX_REPAIRS
+        )
+        if structured.repaired:
+            learning_path = render_challenges(structured.titulo, structured.retos, RUTA_ESTANDAR_FORMAT)
+        input_tokens += structured.usage["input_tokens"]
+        output_tokens += structured.usage["output_tokens"]
+        cache_read_tokens += structured.usage["cache_read_tokens"]
+        cache_write_tokens += structured.usage["cache_write_tokens"]
 
         upload_ruta(
             usuario_id=user_id,
@@ -269,7 +414,9 @@ def lambda_handler(event, context):
             prompt_msg=prompt,
             ai_msg=learning_path,
             input_tokens=input_tokens,
-            output_tokens=output_tokens
+            output_tokens=output_tokens,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens
         )
     
         return {
@@ -277,11 +424,26 @@ def lambda_handler(event, context):
             "body": json.dumps({
                 "success": True,
                 "learning_path": learning_path,
+                "titulo": structured.titulo,
+                "retos": structured.retos,
+                "valid": structured.valid,
+                "errors": structured.errors,
+                "repaired": structured.repaired,
                 "input_tokens": input_tokens,
-                "output_tokens": output_tokens
+                "output_tokens": output_tokens,
+                "cache_read_tokens": cache_read_tokens,
+                "cache_write_tokens": cache_write_tokens
             })
         }
     
+    except DeadlineExceededError as e:
+        logger.warning(f"Plazo de la solicitud agotado: {str(e)}")
+        return timeout_response(e)
+
+    except BedrockThrottledError as e:
+        logger.warning(f"Bedrock saturado: {str(e)}")
+        return throttled_response(e)
+
     except Exception as e:
         logger.error(f"Error en la función Lambda: {str(e)}")
         return {
@@ -1,21 +1,41 @@
 import json
 import os
-import boto3
-import re
-from boto3.dynamodb.conditions import Attr
 from datetime import datetime, timedelta
-from aje_libs.common.helpers.bedrock_helper import BedrockHelper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
-from aje_libs.common.helpers.s3_helper import S3Helper
-from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.challenge_helper import RETO_FORMAT, render_challenges, structure_challenges
+from aprendizaje_libs.helpers.client_helper import install_client_factory
+from aprendizaje_libs.helpers.deadline_helper import (
+    Deadline,
+    DeadlineExceededError,
+    timeout_response
+)
+from aprendizaje_libs.helpers.idempotency_helper import IdempotencyStore, idempotent
+from aprendizaje_libs.helpers.logging_helper import configure_logging, log_payload
+from aprendizaje_libs.helpers.metrics_helper import instrument, mark_init, stage
+from aprendizaje_libs.helpers.model_router_helper import ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.snapstart_helper import before_snapshot
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    throttled_response
+)
+from aprendizaje_libs.helpers.tracing_helper import annotate, item_size
+from aprendizaje_libs.helpers.validation_helper import bad_request_response, missing_fields
+
+# Sesión de boto3 compartida por el contenedor; se instala antes de crear los helpers de aje_libs
+install_client_factory()
 
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
 OWNER = os.environ["OWNER"]
 DYNAMO_REGENERATED_HISTORY_TABLE = os.environ["DYNAMO_REGENERATED_CHALLENGES_HISTORY_TABLE"]
+DYNAMO_BEDROCK_GOVERNOR_TABLE = os.environ["DYNAMO_BEDROCK_GOVERNOR_TABLE"]
+DYNAMO_IDEMPOTENCY_TABLE = os.environ["DYNAMO_IDEMPOTENCY_TABLE"]
 
 # Parameter Store
 ssm_agent = SSMParameterHelper(f"/{ENVIRONMENT}/{PROJECT_NAME}/agent")
@@ -28,8 +48,21 @@ PINECONE_MAX_RETRIEVE_DOCUMENTS = int(PARAMETER_VALUE["PINECONE_MAX_RETRIEVE_DOC
 PINECONE_MIN_THRESHOLD = float(PARAMETER_VALUE["PINECONE_MIN_THRESHOLD"])
 EMBEDDINGS_MODEL_ID = PARAMETER_VALUE["EMBEDDINGS_MODEL_ID"]
 EMBEDDINGS_REGION = PARAMETER_VALUE["EMBEDDINGS_REGION"]
+BEDROCK_MAX_CONCURRENCY = int(PARAMETER_VALUE.get("BEDROCK_MAX_CONCURRENCY", 20))
+CHATBOT_MS_PER_OUTPUT_TOKEN = float(PARAMETER_VALUE.get("CHATBOT_MS_PER_OUTPUT_TOKEN", 25))
+CHATBOT_MIN_OUTPUT_TOKENS = int(PARAMETER_VALUE.get("CHATBOT_MIN_OUTPUT_TOKENS", 256))
+MODEL_ROUTES = PARAMETER_VALUE.get("MODEL_ROUTES", {})
+MODEL_REQUEST_FIELDS = PARAMETER_VALUE.get("MODEL_REQUEST_FIELDS", {})
+PROMPT_CACHE_MODELS = PARAMETER_VALUE.get("PROMPT_CACHE_MODELS", [])
+CHALLENGE_REPAIR_MAX_TOKENS = int(PARAMETER_VALUE.get("CHALLENGE_REPAIR_MAX_TOKENS", 800))
+CHALLENGE_MAX_REPAIRS = int(PARAMETER_VALUE.get("CHALLENGE_MAX_REPAIRS", 1))
+IDEMPOTENCY_TTL_SECONDS = int(PARAMETER_VALUE.get("IDEMPOTENCY_TTL_SECONDS", 900))
+
+mark_init("config")
 
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
+# Nivel, muestreo y límites de los registros según el parámetro del agente
+configure_logging(PARAMETER_VALUE, logger)
 
 # Inicializar DynamoDBHelper
 regenerated_table_helper = DynamoDBHelper(
@@ -38,35 +71,55 @@ regenerated_table_helper = DynamoDBHelper(
     sk_name="date_time"
 )
 
-bedrock_helper = BedrockHelper(region_name=CHATBOT_REGION)
+# Clientes de Bedrock por tramo de read_timeout, ajustados al plazo de cada solicitud
+bedrock_clients = bedrock_client_pool(CHATBOT_REGION)
+# SnapStart: los clientes de Bedrock de cada tramo de timeout se crean antes del snapshot
+before_snapshot(bedrock_clients.warm)
+
+# Gobernador de concurrencia compartido entre contenedores, uno por modelo de Bedrock
+governor_table_helper = DynamoDBHelper(
+    table_name=DYNAMO_BEDROCK_GOVERNOR_TABLE,
+    pk_name="governor_key"
+)
+
+# Modelo y parámetros por tarea; MODEL_ROUTES en el parámetro del agente sobrescribe estos valores
+model_router = ModelRouter(
+    routes=build_routes(
+        MODEL_ROUTES,
+        defaults={
+            "regenerate": {"max_tokens": CHATBOT_LLM_MAX_TOKENS, "temperature": 0.7},
+            # Corrección de un solo reto mal formado (challenge_helper)
+            "repair": {"max_tokens": CHALLENGE_REPAIR_MAX_TOKENS, "temperature": 0.7}
+        },
+        default_model_id=CHATBOT_MODEL_ID
+    ),
+    client_pool=bedrock_clients,
+    governor_factory=lambda model_id: BedrockGovernor(
+        store=DynamoDBStateStore(governor_table_helper),
+        key=f"bedrock#{model_id}",
+        max_limit=BEDROCK_MAX_CONCURRENCY
+    ),
+    ms_per_output_token=CHATBOT_MS_PER_OUTPUT_TOKEN,
+    min_output_tokens=CHATBOT_MIN_OUTPUT_TOKENS,
+    request_fields=MODEL_REQUEST_FIELDS,
+    cache_models=PROMPT_CACHE_MODELS
+)
 
-REGENERAR_RETO_PROMPT_SIN_INDICACIONES = '''
-    Eres un experto en pedagogía y en el curso {nombre_curso}. Tu tarea es generar un reto de aprendizaje siguiendo exactamente este formato:
+# Instrucciones estáticas (bloque de sistema cacheable); los datos de la solicitud van en los prompts de usuario
+REGENERAR_RETO_SYSTEM_PROMPT = PromptTemplate('''
+    Eres un experto en pedagogía y en el curso indicado en la solicitud. Tu tarea es generar un reto de aprendizaje siguiendo exactamente este formato:
 
     @Reto: [Título breve del reto relacionado con uno de los temas clave proporcionados]
     @Pregunta: [Pregunta abierta relacionada al tema del reto]
     @Respuesta Modelo: [Explicación clara, breve y estructurada que responda la pregunta]
     @Conceptos Claves: [Lista separada por coma de los conceptos clave abordados en ese reto, y que termine en punto]
 
-    Debes utilizar la siguiente información como base:
-    - Competencia: {competencia}
-    - Capacidad: {capacidad}
-    - Criterio u objetivo de aprendizaje: {criterio}
-    - Temas clave: {temas_formateados}
-
-    Pregunta ya utilizada anteriormente (no la repitas):
-    "{pregunta}"
-
     Asegúrate de generar un reto centrado en uno o varios de los temas clave proporcionados. Utiliza un lenguaje claro, técnico y directo. ¡Responde con la mayor precisión posible!
-'''
+''', name="REGENERAR_RETO_SYSTEM_PROMPT")
 
-REGENERAR_RETO_PROMPT_BY_INDICACIONES = '''
-    Eres un experto en pedagogía y en el curso {nombre_curso}. Tu tarea es generar un reto de aprendizaje siguiendo exactamente este formato:
 
-    @Reto: [Título breve del reto relacionado con uno de los temas clave proporcionados]
-    @Pregunta: [Pregunta abierta relacionada al tema del reto]
-    @Respuesta Modelo: [Explicación clara, breve y estructurada que responda la pregunta]
-    @Conceptos Claves: [Lista separada por coma de los conceptos clave abordados en ese reto, y que termine en punto]
+REGENERAR_RETO_PROMPT_BY_INDICACIONES = PromptTemplate('''
+    Curso: {nombre_curso}
 
     Debes utilizar la siguiente información como base:
     - Competencia: {competencia}
@@ -80,37 +133,40 @@ REGENERAR_RETO_PROMPT_BY_INDICACIONES = '''
     - Respuesta modelo: "{respuesta_modelo}"
 
     {indicaciones}
+''', name="REGENERAR_RETO_PROMPT_BY_INDICACIONES")
 
-    Asegúrate de generar un reto centrado en uno o varios de los temas clave proporcionados. Utiliza un lenguaje claro, técnico y directo. ¡Responde con la mayor precisión posible!
-'''
+# Campos requeridos del cuerpo; constants/request_models.py genera con ellos el modelo de API Gateway
+REQUIRED_FIELDS = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Competencia", "Capacidad", "Criterio", "TituloReto", "Pregunta", "RespuestaModelo", "Temas", "Indicaciones"]
 
-def get_converse_response(prompt: str, max_tokens: int, temperature: float = 1.0) -> dict:
+# Reintentos del front end: un duplicado espera o recibe el resultado de la solicitud original
+idempotency_store = IdempotencyStore(
+    table_helper=DynamoDBHelper(
+        table_name=DYNAMO_IDEMPOTENCY_TABLE,
+        pk_name="idempotency_key"
+    ),
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
+
+mark_init("clients")
+
+def get_converse_response(prompt: str, task: str, deadline: Deadline = None, max_tokens: int = None, system: str = None) -> dict:
     """
-    Conversa con el modelo de Bedrock usando un prompt de sistema separado y mensajes estructurados.
+    Conversa con el modelo asignado a la tarea en MODEL_ROUTES, usando sus modelos de respaldo si está limitado o lento.
     
     Parámetros:
-    - prompt: texto con las instrucciones del prompt
-    - max_tokens: número máximo de tokens de respuesta
-    - temperature: control de aleatoriedad
+    - prompt: datos de la solicitud (bloque dinámico del usuario)
+    - task: tarea de la ruta de modelos (regenerate o repair)
+    - deadline: plazo de la solicitud; ajusta max_tokens, el read timeout y los reintentos
+    - max_tokens: sobrescribe el máximo de tokens de la ruta
+    - system: instrucciones estáticas; se envían como bloque de sistema con punto de caché
     """
 
-    logger.info(json.dumps(prompt, indent=2))
-
-    parameters = {
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": 0.2
-    }
+    log_payload(logger, "Prompt", prompt)
 
-    response = bedrock_helper.converse(
-        model=CHATBOT_MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        parameters=parameters
-    )
+    return model_router.converse(task, prompt, deadline=deadline, max_tokens=max_tokens, system=system)
 
-    return response
-
-def upload_reto(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, indicaciones: str, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int):
+@stage("history_write")
+def upload_reto(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int, indicaciones: str, prompt_msg: str, ai_msg: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
     """
     Sube un reto a la tabla DynamoDB con los datos especificados.
     """
@@ -132,32 +188,30 @@ def upload_reto(usuario_id: int, silabo_id: int, unidad_id: int, sesion_id: int,
             "ai_msg": ai_msg,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens,
             "ttl": ttl_timestamp
         }
 
+        annotate(table=regenerated_table_helper.table_name, item_bytes=item_size(item))
+
         regenerated_table_helper.put_item(data = item)
-        logger.info(f"Elemento subido con éxito: {item}")
+        log_payload(logger, "Elemento subido con éxito", item)
     except Exception as e:
         logger.error(f"Error al subir el elemento: {e}")
 
+@instrument("ruta-estandar-regenerar_reto")
+@idempotent(idempotency_store)
 def lambda_handler(event, context):
     try:
+        deadline = Deadline.from_context(context)
         body = event.get('body', event)
         if isinstance(body, str):
             body = json.loads(body)
 
-        required_fields = ["UsuarioId", "SilaboId", "UnidadId", "SesionId", "NombreCurso", "Competencia", "Capacidad", "Criterio", "TituloReto", "Pregunta", "RespuestaModelo", "Temas", "Indicaciones"]
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
-            return {
-                "success": False,
-                "message": f"Campos requeridos faltantes: {missing_fields}",
-                "statusCode": 400,
-                "error": {
-                    "code": "MISSING_FIELDS",
-                    "details": f"Campos requeridos faltantes: {missing_fields}"
-                }
-            }
+        missing = missing_fields(body, REQUIRED_FIELDS)
+        if missing:
+            return bad_request_response("MISSING_FIELDS", f"Campos requeridos faltantes: {missing}")
         
         user_id = body["UsuarioId"]
         syllabus_event_id = body["SilaboId"]
@@ -173,22 +227,41 @@ def lambda_handler(event, context):
         temas = body.get("Temas", None)
         indicaciones = body["Indicaciones"]
 
-        prompt = REGENERAR_RETO_PROMPT_BY_INDICACIONES.format(
-            nombre_curso = nombre_curso,
-            competencia = competencia,
-            capacidad = capacidad,
-            criterio = criterio,
-            titulo_reto = titulo_reto,
-            pregunta = pregunta,
-            respuesta_modelo = respuesta_modelo,
-            temas_formateados = ', '.join(temas),
-            indicaciones = indicaciones
-        )
+        with stage("prompt"):
+            prompt = REGENERAR_RETO_PROMPT_BY_INDICACIONES.render(
+                nombre_curso = nombre_curso,
+                competencia = competencia,
+                capacidad = capacidad,
+                criterio = criterio,
+                titulo_reto = titulo_reto,
+                pregunta = pregunta,
+                respuesta_modelo = respuesta_modelo,
+                temas_formateados = ', '.join(temas),
+                indicaciones = indicaciones
+            )
 
-        response = get_converse_response(prompt = prompt, max_tokens=CHATBOT_LLM_MAX_TOKENS, temperature=0.7)
+        response = get_converse_response(prompt=prompt, task="regenerate", deadline=deadline, system=REGENERAR_RETO_SYSTEM_PROMPT.text)
         regenerated_challenge = response['output']['message']['content'][0]['text']
         input_tokens = response['usage']['inputTokens']
         output_tokens = response['usage']['outputTokens']
+        cache_read_tokens, cache_write_tokens = cache_usage(response)
+
+        # Se valida la respuesta; un reto mal formado se corrige con una llamada pequeña que solo genera ese reto
+        structured = structure_challenges(
+            regenerated_challenge,
+            RETO_FORMAT,
+            expected=1,
+            repair=lambda instructions: get_converse_response(
+                prompt=prompt + "\n\n" + instructions, task="repair", deadline=deadline, system=REGENERAR_RETO_SYSTEM_PROMPT.text
+            ),
+            max_repairs=CHALLENGE_MAX_REPAIRS
+        )
+        if structured.repaired:
+            regenerated_challenge = render_challenges(structured.titulo, structured.retos, RETO_FORMAT)
+        input_tokens += structured.usage["input_tokens"]
+        output_tokens += structured.usage["output_tokens"]
+        cache_read_tokens += structured.usage["cache_read_tokens"]
+        cache_write_tokens += structured.usage["cache_write_tokens"]
 
         # Guardar en historial
         upload_reto(
@@ -200,7 +273,9 @@ def lambda_handler(event, context):
             prompt_msg=prompt,
             ai_msg=regenerated_challenge,
             input_tokens=input_tokens,
-            output_tokens=output_tokens
+            output_tokens=output_tokens,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens
         )
 
         return {
@@ -208,11 +283,25 @@ def lambda_handler(event, context):
             "body": json.dumps({
                 "success": True,
                 "regenerated_challenge": regenerated_challenge,
+                "reto": structured.retos[0] if structured.retos else None,
+                "valid": structured.valid,
+                "errors": structured.errors,
+                "repaired": structured.repaired,
                 "input_tokens": input_tokens,
-                "output_tokens": output_tokens
+                "output_tokens": output_tokens,
+                "cache_read_tokens": cache_read_tokens,
+                "cache_write_tokens": cache_write_tokens
             })
         }
         
+    except DeadlineExceededError as e:
+        logger.warning(f"Plazo de la solicitud agotado: {str(e)}")
+        return timeout_response(e)
+
+    except BedrockThrottledError as e:
+        logger.warning(f"Bedrock saturado: {str(e)}")
+        return throttled_response(e)
+
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}", exc_info=True)
         return {
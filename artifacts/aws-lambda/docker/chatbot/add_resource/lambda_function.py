@@ -1,15 +1,24 @@
+import functools
 import json
 import os
 import hashlib
 import requests
+import sys
+import time
 import unicodedata
 import re
 import boto3
+import botocore.session
+import numpy as np
+from botocore.config import Config
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict, Any, List
 from uuid import uuid4
 from datetime import datetime
 
+INIT_STARTED = time.perf_counter()
+
 # Importar helpers de aje-libs
 from aje_libs.common.helpers.s3_helper import S3Helper
 from aje_libs.common.helpers.dynamodb_helper import DynamoDBHelper
@@ -19,6 +28,28 @@ from aje_libs.common.logger import custom_logger
 from aje_libs.common.helpers.secrets_helper import SecretsHelper
 from aje_libs.common.helpers.ssm_helper import SSMParameterHelper
 
+try:
+    # Subsegmentos de X-Ray por etapa cuando la función tiene tracing activo
+    from aws_xray_sdk.core import patch, xray_recorder
+    XRAY_ENABLED = bool(os.environ.get("AWS_XRAY_DAEMON_ADDRESS"))
+except ImportError:
+    XRAY_ENABLED = False
+if XRAY_ENABLED:
+    patch(("botocore", "httplib"))
+
+# Sesión de boto3 por defecto con keepalive, pool de conexiones, timeouts explícitos y reintentos
+# estándar; los helpers de aje_libs crean sus clientes con ella (misma configuración base que
+# aprendizaje_libs.helpers.client_helper, que no está disponible en esta imagen)
+botocore_session = botocore.session.get_session()
+botocore_session.set_default_client_config(Config(
+    tcp_keepalive=True,
+    max_pool_connections=10,
+    connect_timeout=2,
+    read_timeout=60,
+    retries={"max_attempts": 3, "mode": "standard"}
+))
+boto3.setup_default_session(botocore_session=botocore_session)
+
 # Configuración
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 PROJECT_NAME = os.environ["PROJECT_NAME"]
@@ -42,6 +73,16 @@ PINECONE_API_KEY = secret_pinecone.get_secret_value("PINECONE_API_KEY")
 
 DOWNLOAD_FOLDER = "/tmp/downloads"
 S3_PATH = "SOFIA_FILE/PLANIFICACION/AV_Recursos"
+# Índices locales por recurso que generar_ruta consulta sin llamar a Pinecone
+S3_VECTOR_INDEX_PATH = "SOFIA_FILE/PLANIFICACION/AV_Vectores"
+VECTOR_INDEX_FORMAT_VERSION = 1
+
+# Métricas por etapa en CloudWatch Embedded Metric Format, con el mismo espacio de nombres y
+# dimensiones que aprendizaje_libs.helpers.metrics_helper (no disponible en esta imagen)
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AprendizajeGuiado")
+METRICS_ENDPOINT = "add_resource"
+init_stages = {"config": (time.perf_counter() - INIT_STARTED) * 1000}
+stage_timings: Dict[str, float] = {}
  
 logger = custom_logger(__name__, owner=OWNER, service=PROJECT_NAME)
 
@@ -66,7 +107,85 @@ pinecone_helper = PineconeHelper(
     embeddings_region=EMBEDDINGS_REGION
 )
 document_processor = DocumentProcessor()
+init_stages["clients"] = (time.perf_counter() - INIT_STARTED) * 1000 - init_stages["config"]
+
+
+@contextmanager
+def stage(name: str, **annotations):
+    """
+    Acumula la duración de una etapa de la ingesta (download, extract, chunk, embed, upsert...)
+    y, con tracing activo, la traza como subsegmento de X-Ray con las anotaciones dadas.
+
+    :param name: Nombre de la etapa
+    :param annotations: Anotaciones del subsegmento (p. ej. chunks, vectors)
+    """
+    started = time.perf_counter()
+    try:
+        if XRAY_ENABLED:
+            with xray_recorder.in_subsegment(name) as subsegment:
+                for key, value in annotations.items():
+                    if subsegment is not None:
+                        subsegment.put_annotation(key, value)
+                yield
+        else:
+            yield
+    finally:
+        stage_timings[name] = stage_timings.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def emit_metrics(status_code: int, total_ms: float, start: str) -> None:
+    """
+    Escribe en la salida estándar el documento EMF de la invocación con los tiempos por etapa.
+
+    :param status_code: statusCode de la respuesta
+    :param total_ms: Duración total de la invocación
+    :param start: "cold" en la primera invocación del contenedor, "warm" en las demás
+    """
+    values = {f"{name}_ms": round(value, 1) for name, value in stage_timings.items()}
+    if start == "cold":
+        values.update({f"init_{name}_ms": round(value, 1) for name, value in init_stages.items()})
+    values["total_ms"] = round(total_ms, 1)
+    values["errors"] = 1 if status_code >= 500 else 0
+    document = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Endpoint", "Start"], ["Endpoint"]],
+                "Metrics": [{"Name": name, "Unit": "Count" if name == "errors" else "Milliseconds"} for name in values]
+            }]
+        },
+        "Endpoint": METRICS_ENDPOINT,
+        "Start": start,
+        "StatusCode": status_code,
+        "EmbeddingsModel": EMBEDDINGS_MODEL_ID,
+        **values
+    }
+    sys.stdout.write(json.dumps(document) + "\n")
+    sys.stdout.flush()
+
+
+def instrument(handler):
+    """Mide la invocación completa y emite sus métricas al terminar."""
+    invocations = {"count": 0}
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        stage_timings.clear()
+        start = "cold" if invocations["count"] == 0 else "warm"
+        invocations["count"] += 1
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = handler(event, context)
+            status_code = response.get("statusCode", 200)
+            return response
+        finally:
+            emit_metrics(status_code, (time.perf_counter() - started) * 1000, start)
+    return wrapper
 
+
+@instrument
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Handler principal de Lambda para agregar un recurso educativo.
@@ -148,7 +267,8 @@ def process_resource_addition(resource_id: str, title: str, drive_id: str, silab
     """
     try:
         # Descargar archivo desde Google Drive
-        file_path = download_file_from_gdrive(title, drive_id)
+        with stage("download", drive_id=drive_id):
+            file_path = download_file_from_gdrive(title, drive_id)
         
         # Generar hash del archivo
         file_hash = generate_file_hash(file_path)
@@ -181,11 +301,12 @@ def process_resource_addition(resource_id: str, title: str, drive_id: str, silab
         resource_data['pinecone_ids'] = pinecone_ids
         
         # Guardar en DynamoDB
-        files_table_helper.put_item(resource_data)
-        hash_table_helper.put_item({
-            'file_hash': file_hash,
-            's3_path': s3_path
-        })
+        with stage("metadata_write"):
+            files_table_helper.put_item(resource_data)
+            hash_table_helper.put_item({
+                'file_hash': file_hash,
+                's3_path': s3_path
+            })
 
         try:
             library_item = library_table_helper.get_item(silabus_id)
@@ -220,6 +341,53 @@ def process_resource_addition(resource_id: str, title: str, drive_id: str, silab
         logger.error(f"Error processing resource addition: {str(e)}", exc_info=True)
         return {'success': False, 'message': str(e)}
 
+def export_vector_index(resource_id: str, vectors: List[Dict[str, Any]]) -> None:
+    """
+    Exporta los vectores del recurso a S3 en el formato de aprendizaje_libs.helpers.vector_index_helper.
+
+    Archivos: vectors.npy (float32 normalizado), texts.bin (metadata JSON concatenada),
+    offsets.npy (inicio de cada registro) y manifest.json. manifest.json y texts.bin se suben
+    al final para que los lectores no encuentren un índice incompleto.
+    
+    :param resource_id: ID del recurso
+    :param vectors: Vectores subidos a Pinecone (id, values, metadata)
+    """
+    directory = os.path.join(DOWNLOAD_FOLDER, "vector_index", str(resource_id))
+    os.makedirs(directory, exist_ok=True)
+
+    matrix = np.asarray([vector['values'] for vector in vectors], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    records = [
+        json.dumps({
+            'id': vector['id'],
+            'resource_id': str(vector['metadata']['resource_id']),
+            'chunk_index': vector['metadata']['chunk_index'],
+            'text': vector['metadata']['text']
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for vector in vectors
+    ]
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(record) for record in records])
+
+    np.save(os.path.join(directory, "vectors.npy"), matrix)
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    with open(os.path.join(directory, "texts.bin"), "wb") as f:
+        f.write(b"".join(records))
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": VECTOR_INDEX_FORMAT_VERSION,
+            "embeddings_model_id": EMBEDDINGS_MODEL_ID,
+            "count": int(matrix.shape[0]),
+            "dimension": int(matrix.shape[1])
+        }, f)
+
+    for file_name in ("vectors.npy", "offsets.npy", "manifest.json", "texts.bin"):
+        s3_helper.upload_file(os.path.join(directory, file_name), f"{S3_VECTOR_INDEX_PATH}/{resource_id}/{file_name}")
+        os.remove(os.path.join(directory, file_name))
+    logger.info(f"Local vector index exported for resource {resource_id}: {matrix.shape[0]} vectors")
+
 def download_file_from_gdrive(file_name: str, gdrive_id: str) -> str:
     """
     Descarga un archivo desde Google Drive y lo guarda localmente.
@@ -311,32 +479,36 @@ def process_document_to_pinecone(file_path: str, metadata: Dict[str, Any]) -> Li
     
     try:
         # Extraer texto del documento usando DocumentProcessor
-        text_content = document_processor.process_document(file_path)
+        with stage("extract", file_extension=file_extension):
+            text_content = document_processor.process_document(file_path)
         
         if not text_content:
             logger.warning(f"No text content extracted from {file_path}")
             return []
         
         # Dividir texto en chunks (sin usar langchain)
-        chunks = chunk_text(text_content)
+        with stage("chunk"):
+            chunks = chunk_text(text_content)
         
         # Generar UUIDs para los vectores
         uuids = [str(uuid4()) for _ in range(len(chunks))]
         
         # Convertir chunks a vectores y subir a Pinecone
         vectors_to_upsert = []
-        for chunk, doc_id in zip(chunks, uuids):
-            # Obtener embeddings
-            embedding = pinecone_helper.get_embeddings(chunk)
-            # Crear vector con metadata
-            vectors_to_upsert.append({
-                'id': doc_id,
-                'values': embedding,
-                'metadata': {
-                    **metadata,
-                    'text': chunk  # Agregar el texto como parte de metadata
-                }
-            })
+        with stage("embed", chunks=len(chunks), words=len(text_content.split())):
+            for chunk_index, (chunk, doc_id) in enumerate(zip(chunks, uuids)):
+                # Obtener embeddings
+                embedding = pinecone_helper.get_embeddings(chunk)
+                # Crear vector con metadata
+                vectors_to_upsert.append({
+                    'id': doc_id,
+                    'values': embedding,
+                    'metadata': {
+                        **metadata,
+                        'chunk_index': chunk_index,  # Posición del chunk para unir chunks consecutivos al armar el contexto
+                        'text': chunk  # Agregar el texto como parte de metadata
+                    }
+                })
         
         if not vectors_to_upsert:
             logger.warning("No vectors to upsert")
@@ -345,8 +517,16 @@ def process_document_to_pinecone(file_path: str, metadata: Dict[str, Any]) -> Li
         # Subir vectores a Pinecone
         logger.info(f"Vectors to upsert: {len(vectors_to_upsert)}")
         
-        response = pinecone_helper.upsert_vectors(vectors_to_upsert)
+        with stage("upsert", vectors=len(vectors_to_upsert)):
+            response = pinecone_helper.upsert_vectors(vectors_to_upsert)
         logger.info(f"Upsert successful. Response: {response}")
+
+        try:
+            with stage("export", vectors=len(vectors_to_upsert)):
+                export_vector_index(metadata['resource_id'], vectors_to_upsert)
+        except Exception as e:
+            # Sin índice local generar_ruta consulta Pinecone para este recurso
+            logger.error(f"Error exporting local vector index: {str(e)}", exc_info=True)
         
         # Devolver IDs de los vectores
         return uuids
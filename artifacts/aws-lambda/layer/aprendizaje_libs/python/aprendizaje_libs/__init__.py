@@ -0,0 +1 @@
+"""Utilidades compartidas por las funciones Lambda de aprendizaje guiado."""
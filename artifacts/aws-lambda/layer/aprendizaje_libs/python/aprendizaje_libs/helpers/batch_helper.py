@@ -0,0 +1,81 @@
+# Built-in imports
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.deadline_helper import DeadlineExceededError
+from aprendizaje_libs.helpers.throttling_helper import BedrockThrottledError
+from aprendizaje_libs.helpers.tracing_helper import bind_context
+
+logger = custom_logger(__name__)
+
+
+class BatchItemResult(NamedTuple):
+    """Resultado de procesar un elemento de un lote: `value` si tuvo éxito, `error` si falló."""
+
+    value: Any = None
+    error: Optional[Exception] = None
+
+
+def map_bounded(fn: Callable[[Any], Any], items: Sequence[Any], max_concurrency: int) -> List[BatchItemResult]:
+    """
+    Aplica `fn` a cada elemento con un máximo de `max_concurrency` ejecuciones simultáneas.
+
+    Los errores se capturan por elemento para que una falla no cancele el resto del lote.
+
+    :param fn: Función a aplicar.
+    :param items: Elementos del lote.
+    :param max_concurrency: Máximo de elementos procesados en paralelo.
+    :return: Resultados en el mismo orden que `items`.
+    """
+    def run(item: Any) -> BatchItemResult:
+        try:
+            return BatchItemResult(value=fn(item))
+        except Exception as error:
+            logger.warning(f"Error al procesar elemento del lote: {error}")
+            return BatchItemResult(error=error)
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(items)))) as executor:
+        # Los elementos se trazan bajo el subsegmento del lote, no como trazas sueltas
+        return list(executor.map(bind_context(run), items))
+
+
+def error_details(error: Exception) -> Dict[str, str]:
+    """
+    Código y detalle de error de un elemento fallido, con los mismos códigos que las respuestas individuales.
+
+    :param error: Excepción del elemento.
+    :return: Diccionario con `code` y `details`.
+    """
+    if isinstance(error, DeadlineExceededError):
+        return {"code": "DEADLINE_EXCEEDED", "details": str(error)}
+    if isinstance(error, BedrockThrottledError):
+        return {"code": "BEDROCK_THROTTLED", "details": str(error)}
+    return {"code": "INTERNAL_ERROR", "details": str(error)}
+
+
+def save_batch_history(write: Callable[[List[Dict[str, Any]]], Any], items: Dict[int, Dict[str, Any]], results: List[Dict[str, Any]]) -> bool:
+    """
+    Guarda el historial de un lote con una sola escritura.
+
+    Si la escritura falla, los elementos cuyo historial no se guardó se marcan como fallidos
+    (HISTORY_WRITE_FAILED) para que el cliente no los dé por registrados y los reintente.
+
+    :param write: Función que escribe la lista de elementos (p. ej. batch_write_items).
+    :param items: Elementos del historial por posición en el lote.
+    :param results: Resultados del lote; se actualizan en el lugar.
+    :return: True si el historial quedó guardado (o no había nada que guardar).
+    """
+    if not items:
+        return True
+    try:
+        write(list(items.values()))
+        return True
+    except Exception as error:
+        logger.error(f"Error al guardar el historial del lote: {error}")
+        for index in items:
+            results[index].update({"success": False, "error": {"code": "HISTORY_WRITE_FAILED", "details": str(error)}})
+        return False
@@ -0,0 +1,294 @@
+# Built-in imports
+import re
+import unicodedata
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.deadline_helper import DeadlineExceededError
+from aprendizaje_libs.helpers.model_router_helper import cache_usage
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate
+from aprendizaje_libs.helpers.throttling_helper import BedrockThrottledError
+
+logger = custom_logger(__name__)
+
+# Marcador de sección: `@Etiqueta:` al inicio de línea, tolerando viñetas, encabezados y negritas
+MARKER_PATTERN = re.compile(r"^[ \t>*#-]*@[ \t]*(?P<label>[^:@\n]{1,40}?)[ \t*]*:[ \t*]*", re.MULTILINE)
+
+# Etiqueta normalizada (_label_key) -> campo del reto
+SECTION_LABELS = {
+    "titulo": "titulo",
+    "reto": "reto",
+    "contexto": "contexto",
+    "pregunta": "pregunta",
+    "respuesta modelo": "respuesta_modelo",
+    "conceptos clave": "conceptos_clave",
+    "conceptos claves": "conceptos_clave"
+}
+
+# Etiqueta con la que se vuelve a escribir cada campo
+FIELD_LABELS = {
+    "titulo": "Titulo",
+    "reto": "Reto",
+    "contexto": "Contexto",
+    "pregunta": "Pregunta",
+    "respuesta_modelo": "Respuesta Modelo"
+}
+
+CHALLENGE_REPAIR_PROMPT = PromptTemplate("""
+    ### Corrección
+    La respuesta anterior no cumplió el formato en {objetivo}. Genera únicamente {objetivo}, con el formato de las instrucciones y sin preámbulo ni los demás retos.
+    - Secciones obligatorias: {secciones}
+    - Retos ya generados, que no debes repetir: {otros_retos}
+    {borrador}
+""", name="CHALLENGE_REPAIR_PROMPT")
+
+
+class ChallengeFormat(NamedTuple):
+    """Secciones obligatorias de cada reto según el prompt que lo genera."""
+
+    sections: Tuple[str, ...]
+    concepts_label: str = "Conceptos Claves"
+    with_title: bool = True
+
+
+# Ruta estándar (generar_ruta), metodo-caso (generar_ruta) y un reto suelto (regenerar_reto)
+RUTA_ESTANDAR_FORMAT = ChallengeFormat(sections=("reto", "pregunta", "respuesta_modelo", "conceptos_clave"))
+METODO_CASO_FORMAT = ChallengeFormat(
+    sections=("reto", "contexto", "pregunta", "respuesta_modelo", "conceptos_clave"),
+    concepts_label="Conceptos Clave"
+)
+RETO_FORMAT = RUTA_ESTANDAR_FORMAT._replace(with_title=False)
+
+
+class ParsedChallenges(NamedTuple):
+    """Título y retos leídos de la respuesta del modelo; cada reto solo tiene las secciones encontradas."""
+
+    titulo: Optional[str]
+    retos: List[Dict[str, Any]]
+
+
+class ChallengeDefect(NamedTuple):
+    """Título faltante (`position` None) o reto incompleto o faltante (`position` desde 0)."""
+
+    position: Optional[int]
+    missing: Tuple[str, ...]
+
+    def describe(self) -> str:
+        if self.position is None:
+            return "falta el título de la ruta"
+        return f"reto {self.position + 1}: faltan {', '.join(self.missing)}"
+
+
+class StructuredChallenges(NamedTuple):
+    """Resultado validado (y reparado si hizo falta) de una generación de retos."""
+
+    titulo: Optional[str]
+    retos: List[Dict[str, Any]]
+    errors: List[str]
+    repaired: List[str]
+    usage: Dict[str, int]
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+def _label_key(label: str) -> str:
+    # Sin tildes ni mayúsculas; no usa prescoring_helper para no cargar numpy en los generadores
+    label = unicodedata.normalize("NFKD", label)
+    return " ".join("".join(char for char in label if not unicodedata.combining(char)).lower().split())
+
+
+def _clean(value: str) -> str:
+    lines = [line.rstrip() for line in value.strip().strip("*").strip().splitlines()]
+    return "\n".join(lines).strip()
+
+
+def _concepts(value: str) -> List[str]:
+    concepts = [item.strip().strip("*").strip() for item in value.replace("\n", " ").split(",")]
+    if concepts:
+        concepts[-1] = concepts[-1].rstrip(".").strip()
+    return [concept for concept in concepts if concept]
+
+
+def parse_challenges(text: str) -> ParsedChallenges:
+    """
+    Lee el título y los retos de la respuesta del modelo en formato `@Etiqueta: valor`.
+
+    Un reto empieza con `@Reto` o cuando se repite una sección del reto en curso, de modo
+    que un reto sin su línea `@Reto` no se mezcla con el anterior.
+
+    :param text: Texto generado por el modelo.
+    :return: Título (None si no está) y retos con las secciones encontradas.
+    """
+    markers = [
+        (match, SECTION_LABELS[_label_key(match.group("label"))])
+        for match in MARKER_PATTERN.finditer(text or "")
+        if _label_key(match.group("label")) in SECTION_LABELS
+    ]
+    titulo = None
+    retos: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    for position, (match, field) in enumerate(markers):
+        end = markers[position + 1][0].start() if position + 1 < len(markers) else len(text)
+        value = _clean(text[match.end():end])
+        if field == "titulo":
+            titulo = titulo or value or None
+            continue
+        if current is None or field == "reto" or field in current:
+            current = {}
+            retos.append(current)
+        if field == "conceptos_clave":
+            concepts = _concepts(value)
+            if concepts:
+                current[field] = concepts
+        elif value:
+            current[field] = value
+    return ParsedChallenges(titulo=titulo, retos=retos)
+
+
+def find_defects(parsed: ParsedChallenges, challenge_format: ChallengeFormat, expected: int) -> List[ChallengeDefect]:
+    """
+    Secciones faltantes del título y de los primeros `expected` retos.
+
+    :param parsed: Resultado de parse_challenges.
+    :param challenge_format: Secciones obligatorias.
+    :param expected: Número de retos solicitado (NumeroRetos).
+    :return: Defectos encontrados; los retos que faltan aparecen con todas sus secciones.
+    """
+    defects = []
+    if challenge_format.with_title and not parsed.titulo:
+        defects.append(ChallengeDefect(position=None, missing=("titulo",)))
+    for position in range(expected):
+        reto = parsed.retos[position] if position < len(parsed.retos) else {}
+        missing = tuple(section for section in challenge_format.sections if not reto.get(section))
+        if missing:
+            defects.append(ChallengeDefect(position=position, missing=missing))
+    return defects
+
+
+def render_challenge(reto: Dict[str, Any], challenge_format: ChallengeFormat) -> str:
+    """Reto en el mismo formato `@Etiqueta: valor` que genera el modelo."""
+    lines = []
+    for section in challenge_format.sections:
+        if section == "conceptos_clave":
+            concepts = reto.get(section) or []
+            lines.append(f"@{challenge_format.concepts_label}: {', '.join(concepts)}." if concepts else f"@{challenge_format.concepts_label}:")
+        else:
+            lines.append(f"@{FIELD_LABELS[section]}: {reto.get(section, '')}".rstrip())
+    return "\n".join(lines)
+
+
+def render_challenges(titulo: Optional[str], retos: List[Dict[str, Any]], challenge_format: ChallengeFormat) -> str:
+    """Ruta completa en el formato del modelo, para el historial y los clientes que leen el texto."""
+    blocks = [f"@Titulo: {titulo or ''}".rstrip()] if challenge_format.with_title else []
+    blocks.extend(render_challenge(reto, challenge_format) for reto in retos)
+    return "\n\n".join(blocks)
+
+
+def repair_instructions(
+    defect: ChallengeDefect,
+    parsed: ParsedChallenges,
+    challenge_format: ChallengeFormat,
+    expected: int
+) -> str:
+    """
+    Instrucción de corrección de un solo defecto; se agrega al final del prompt original.
+
+    :param defect: Título o reto a corregir.
+    :param parsed: Retos ya generados, para no repetirlos y como borrador del reto incompleto.
+    :param challenge_format: Secciones obligatorias.
+    :param expected: Número de retos solicitado.
+    :return: Bloque de texto con la corrección pedida.
+    """
+    if defect.position is None:
+        objetivo = "el @Titulo de la ruta"
+        secciones = "@Titulo"
+        draft = {}
+    else:
+        objetivo = f"el reto {defect.position + 1} de {expected}"
+        secciones = ", ".join(
+            f"@{challenge_format.concepts_label}" if section == "conceptos_clave" else f"@{FIELD_LABELS[section]}"
+            for section in challenge_format.sections
+        )
+        draft = parsed.retos[defect.position] if defect.position < len(parsed.retos) else {}
+    otros_retos = [
+        reto["reto"] for position, reto in enumerate(parsed.retos[:expected])
+        if reto.get("reto") and position != defect.position
+    ]
+    borrador = f"- Borrador incompleto que debes completar:\n{render_challenge(draft, challenge_format)}" if draft else ""
+    return CHALLENGE_REPAIR_PROMPT.render(
+        objetivo=objetivo,
+        secciones=secciones,
+        otros_retos="; ".join(otros_retos) or "ninguno",
+        borrador=borrador
+    )
+
+
+def structure_challenges(
+    text: str,
+    challenge_format: ChallengeFormat,
+    expected: int,
+    repair: Optional[Callable[[str], Dict[str, Any]]] = None,
+    max_repairs: int = 1
+) -> StructuredChallenges:
+    """
+    Valida la respuesta del modelo y corrige con llamadas pequeñas los defectos aislados.
+
+    Cada defecto (título o reto) se corrige con una llamada que genera solo esa parte, en lugar
+    de repetir toda la generación. Si hay más de `max_repairs` defectos no se intenta corregir:
+    la respuesta se devuelve con sus errores y el cliente decide si regenera. Si el plazo se
+    agota o Bedrock está saturado durante una corrección, se devuelve lo obtenido hasta ese momento.
+
+    :param text: Texto generado por el modelo.
+    :param challenge_format: Secciones obligatorias.
+    :param expected: Número de retos solicitado.
+    :param repair: Recibe la instrucción de corrección y devuelve la respuesta de Converse.
+    :param max_repairs: Máximo de defectos que se corrigen.
+    :return: Título, retos (recortados a `expected`), errores pendientes, partes corregidas y tokens de las correcciones.
+    """
+    parsed = parse_challenges(text)
+    if len(parsed.retos) > expected:
+        logger.warning(f"El modelo generó {len(parsed.retos)} retos de {expected}; se conservan los primeros")
+    titulo = parsed.titulo
+    retos = [dict(reto) for reto in parsed.retos[:expected]]
+    usage = {"input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+    repaired: List[str] = []
+
+    defects = find_defects(parsed, challenge_format, expected)
+    if defects and repair is not None and len(defects) <= max_repairs:
+        for defect in defects:
+            try:
+                response = repair(repair_instructions(defect, parsed, challenge_format, expected))
+            except (DeadlineExceededError, BedrockThrottledError) as error:
+                logger.warning(f"Corrección interrumpida ({defect.describe()}): {error}")
+                break
+            usage["input_tokens"] += response["usage"]["inputTokens"]
+            usage["output_tokens"] += response["usage"]["outputTokens"]
+            cache_read_tokens, cache_write_tokens = cache_usage(response)
+            usage["cache_read_tokens"] += cache_read_tokens
+            usage["cache_write_tokens"] += cache_write_tokens
+
+            fixed = parse_challenges(response["output"]["message"]["content"][0]["text"])
+            if defect.position is None and fixed.titulo:
+                titulo = fixed.titulo
+                repaired.append("titulo")
+            elif defect.position is not None and fixed.retos and defect.position <= len(retos):
+                # Las secciones del borrador solo se conservan si la corrección no las trae
+                draft = retos[defect.position] if defect.position < len(retos) else {}
+                candidate = {**draft, **fixed.retos[0]}
+                if defect.position < len(retos):
+                    retos[defect.position] = candidate
+                else:
+                    retos.append(candidate)
+                repaired.append(f"reto {defect.position + 1}")
+    elif defects:
+        logger.warning(f"{len(defects)} defectos en la respuesta; no se corrigen (máximo {max_repairs})")
+
+    remaining = find_defects(ParsedChallenges(titulo=titulo, retos=retos), challenge_format, expected)
+    errors = [defect.describe() for defect in remaining]
+    if len(retos) < expected:
+        errors.insert(0, f"se esperaban {expected} retos y se recibieron {len(retos)}")
+    logger.info(f"Retos estructurados: {len(retos)}/{expected}, corregidos {repaired}, errores {errors}")
+    return StructuredChallenges(titulo=titulo, retos=retos, errors=errors, repaired=repaired, usage=usage)
@@ -0,0 +1,171 @@
+# Built-in imports
+import os
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+# External imports
+import boto3
+from botocore.config import Config
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.snapstart_helper import after_restore, before_snapshot, warm_operations
+from aprendizaje_libs.helpers.tracing_helper import install_tracing
+from aprendizaje_libs.helpers.traffic_helper import install_traffic_mode
+
+logger = custom_logger(__name__)
+
+# Conexiones por cliente; cubre los lotes concurrentes (EVALUAR_BATCH_MAX_CONCURRENCY) con margen
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", 32))
+
+# Configuración común: keepalive para reutilizar conexiones entre invocaciones en caliente
+DEFAULT_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    connect_timeout=2,
+    read_timeout=10,
+    retries={"max_attempts": 3, "mode": "standard"}
+)
+
+# Timeouts y reintentos por servicio. Bedrock usa el modo adaptativo con pocos intentos porque
+# los reintentos largos los gestiona BedrockGovernor y el read_timeout lo ajusta TimeoutClientPool
+SERVICE_CONFIGS: Dict[str, Config] = {
+    "bedrock-runtime": Config(connect_timeout=2, read_timeout=60, retries={"max_attempts": 2, "mode": "adaptive"}),
+    "dynamodb": Config(connect_timeout=1, read_timeout=5, retries={"max_attempts": 3, "mode": "standard"}),
+    "ssm": Config(connect_timeout=1, read_timeout=5, retries={"max_attempts": 3, "mode": "standard"}),
+    "secretsmanager": Config(connect_timeout=1, read_timeout=5, retries={"max_attempts": 3, "mode": "standard"}),
+    "s3": Config(connect_timeout=2, read_timeout=30, retries={"max_attempts": 3, "mode": "standard"}),
+    "sqs": Config(connect_timeout=1, read_timeout=5, retries={"max_attempts": 3, "mode": "standard"}),
+    "apigatewaymanagementapi": Config(connect_timeout=1, read_timeout=5, retries={"max_attempts": 2, "mode": "standard"})
+}
+
+# Operaciones que usan los handlers; sus modelos se cargan antes del snapshot de SnapStart
+WARM_OPERATIONS: Dict[str, List[str]] = {
+    "bedrock-runtime": ["Converse", "InvokeModel"],
+    "dynamodb": ["GetItem", "PutItem", "UpdateItem", "Query"],
+    "s3": ["GetObject"],
+    "sqs": ["SendMessage"]
+}
+
+
+class ClientFactory(boto3.session.Session):
+    """
+    Sesión de boto3 compartida por el contenedor que configura y reutiliza los clientes.
+
+    Se instala como sesión por defecto de boto3 (install_client_factory), de modo que los
+    helpers de aje_libs, que llaman a boto3.client/boto3.resource al construirse, reciben
+    clientes con keepalive, pool de conexiones, timeouts por servicio y reintentos
+    standard/adaptive. Los clientes sin configuración explícita se crean una sola vez por
+    servicio y región; si el llamador pasa su propia Config, esta se combina con la del
+    servicio y tiene prioridad.
+    """
+
+    def __init__(self, service_configs: Optional[Dict[str, Config]] = None, **session_kwargs: Any) -> None:
+        """
+        :param service_configs: Configuración por servicio (por defecto SERVICE_CONFIGS).
+        :param session_kwargs: Parámetros de boto3.session.Session.
+        """
+        super().__init__(**session_kwargs)
+        self.service_configs = SERVICE_CONFIGS if service_configs is None else service_configs
+        self._clients: Dict[Tuple, Any] = {}
+        self._resources: Dict[Tuple, Any] = {}
+        # Todos los clientes creados, incluidos los que guarda quien los pide (TimeoutClientPool)
+        self._created: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def config_for(self, service_name: str, config: Optional[Config] = None) -> Config:
+        """
+        Configuración efectiva de un servicio.
+
+        :param service_name: Nombre del servicio de AWS.
+        :param config: Configuración del llamador (tiene prioridad).
+        :return: Config combinada.
+        """
+        merged = DEFAULT_CONFIG
+        if service_name in self.service_configs:
+            merged = merged.merge(self.service_configs[service_name])
+        return merged.merge(config) if config is not None else merged
+
+    def client(self, service_name: str, region_name: Optional[str] = None, config: Optional[Config] = None, **kwargs: Any) -> Any:
+        merged = self.config_for(service_name, config)
+        # Solo se reutilizan los clientes con la configuración del servicio; los demás
+        # (p. ej. los de TimeoutClientPool) los guarda quien los crea
+        if config is not None:
+            return self._track(super().client(service_name, region_name=region_name, config=merged, **kwargs))
+        key = (service_name, region_name, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self._track(super().client(service_name, region_name=region_name, config=merged, **kwargs))
+            return self._clients[key]
+
+    def resource(self, service_name: str, region_name: Optional[str] = None, config: Optional[Config] = None, **kwargs: Any) -> Any:
+        merged = self.config_for(service_name, config)
+        if config is not None:
+            resource = super().resource(service_name, region_name=region_name, config=merged, **kwargs)
+            self._track(resource.meta.client)
+            return resource
+        key = (service_name, region_name, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = super().resource(service_name, region_name=region_name, config=merged, **kwargs)
+                self._track(self._resources[key].meta.client)
+            return self._resources[key]
+
+    def _track(self, client: Any) -> Any:
+        self._created.add(client)
+        return client
+
+    def warm_clients(self) -> int:
+        """
+        Carga los modelos de las operaciones de WARM_OPERATIONS en los clientes creados.
+
+        :return: Cantidad de clientes precalentados.
+        """
+        warmed = 0
+        for client in list(self._created):
+            operations = WARM_OPERATIONS.get(client.meta.service_model.service_name)
+            if operations:
+                warm_operations(client, operations)
+                warmed += 1
+        return warmed
+
+    def reset_connections(self) -> int:
+        """
+        Cierra las conexiones abiertas de todos los clientes; se reabren en la siguiente llamada.
+
+        Tras restaurar un snapshot de SnapStart, las conexiones keepalive del snapshot ya no existen.
+
+        :return: Cantidad de clientes reiniciados.
+        """
+        clients = list(self._created)
+        for client in clients:
+            client.close()
+        return len(clients)
+
+
+_client_factory: Optional[ClientFactory] = None
+
+
+def install_client_factory() -> ClientFactory:
+    """
+    Crea (una vez por contenedor) la ClientFactory y la instala como sesión por defecto de boto3.
+
+    Debe llamarse antes de construir los helpers de aje_libs. Activa además el tracing de X-Ray
+    si la función lo tiene habilitado (tracing_helper) y, con TRAFFIC_MODE definido, la grabación
+    o reproducción de Bedrock y Pinecone (traffic_helper).
+
+    :return: ClientFactory del contenedor.
+    """
+    global _client_factory
+    if _client_factory is None:
+        _client_factory = ClientFactory()
+        boto3.DEFAULT_SESSION = _client_factory
+        install_tracing()
+        install_traffic_mode(_client_factory)
+        # Al final del snapshot, cuando los handlers ya crearon sus clientes (p. ej. TimeoutClientPool.warm),
+        # y al inicio de la restauración, antes de que otros hooks vuelvan a llamar a AWS
+        before_snapshot(_client_factory.warm_clients, order=100)
+        after_restore(_client_factory.reset_connections, order=-1)
+        logger.info(f"ClientFactory instalada (max_pool_connections={MAX_POOL_CONNECTIONS})")
+    return _client_factory
@@ -0,0 +1,206 @@
+# Built-in imports
+import re
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.prompt_helper import estimate_tokens
+
+logger = custom_logger(__name__)
+
+# Solapamiento máximo entre chunks consecutivos que se busca al unirlos (chunk_text usa 20 palabras)
+MAX_OVERLAP_WORDS = 40
+
+# Mínimo de palabras compartidas para considerar que dos chunks son consecutivos
+MIN_OVERLAP_WORDS = 8
+
+# Separador entre fragmentos del contexto
+CHUNK_SEPARATOR = "\n\n"
+
+
+class ContextChunk(NamedTuple):
+    """Fragmento recuperado del índice vectorial."""
+
+    text: str
+    score: float
+    resource_id: Optional[str] = None
+    chunk_index: Optional[int] = None
+
+
+def _shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return frozenset(words)
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Similitud de Jaccard entre dos conjuntos."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def chunks_from_matches(matches: Sequence[Dict[str, Any]], text_field: str = "text") -> List[ContextChunk]:
+    """
+    Convierte los resultados de PineconeHelper.search_by_text(return_format="raw") en fragmentos.
+
+    :param matches: Coincidencias con `score` y `metadata`.
+    :param text_field: Campo de metadata con el texto del chunk.
+    :return: Fragmentos con texto, ordenados por relevancia.
+    """
+    chunks = []
+    for match in matches:
+        metadata = match.get("metadata") or {}
+        text = " ".join(str(metadata.get(text_field, "")).split())
+        if not text:
+            continue
+        chunk_index = metadata.get("chunk_index")
+        chunks.append(ContextChunk(
+            text=text,
+            score=float(match.get("score", 0.0)),
+            resource_id=None if metadata.get("resource_id") is None else str(metadata["resource_id"]),
+            chunk_index=None if chunk_index is None else int(chunk_index)
+        ))
+    return sorted(chunks, key=lambda chunk: chunk.score, reverse=True)
+
+
+def _overlap(first: List[str], second: List[str]) -> int:
+    for size in range(min(MAX_OVERLAP_WORDS, len(first), len(second)), MIN_OVERLAP_WORDS - 1, -1):
+        if first[-size:] == second[:size]:
+            return size
+    return 0
+
+
+def _follows(first: ContextChunk, second: ContextChunk) -> bool:
+    if first.chunk_index is not None and second.chunk_index is not None:
+        return first.resource_id == second.resource_id and second.chunk_index == first.chunk_index + 1
+    return False
+
+
+def merge_adjacent(chunks: Sequence[ContextChunk]) -> List[ContextChunk]:
+    """
+    Une los chunks consecutivos de un mismo documento eliminando el texto solapado.
+
+    Usa `chunk_index` cuando el vector lo tiene en la metadata (add_resource lo guarda) y, para
+    los vectores anteriores, detecta el solapamiento de palabras que agrega chunk_text.
+
+    :param chunks: Fragmentos recuperados.
+    :return: Fragmentos unidos; cada uno conserva la mayor relevancia de sus partes.
+    """
+    merged = list(chunks)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged)):
+                if i == j:
+                    continue
+                first, second = merged[i], merged[j]
+                if first.resource_id != second.resource_id and None not in (first.resource_id, second.resource_id):
+                    continue
+                first_words, second_words = first.text.split(), second.text.split()
+                overlap = _overlap(first_words, second_words)
+                if not overlap and not _follows(first, second):
+                    continue
+                merged[i] = ContextChunk(
+                    text=" ".join(first_words + second_words[overlap:]),
+                    score=max(first.score, second.score),
+                    resource_id=first.resource_id or second.resource_id,
+                    chunk_index=second.chunk_index
+                )
+                del merged[j]
+                changed = True
+                break
+            if changed:
+                break
+    return sorted(merged, key=lambda chunk: chunk.score, reverse=True)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    words = text.split()
+    low, high = 0, len(words)
+    # Búsqueda binaria del mayor prefijo de palabras que entra en el presupuesto
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def select_diverse(
+    chunks: Sequence[ContextChunk],
+    max_tokens: int,
+    diversity: float = 0.3,
+    duplicate_threshold: float = 0.8,
+    min_tail_tokens: int = 50
+) -> List[ContextChunk]:
+    """
+    Selecciona fragmentos relevantes y diversos (MMR) hasta agotar el presupuesto de tokens.
+
+    :param chunks: Fragmentos candidatos.
+    :param max_tokens: Presupuesto de tokens del contexto.
+    :param diversity: Peso de la penalización por similitud con los fragmentos ya elegidos (0 a 1).
+    :param duplicate_threshold: Similitud a partir de la cual un fragmento se descarta por repetido.
+    :param min_tail_tokens: Mínimo de tokens para incluir un fragmento recortado al final del presupuesto.
+    :return: Fragmentos elegidos en orden de selección.
+    """
+    candidates = [(chunk, _shingles(chunk.text)) for chunk in chunks]
+    selected: List[ContextChunk] = []
+    selected_shingles: List[FrozenSet[str]] = []
+    remaining = max_tokens
+
+    while candidates and remaining > 0:
+        def mmr(candidate):
+            chunk, shingles = candidate
+            redundancy = max((jaccard(shingles, other) for other in selected_shingles), default=0.0)
+            return (1 - diversity) * chunk.score - diversity * redundancy, redundancy
+
+        best = max(candidates, key=lambda candidate: mmr(candidate)[0])
+        candidates.remove(best)
+        chunk, shingles = best
+        if mmr(best)[1] >= duplicate_threshold:
+            logger.info(f"Fragmento descartado por repetido (relevancia {chunk.score:.4f})")
+            continue
+
+        cost = estimate_tokens(chunk.text)
+        if cost > remaining:
+            if remaining < min_tail_tokens:
+                break
+            chunk = chunk._replace(text=_truncate(chunk.text, remaining))
+            cost = estimate_tokens(chunk.text)
+        selected.append(chunk)
+        selected_shingles.append(shingles)
+        remaining -= cost + 1
+    return selected
+
+
+def assemble_context(
+    matches: Sequence[Dict[str, Any]],
+    max_tokens: int,
+    text_field: str = "text",
+    diversity: float = 0.3,
+    duplicate_threshold: float = 0.8
+) -> str:
+    """
+    Arma el contexto documental de un prompt a partir de las coincidencias del índice vectorial.
+
+    Une los chunks consecutivos, descarta los casi repetidos y recorta al presupuesto de tokens.
+
+    :param matches: Resultados crudos de la búsqueda.
+    :param max_tokens: Presupuesto de tokens del contexto.
+    :param text_field: Campo de metadata con el texto.
+    :param diversity: Peso de la diversidad en la selección MMR.
+    :param duplicate_threshold: Similitud a partir de la cual se descarta un fragmento.
+    :return: Contexto listo para insertar en el prompt (vacío si no hubo coincidencias).
+    """
+    chunks = merge_adjacent(chunks_from_matches(matches, text_field))
+    selected = select_diverse(chunks, max_tokens, diversity=diversity, duplicate_threshold=duplicate_threshold)
+    context = CHUNK_SEPARATOR.join(chunk.text for chunk in selected)
+    logger.info(
+        f"Contexto armado: {len(matches)} coincidencias, {len(chunks)} fragmentos unidos, "
+        f"{len(selected)} seleccionados, ~{estimate_tokens(context)} tokens"
+    )
+    return context
@@ -0,0 +1,198 @@
+# Built-in imports
+import json
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# External imports
+from botocore.config import Config
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+# Tiempo máximo de integración de API Gateway REST (29 segundos)
+API_GATEWAY_TIMEOUT_MS = 29000
+
+
+class DeadlineExceededError(Exception):
+    """No queda tiempo suficiente para completar una etapa antes del límite de la solicitud."""
+
+    def __init__(self, stage: str, remaining_ms: int = 0) -> None:
+        super().__init__(f"Tiempo agotado antes de la etapa '{stage}' (restante: {remaining_ms} ms)")
+        self.stage = stage
+        self.remaining_ms = remaining_ms
+
+
+def timeout_response(error: DeadlineExceededError) -> Dict[str, Any]:
+    """
+    Construye la respuesta 504 tipada que se devuelve cuando se agota el tiempo.
+
+    :param error: Excepción de tiempo agotado.
+    :return: Respuesta en formato proxy de API Gateway.
+    """
+    return {
+        "statusCode": 504,
+        "body": json.dumps({
+            "success": False,
+            "message": str(error),
+            "error": {
+                "code": "DEADLINE_EXCEEDED",
+                "details": error.stage
+            }
+        })
+    }
+
+
+class Deadline:
+    """Plazo de una solicitud, derivado del tiempo restante de la Lambda y del límite de API Gateway."""
+
+    def __init__(
+        self,
+        budget_ms: int,
+        safety_margin_ms: int = 1000,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """
+        :param budget_ms: Tiempo total disponible para la solicitud.
+        :param safety_margin_ms: Tiempo reservado para serializar y devolver la respuesta.
+        :param clock: Reloj monotónico (inyectable para pruebas).
+        """
+        self._clock = clock
+        self._expires_at = clock() + (budget_ms - safety_margin_ms) / 1000
+
+    @classmethod
+    def from_context(
+        cls,
+        context: Any,
+        limit_ms: Optional[int] = API_GATEWAY_TIMEOUT_MS,
+        safety_margin_ms: int = 1000
+    ) -> "Deadline":
+        """
+        Crea el plazo a partir de `context.get_remaining_time_in_millis()`.
+
+        :param context: Contexto de la Lambda (puede ser None en ejecución local).
+        :param limit_ms: Límite externo de la solicitud; None para usar solo el de la Lambda.
+        :param safety_margin_ms: Tiempo reservado para responder.
+        :return: Deadline.
+        """
+        budget_ms = context.get_remaining_time_in_millis() if context else (limit_ms or API_GATEWAY_TIMEOUT_MS)
+        if limit_ms:
+            budget_ms = min(budget_ms, limit_ms)
+        return cls(budget_ms, safety_margin_ms=safety_margin_ms)
+
+    def remaining_ms(self) -> int:
+        """Milisegundos disponibles antes del plazo."""
+        return max(0, int((self._expires_at - self._clock()) * 1000))
+
+    def has_budget(self, needed_ms: int) -> bool:
+        """Indica si quedan al menos `needed_ms` milisegundos."""
+        return self.remaining_ms() >= needed_ms
+
+    def check(self, stage: str, needed_ms: int = 1) -> None:
+        """
+        Verifica que quede tiempo para una etapa.
+
+        :param stage: Nombre de la etapa (se incluye en la respuesta de timeout).
+        :param needed_ms: Tiempo mínimo que requiere la etapa.
+        :raises DeadlineExceededError: Si no queda tiempo suficiente.
+        """
+        remaining = self.remaining_ms()
+        if remaining < needed_ms:
+            raise DeadlineExceededError(stage, remaining)
+
+    def read_timeout_seconds(self) -> int:
+        """Timeout de lectura para botocore, sin exceder el tiempo restante."""
+        return max(1, self.remaining_ms() // 1000)
+
+    def max_tokens(
+        self,
+        max_tokens: int,
+        ms_per_token: float,
+        min_tokens: int = 1,
+        overhead_ms: int = 500,
+        stage: str = "bedrock"
+    ) -> int:
+        """
+        Reduce `max_tokens` a lo que el modelo alcanza a generar en el tiempo restante.
+
+        :param max_tokens: Máximo de tokens solicitado.
+        :param ms_per_token: Tiempo estimado de generación por token de salida.
+        :param min_tokens: Mínimo de tokens con el que la llamada sigue siendo útil.
+        :param overhead_ms: Latencia fija estimada de la llamada (primer token, red).
+        :param stage: Nombre de la etapa para el error.
+        :return: Máximo de tokens ajustado.
+        :raises DeadlineExceededError: Si no alcanza para `min_tokens`.
+        """
+        remaining = self.remaining_ms()
+        affordable = int((remaining - overhead_ms) / ms_per_token) if ms_per_token > 0 else max_tokens
+        if affordable < min_tokens:
+            raise DeadlineExceededError(stage, remaining)
+        if affordable < max_tokens:
+            logger.warning(f"max_tokens reducido de {max_tokens} a {affordable} por tiempo restante ({remaining} ms)")
+            return affordable
+        return max_tokens
+
+
+def deadline_client_config(read_timeout: int, connect_timeout: int = 2) -> Config:
+    """
+    Configuración de botocore para los clientes de TimeoutClientPool.
+
+    Los modos standard y adaptive reintentan un ReadTimeoutError, con lo que una llamada lenta
+    esperaría read_timeout una vez por intento. Con un solo intento el read_timeout acota la
+    llamada completa; los reintentos por limitación los gestiona BedrockGovernor.
+
+    :param read_timeout: Timeout de lectura en segundos (el tramo del pool).
+    :param connect_timeout: Timeout de conexión en segundos.
+    :return: Objeto Config.
+    """
+    return Config(
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={"total_max_attempts": 1, "mode": "standard"}
+    )
+
+
+class TimeoutClientPool:
+    """
+    Clientes boto3 agrupados por tramos de read_timeout.
+
+    El timeout de lectura de botocore se fija al crear el cliente, por lo que se
+    reutiliza un cliente por tramo en lugar de crear uno nuevo en cada solicitud.
+    Los clientes deben crearse sin reintentos de botocore (deadline_client_config).
+    Es seguro entre hilos (evaluaciones en lote): cada llamada toma el cliente de su propio
+    tramo y la creación de clientes, que boto3 no soporta en paralelo, se serializa.
+    """
+
+    def __init__(self, factory: Callable[[int], Any], step_seconds: int = 5) -> None:
+        """
+        :param factory: Función que crea un cliente dado el read_timeout en segundos.
+        :param step_seconds: Tamaño de los tramos de timeout.
+        """
+        self._factory = factory
+        self._step_seconds = step_seconds
+        self._clients: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, read_timeout_seconds: int) -> Any:
+        """Devuelve un cliente cuyo read_timeout no excede `read_timeout_seconds`."""
+        if read_timeout_seconds >= self._step_seconds:
+            bucket = math.floor(read_timeout_seconds / self._step_seconds) * self._step_seconds
+        else:
+            bucket = max(1, int(read_timeout_seconds))
+        with self._lock:
+            if bucket not in self._clients:
+                self._clients[bucket] = self._factory(bucket)
+            return self._clients[bucket]
+
+    def warm(self, max_seconds: int = API_GATEWAY_TIMEOUT_MS // 1000) -> int:
+        """
+        Crea de antemano los clientes de todos los tramos hasta `max_seconds` (p. ej. antes del snapshot de SnapStart).
+
+        :return: Cantidad de clientes del pool.
+        """
+        for seconds in range(self._step_seconds, max_seconds + 1, self._step_seconds):
+            self.get(seconds)
+        return len(self._clients)
@@ -0,0 +1,287 @@
+# Built-in imports
+import functools
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+
+# External imports
+from botocore.exceptions import ClientError
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.deadline_helper import API_GATEWAY_TIMEOUT_MS, Deadline
+
+logger = custom_logger(__name__)
+
+IDEMPOTENCY_STATUS_IN_PROGRESS = "IN_PROGRESS"
+IDEMPOTENCY_STATUS_COMPLETED = "COMPLETED"
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Límite de DynamoDB por elemento (400 KB) menos margen para el resto de atributos
+MAX_RESPONSE_BYTES = 350000
+
+
+def payload_hash(body: Dict[str, Any]) -> str:
+    """Hash del cuerpo de la solicitud, independiente del orden de los campos."""
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def idempotency_key(event: Dict[str, Any], body: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    """
+    Clave de idempotencia de una solicitud a la API.
+
+    Con el header Idempotency-Key la clave es la del cliente; sin él, RetoEjecucionId más el
+    hash del cuerpo, de modo que un reintento idéntico de una evaluación se reconoce aunque no
+    envíe el header. Sin ninguno de los dos no hay clave: repetir a propósito una generación
+    (p. ej. regenerar un reto) debe producir un resultado nuevo. La clave se limita a la ruta.
+
+    :param event: Evento de API Gateway.
+    :param body: Cuerpo de la solicitud ya decodificado.
+    :return: (clave o None si la solicitud no se deduplica, hash del cuerpo).
+    """
+    digest = payload_hash(body)
+    resource = event.get("resource") or event.get("path") or ""
+    headers = {name.lower(): value for name, value in (event.get("headers") or {}).items()}
+    client_key = headers.get(IDEMPOTENCY_HEADER)
+    if client_key:
+        return f"{resource}#key#{client_key}", digest
+    if body.get("RetoEjecucionId") in (None, ""):
+        return None, digest
+    return f"{resource}#{body['RetoEjecucionId']}#{digest}", digest
+
+
+def conflict_response(code: str, message: str, status_code: int = 409, retry_after_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Respuesta para una solicitud duplicada que no se puede atender con el resultado original.
+
+    :param code: Código de error (REQUEST_IN_PROGRESS, IDEMPOTENCY_KEY_REUSED).
+    :param message: Mensaje para el cliente.
+    :param status_code: 409 si la original sigue en curso, 422 si la clave se reusó con otro cuerpo.
+    :param retry_after_seconds: Valor del header Retry-After.
+    :return: Respuesta en formato proxy de API Gateway.
+    """
+    response = {
+        "statusCode": status_code,
+        "body": json.dumps({
+            "success": False,
+            "message": message,
+            "error": {
+                "code": code,
+                "details": message
+            }
+        })
+    }
+    if retry_after_seconds is not None:
+        response["headers"] = {"Retry-After": str(retry_after_seconds)}
+    return response
+
+
+class IdempotencyStore:
+    """
+    Registros de idempotencia en una tabla DynamoDB con clave de partición `idempotency_key`.
+
+    Una solicitud reclama su clave con un registro IN_PROGRESS cuyo `lease_expires` es el
+    tiempo restante de la Lambda: si la invocación muere sin liberarla, la clave vuelve a estar
+    disponible al vencer. Al terminar con éxito el registro pasa a COMPLETED con la respuesta,
+    y el atributo `ttl` lo elimina pasado `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        table_helper: Any,
+        ttl_seconds: int = 900,
+        poll_seconds: float = 0.25,
+        max_poll_seconds: float = 1.0,
+        key_name: str = "idempotency_key",
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep
+    ) -> None:
+        """
+        :param table_helper: DynamoDBHelper de la tabla de idempotencia.
+        :param ttl_seconds: Tiempo durante el que un duplicado recibe la respuesta original.
+        :param poll_seconds: Espera inicial entre consultas de un duplicado concurrente.
+        :param max_poll_seconds: Espera máxima entre consultas.
+        :param key_name: Nombre de la clave de partición.
+        :param clock: Reloj en segundos (inyectable para pruebas).
+        :param sleep: Función de espera (inyectable para pruebas).
+        """
+        self.table = table_helper.get_table()
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.key_name = key_name
+        self._clock = clock
+        self._sleep = sleep
+
+    def claim(self, key: str, digest: str, lease_ms: int) -> Optional[str]:
+        """
+        Reclama la clave para ejecutar la solicitud.
+
+        :param key: Clave de idempotencia.
+        :param digest: Hash del cuerpo.
+        :param lease_ms: Tiempo máximo que la solicitud puede tardar.
+        :return: Identificador del reclamo, o None si otra solicitud tiene la clave.
+        """
+        now = self._clock()
+        claim_id = str(uuid4())
+        try:
+            self.table.put_item(
+                Item={
+                    self.key_name: key,
+                    "status": IDEMPOTENCY_STATUS_IN_PROGRESS,
+                    "claim_id": claim_id,
+                    "payload_hash": digest,
+                    "lease_expires": int(now * 1000) + lease_ms,
+                    "ttl": int(now) + self.ttl_seconds
+                },
+                # TTL borra con retraso: un registro vencido o un reclamo abandonado no bloquean la clave
+                ConditionExpression="attribute_not_exists(#k) OR #ttl < :now OR (#status = :in_progress AND lease_expires < :now_ms)",
+                ExpressionAttributeNames={"#k": self.key_name, "#ttl": "ttl", "#status": "status"},
+                ExpressionAttributeValues={":now": int(now), ":now_ms": int(now * 1000), ":in_progress": IDEMPOTENCY_STATUS_IN_PROGRESS}
+            )
+            return claim_id
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            raise error
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Registro vigente de la clave (lectura consistente)."""
+        item = self.table.get_item(Key={self.key_name: key}, ConsistentRead=True).get("Item")
+        if item and int(item.get("ttl", 0)) < self._clock():
+            return None
+        return item
+
+    def complete(self, key: str, claim_id: str, response: Dict[str, Any]) -> None:
+        """
+        Guarda la respuesta de la solicitud para los duplicados.
+
+        Una respuesta que no cabe en el elemento libera la clave en su lugar.
+        """
+        serialized = json.dumps(response, default=str)
+        if len(serialized.encode("utf-8")) > MAX_RESPONSE_BYTES:
+            logger.warning(f"Respuesta de {len(serialized)} caracteres demasiado grande para idempotencia; se libera {key}")
+            self.release(key, claim_id)
+            return
+        self._owned(
+            self.table.update_item,
+            Key={self.key_name: key},
+            UpdateExpression="SET #status = :completed, #response = :response, #ttl = :ttl",
+            ConditionExpression="claim_id = :claim_id",
+            ExpressionAttributeNames={"#status": "status", "#response": "response", "#ttl": "ttl"},
+            ExpressionAttributeValues={
+                ":completed": IDEMPOTENCY_STATUS_COMPLETED,
+                ":response": serialized,
+                ":ttl": int(self._clock()) + self.ttl_seconds,
+                ":claim_id": claim_id
+            }
+        )
+
+    def release(self, key: str, claim_id: str) -> None:
+        """Libera la clave tras un fallo para que un reintento vuelva a ejecutar la solicitud."""
+        self._owned(
+            self.table.delete_item,
+            Key={self.key_name: key},
+            ConditionExpression="claim_id = :claim_id",
+            ExpressionAttributeValues={":claim_id": claim_id}
+        )
+
+    def wait(self, key: str, deadline: Deadline) -> Optional[Dict[str, Any]]:
+        """
+        Espera a que la solicitud original termine.
+
+        :return: Registro COMPLETED, o None si la clave quedó libre (la original falló) o se agotó el plazo.
+        """
+        interval = self.poll_seconds
+        while deadline.has_budget(int(interval * 1000)):
+            self._sleep(interval)
+            item = self.get(key)
+            if item is None or item.get("status") == IDEMPOTENCY_STATUS_COMPLETED:
+                return item
+            interval = min(interval * 2, self.max_poll_seconds)
+        return None
+
+    def _owned(self, operation: Callable[..., Any], **kwargs: Any) -> None:
+        try:
+            operation(**kwargs)
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise error
+            # El reclamo venció y otra solicitud tomó la clave; su resultado prevalece
+            logger.warning(f"La clave de idempotencia {kwargs['Key'][self.key_name]} ya no pertenece a esta solicitud")
+
+
+def replayed(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Respuesta original guardada en el registro, marcada como repetida."""
+    response = json.loads(item["response"])
+    response["headers"] = {**(response.get("headers") or {}), REPLAYED_HEADER: "true"}
+    return response
+
+
+def idempotent(store: IdempotencyStore) -> Callable[[Callable[[Any, Any], Any]], Callable[[Any, Any], Any]]:
+    """
+    Decorador de los handlers POST de la API: un duplicado de una solicitud en curso espera y
+    recibe su resultado, y uno de una solicitud terminada recibe la respuesta guardada sin
+    volver a invocar a Bedrock ni escribir de nuevo el historial.
+
+    Solo se guardan las respuestas 2xx; tras un error (4xx, 5xx, 429 o excepción) la clave se
+    libera para que el reintento se ejecute. Los eventos sin cuerpo JSON y las solicitudes sin
+    header Idempotency-Key ni RetoEjecucionId pasan sin cambios.
+
+    :param store: Almacén de idempotencia.
+    """
+    def decorator(handler: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+        @functools.wraps(handler)
+        def wrapper(event: Any, context: Any) -> Any:
+            body = event.get("body", event) if isinstance(event, dict) else None
+            try:
+                if isinstance(body, str):
+                    body = json.loads(body)
+            except ValueError:
+                body = None
+            if not isinstance(body, dict) or event.get("httpMethod", "POST") != "POST":
+                return handler(event, context)
+
+            key, digest = idempotency_key(event, body)
+            if key is None:
+                return handler(event, context)
+            deadline = Deadline.from_context(context)
+            # El reclamo dura lo que puede durar la invocación, no solo el plazo de API Gateway
+            lease_ms = context.get_remaining_time_in_millis() if context else API_GATEWAY_TIMEOUT_MS
+            while True:
+                claim_id = store.claim(key, digest, lease_ms=lease_ms)
+                if claim_id is not None:
+                    break
+                item = store.get(key)
+                if item is not None and item.get("payload_hash") != digest:
+                    return conflict_response("IDEMPOTENCY_KEY_REUSED", "La clave de idempotencia ya se usó con otra solicitud", status_code=422)
+                if item is not None and item.get("status") == IDEMPOTENCY_STATUS_IN_PROGRESS:
+                    logger.info(f"Solicitud duplicada en curso, esperando el resultado de {key}")
+                    item = store.wait(key, deadline)
+                if item is not None and item.get("status") == IDEMPOTENCY_STATUS_COMPLETED:
+                    logger.info(f"Solicitud duplicada, se devuelve el resultado de {key}")
+                    return replayed(item)
+                if not deadline.has_budget(1000):
+                    return conflict_response("REQUEST_IN_PROGRESS", "Una solicitud idéntica sigue en curso", retry_after_seconds=2)
+                # La clave quedó libre (la original falló o venció): se vuelve a reclamar
+
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                status_code = response.get("statusCode") if isinstance(response, dict) else None
+                try:
+                    if status_code is not None and 200 <= int(status_code) < 300:
+                        store.complete(key, claim_id, response)
+                    else:
+                        store.release(key, claim_id)
+                except Exception as error:
+                    logger.warning(f"No se pudo actualizar el registro de idempotencia {key}: {error}")
+        return wrapper
+    return decorator
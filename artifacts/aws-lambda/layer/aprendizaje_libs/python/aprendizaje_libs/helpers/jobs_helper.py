@@ -0,0 +1,282 @@
+# Built-in imports
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Optional
+from uuid import uuid4
+
+# External imports
+import boto3
+from botocore.exceptions import ClientError
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.throttling_helper import BedrockThrottledError
+
+logger = custom_logger(__name__)
+
+JOB_STATUS_PENDING = "PENDING"
+JOB_STATUS_RUNNING = "RUNNING"
+JOB_STATUS_COMPLETED = "COMPLETED"
+JOB_STATUS_FAILED = "FAILED"
+JOB_FINAL_STATUSES = (JOB_STATUS_COMPLETED, JOB_STATUS_FAILED)
+
+# Entregas de un mensaje antes de que SQS lo mueva a la DLQ (max_receive_count de las colas)
+DEFAULT_MAX_RECEIVE_COUNT = 3
+
+
+def accepted_response(job_id: str) -> Dict[str, Any]:
+    """
+    Respuesta 202 que se devuelve al registrar un trabajo asíncrono.
+
+    :param job_id: ID del trabajo.
+    :return: Respuesta en formato proxy de API Gateway.
+    """
+    return {
+        "statusCode": 202,
+        "body": json.dumps({
+            "success": True,
+            "job_id": job_id,
+            "status": JOB_STATUS_PENDING
+        })
+    }
+
+
+def job_messages(event: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre los mensajes de trabajo contenidos en un evento de SQS.
+
+    Cada mensaje incluye `receive_count`, el número de entrega (ApproximateReceiveCount).
+    """
+    for record in event.get("Records", []):
+        message = json.loads(record["body"])
+        message["receive_count"] = int(record.get("attributes", {}).get("ApproximateReceiveCount", 1))
+        yield message
+
+
+class JobsHelper:
+    """Registro, encolado y seguimiento de generaciones asíncronas."""
+
+    def __init__(
+        self,
+        table_helper: Any,
+        queue_url: Optional[str] = None,
+        ttl_seconds: int = 86400
+    ) -> None:
+        """
+        :param table_helper: DynamoDBHelper de la tabla de trabajos (clave `job_id`).
+        :param queue_url: URL de la cola SQS de la que lee el worker (solo para registrar trabajos).
+        :param ttl_seconds: Tiempo de vida de los trabajos en la tabla.
+        """
+        self.table_helper = table_helper
+        self.table = table_helper.get_table()
+        self.queue_url = queue_url
+        self.ttl_seconds = ttl_seconds
+        self._sqs_client = None
+        self._ws_clients: Dict[str, Any] = {}
+
+    def submit(self, job_type: str, payload: Dict[str, Any], usuario_id: Optional[int] = None) -> str:
+        """
+        Registra un trabajo en estado PENDING y lo envía a la cola del worker.
+
+        :param job_type: Tipo de generación (por ejemplo `generar_caso`).
+        :param payload: Cuerpo validado de la solicitud original.
+        :param usuario_id: ID del usuario que solicita la generación.
+        :return: ID del trabajo.
+        """
+        job_id = str(uuid4())
+        now = datetime.now()
+        self.table_helper.put_item({
+            "job_id": job_id,
+            "job_type": job_type,
+            "status": JOB_STATUS_PENDING,
+            "usuario_id": usuario_id,
+            "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "updated_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "ttl": int((now + timedelta(seconds=self.ttl_seconds)).timestamp())
+        })
+
+        if self._sqs_client is None:
+            self._sqs_client = boto3.client("sqs")
+        self._sqs_client.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps({"job_id": job_id, "job_type": job_type, "payload": payload})
+        )
+        logger.info(f"Trabajo {job_id} ({job_type}) registrado y encolado")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene el registro de un trabajo."""
+        return self.table_helper.get_item(job_id)
+
+    def mark_running(self, job_id: str, lease_ms: int) -> bool:
+        """
+        Pasa el trabajo de PENDING a RUNNING con un plazo (`lease_expires`).
+
+        SQS entrega los mensajes al menos una vez; si el trabajo está en curso o terminado se
+        devuelve False y el mensaje duplicado se descarta. Si el worker anterior murió o agotó su
+        timeout después de marcarlo, el plazo ya venció cuando SQS vuelve a entregar el mensaje
+        y el trabajo se retoma.
+
+        :param job_id: ID del trabajo.
+        :param lease_ms: Tiempo que el worker puede tardar en terminarlo.
+        :return: True si el worker tomó el trabajo.
+        """
+        now_ms = int(time.time() * 1000)
+        return self._transition(
+            job_id,
+            JOB_STATUS_RUNNING,
+            expected=JOB_STATUS_PENDING,
+            extra={"lease_expires": now_ms + lease_ms},
+            reclaim_before_ms=now_ms
+        )
+
+    def release(self, job_id: str) -> None:
+        """Devuelve el trabajo a PENDING para que SQS lo vuelva a entregar."""
+        self._transition(job_id, JOB_STATUS_PENDING, expected=JOB_STATUS_RUNNING)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Guarda el resultado del trabajo y lo marca como COMPLETED."""
+        self._transition(job_id, JOB_STATUS_COMPLETED, extra={"result": result})
+
+    def fail(self, job_id: str, message: str) -> None:
+        """Marca el trabajo como FAILED con el mensaje de error."""
+        self._transition(job_id, JOB_STATUS_FAILED, extra={"error": message})
+
+    def process(
+        self,
+        message: Dict[str, Any],
+        work: Callable[[Dict[str, Any]], Dict[str, Any]],
+        lease_ms: int,
+        callback_url: Optional[str],
+        max_receive_count: int = DEFAULT_MAX_RECEIVE_COUNT
+    ) -> None:
+        """
+        Ejecuta un trabajo recibido de SQS y notifica su estado final.
+
+        Ante una limitación de Bedrock el trabajo vuelve a PENDING y la excepción se propaga para
+        que SQS reentregue el mensaje; en la última entrega, tras la cual SQS lo mueve a la DLQ,
+        el trabajo se marca como FAILED para que no quede pendiente indefinidamente.
+
+        :param message: Mensaje de job_messages.
+        :param work: Función que genera el resultado a partir del payload.
+        :param lease_ms: Tiempo que el worker puede tardar en el trabajo.
+        :param callback_url: URL de callback del stage WebSocket.
+        :param max_receive_count: Entregas antes de que SQS mueva el mensaje a la DLQ.
+        """
+        job_id = message["job_id"]
+        if not self.mark_running(job_id, lease_ms=lease_ms):
+            return
+
+        try:
+            self.complete(job_id, work(message["payload"]))
+        except BedrockThrottledError as e:
+            if message.get("receive_count", 1) < max_receive_count:
+                # Se devuelve el trabajo a la cola para reintentarlo cuando baje la presión
+                logger.warning(f"Bedrock saturado, trabajo {job_id} reencolado: {str(e)}")
+                self.release(job_id)
+                raise
+            logger.error(f"Bedrock saturado en la última entrega del trabajo {job_id}: {str(e)}")
+            self.fail(job_id, str(e))
+        except Exception as e:
+            logger.error(f"Error en el trabajo {job_id}: {str(e)}")
+            self.fail(job_id, str(e))
+
+        self.notify(job_id, callback_url)
+
+    def attach_connection(self, job_id: str, connection_id: str) -> Dict[str, Any]:
+        """
+        Asocia una conexión WebSocket al trabajo para notificar su resultado.
+
+        Si el worker terminó antes de la conexión, `notify` ya se ejecutó sin conexión asociada:
+        el estado devuelto (leído en la misma escritura) permite al llamador detectarlo.
+
+        :param job_id: ID del trabajo.
+        :param connection_id: ID de la conexión WebSocket.
+        :return: Registro del trabajo tras asociar la conexión.
+        """
+        response = self.table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET connection_id = :connection_id",
+            ConditionExpression="attribute_exists(job_id)",
+            ExpressionAttributeValues={":connection_id": connection_id},
+            ReturnValues="ALL_NEW"
+        )
+        return response["Attributes"]
+
+    def notify(self, job_id: str, callback_url: Optional[str]) -> None:
+        """
+        Envía el estado final del trabajo a la conexión WebSocket asociada, si existe.
+
+        :param job_id: ID del trabajo.
+        :param callback_url: URL de callback del stage WebSocket.
+        """
+        if not callback_url:
+            return
+        job = self.get(job_id)
+        if not job or not job.get("connection_id"):
+            return
+        if callback_url not in self._ws_clients:
+            self._ws_clients[callback_url] = boto3.client("apigatewaymanagementapi", endpoint_url=callback_url)
+        try:
+            self._ws_clients[callback_url].post_to_connection(
+                ConnectionId=job["connection_id"],
+                Data=json.dumps(self.to_public(job), default=str).encode("utf-8")
+            )
+        except ClientError as error:
+            # El cliente pudo haberse desconectado; el resultado sigue disponible por consulta
+            logger.warning(f"No se pudo notificar el trabajo {job_id}: {error}")
+
+    @staticmethod
+    def to_public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Campos del trabajo que se exponen al cliente."""
+        public = {
+            "job_id": job["job_id"],
+            "job_type": job.get("job_type"),
+            "status": job["status"],
+            "updated_at": job.get("updated_at")
+        }
+        if "result" in job:
+            public["result"] = job["result"]
+        if "error" in job:
+            public["error"] = job["error"]
+        return public
+
+    def _transition(
+        self,
+        job_id: str,
+        status: str,
+        expected: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        reclaim_before_ms: Optional[int] = None
+    ) -> bool:
+        names = {"#status": "status"}
+        values = {":status": status, ":updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        update = "SET #status = :status, updated_at = :updated_at"
+        for index, (field, value) in enumerate((extra or {}).items()):
+            names[f"#f{index}"] = field
+            values[f":v{index}"] = value
+            update += f", #f{index} = :v{index}"
+
+        kwargs = {
+            "Key": {"job_id": job_id},
+            "UpdateExpression": update,
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values
+        }
+        if expected:
+            kwargs["ConditionExpression"] = "#status = :expected"
+            values[":expected"] = expected
+        if expected and reclaim_before_ms is not None:
+            # También un trabajo RUNNING cuyo plazo venció (el worker anterior no terminó)
+            kwargs["ConditionExpression"] += " OR (#status = :running AND lease_expires < :now_ms)"
+            values.update({":running": JOB_STATUS_RUNNING, ":now_ms": reclaim_before_ms})
+
+        try:
+            self.table.update_item(**kwargs)
+            return True
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                logger.warning(f"El trabajo {job_id} no está en estado {expected}")
+                return False
+            raise error
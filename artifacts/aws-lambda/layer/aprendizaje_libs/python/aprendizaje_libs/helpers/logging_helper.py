@@ -0,0 +1,138 @@
+# Built-in imports
+import functools
+import hashlib
+import json
+import logging
+import random
+from collections import deque
+from typing import Any, Callable, Dict
+
+# Own imports
+from aje_libs.common import logger as aje_logger
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+# Valores por defecto de la política; se sobrescriben con el parámetro del agente en Parameter Store
+DEFAULT_POLICY: Dict[str, Any] = {
+    "LOG_LEVEL": "INFO",
+    # Caracteres del inicio de un payload que se muestran en el resumen
+    "LOG_PAYLOAD_PREVIEW_CHARS": 160,
+    # Fracción de invocaciones que registran los payloads completos
+    "LOG_PAYLOAD_SAMPLE_RATE": 0.01,
+    # Límite de cualquier mensaje, incluidos los de aje_libs (p. ej. el vector de consulta de Pinecone)
+    "LOG_MAX_MESSAGE_CHARS": 2000,
+    # Payloads que se conservan para registrarlos completos si la invocación falla
+    "LOG_ERROR_PAYLOADS": 20
+}
+
+_policy: Dict[str, Any] = dict(DEFAULT_POLICY)
+_invocation: Dict[str, Any] = {"sampled": False, "deferred": deque(maxlen=DEFAULT_POLICY["LOG_ERROR_PAYLOADS"])}
+
+
+class BoundedMessageFilter(logging.Filter):
+    """Recorta los mensajes de texto que superan el límite de la política (salvo los payloads completos)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not isinstance(record.msg, str) or getattr(record, "full_payload", False):
+            return True
+        # El mensaje se formatea una sola vez aquí; el handler reutiliza el resultado
+        message = record.getMessage() if record.args else record.msg
+        limit = int(_policy["LOG_MAX_MESSAGE_CHARS"])
+        if len(message) > limit:
+            message = f"{message[:limit]}... [{len(message)} caracteres]"
+        record.msg, record.args = message, ()
+        return True
+
+
+def configure_logging(parameters: Dict[str, Any], *loggers: Any) -> Dict[str, Any]:
+    """
+    Aplica la política de logging del parámetro del agente (una vez por contenedor, tras leerlo).
+
+    El nivel se aplica a los loggers indicados y al logger compartido de aje_libs y de esta capa;
+    todos reciben además el filtro que recorta los mensajes largos.
+
+    :param parameters: Parámetro del agente (LOG_LEVEL, LOG_PAYLOAD_SAMPLE_RATE...).
+    :param loggers: Loggers del handler.
+    :return: La política en uso.
+    """
+    _policy.update({key: parameters.get(key, default) for key, default in DEFAULT_POLICY.items()})
+    _policy["LOG_LEVEL"] = str(_policy["LOG_LEVEL"]).upper()
+    _invocation["deferred"] = deque(maxlen=int(_policy["LOG_ERROR_PAYLOADS"]))
+
+    shared = logging.getLogger(aje_logger.GLOBAL_SERVICE)
+    for target in (*loggers, shared):
+        target.setLevel(_policy["LOG_LEVEL"])
+        base = getattr(target, "_logger", target)
+        if not any(isinstance(existing, BoundedMessageFilter) for existing in base.filters):
+            base.addFilter(BoundedMessageFilter())
+    return _policy
+
+
+def _serialize(payload: Any) -> str:
+    if isinstance(payload, str):
+        return payload
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def describe_payload(payload: Any) -> str:
+    """Resumen acotado de un payload: tamaño, hash (para correlacionar repeticiones) e inicio."""
+    text = _serialize(payload)
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    preview = text[:int(_policy["LOG_PAYLOAD_PREVIEW_CHARS"])]
+    return f"{len(text)} caracteres, sha256={digest}, inicio={preview!r}"
+
+
+def log_payload(target: Any, label: str, payload: Any, level: int = logging.INFO) -> None:
+    """
+    Registra un payload grande (prompt, elemento del historial, contexto) según la política.
+
+    Se registra completo en las invocaciones muestreadas o con nivel DEBUG; en las demás se
+    registra un resumen y el payload se conserva para registrarlo completo si la invocación falla.
+    Si el nivel no está habilitado no se serializa nada.
+
+    :param target: Logger del handler.
+    :param label: Descripción del payload, p. ej. "Prompt".
+    :param payload: Texto u objeto serializable a JSON.
+    :param level: Nivel del registro.
+    """
+    _invocation["deferred"].append((target, label, payload))
+    if not target.isEnabledFor(level):
+        return
+    if _invocation["sampled"] or target.isEnabledFor(logging.DEBUG):
+        target.log(level, f"{label}: {_serialize(payload)}", extra={"full_payload": True}, stacklevel=2)
+    else:
+        target.log(level, f"{label}: {describe_payload(payload)}", stacklevel=2)
+
+
+def flush_deferred() -> None:
+    """Registra como ERROR los payloads completos conservados de la invocación en curso."""
+    while _invocation["deferred"]:
+        target, label, payload = _invocation["deferred"].popleft()
+        target.error(f"{label} (completo): {_serialize(payload)}", extra={"full_payload": True})
+
+
+def payload_logging(handler: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """
+    Decorador de los handlers: decide si la invocación se muestrea y, si falla (excepción o
+    statusCode >= 500), registra completos los payloads resumidos durante la invocación.
+    """
+    @functools.wraps(handler)
+    def wrapper(event: Any, context: Any) -> Any:
+        rate = float(_policy["LOG_PAYLOAD_SAMPLE_RATE"])
+        _invocation["sampled"] = rate > 0 and random.random() < rate
+        _invocation["deferred"].clear()
+        failed = True
+        try:
+            response = handler(event, context)
+            failed = isinstance(response, dict) and (response.get("statusCode") or 0) >= 500
+            return response
+        finally:
+            try:
+                if failed:
+                    flush_deferred()
+            except Exception as error:
+                logger.warning(f"No se pudieron registrar los payloads de la invocación fallida: {error}")
+            _invocation["deferred"].clear()
+            _invocation["sampled"] = False
+    return wrapper
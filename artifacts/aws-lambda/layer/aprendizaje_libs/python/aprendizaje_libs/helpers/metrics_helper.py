@@ -0,0 +1,224 @@
+# Built-in imports
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.logging_helper import payload_logging
+from aprendizaje_libs.helpers.snapstart_helper import restored
+from aprendizaje_libs.helpers.tracing_helper import subsegment
+
+logger = custom_logger(__name__)
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AprendizajeGuiado")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() != "false"
+
+# EMF acepta hasta 100 valores por métrica en un mismo documento
+MAX_VALUES_PER_METRIC = 100
+
+# Prefijo de las rutas de la API; el endpoint es la ruta sin él (p. ej. "evaluar_reto_estandar_lote")
+API_PREFIX = "/api/v1/"
+
+# Etapas de la inicialización del módulo (mark_init); se emiten con la primera invocación
+_init: Dict[str, Any] = {"last": time.perf_counter(), "stages": {}, "emitted": False}
+_active: Dict[str, Optional["InvocationMetrics"]] = {"invocation": None}
+
+
+def mark_init(stage_name: str) -> None:
+    """
+    Registra el tiempo de inicialización transcurrido desde la marca anterior.
+
+    La primera marca mide desde la importación de este módulo. Los handlers marcan "config"
+    tras leer Parameter Store y Secrets Manager, y "clients" tras crear helpers y clientes.
+
+    :param stage_name: Nombre de la etapa.
+    """
+    now = time.perf_counter()
+    _init["stages"][stage_name] = (now - _init["last"]) * 1000
+    _init["last"] = now
+
+
+class InvocationMetrics:
+    """
+    Tiempos por etapa y llamadas al modelo de una invocación, emitidos como EMF al terminar.
+
+    Los lotes concurrentes (batch_helper) registran desde varios hilos: las etapas suman el
+    tiempo de todos ellos, por lo que pueden superar la duración total.
+    """
+
+    def __init__(self, endpoint: str, start: str, request_id: Optional[str] = None) -> None:
+        self.endpoint = endpoint
+        self.start = start
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.model_calls: Dict[Tuple[str, str], List[Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage_name: str, duration_ms: float) -> None:
+        with self._lock:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.0) + duration_ms
+
+    def add_model_call(self, model_id: str, stop_reason: str, latency_ms: float, usage: Dict[str, int]) -> None:
+        output_tokens = usage.get("outputTokens", 0)
+        call = {
+            "latency_ms": latency_ms,
+            "input_tokens": usage.get("inputTokens", 0),
+            "output_tokens": output_tokens,
+            "cache_read_tokens": usage.get("cacheReadInputTokens", 0),
+            "tokens_per_second": output_tokens / (latency_ms / 1000) if latency_ms > 0 else 0.0
+        }
+        with self._lock:
+            self.model_calls.setdefault((model_id, stop_reason or "unknown"), []).append(call)
+
+    def documents(self, status_code: Optional[int], failed: bool = False, init_stages: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Documentos EMF de la invocación: uno con las etapas y uno por modelo y motivo de parada.
+
+        :param status_code: statusCode de la respuesta (None en eventos que no son de API Gateway).
+        :param failed: El handler lanzó una excepción.
+        :param init_stages: Etapas de inicialización a incluir (solo en el arranque en frío).
+        :return: Documentos listos para escribir en el log.
+        """
+        timestamp = int(time.time() * 1000)
+        values: Dict[str, Any] = {f"{name}_ms": round(value, 1) for name, value in self.stages.items()}
+        values.update({f"init_{name}_ms": round(value, 1) for name, value in (init_stages or {}).items()})
+        values["total_ms"] = round((time.perf_counter() - self.started) * 1000, 1)
+        values["errors"] = 1 if failed or (status_code or 0) >= 500 else 0
+        documents = [_document(
+            timestamp,
+            dimensions=[["Endpoint", "Start"], ["Endpoint"]],
+            properties={"Endpoint": self.endpoint, "Start": self.start, "StatusCode": status_code, "RequestId": self.request_id},
+            values=values,
+            units={"errors": "Count"}
+        )]
+        for (model_id, stop_reason), calls in sorted(self.model_calls.items()):
+            calls = calls[:MAX_VALUES_PER_METRIC]
+            documents.append(_document(
+                timestamp,
+                dimensions=[["Endpoint", "Model", "Start"], ["Endpoint", "Model", "StopReason"], ["Model"]],
+                properties={"Endpoint": self.endpoint, "Model": model_id, "StopReason": stop_reason, "Start": self.start, "RequestId": self.request_id},
+                values={
+                    "model_calls": len(calls),
+                    "model_latency_ms": [round(call["latency_ms"], 1) for call in calls],
+                    "tokens_per_second": [round(call["tokens_per_second"], 2) for call in calls],
+                    "input_tokens": sum(call["input_tokens"] for call in calls),
+                    "output_tokens": sum(call["output_tokens"] for call in calls),
+                    "cache_read_tokens": sum(call["cache_read_tokens"] for call in calls)
+                },
+                units={"model_calls": "Count", "tokens_per_second": "Count/Second", "input_tokens": "Count", "output_tokens": "Count", "cache_read_tokens": "Count"}
+            ))
+        return documents
+
+
+def _document(timestamp: int, dimensions: List[List[str]], properties: Dict[str, Any], values: Dict[str, Any], units: Dict[str, str]) -> Dict[str, Any]:
+    metrics = [{"Name": name, "Unit": units.get(name, "Milliseconds")} for name in values]
+    return {
+        "_aws": {
+            "Timestamp": timestamp,
+            "CloudWatchMetrics": [{"Namespace": METRICS_NAMESPACE, "Dimensions": dimensions, "Metrics": metrics}]
+        },
+        **{key: value for key, value in properties.items() if value is not None},
+        **values
+    }
+
+
+def current() -> Optional[InvocationMetrics]:
+    """Invocación en curso del contenedor, o None fuera de un handler instrumentado."""
+    return _active["invocation"]
+
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    """
+    Mide una etapa de la invocación en curso; también sirve como decorador.
+
+    Cada etapa es además un subsegmento de la traza (tracing_helper). Sin invocación en curso
+    (pruebas, inicialización) no registra métricas.
+
+    :param stage_name: Nombre de la etapa, p. ej. "embedding", "vector_query", "history_write".
+    """
+    started = time.perf_counter()
+    try:
+        with subsegment(stage_name):
+            yield
+    finally:
+        invocation = current()
+        if invocation is not None:
+            invocation.add_stage(stage_name, (time.perf_counter() - started) * 1000)
+
+
+def record_model_call(model_id: str, response: Dict[str, Any], latency_ms: float) -> None:
+    """
+    Registra una respuesta de Converse (latencia, tokens y motivo de parada) en la invocación en curso.
+
+    :param model_id: Modelo que respondió.
+    :param response: Respuesta de Converse.
+    :param latency_ms: Duración de la llamada medida por el llamador.
+    """
+    invocation = current()
+    if invocation is not None:
+        invocation.add_model_call(model_id, response.get("stopReason"), latency_ms, response.get("usage") or {})
+
+
+def endpoint_of(event: Any, default: str) -> str:
+    """Ruta de la API invocada (sin /api/v1/) o `default` para eventos que no vienen de API Gateway."""
+    resource = event.get("resource") if isinstance(event, dict) else None
+    if resource:
+        return resource.split(API_PREFIX, 1)[-1].strip("/")
+    return default
+
+
+def emit(documents: List[Dict[str, Any]]) -> None:
+    """Escribe los documentos EMF en la salida estándar, de donde CloudWatch extrae las métricas."""
+    for document in documents:
+        sys.stdout.write(json.dumps(document, ensure_ascii=False, default=str) + "\n")
+    sys.stdout.flush()
+
+
+def instrument(function_name: str) -> Callable[[Callable[[Any, Any], Any]], Callable[[Any, Any], Any]]:
+    """
+    Decorador de los handlers: abre las métricas de la invocación y las emite al terminar.
+
+    La dimensión Start es "cold" en la primera invocación del contenedor, "restore" en la
+    primera tras restaurar un snapshot de SnapStart y "warm" en las demás. También aplica la
+    política de payloads de logging_helper (muestreo y registro completo si la invocación falla).
+
+    :param function_name: Nombre de la función en el registro; es el endpoint de los eventos sin ruta.
+    """
+    def decorator(handler: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+        handler = payload_logging(handler)
+
+        @functools.wraps(handler)
+        def wrapper(event: Any, context: Any) -> Any:
+            if not METRICS_ENABLED:
+                return handler(event, context)
+            first = not _init["emitted"]
+            start = ("restore" if restored() else "cold") if first else "warm"
+            invocation = InvocationMetrics(endpoint_of(event, function_name), start, getattr(context, "aws_request_id", None))
+            _active["invocation"] = invocation
+            response, failed = None, False
+            try:
+                with subsegment("handler", endpoint=invocation.endpoint, start=start):
+                    response = handler(event, context)
+                return response
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _active["invocation"] = None
+                _init["emitted"] = True
+                status_code = response.get("statusCode") if isinstance(response, dict) else None
+                try:
+                    # Tras una restauración, la inicialización medida es la del snapshot: no se emite
+                    emit(invocation.documents(status_code, failed, init_stages=_init["stages"] if start == "cold" else None))
+                except Exception as error:
+                    logger.warning(f"No se pudieron emitir las métricas: {error}")
+        return wrapper
+    return decorator
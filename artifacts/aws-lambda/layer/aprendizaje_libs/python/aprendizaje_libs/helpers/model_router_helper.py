@@ -0,0 +1,321 @@
+# Built-in imports
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# External imports
+import boto3
+from botocore.exceptions import ReadTimeoutError
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.deadline_helper import Deadline, DeadlineExceededError, TimeoutClientPool, deadline_client_config
+from aprendizaje_libs.helpers.metrics_helper import record_model_call, stage
+from aprendizaje_libs.helpers.throttling_helper import BedrockGovernor, BedrockThrottledError
+from aprendizaje_libs.helpers.tracing_helper import subsegment
+
+logger = custom_logger(__name__)
+
+# Campos adicionales que BedrockHelper.converse envía por defecto (requeridos por Nova)
+DEFAULT_ADDITIONAL_FIELDS = {"inferenceConfig": {"topK": 1}}
+
+# Timeout de lectura cuando la llamada no tiene plazo ni timeout de ruta
+DEFAULT_READ_TIMEOUT_SECONDS = 60
+
+# Punto de caché de Bedrock: el contenido anterior (instrucciones estáticas) se reutiliza entre llamadas
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+
+class ModelTimeoutError(Exception):
+    """El modelo no respondió dentro del timeout de la ruta."""
+
+    def __init__(self, model_id: str) -> None:
+        super().__init__(f"El modelo {model_id} no respondió a tiempo")
+        self.model_id = model_id
+
+
+class ModelRoute:
+    """Modelo principal, modelos de respaldo y parámetros de inferencia de una tarea."""
+
+    def __init__(
+        self,
+        task: str,
+        model_id: str,
+        max_tokens: int,
+        temperature: float,
+        top_p: float = 0.2,
+        fallbacks: Optional[List[str]] = None,
+        timeout_seconds: Optional[int] = None,
+        ms_per_output_token: Optional[float] = None
+    ) -> None:
+        """
+        :param task: Nombre de la tarea (score, feedback, path, case, regenerate, final_feedback).
+        :param model_id: Modelo principal.
+        :param max_tokens: Máximo de tokens de salida.
+        :param temperature: Temperatura de muestreo.
+        :param top_p: Top-p de muestreo.
+        :param fallbacks: Modelos que se prueban en orden si el anterior está limitado o es lento.
+        :param timeout_seconds: Timeout de lectura de cada modelo antes de pasar al siguiente.
+        :param ms_per_output_token: Velocidad estimada del modelo; reemplaza la global para esta ruta.
+        """
+        self.task = task
+        self.model_id = model_id
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.fallbacks = fallbacks or []
+        self.timeout_seconds = timeout_seconds
+        self.ms_per_output_token = ms_per_output_token
+
+    @property
+    def models(self) -> List[str]:
+        """Cadena de modelos de la ruta, empezando por el principal."""
+        return [self.model_id] + [model_id for model_id in self.fallbacks if model_id != self.model_id]
+
+    @classmethod
+    def from_config(cls, task: str, config: Dict[str, Any], defaults: Dict[str, Any]) -> "ModelRoute":
+        """
+        Crea la ruta combinando la configuración de SSM con los valores por defecto del handler.
+
+        :param task: Nombre de la tarea.
+        :param config: Entrada de `MODEL_ROUTES` para la tarea (puede estar vacía).
+        :param defaults: Valores por defecto (`model_id`, `max_tokens`, `temperature`...).
+        :return: ModelRoute.
+        """
+        merged = {**defaults, **config}
+        return cls(
+            task=task,
+            model_id=merged["model_id"],
+            max_tokens=int(merged["max_tokens"]),
+            temperature=float(merged["temperature"]),
+            top_p=float(merged.get("top_p", 0.2)),
+            fallbacks=list(merged.get("fallbacks", [])),
+            timeout_seconds=merged.get("timeout_seconds"),
+            ms_per_output_token=merged.get("ms_per_output_token")
+        )
+
+
+def build_routes(
+    routes_config: Dict[str, Dict[str, Any]],
+    defaults: Dict[str, Dict[str, Any]],
+    default_model_id: str
+) -> Dict[str, ModelRoute]:
+    """
+    Construye las rutas de las tareas que usa un handler.
+
+    :param routes_config: Valor de `MODEL_ROUTES` en el parámetro del agente.
+    :param defaults: Parámetros por defecto de cada tarea del handler.
+    :param default_model_id: Modelo para las tareas sin `model_id` configurado (CHATBOT_MODEL_ID).
+    :return: Rutas por tarea.
+    """
+    return {
+        task: ModelRoute.from_config(
+            task,
+            routes_config.get(task, {}),
+            {"model_id": default_model_id, **task_defaults}
+        )
+        for task, task_defaults in defaults.items()
+    }
+
+
+def build_converse_request(
+    model_id: str,
+    prompt: str,
+    parameters: Dict[str, Any],
+    additional_fields: Optional[Dict[str, Any]] = None,
+    system: Optional[str] = None,
+    cache_system: bool = False
+) -> Dict[str, Any]:
+    """
+    Arma la solicitud de la API Converse con el mismo formato que BedrockHelper.converse.
+
+    :param model_id: ID del modelo.
+    :param prompt: Prompt del usuario (parte dinámica de la solicitud).
+    :param parameters: Parámetros de inferencia (`max_tokens`, `temperature`, `top_p`).
+    :param additional_fields: `additionalModelRequestFields` propios de la familia del modelo.
+    :param system: Instrucciones estáticas que se envían como bloque de sistema.
+    :param cache_system: Agrega un punto de caché después del bloque de sistema.
+    :return: Argumentos para `bedrock_runtime.converse`.
+    """
+    request = {
+        "modelId": model_id,
+        "messages": [{"role": "user", "content": [{"text": prompt}]}],
+        "inferenceConfig": {
+            "maxTokens": parameters["max_tokens"],
+            "temperature": parameters["temperature"],
+            "topP": parameters["top_p"]
+        }
+    }
+    if system:
+        request["system"] = [{"text": system}] + ([CACHE_POINT] if cache_system else [])
+    if additional_fields:
+        request["additionalModelRequestFields"] = additional_fields
+    return request
+
+
+def cache_usage(response: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Tokens leídos y escritos en la caché de prompts según el `usage` de la respuesta.
+
+    :param response: Respuesta de la API Converse.
+    :return: Tupla (cache_read_tokens, cache_write_tokens).
+    """
+    usage = response.get("usage", {})
+    return usage.get("cacheReadInputTokens", 0), usage.get("cacheWriteInputTokens", 0)
+
+
+def bedrock_client_pool(region_name: str, step_seconds: int = 5) -> TimeoutClientPool:
+    """
+    Clientes de bedrock-runtime para ModelRouter, por tramo de read_timeout y sin reintentos de
+    botocore: un ReadTimeoutError llega al router tras un solo intento, de modo que el
+    `timeout_seconds` de la ruta acota cada modelo antes de pasar al de respaldo.
+
+    :param region_name: Región de Bedrock.
+    :param step_seconds: Tamaño de los tramos de timeout.
+    :return: TimeoutClientPool.
+    """
+    return TimeoutClientPool(
+        lambda read_timeout: boto3.client(
+            "bedrock-runtime",
+            region_name=region_name,
+            config=deadline_client_config(read_timeout)
+        ),
+        step_seconds=step_seconds
+    )
+
+
+class ModelRouter:
+    """
+    Envía cada tarea al modelo configurado en su ruta y recorre la cadena de respaldo
+    cuando el modelo está limitado (ThrottlingException) o supera el timeout de la ruta.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, ModelRoute],
+        client_pool: TimeoutClientPool,
+        governor_factory: Callable[[str], BedrockGovernor],
+        ms_per_output_token: float,
+        min_output_tokens: int,
+        request_fields: Optional[Dict[str, Dict[str, Any]]] = None,
+        cache_models: Optional[Sequence[str]] = None
+    ) -> None:
+        """
+        :param routes: Rutas por tarea.
+        :param client_pool: Clientes de bedrock-runtime por tramo de read_timeout (bedrock_client_pool).
+        :param governor_factory: Crea el gobernador de concurrencia de un modelo.
+        :param ms_per_output_token: Velocidad estimada de generación por defecto.
+        :param min_output_tokens: Mínimo de tokens con el que vale la pena llamar al modelo.
+        :param request_fields: `additionalModelRequestFields` por modelo (por defecto los de Nova).
+        :param cache_models: Modelos que soportan caché de prompts; solo a ellos se envía el punto de caché.
+        """
+        self.routes = routes
+        self.client_pool = client_pool
+        self.governor_factory = governor_factory
+        self.ms_per_output_token = ms_per_output_token
+        self.min_output_tokens = min_output_tokens
+        self.request_fields = request_fields or {}
+        self.cache_models = set(cache_models or [])
+        self._governors: Dict[str, BedrockGovernor] = {}
+        # Las evaluaciones en lote llaman al router desde varios hilos
+        self._lock = threading.Lock()
+
+    def converse(
+        self,
+        task: str,
+        prompt: str,
+        deadline: Optional[Deadline] = None,
+        max_tokens: Optional[int] = None,
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Ejecuta la tarea con el primer modelo de la cadena que responda.
+
+        :param task: Nombre de la tarea.
+        :param prompt: Prompt del usuario.
+        :param deadline: Plazo de la solicitud.
+        :param max_tokens: Sobrescribe el máximo de tokens de la ruta.
+        :param system: Instrucciones estáticas de la tarea; se cachean en los modelos que lo soportan.
+        :return: Respuesta de la API Converse; `modelId` indica el modelo que respondió.
+        :raises BedrockThrottledError: Si todos los modelos de la cadena están limitados.
+        :raises DeadlineExceededError: Si no queda tiempo o el último modelo no respondió a tiempo.
+        """
+        route = self.routes[task]
+        models = route.models
+        for index, model_id in enumerate(models):
+            has_fallback = index < len(models) - 1
+            try:
+                response = self._invoke(route, model_id, prompt, system, deadline, max_tokens, has_fallback)
+                response["modelId"] = model_id
+                return response
+            except (BedrockThrottledError, ModelTimeoutError) as error:
+                if not has_fallback:
+                    if isinstance(error, ModelTimeoutError):
+                        raise DeadlineExceededError("bedrock") from error
+                    raise error
+                logger.warning(f"Tarea {task}: {error}; se usa el modelo de respaldo {models[index + 1]}")
+
+    def _invoke(
+        self,
+        route: ModelRoute,
+        model_id: str,
+        prompt: str,
+        system: Optional[str],
+        deadline: Optional[Deadline],
+        max_tokens: Optional[int],
+        has_fallback: bool
+    ) -> Dict[str, Any]:
+        max_tokens = max_tokens or route.max_tokens
+        read_timeout = route.timeout_seconds if has_fallback and route.timeout_seconds else None
+        remaining_time_ms = None
+        if deadline:
+            max_tokens = deadline.max_tokens(
+                max_tokens,
+                ms_per_token=route.ms_per_output_token or self.ms_per_output_token,
+                min_tokens=min(self.min_output_tokens, max_tokens)
+            )
+            read_timeout = min(read_timeout or deadline.read_timeout_seconds(), deadline.read_timeout_seconds())
+            remaining_time_ms = deadline.remaining_ms
+        client = self.client_pool.get(read_timeout or DEFAULT_READ_TIMEOUT_SECONDS)
+
+        request = build_converse_request(
+            model_id,
+            prompt,
+            {"max_tokens": max_tokens, "temperature": route.temperature, "top_p": route.top_p},
+            self.request_fields.get(model_id, DEFAULT_ADDITIONAL_FIELDS),
+            system=system,
+            cache_system=model_id in self.cache_models
+        )
+
+        def converse(**kwargs: Any) -> Dict[str, Any]:
+            # Latencia del modelo sin las esperas del gobernador, para tokens por segundo
+            with subsegment("converse", model_id=model_id, max_tokens=max_tokens) as span:
+                started = time.perf_counter()
+                response = client.converse(**kwargs)
+                record_model_call(model_id, response, (time.perf_counter() - started) * 1000)
+                usage = response.get("usage") or {}
+                span.annotate(
+                    input_tokens=usage.get("inputTokens", 0),
+                    output_tokens=usage.get("outputTokens", 0),
+                    cache_read_tokens=usage.get("cacheReadInputTokens", 0),
+                    stop_reason=response.get("stopReason", "")
+                )
+            return response
+
+        try:
+            # Con modelo de respaldo disponible no se reintenta: la limitación pasa al siguiente modelo
+            with stage("model"):
+                return self._governor(model_id).call(
+                    converse,
+                    remaining_time_ms=remaining_time_ms,
+                    max_attempts=1 if has_fallback else None,
+                    **request
+                )
+        except ReadTimeoutError as error:
+            raise ModelTimeoutError(model_id) from error
+
+    def _governor(self, model_id: str) -> BedrockGovernor:
+        with self._lock:
+            if model_id not in self._governors:
+                self._governors[model_id] = self.governor_factory(model_id)
+            return self._governors[model_id]
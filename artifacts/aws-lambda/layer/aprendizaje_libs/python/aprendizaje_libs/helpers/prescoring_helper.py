@@ -0,0 +1,262 @@
+# Built-in imports
+import json
+import random
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+# External imports
+import numpy as np
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.metrics_helper import stage
+
+logger = custom_logger(__name__)
+
+PRESCORE_REASON_EMPTY = "empty"
+PRESCORE_REASON_VERBATIM = "verbatim"
+PRESCORE_REASON_HIGH_BAND = "high_band"
+PRESCORE_REASON_LOW_BAND = "low_band"
+PRESCORE_REASON_LLM = "llm"
+PRESCORE_REASON_AUDIT = "audit"
+
+# Razones que corresponden a puntajes asignados por el modelo (válidas para calibrar)
+MODEL_SCORED_REASONS = (PRESCORE_REASON_LLM, PRESCORE_REASON_AUDIT)
+
+DEFAULT_BANDS = {
+    "verbatim_overlap": 0.95,
+    "verbatim_score": 1.0,
+    "low_similarity": None,
+    "low_score": 0.0,
+    "high_similarity": None,
+    "high_score": 1.0,
+    "audit_rate": 0.0
+}
+
+
+def normalize_text(text: str) -> str:
+    """Texto en minúsculas, sin tildes ni signos de puntuación y con espacios simples."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text)).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """Palabras de al menos tres caracteres del texto normalizado."""
+    return [token for token in normalize_text(text).split(" ") if len(token) > 2]
+
+
+def cosine_similarities(matrix: Any, vector: Any) -> np.ndarray:
+    """
+    Similitud coseno entre cada fila de `matrix` y `vector`.
+
+    :param matrix: Embeddings de las respuestas (n x d).
+    :param vector: Embedding de referencia (d).
+    :return: Arreglo con n similitudes.
+    """
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    vector = np.asarray(vector, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    return np.divide(matrix @ vector, norms, out=np.zeros(matrix.shape[0], dtype=np.float32), where=norms > 0)
+
+
+def bedrock_embedder(client: Any, model_id: str) -> Callable[[str], List[float]]:
+    """
+    Función de embeddings con el mismo formato de solicitud que PineconeHelper.get_embeddings.
+
+    :param client: Cliente de bedrock-runtime.
+    :param model_id: Modelo de embeddings.
+    :return: Función que recibe un texto y devuelve su embedding.
+    """
+    @stage("embedding")
+    def embed(text: str) -> List[float]:
+        response = client.invoke_model(body=json.dumps({"inputText": text}), modelId=model_id)
+        return json.loads(response["body"].read()).get("embedding", [])
+    return embed
+
+
+class Prescore(NamedTuple):
+    """Resultado del pre-puntaje: `score` es None cuando la respuesta debe evaluarse con el modelo."""
+
+    score: Optional[float]
+    reason: str
+    similarity: Optional[float] = None
+
+
+class PrescoreReference(NamedTuple):
+    """Respuesta modelo preprocesada, compartida por todas las respuestas de una pregunta."""
+
+    tokens: frozenset
+    normalized: str
+    embedding: Optional[np.ndarray]
+
+
+class PreScorer:
+    """
+    Asigna el puntaje sin llamar al modelo cuando la respuesta cae en una banda confiable.
+
+    Con el pre-puntaje desactivado toda respuesta se evalúa con el modelo. Activado, primero
+    aplica verificaciones léxicas (respuesta en blanco o copia casi literal de la respuesta
+    modelo) y luego compara la similitud coseno de los embeddings contra las bandas calibradas
+    con tools/calibrate_prescore.py. Sin bandas configuradas la similitud solo se calcula y se
+    guarda en el historial para la calibración.
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], List[float]]],
+        bands: Optional[Dict[str, Any]] = None,
+        cache_size: int = 128,
+        rng: Callable[[], float] = random.random,
+        enabled: bool = True
+    ) -> None:
+        """
+        :param embed: Función de embeddings (None para usar solo las verificaciones léxicas).
+        :param bands: Valor de `PRESCORE_BANDS` en el parámetro del agente.
+        :param cache_size: Respuestas modelo cuyo embedding se conserva entre invocaciones.
+        :param rng: Generador aleatorio para el muestreo de auditoría (inyectable para pruebas).
+        :param enabled: Valor de `PRESCORE_BANDS.enabled`; desactivado no se asigna ningún puntaje.
+        """
+        self.enabled = enabled
+        self.embed = embed
+        self.bands = {**DEFAULT_BANDS, **(bands or {})}
+        self.cache_size = cache_size
+        self._rng = rng
+        self._references: "OrderedDict[str, PrescoreReference]" = OrderedDict()
+
+    def reference(self, respuesta_modelo: str) -> PrescoreReference:
+        """
+        Preprocesa la respuesta modelo; el embedding se calcula una vez por texto.
+
+        :param respuesta_modelo: Respuesta modelo de la pregunta.
+        :return: PrescoreReference.
+        """
+        if respuesta_modelo in self._references:
+            self._references.move_to_end(respuesta_modelo)
+            return self._references[respuesta_modelo]
+
+        embedding = None
+        if self.enabled and self.embed is not None:
+            embedding = self._safe_embed(respuesta_modelo)
+        reference = PrescoreReference(
+            tokens=frozenset(tokenize(respuesta_modelo)),
+            normalized=normalize_text(respuesta_modelo),
+            embedding=embedding
+        )
+        if embedding is not None:
+            self._references[respuesta_modelo] = reference
+            while len(self._references) > self.cache_size:
+                self._references.popitem(last=False)
+        return reference
+
+    def prescore(self, reference: PrescoreReference, respuesta_usuario: str) -> Prescore:
+        """
+        Calcula el pre-puntaje de una respuesta.
+
+        :param reference: Respuesta modelo preprocesada.
+        :param respuesta_usuario: Respuesta del estudiante.
+        :return: Prescore con el puntaje, o con `score` None si debe evaluarla el modelo.
+        """
+        if not self.enabled:
+            return Prescore(None, PRESCORE_REASON_LLM)
+
+        # Solo una respuesta en blanco recibe 0 sin el modelo: una respuesta corta puede ser correcta
+        if not (respuesta_usuario or "").strip():
+            return Prescore(0.0, PRESCORE_REASON_EMPTY)
+
+        tokens = tokenize(respuesta_usuario)
+        if reference.tokens and tokens and self._is_verbatim(reference, respuesta_usuario, tokens):
+            return Prescore(self.bands["verbatim_score"], PRESCORE_REASON_VERBATIM)
+
+        if reference.embedding is None:
+            return Prescore(None, PRESCORE_REASON_LLM)
+
+        embedding = self._safe_embed(respuesta_usuario)
+        if embedding is None:
+            return Prescore(None, PRESCORE_REASON_LLM)
+        similarity = round(float(cosine_similarities(embedding, reference.embedding)[0]), 4)
+
+        band = self._band(similarity)
+        if band is None:
+            return Prescore(None, PRESCORE_REASON_LLM, similarity)
+        # Una fracción de las respuestas en banda se sigue evaluando con el modelo para recalibrar
+        if self._rng() < self.bands["audit_rate"]:
+            return Prescore(None, PRESCORE_REASON_AUDIT, similarity)
+        return Prescore(*band, similarity)
+
+    def _band(self, similarity: float) -> Optional[tuple]:
+        high, low = self.bands["high_similarity"], self.bands["low_similarity"]
+        if high is not None and similarity >= high:
+            return self.bands["high_score"], PRESCORE_REASON_HIGH_BAND
+        if low is not None and similarity <= low:
+            return self.bands["low_score"], PRESCORE_REASON_LOW_BAND
+        return None
+
+    def _is_verbatim(self, reference: PrescoreReference, respuesta_usuario: str, tokens: List[str]) -> bool:
+        normalized = normalize_text(respuesta_usuario)
+        if normalized == reference.normalized:
+            return True
+        # Cobertura en ambos sentidos para no premiar respuestas que solo agregan palabras de la modelo
+        answer_tokens = set(tokens)
+        shared = len(answer_tokens & reference.tokens)
+        coverage = shared / len(reference.tokens)
+        precision = shared / len(answer_tokens)
+        return min(coverage, precision) >= self.bands["verbatim_overlap"]
+
+    def _safe_embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            return np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as error:
+            # Sin embedding la respuesta se evalúa con el modelo
+            logger.warning(f"No se pudo obtener el embedding para el pre-puntaje: {error}")
+            return None
+
+
+def calibrate_bands(
+    similarities: Sequence[float],
+    scores: Sequence[float],
+    tolerance: float = 0.1,
+    min_samples: int = 30
+) -> Dict[str, Any]:
+    """
+    Calcula las bandas de similitud a partir de puntajes asignados por el modelo.
+
+    La banda alta empieza en la menor similitud a partir de la cual el puntaje mediano de la
+    banda difiere en promedio a lo más `tolerance` de los puntajes reales; la banda baja se
+    calcula de forma simétrica desde las similitudes menores.
+
+    :param similarities: Similitud coseno de cada evaluación.
+    :param scores: Puntaje asignado por el modelo a cada evaluación.
+    :param tolerance: Error absoluto medio aceptado dentro de cada banda.
+    :param min_samples: Mínimo de evaluaciones para aceptar una banda.
+    :return: Bandas para `PRESCORE_BANDS` y su cobertura.
+    """
+    similarities = np.asarray(similarities, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(similarities)
+    similarities, scores = similarities[order], scores[order]
+    total = len(similarities)
+
+    def widest_band(sims: np.ndarray, band_scores: np.ndarray) -> Optional[tuple]:
+        # sims ordenadas desde el extremo de la banda hacia el centro
+        best = None
+        for end in range(min_samples, len(sims) + 1):
+            band_score = float(np.median(band_scores[:end]))
+            if np.mean(np.abs(band_scores[:end] - band_score)) <= tolerance:
+                best = (float(sims[end - 1]), round(band_score, 2), end)
+        return best
+
+    result: Dict[str, Any] = {"low_similarity": None, "high_similarity": None, "samples": total}
+    covered = 0
+    high = widest_band(similarities[::-1], scores[::-1])
+    if high:
+        result.update({"high_similarity": high[0], "high_score": high[1]})
+        covered += high[2]
+    low = widest_band(similarities, scores)
+    if low and (high is None or low[0] < high[0]):
+        result.update({"low_similarity": low[0], "low_score": low[1]})
+        covered += low[2]
+    result["coverage"] = round(covered / total, 4) if total else 0.0
+    return result
@@ -0,0 +1,106 @@
+# Built-in imports
+import math
+import re
+import textwrap
+from string import Formatter
+from typing import Any, FrozenSet, List, Optional, Tuple
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+# Palabras, signos de puntuación y bloques de espacios (salto de línea con sangría o espacios
+# repetidos), aproximación a los tokens BPE de los modelos de Bedrock
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\n[ \t]*|[ \t]{2,}")
+
+# Caracteres promedio por token de una palabra en español
+CHARS_PER_TOKEN = 4
+
+
+class PromptTemplateError(ValueError):
+    """La plantilla tiene marcadores inválidos o faltan campos al renderizarla."""
+
+
+def compact_prompt(text: str) -> str:
+    """
+    Elimina los espacios sin significado de una plantilla escrita como cadena con sangría.
+
+    Quita la sangría común, los espacios al final de cada línea, los espacios repetidos
+    dentro de las líneas y las líneas en blanco consecutivas. La sangría relativa se conserva
+    porque indica el anidamiento de las listas.
+
+    :param text: Texto de la plantilla.
+    :return: Texto compacto.
+    """
+    lines = []
+    for line in textwrap.dedent(text).strip("\n").splitlines():
+        indent = line[:len(line) - len(line.lstrip())]
+        line = indent + re.sub(r"[ \t]{2,}", " ", line.strip())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima los tokens de entrada de un texto sin depender del tokenizador del modelo.
+
+    La estimación sirve para comparar versiones de una plantilla, no para facturación.
+
+    :param text: Texto del prompt.
+    :return: Número estimado de tokens.
+    """
+    return sum(
+        math.ceil(len(token) / CHARS_PER_TOKEN) if token[0].isalnum() or token[0] == "_" else 1
+        for token in TOKEN_PATTERN.findall(text)
+    )
+
+
+class PromptTemplate:
+    """
+    Plantilla de prompt compilada una sola vez al importar el handler.
+
+    Compacta el texto, valida que todos los marcadores sean campos con nombre y separa
+    las partes literales para que cada solicitud solo concatene los valores.
+    """
+
+    def __init__(self, template: str, name: Optional[str] = None) -> None:
+        """
+        :param template: Texto de la plantilla con marcadores `{campo}`.
+        :param name: Nombre de la plantilla para los mensajes de error.
+        :raises PromptTemplateError: Si algún marcador es posicional o tiene formato o conversión.
+        """
+        self.name = name or "prompt"
+        self.text = compact_prompt(template)
+        self._parts = self._compile(self.text)
+        self.fields: FrozenSet[str] = frozenset(field for _, field in self._parts if field)
+        self.token_estimate = estimate_tokens("".join(literal for literal, _ in self._parts))
+
+    def _compile(self, text: str) -> List[Tuple[str, Optional[str]]]:
+        parts = []
+        try:
+            parsed = list(Formatter().parse(text))
+        except ValueError as error:
+            raise PromptTemplateError(f"Plantilla {self.name} inválida: {error}") from error
+        for literal, field, format_spec, conversion in parsed:
+            if field is not None and (not field.isidentifier() or format_spec or conversion):
+                raise PromptTemplateError(f"Marcador inválido en la plantilla {self.name}: {{{field}}}")
+            parts.append((literal, field))
+        return parts
+
+    def render(self, **fields: Any) -> str:
+        """
+        Renderiza la plantilla con los valores de la solicitud.
+
+        :param fields: Valor de cada marcador.
+        :return: Prompt renderizado.
+        :raises PromptTemplateError: Si falta algún campo de la plantilla.
+        """
+        missing = self.fields - fields.keys()
+        if missing:
+            raise PromptTemplateError(f"Campos faltantes en la plantilla {self.name}: {sorted(missing)}")
+        return "".join(literal + (str(fields[field]) if field else "") for literal, field in self._parts)
+
+    def __str__(self) -> str:
+        return self.text
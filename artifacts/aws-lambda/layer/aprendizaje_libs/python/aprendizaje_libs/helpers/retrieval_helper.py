@@ -0,0 +1,99 @@
+# Built-in imports
+from typing import Any, Dict, List, Sequence
+
+# External imports
+import numpy as np
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+from aprendizaje_libs.helpers.prescoring_helper import tokenize
+
+logger = custom_logger(__name__)
+
+# Constante de Reciprocal Rank Fusion; amortigua la diferencia entre los primeros puestos
+RRF_K = 60
+
+
+def bm25_scores(query: str, documents: Sequence[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    Puntaje BM25 de cada documento para la consulta, con IDF calculado sobre los candidatos.
+
+    :param query: Texto de la consulta.
+    :param documents: Textos candidatos.
+    :param k1: Saturación de la frecuencia de término.
+    :param b: Normalización por longitud del documento.
+    :return: Arreglo con un puntaje por documento.
+    """
+    terms = sorted(set(tokenize(query)))
+    if not documents or not terms:
+        return np.zeros(len(documents), dtype=np.float64)
+
+    term_index = {term: column for column, term in enumerate(terms)}
+    frequencies = np.zeros((len(documents), len(terms)), dtype=np.float64)
+    lengths = np.zeros(len(documents), dtype=np.float64)
+    for row, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths[row] = len(tokens)
+        columns = [term_index[token] for token in tokens if token in term_index]
+        np.add.at(frequencies[row], columns, 1.0)
+
+    document_frequency = np.count_nonzero(frequencies, axis=0)
+    idf = np.log1p((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+    average_length = lengths.mean() or 1.0
+    norm = k1 * (1 - b + b * lengths / average_length)
+    return ((frequencies * (k1 + 1)) / (frequencies + norm[:, None])) @ idf
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[float]], k: int = RRF_K) -> np.ndarray:
+    """
+    Fusiona varios puntajes por posición (RRF): sum(1 / (k + puesto)).
+
+    :param rankings: Puntajes de cada ranking para los mismos documentos (mayor es mejor);
+        NaN indica que el documento no aparece en ese ranking y no suma.
+    :param k: Constante de RRF.
+    :return: Puntaje fusionado por documento.
+    """
+    fused = None
+    for scores in rankings:
+        scores = np.asarray(scores, dtype=np.float64)
+        ranked = ~np.isnan(scores)
+        # Puesto 1 para el mayor puntaje; argsort deja los NaN al final y el orden estable
+        # conserva el orden original en empates
+        ranks = np.empty(len(scores), dtype=np.float64)
+        ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(scores) + 1)
+        contribution = np.where(ranked, 1.0 / (k + ranks), 0.0)
+        fused = contribution if fused is None else fused + contribution
+    return fused if fused is not None else np.zeros(0)
+
+
+def hybrid_rerank(
+    matches: Sequence[Dict[str, Any]],
+    query: str,
+    top_n: int,
+    text_field: str = "text"
+) -> List[Dict[str, Any]]:
+    """
+    Reordena las coincidencias del índice vectorial combinando su similitud con BM25 local.
+
+    El puntaje de cada coincidencia se reemplaza por el puntaje fusionado normalizado a [0, 1]
+    para que el armado del contexto (context_helper) lo use como relevancia.
+
+    :param matches: Candidatos de PineconeHelper.search_by_text(return_format="raw").
+    :param query: Consulta con los términos exactos a buscar (criterio y temas).
+    :param top_n: Coincidencias que se conservan.
+    :param text_field: Campo de metadata con el texto del chunk.
+    :return: Las `top_n` mejores coincidencias, de mayor a menor puntaje fusionado.
+    """
+    if not matches:
+        return []
+    texts = [str((match.get("metadata") or {}).get(text_field, "")) for match in matches]
+    dense = [float(match.get("score", 0.0)) for match in matches]
+    # Los candidatos sin ningún término de la consulta no participan en el ranking léxico
+    lexical = bm25_scores(query, texts)
+    lexical[lexical <= 0] = np.nan
+
+    fused = reciprocal_rank_fusion([dense, lexical])
+    fused = fused / fused.max()
+    order = np.argsort(-fused, kind="stable")[:top_n]
+    logger.info(f"Reordenamiento híbrido: {len(matches)} candidatos, {len(order)} conservados")
+    return [{**matches[index], "score": round(float(fused[index]), 4)} for index in order]
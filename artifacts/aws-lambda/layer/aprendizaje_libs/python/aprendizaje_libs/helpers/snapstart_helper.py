@@ -0,0 +1,108 @@
+# Built-in imports
+import random
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+try:
+    # Disponible en los runtimes de Lambda con SnapStart (Python 3.12+)
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+    SNAPSTART_AVAILABLE = True
+except ImportError:
+    SNAPSTART_AVAILABLE = False
+
+# Hooks registrados como (orden, función); fuera de SnapStart solo se ejecutan con run_hooks
+_hooks: Dict[str, List[Tuple[int, Callable[[], Any]]]] = {"before_snapshot": [], "after_restore": []}
+_state = {"restored": False}
+
+
+def before_snapshot(fn: Callable[[], Any], order: int = 0) -> Callable[[], Any]:
+    """
+    Registra una función que se ejecuta antes de tomar el snapshot (al publicar la versión).
+
+    Se usa para precalentar clientes y cachés que de otro modo se crearían en la primera solicitud.
+
+    :param fn: Función sin argumentos.
+    :param order: Los hooks con menor orden se ejecutan primero; a igual orden, por registro.
+    :return: La misma función, para usarla como decorador.
+    """
+    _hooks["before_snapshot"].append((order, fn))
+    return fn
+
+
+def after_restore(fn: Callable[[], Any], order: int = 0) -> Callable[[], Any]:
+    """
+    Registra una función que se ejecuta al restaurar un entorno desde el snapshot.
+
+    Se usa para lo que no puede compartirse entre entornos restaurados: conexiones abiertas,
+    secretos que pudieron rotar desde el snapshot y la semilla de los generadores aleatorios.
+
+    :param fn: Función sin argumentos.
+    :param order: Los hooks con menor orden se ejecutan primero; a igual orden, por registro.
+    :return: La misma función, para usarla como decorador.
+    """
+    _hooks["after_restore"].append((order, fn))
+    return fn
+
+
+def _guarded(fn: Callable[[], Any]) -> Callable[[], None]:
+    # Un hook fallido no debe impedir el snapshot ni la restauración: la solicitud
+    # siguiente vuelve a crear lo que haga falta
+    def run() -> None:
+        try:
+            fn()
+        except Exception as error:
+            logger.warning(f"Hook de SnapStart {getattr(fn, '__name__', fn)} fallido: {error}")
+    return run
+
+
+def run_hooks(phase: str) -> None:
+    """
+    Ejecuta los hooks de una fase ("before_snapshot" o "after_restore") en orden.
+
+    El runtime la invoca una vez por fase; fuera de SnapStart se llama directamente (pruebas).
+    """
+    for _, fn in sorted(_hooks[phase], key=lambda hook: hook[0]):
+        _guarded(fn)()
+
+
+if SNAPSTART_AVAILABLE:
+    # Un único hook por fase ante el runtime, para controlar el orden de los registrados aquí
+    register_before_snapshot(lambda: run_hooks("before_snapshot"))
+    register_after_restore(lambda: run_hooks("after_restore"))
+
+
+def restored() -> bool:
+    """Indica si el entorno se restauró desde un snapshot (para distinguirlo de un arranque en frío)."""
+    return _state["restored"]
+
+
+def warm_operations(client: Any, operation_names: Iterable[str]) -> None:
+    """
+    Carga los modelos de las operaciones de un cliente boto3 sin hacer llamadas de red.
+
+    botocore resuelve las formas de entrada y salida de cada operación la primera vez que se
+    usa; hacerlo antes del snapshot saca ese costo de la primera solicitud.
+
+    :param client: Cliente boto3.
+    :param operation_names: Operaciones, p. ej. ["Converse"].
+    """
+    service_model = client.meta.service_model
+    for name in operation_names:
+        operation = service_model.operation_model(name)
+        for shape in (operation.input_shape, operation.output_shape):
+            if shape is not None and hasattr(shape, "members"):
+                dict(shape.members)
+
+
+def _mark_restored() -> None:
+    _state["restored"] = True
+    # Cada entorno restaurado parte del mismo estado de memoria: sin nueva semilla, todos
+    # generarían la misma secuencia (p. ej. el muestreo de auditoría del pre-puntaje)
+    random.seed()
+
+
+after_restore(_mark_restored, order=-1)
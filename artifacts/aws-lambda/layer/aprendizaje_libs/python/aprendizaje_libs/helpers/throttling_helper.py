@@ -0,0 +1,376 @@
+# Built-in imports
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+# External imports
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+def adaptive_retry_config(max_attempts: int = 2, **kwargs) -> Config:
+    """
+    Configuración de botocore con reintentos en modo adaptativo.
+
+    El modo adaptativo agrega un limitador de tasa del lado del cliente; se mantienen
+    pocos intentos porque los reintentos largos los gestiona BedrockGovernor.
+
+    :param max_attempts: Número total de intentos por llamada (incluye el primero).
+    :param kwargs: Parámetros adicionales de botocore.config.Config.
+    :return: Objeto Config.
+    """
+    return Config(retries={"max_attempts": max_attempts, "mode": "adaptive"}, **kwargs)
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Indica si la excepción corresponde a una limitación de capacidad de Bedrock."""
+    if not isinstance(error, ClientError):
+        return False
+    return error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+class BedrockThrottledError(Exception):
+    """Bedrock sigue limitando las llamadas y no queda presupuesto de reintentos o de tiempo."""
+
+    def __init__(self, message: str, retry_after_seconds: int = 1) -> None:
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+
+def throttled_response(error: BedrockThrottledError) -> Dict[str, Any]:
+    """
+    Construye la respuesta 429 que se devuelve al cliente cuando Bedrock está saturado.
+
+    :param error: Excepción lanzada por BedrockGovernor.
+    :return: Respuesta en formato proxy de API Gateway.
+    """
+    return {
+        "statusCode": 429,
+        "headers": {"Retry-After": str(error.retry_after_seconds)},
+        "body": json.dumps({
+            "success": False,
+            "message": str(error),
+            "error": {
+                "code": "BEDROCK_THROTTLED",
+                "details": f"Reintente en {error.retry_after_seconds} segundos"
+            }
+        })
+    }
+
+
+class ConcurrencyStateStore(ABC):
+    """Almacén compartido entre contenedores para el límite y los cupos de concurrencia."""
+
+    @abstractmethod
+    def get_limit(self, key: str) -> Optional[int]:
+        """Devuelve el límite actual o None si aún no se ha registrado."""
+
+    @abstractmethod
+    def compare_and_set_limit(self, key: str, limit: int, expected: Optional[int]) -> bool:
+        """Actualiza el límite solo si el valor almacenado coincide con `expected`."""
+
+    @abstractmethod
+    def try_acquire(self, key: str, slot: int, lease_seconds: float) -> bool:
+        """Intenta reservar el cupo `slot`; los cupos con la reserva vencida se pueden reutilizar."""
+
+    @abstractmethod
+    def release(self, key: str, slot: int) -> None:
+        """Libera el cupo `slot`."""
+
+
+class InMemoryStateStore(ConcurrencyStateStore):
+    """Implementación local del almacén, útil para pruebas y ejecución fuera de AWS."""
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._limits: Dict[str, int] = {}
+        self._leases: Dict[str, float] = {}
+
+    def get_limit(self, key: str) -> Optional[int]:
+        with self._lock:
+            return self._limits.get(key)
+
+    def compare_and_set_limit(self, key: str, limit: int, expected: Optional[int]) -> bool:
+        with self._lock:
+            if self._limits.get(key) != expected:
+                return False
+            self._limits[key] = limit
+            return True
+
+    def try_acquire(self, key: str, slot: int, lease_seconds: float) -> bool:
+        slot_key = f"{key}#slot#{slot}"
+        now = self._clock()
+        with self._lock:
+            if self._leases.get(slot_key, 0) > now:
+                return False
+            self._leases[slot_key] = now + lease_seconds
+            return True
+
+    def release(self, key: str, slot: int) -> None:
+        with self._lock:
+            self._leases.pop(f"{key}#slot#{slot}", None)
+
+
+class DynamoDBStateStore(ConcurrencyStateStore):
+    """
+    Almacén respaldado por una tabla DynamoDB con clave de partición `governor_key`.
+
+    Opera con el cliente de la tabla (`meta.client`, que conserva la conversión de tipos de
+    boto3): los recursos no son seguros entre hilos y las evaluaciones por lote reservan cupos
+    desde varios hilos del mismo contenedor.
+    """
+
+    def __init__(self, table_helper: Any, key_name: str = "governor_key") -> None:
+        """
+        :param table_helper: DynamoDBHelper de la tabla de estado del gobernador.
+        :param key_name: Nombre de la clave de partición.
+        """
+        table = table_helper.get_table()
+        self.client = table.meta.client
+        self.table_name = table.name
+        self.key_name = key_name
+
+    def get_limit(self, key: str) -> Optional[int]:
+        response = self.client.get_item(TableName=self.table_name, Key={self.key_name: f"{key}#limit"})
+        item = response.get("Item")
+        return int(item["concurrency_limit"]) if item else None
+
+    def compare_and_set_limit(self, key: str, limit: int, expected: Optional[int]) -> bool:
+        if expected is None:
+            condition = "attribute_not_exists(#k)"
+            values = None
+        else:
+            condition = "concurrency_limit = :expected"
+            values = {":expected": expected}
+        kwargs = {
+            "TableName": self.table_name,
+            "Item": {self.key_name: f"{key}#limit", "concurrency_limit": limit},
+            "ConditionExpression": condition,
+        }
+        if values:
+            kwargs["ExpressionAttributeValues"] = values
+        else:
+            kwargs["ExpressionAttributeNames"] = {"#k": self.key_name}
+        return self._conditional(self.client.put_item, **kwargs)
+
+    def try_acquire(self, key: str, slot: int, lease_seconds: float) -> bool:
+        now = time.time()
+        return self._conditional(
+            self.client.put_item,
+            TableName=self.table_name,
+            Item={
+                self.key_name: f"{key}#slot#{slot}",
+                "lease_expires": int((now + lease_seconds) * 1000),
+                "ttl": int(now + lease_seconds + 86400),
+            },
+            ConditionExpression="attribute_not_exists(#k) OR lease_expires < :now",
+            ExpressionAttributeNames={"#k": self.key_name},
+            ExpressionAttributeValues={":now": int(now * 1000)},
+        )
+
+    def release(self, key: str, slot: int) -> None:
+        self.client.delete_item(TableName=self.table_name, Key={self.key_name: f"{key}#slot#{slot}"})
+
+    @staticmethod
+    def _conditional(operation: Callable[..., Any], **kwargs) -> bool:
+        try:
+            operation(**kwargs)
+            return True
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise error
+
+
+class BedrockGovernor:
+    """
+    Limita la concurrencia hacia Bedrock entre todos los contenedores usando AIMD.
+
+    Cada llamada reserva un cupo en el almacén compartido. El límite crece en uno tras
+    llamadas exitosas (como máximo una vez por `increase_interval_seconds` por contenedor)
+    y se reduce multiplicativamente ante un ThrottlingException. Los reintentos usan
+    backoff exponencial con jitter y nunca superan el tiempo restante de la Lambda.
+    """
+
+    def __init__(
+        self,
+        store: ConcurrencyStateStore,
+        key: str,
+        min_limit: int = 1,
+        max_limit: int = 20,
+        initial_limit: Optional[int] = None,
+        decrease_factor: float = 0.5,
+        increase_interval_seconds: float = 5.0,
+        lease_seconds: float = 90.0,
+        max_attempts: int = 4,
+        base_backoff_seconds: float = 0.25,
+        max_backoff_seconds: float = 4.0,
+        safety_margin_ms: int = 1500,
+        limit_cache_seconds: float = 2.0,
+        probe_slots: int = 3,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param store: Almacén compartido de estado.
+        :param key: Clave del recurso gobernado (por ejemplo `bedrock#<model_id>`).
+        :param min_limit: Límite mínimo de concurrencia.
+        :param max_limit: Límite máximo de concurrencia.
+        :param initial_limit: Límite inicial si el almacén está vacío (por defecto `max_limit`).
+        :param decrease_factor: Factor multiplicativo aplicado ante limitación.
+        :param increase_interval_seconds: Intervalo mínimo entre incrementos por contenedor.
+        :param lease_seconds: Vigencia de una reserva de cupo si el contenedor no la libera.
+        :param max_attempts: Número máximo de intentos por llamada.
+        :param base_backoff_seconds: Espera base del backoff exponencial.
+        :param max_backoff_seconds: Espera máxima entre intentos.
+        :param safety_margin_ms: Tiempo que se reserva para responder antes del timeout.
+        :param limit_cache_seconds: Tiempo durante el cual se reutiliza el límite leído.
+        :param probe_slots: Cupos que se prueban en cada intento de reserva.
+        """
+        self.store = store
+        self.key = key
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.initial_limit = initial_limit or max_limit
+        self.decrease_factor = decrease_factor
+        self.increase_interval_seconds = increase_interval_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.safety_margin_ms = safety_margin_ms
+        self.limit_cache_seconds = limit_cache_seconds
+        self.probe_slots = probe_slots
+        self._sleep = sleep
+        self._clock = clock
+        self._cached_limit: Optional[int] = None
+        self._cached_at = float("-inf")
+        self._last_increase = float("-inf")
+
+    def current_limit(self) -> int:
+        """Devuelve el límite compartido, leído del almacén como máximo cada `limit_cache_seconds`."""
+        now = self._clock()
+        if self._cached_limit is None or now - self._cached_at >= self.limit_cache_seconds:
+            stored = self.store.get_limit(self.key)
+            self._cached_limit = stored if stored is not None else self.initial_limit
+            self._cached_at = now
+        return self._cached_limit
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        remaining_time_ms: Optional[Callable[[], int]] = None,
+        max_attempts: Optional[int] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Ejecuta `fn` dentro de un cupo de concurrencia, con reintentos presupuestados.
+
+        :param fn: Función a ejecutar (por ejemplo `bedrock_helper.converse`).
+        :param remaining_time_ms: Función que devuelve el tiempo restante de la Lambda.
+        :param max_attempts: Sobrescribe el número máximo de intentos para esta llamada.
+        :return: Resultado de `fn`.
+        :raises BedrockThrottledError: Si no se obtiene respuesta dentro del presupuesto.
+        """
+        max_attempts = max_attempts or self.max_attempts
+        attempt = 0
+        while True:
+            attempt += 1
+            slot = self._acquire(remaining_time_ms)
+            try:
+                result = fn(*args, **kwargs)
+            except ClientError as error:
+                if not is_throttling_error(error):
+                    raise error
+                self._on_throttle()
+                delay = self._backoff(attempt)
+                if attempt >= max_attempts or not self._has_time(remaining_time_ms, delay * 1000):
+                    raise BedrockThrottledError(
+                        f"Bedrock limitó la solicitud tras {attempt} intentos",
+                        retry_after_seconds=max(1, round(delay))
+                    ) from error
+                logger.warning(f"Bedrock limitó la solicitud (intento {attempt}), reintentando en {delay:.2f}s")
+                self._sleep(delay)
+                continue
+            finally:
+                self._release(slot)
+            self._on_success()
+            return result
+
+    def _acquire(self, remaining_time_ms: Optional[Callable[[], int]]) -> Optional[int]:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                limit = self.current_limit()
+                for slot in random.sample(range(limit), k=min(limit, self.probe_slots)):
+                    if self.store.try_acquire(self.key, slot, self.lease_seconds):
+                        return slot
+            except Exception as error:
+                # Si el almacén no está disponible se continúa sin cupo para no bloquear la generación
+                logger.warning(f"Almacén de concurrencia no disponible: {error}")
+                return None
+            delay = self._backoff(attempt)
+            if not self._has_time(remaining_time_ms, delay * 1000):
+                raise BedrockThrottledError(
+                    "No hay cupo de concurrencia disponible para Bedrock",
+                    retry_after_seconds=max(1, round(delay))
+                )
+            self._sleep(delay)
+
+    def _release(self, slot: Optional[int]) -> None:
+        if slot is None:
+            return
+        try:
+            self.store.release(self.key, slot)
+        except Exception as error:
+            logger.warning(f"No se pudo liberar el cupo {slot}: {error}")
+
+    def _on_success(self) -> None:
+        now = self._clock()
+        if now - self._last_increase < self.increase_interval_seconds:
+            return
+        self._last_increase = now
+        self._update_limit(lambda limit: min(self.max_limit, limit + 1))
+
+    def _on_throttle(self) -> None:
+        self._update_limit(lambda limit: max(self.min_limit, int(limit * self.decrease_factor)))
+        logger.warning(f"Límite de concurrencia de {self.key} reducido a {self._cached_limit}")
+
+    def _update_limit(self, compute: Callable[[int], int]) -> None:
+        try:
+            stored = self.store.get_limit(self.key)
+            current = stored if stored is not None else self.initial_limit
+            new_limit = compute(current)
+            if new_limit != current or stored is None:
+                self.store.compare_and_set_limit(self.key, new_limit, stored)
+            self._cached_limit = new_limit
+            self._cached_at = self._clock()
+        except Exception as error:
+            logger.warning(f"No se pudo actualizar el límite de concurrencia: {error}")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: espera aleatoria entre 0 y el backoff exponencial acotado
+        return random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** attempt)))
+
+    def _has_time(self, remaining_time_ms: Optional[Callable[[], int]], needed_ms: float) -> bool:
+        if remaining_time_ms is None:
+            return True
+        return remaining_time_ms() - needed_ms > self.safety_margin_ms
@@ -0,0 +1,201 @@
+# Built-in imports
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+try:
+    # Incluido en la capa de Powertools; sin él (local, pruebas) el exportador es NoopExporter
+    from aws_xray_sdk.core import patch, xray_recorder
+    from aws_xray_sdk.core.models.subsegment import Subsegment
+    XRAY_AVAILABLE = True
+except ImportError:
+    XRAY_AVAILABLE = False
+
+# Bibliotecas cuyas llamadas se trazan como subsegmentos: botocore (Bedrock, DynamoDB, S3, SQS)
+# y http.client (Pinecone); las conexiones de botocore se excluyen de http.client
+PATCHED_MODULES = ("botocore", "httplib")
+
+
+class Span:
+    """Subsegmento registrado por InMemoryExporter."""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None) -> None:
+        self.name = name
+        self.parent = parent
+        self.annotations: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    def annotate(self, **annotations: Any) -> None:
+        self.annotations.update(annotations)
+
+
+class NoopExporter:
+    """Exportador sin efecto: los subsegmentos no cuestan nada fuera de Lambda."""
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Any]:
+        yield self
+
+    def annotate(self, **annotations: Any) -> None:
+        pass
+
+    def current(self) -> Any:
+        return None
+
+    def attach(self, context: Any) -> None:
+        pass
+
+
+class InMemoryExporter:
+    """
+    Exportador en memoria para pruebas y ejecuciones locales.
+
+    `spans` guarda los subsegmentos terminados en orden de cierre; cada uno conoce a su padre.
+    """
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[Span]:
+        return getattr(self._local, "span", None)
+
+    def attach(self, context: Optional[Span]) -> None:
+        self._local.span = context
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        span = Span(name, parent=self.current())
+        self._local.span = span
+        try:
+            yield span
+        except Exception as error:
+            span.error = type(error).__name__
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - span.started) * 1000
+            self._local.span = span.parent
+            with self._lock:
+                self.spans.append(span)
+
+    def annotate(self, **annotations: Any) -> None:
+        span = self.current()
+        if span is not None:
+            span.annotate(**annotations)
+
+    def find(self, name: str) -> List[Span]:
+        return [span for span in self.spans if span.name == name]
+
+
+class XRayExporter:
+    """Subsegmentos de AWS X-Ray bajo el segmento de la invocación que crea Lambda (tracing activo)."""
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Any]:
+        with xray_recorder.in_subsegment(name):
+            yield self
+
+    def annotate(self, **annotations: Any) -> None:
+        entity = xray_recorder.get_trace_entity()
+        # El segmento de la invocación lo crea Lambda y no admite anotaciones
+        if not isinstance(entity, Subsegment):
+            return
+        for key, value in annotations.items():
+            if isinstance(value, (str, int, float, bool)):
+                entity.put_annotation(key, value)
+            else:
+                entity.put_metadata(key, value)
+
+    def current(self) -> Any:
+        return xray_recorder.get_trace_entity()
+
+    def attach(self, context: Any) -> None:
+        if context is not None:
+            xray_recorder.set_trace_entity(context)
+
+
+_exporter: Dict[str, Any] = {"current": NoopExporter()}
+
+
+def set_exporter(exporter: Any) -> Any:
+    """
+    Reemplaza el exportador de subsegmentos (p. ej. InMemoryExporter en pruebas).
+
+    :return: El exportador anterior.
+    """
+    previous = _exporter["current"]
+    _exporter["current"] = exporter
+    return previous
+
+
+def install_tracing() -> Any:
+    """
+    Activa X-Ray cuando la función tiene tracing activo y el SDK está disponible (una vez por contenedor).
+
+    Traza automáticamente las llamadas de botocore y http.client como subsegmentos. Fuera de
+    Lambda (sin AWS_XRAY_DAEMON_ADDRESS) se mantiene el exportador configurado.
+
+    :return: El exportador en uso.
+    """
+    if XRAY_AVAILABLE and os.environ.get("AWS_XRAY_DAEMON_ADDRESS") and not isinstance(_exporter["current"], XRayExporter):
+        patch(PATCHED_MODULES)
+        set_exporter(XRayExporter())
+        logger.info("Tracing de X-Ray activado")
+    return _exporter["current"]
+
+
+@contextmanager
+def subsegment(name: str, **annotations: Any) -> Iterator[Any]:
+    """
+    Abre un subsegmento con anotaciones; también sirve como decorador.
+
+    Las anotaciones permiten filtrar trazas (p. ej. model_id, top_k); los valores que no son
+    texto, número o booleano se guardan como metadata.
+
+    :param name: Nombre del subsegmento.
+    :return: Objeto con annotate(**anotaciones) para agregar datos conocidos al final.
+    """
+    exporter = _exporter["current"]
+    with exporter.span(name) as span:
+        if annotations:
+            exporter.annotate(**annotations)
+        yield span
+
+
+def annotate(**annotations: Any) -> None:
+    """Agrega anotaciones al subsegmento en curso (sin efecto si no hay ninguno)."""
+    _exporter["current"].annotate(**annotations)
+
+
+def bind_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Propaga el subsegmento en curso a los hilos que ejecuten `fn` (lotes de batch_helper).
+
+    :param fn: Función que se ejecutará en otro hilo.
+    :return: Función que adopta el contexto de trazas del hilo que la creó.
+    """
+    exporter = _exporter["current"]
+    context = exporter.current()
+    if context is None:
+        return fn
+
+    def bound(*args: Any, **kwargs: Any) -> Any:
+        exporter.attach(context)
+        return fn(*args, **kwargs)
+    return bound
+
+
+def item_size(item: Dict[str, Any]) -> int:
+    """Tamaño aproximado en bytes de un elemento de DynamoDB (para anotar las escrituras)."""
+    return len(json.dumps(item, ensure_ascii=False, default=str).encode("utf-8"))
@@ -0,0 +1,378 @@
+# Built-in imports
+import copy
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# External imports
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+# Modo de tráfico del contenedor: sin definir (llamadas reales), "record" o "replay"
+TRAFFIC_MODE_ENV = "TRAFFIC_MODE"
+TRAFFIC_DIR_ENV = "TRAFFIC_DIR"
+TRAFFIC_LATENCY_ENV = "TRAFFIC_LATENCY"
+TRAFFIC_LATENCY_SCALE_ENV = "TRAFFIC_LATENCY_SCALE"
+TRAFFIC_THROTTLE_RATE_ENV = "TRAFFIC_THROTTLE_RATE"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+DEFAULT_TRAFFIC_DIR = "/tmp/traffic"
+
+# Operaciones de Bedrock que se graban y reproducen; el resto sigue su camino normal
+BEDROCK_OPERATIONS = ("Converse", "InvokeModel")
+BEDROCK_FILE = "bedrock-runtime.jsonl"
+PINECONE_FILE = "pinecone.jsonl"
+
+# Módulo de aje_libs cuyo cliente de Pinecone se reemplaza en los modos de grabación y reproducción
+PINECONE_HELPER_MODULE = "aje_libs.bd.helpers.pinecone_helper"
+
+
+class TrafficNotRecordedError(Exception):
+    """No hay ninguna grabación que sirva para responder la llamada en modo replay."""
+
+
+def traffic_mode() -> Optional[str]:
+    """
+    Modo configurado en TRAFFIC_MODE.
+
+    :return: "record", "replay" o None si las llamadas van a los servicios reales.
+    """
+    mode = os.environ.get(TRAFFIC_MODE_ENV, "").strip().lower()
+    if mode and mode not in (MODE_RECORD, MODE_REPLAY):
+        raise ValueError(f"{TRAFFIC_MODE_ENV} inválido: {mode!r} (se esperaba '{MODE_RECORD}' o '{MODE_REPLAY}')")
+    return mode or None
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def bedrock_keys(operation_name: str, params: Dict[str, Any]) -> List[str]:
+    """
+    Claves de búsqueda de una llamada a Bedrock, de la más a la menos específica.
+
+    La primera identifica la solicitud exacta. En Converse la segunda agrupa por modelo e
+    instrucciones de sistema, que son fijas por tarea (generar, evaluar, feedback...), de modo
+    que una solicitud nueva recibe una respuesta grabada de la misma tarea.
+
+    :param operation_name: "Converse" o "InvokeModel".
+    :param params: Parámetros de la llamada.
+    :return: Lista de claves.
+    """
+    model_id = params.get("modelId", "")
+    keys = [f"{operation_name}|{_digest(params)}"]
+    if operation_name == "Converse":
+        keys.append(f"{operation_name}|{model_id}|{_digest(params.get('system'))}")
+    keys.extend([f"{operation_name}|{model_id}", operation_name])
+    return keys
+
+
+def pinecone_keys(params: Dict[str, Any]) -> List[str]:
+    """
+    Claves de búsqueda de una consulta a Pinecone, de la más a la menos específica.
+
+    El vector se redondea para que los embeddings reproducidos coincidan con los grabados.
+    """
+    exact = dict(params, vector=[round(value, 6) for value in params.get("vector") or []])
+    filter_key = _digest(params.get("filter"))
+    top_k = params.get("top_k")
+    return [f"query|{_digest(exact)}", f"query|{top_k}|{filter_key}", f"query|{top_k}", "query"]
+
+
+class LatencyModel:
+    """
+    Distribución de latencias inyectada en modo replay (TRAFFIC_LATENCY).
+
+    - "recorded": la latencia grabada con la respuesta (por defecto).
+    - "fixed:<ms>": una latencia constante.
+    - "lognormal:<mediana_ms>:<sigma>": latencias lognormales con la mediana indicada.
+
+    `scale` multiplica el resultado (p. ej. 2.0 para simular un modelo degradado).
+    """
+
+    def __init__(self, spec: str = "recorded", scale: float = 1.0, rng: Optional[random.Random] = None) -> None:
+        parts = (spec or "recorded").split(":")
+        self.kind = parts[0]
+        if self.kind == "recorded" and len(parts) == 1:
+            self.params: List[float] = []
+        elif self.kind == "fixed" and len(parts) == 2:
+            self.params = [float(parts[1])]
+        elif self.kind == "lognormal" and len(parts) == 3:
+            self.params = [float(parts[1]), float(parts[2])]
+        else:
+            raise ValueError(f"{TRAFFIC_LATENCY_ENV} inválido: {spec!r}")
+        self.scale = scale
+        self.rng = rng or random.Random()
+
+    def sample(self, recorded_ms: Optional[float] = None) -> float:
+        """
+        :param recorded_ms: Latencia grabada con la respuesta, si existe.
+        :return: Latencia a simular en milisegundos.
+        """
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            value = self.rng.lognormvariate(math.log(median), sigma)
+        else:
+            value = recorded_ms or 0.0
+        return max(0.0, value * self.scale)
+
+
+class TrafficRecorder:
+    """
+    Graba en JSON Lines las llamadas a Bedrock y Pinecone con su respuesta, uso de tokens y latencia.
+
+    Se engancha a los eventos de botocore de la sesión, así que funciona con cualquier cliente de
+    bedrock-runtime (ModelRouter, PineconeHelper, LocalVectorStore) sin tocar a los llamadores.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, file_name: str, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(os.path.join(self.directory, file_name), "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    def before_parameter_build(self, params: Dict[str, Any], model: Any, context: Dict[str, Any], **kwargs) -> None:
+        if model.name in BEDROCK_OPERATIONS:
+            context["traffic_keys"] = bedrock_keys(model.name, params)
+            context["traffic_started"] = time.perf_counter()
+
+    def after_call(self, http_response: Any, parsed: Dict[str, Any], model: Any, context: Dict[str, Any], **kwargs) -> None:
+        if "traffic_keys" not in context:
+            return
+        latency_ms = (time.perf_counter() - context["traffic_started"]) * 1000
+        response = {key: value for key, value in parsed.items() if key != "ResponseMetadata"}
+        body = response.get("body")
+        if hasattr(body, "read"):
+            # El cuerpo de InvokeModel es un stream: se lee una vez y se devuelve uno nuevo al llamador
+            data = body.read()
+            parsed["body"] = StreamingBody(io.BytesIO(data), len(data))
+            response["body"] = data.decode("utf-8")
+        self.write(BEDROCK_FILE, {
+            "operation": model.name,
+            "keys": context["traffic_keys"],
+            "status": http_response.status_code,
+            "latency_ms": round(latency_ms, 1),
+            "usage": response.get("usage"),
+            "response": response
+        })
+
+    def query(self, index: Any, params: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        response = index.query(**params)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.write(PINECONE_FILE, {
+            "operation": "query",
+            "keys": pinecone_keys(params),
+            "latency_ms": round(latency_ms, 1),
+            "response": response.to_dict() if hasattr(response, "to_dict") else dict(response)
+        })
+        return response
+
+
+class TrafficReplayer:
+    """
+    Responde las llamadas a Bedrock y Pinecone con las grabaciones de TrafficRecorder, sin red.
+
+    Antes de cada respuesta espera la latencia de `latency` y, con probabilidad `throttle_rate`,
+    responde ThrottlingException como lo haría Bedrock, para ejercitar BedrockGovernor y los
+    modelos de respaldo. El resto del handler (cachés, DynamoDB, etc.) sigue su camino normal.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        latency: Optional[LatencyModel] = None,
+        throttle_rate: float = 0.0,
+        rng: Optional[random.Random] = None,
+        sleep: Callable[[float], None] = time.sleep
+    ) -> None:
+        self.directory = directory
+        self.rng = rng or random.Random()
+        self.latency = latency or LatencyModel(rng=self.rng)
+        self.throttle_rate = throttle_rate
+        self.sleep = sleep
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._cursors: Counter = Counter()
+        self._records = {
+            BEDROCK_FILE: self._load(BEDROCK_FILE, lambda record: record.get("status", 200) < 300),
+            PINECONE_FILE: self._load(PINECONE_FILE)
+        }
+
+    def _load(self, file_name: str, accept: Callable[[Dict[str, Any]], bool] = lambda record: True) -> Dict[str, List[Dict[str, Any]]]:
+        records: Dict[str, List[Dict[str, Any]]] = {}
+        path = os.path.join(self.directory, file_name)
+        if not os.path.exists(path):
+            logger.warning(f"Sin grabaciones en {path}")
+            return records
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if accept(record):
+                    for key in record["keys"]:
+                        records.setdefault(key, []).append(record)
+        return records
+
+    def lookup(self, file_name: str, keys: List[str]) -> Dict[str, Any]:
+        """
+        Grabación para las claves dadas; entre varias candidatas se rota para variar las respuestas.
+
+        :raises TrafficNotRecordedError: Si ninguna clave tiene grabaciones.
+        """
+        for level, key in enumerate(keys):
+            candidates = self._records[file_name].get(key)
+            if candidates:
+                with self._lock:
+                    position = self._cursors[key]
+                    self._cursors[key] += 1
+                    self.stats["exact" if level == 0 else "fallback"] += 1
+                return candidates[position % len(candidates)]
+        raise TrafficNotRecordedError(f"Sin grabación para {keys[-1]} en {self.directory}")
+
+    def _wait(self, recorded_ms: Optional[float]) -> None:
+        self.sleep(self.latency.sample(recorded_ms) / 1000)
+
+    def before_parameter_build(self, params: Dict[str, Any], model: Any, context: Dict[str, Any], **kwargs) -> None:
+        if model.name in BEDROCK_OPERATIONS:
+            context["traffic_keys"] = bedrock_keys(model.name, params)
+
+    def before_call(self, model: Any, context: Dict[str, Any], **kwargs) -> Optional[Any]:
+        """Evento before-call de botocore: una respuesta no nula reemplaza la llamada HTTP."""
+        if "traffic_keys" not in context:
+            return None
+        if self.throttle_rate and self.rng.random() < self.throttle_rate:
+            with self._lock:
+                self.stats["throttled"] += 1
+            error = {"Error": {"Code": "ThrottlingException", "Message": "Too many requests (replay)"}, "ResponseMetadata": {"HTTPStatusCode": 429}}
+            return AWSResponse(None, 429, {}, None), error
+        record = self.lookup(BEDROCK_FILE, context["traffic_keys"])
+        self._wait(record.get("latency_ms"))
+        parsed = copy.deepcopy(record["response"])
+        if model.name == "InvokeModel":
+            data = parsed["body"].encode("utf-8")
+            parsed["body"] = StreamingBody(io.BytesIO(data), len(data))
+        parsed["ResponseMetadata"] = {"HTTPStatusCode": 200, "HTTPHeaders": {}, "RetryAttempts": 0}
+        return AWSResponse(None, 200, {}, None), parsed
+
+    def query(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        record = self.lookup(PINECONE_FILE, pinecone_keys(params))
+        self._wait(record.get("latency_ms"))
+        return copy.deepcopy(record["response"])
+
+
+class RecordingIndex:
+    """Índice de Pinecone que graba las consultas y delega todo lo demás en el índice real."""
+
+    def __init__(self, index: Any, recorder: TrafficRecorder) -> None:
+        self._index = index
+        self._recorder = recorder
+
+    def query(self, **params) -> Any:
+        return self._recorder.query(self._index, params)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._index, name)
+
+
+class ReplayIndex:
+    """Índice de Pinecone que responde las consultas con grabaciones y acepta las escrituras sin red."""
+
+    def __init__(self, replayer: TrafficReplayer) -> None:
+        self._replayer = replayer
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        return {"total_vector_count": 0, "namespaces": {}}
+
+    def query(self, **params) -> Dict[str, Any]:
+        return self._replayer.query(params)
+
+    def upsert(self, vectors: List[Any], **kwargs) -> Dict[str, Any]:
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, **kwargs) -> Dict[str, Any]:
+        return {}
+
+
+def _pinecone_client(mode: str, handler: Any, pinecone_class: Any) -> Any:
+    if mode == MODE_REPLAY:
+        class ReplayPinecone:
+            def __init__(self, *args, **kwargs) -> None:
+                pass
+
+            def Index(self, *args, **kwargs) -> ReplayIndex:
+                return ReplayIndex(handler)
+        return ReplayPinecone
+
+    class RecordingPinecone(pinecone_class):
+        def Index(self, *args, **kwargs) -> RecordingIndex:
+            return RecordingIndex(super().Index(*args, **kwargs), handler)
+    return RecordingPinecone
+
+
+_installed: Dict[str, Any] = {}
+
+
+def install_traffic_mode(session: Any) -> Optional[Any]:
+    """
+    Activa la grabación o la reproducción de tráfico según TRAFFIC_MODE (una vez por contenedor).
+
+    Registra los manejadores en los eventos de botocore de `session`, por lo que debe llamarse
+    antes de crear los clientes (install_client_factory lo hace). Si el handler ya importó
+    PineconeHelper, reemplaza también su cliente de Pinecone.
+
+    Variables de entorno:
+    - TRAFFIC_DIR: carpeta de las grabaciones (por defecto /tmp/traffic).
+    - TRAFFIC_LATENCY y TRAFFIC_LATENCY_SCALE: ver LatencyModel (solo replay).
+    - TRAFFIC_THROTTLE_RATE: fracción de llamadas a Bedrock que responden ThrottlingException (solo replay).
+
+    :param session: Sesión de boto3 del contenedor.
+    :return: El TrafficRecorder o TrafficReplayer instalado, o None sin TRAFFIC_MODE.
+    """
+    mode = traffic_mode()
+    if mode is None:
+        return None
+    if "handler" in _installed:
+        return _installed["handler"]
+
+    directory = os.environ.get(TRAFFIC_DIR_ENV, DEFAULT_TRAFFIC_DIR)
+    if mode == MODE_RECORD:
+        handler: Any = TrafficRecorder(directory)
+        session.events.register("after-call.bedrock-runtime", handler.after_call)
+    else:
+        latency = LatencyModel(
+            os.environ.get(TRAFFIC_LATENCY_ENV, "recorded"),
+            scale=float(os.environ.get(TRAFFIC_LATENCY_SCALE_ENV, 1.0))
+        )
+        handler = TrafficReplayer(directory, latency=latency, throttle_rate=float(os.environ.get(TRAFFIC_THROTTLE_RATE_ENV, 0.0)))
+        session.events.register("before-call.bedrock-runtime", handler.before_call)
+    session.events.register("before-parameter-build.bedrock-runtime", handler.before_parameter_build)
+
+    pinecone_module = sys.modules.get(PINECONE_HELPER_MODULE)
+    if pinecone_module is not None:
+        pinecone_module.Pinecone = _pinecone_client(mode, handler, pinecone_module.Pinecone)
+
+    _installed["handler"] = handler
+    logger.warning(f"Tráfico de Bedrock y Pinecone en modo {mode} ({directory})")
+    return handler
@@ -0,0 +1,38 @@
+# Built-in imports
+import json
+from typing import Any, Dict, List, Sequence
+
+
+def missing_fields(body: Dict[str, Any], required_fields: Sequence[str]) -> List[str]:
+    """
+    Campos requeridos ausentes en el cuerpo de la solicitud.
+
+    API Gateway rechaza estas solicitudes con el modelo generado de las mismas listas
+    (constants/request_models.py); la validación en el handler cubre las invocaciones directas.
+
+    :param body: Cuerpo de la solicitud.
+    :param required_fields: Lista REQUIRED_FIELDS (o equivalente) del handler.
+    :return: Campos faltantes, en el orden de la lista.
+    """
+    return [field for field in required_fields if field not in body]
+
+
+def bad_request_response(code: str, message: str) -> Dict[str, Any]:
+    """
+    Respuesta 400 con el mismo cuerpo que devuelve API Gateway al rechazar una solicitud.
+
+    :param code: Código de error (MISSING_FIELDS, BATCH_TOO_LARGE...).
+    :param message: Mensaje para el cliente.
+    :return: Respuesta en formato proxy de API Gateway.
+    """
+    return {
+        "statusCode": 400,
+        "body": json.dumps({
+            "success": False,
+            "message": message,
+            "error": {
+                "code": code,
+                "details": message
+            }
+        })
+    }
@@ -0,0 +1,250 @@
+# Built-in imports
+import json
+import mmap
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# External imports
+import numpy as np
+from botocore.exceptions import ClientError
+
+# Own imports
+from aje_libs.common.logger import custom_logger
+
+logger = custom_logger(__name__)
+
+# Formato del índice exportado por add_resource (uno por recurso):
+# - vectors.npy: matriz float32 (n x d) con los embeddings normalizados
+# - texts.bin: metadata compacta de cada vector en JSON UTF-8, concatenada
+# - offsets.npy: int64 (n + 1) con el inicio de cada registro en texts.bin
+# - manifest.json: versión del formato, modelo de embeddings, n y d
+VECTOR_INDEX_FORMAT_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+MANIFEST_FILE = "manifest.json"
+INDEX_FILES = (MANIFEST_FILE, VECTORS_FILE, OFFSETS_FILE, TEXTS_FILE)
+
+# Tiempo durante el que no se vuelve a buscar en S3 el índice de un recurso que no lo tiene
+MISSING_INDEX_TTL_SECONDS = 300
+
+
+def write_vector_index(
+    directory: str,
+    vectors: Sequence[Sequence[float]],
+    records: Sequence[Dict[str, Any]],
+    embeddings_model_id: str
+) -> List[str]:
+    """
+    Escribe un índice local en el formato que lee LocalVectorIndex.
+
+    :param directory: Carpeta de salida.
+    :param vectors: Embeddings de los chunks.
+    :param records: Metadata de cada chunk (`id`, `resource_id`, `chunk_index`, `text`).
+    :param embeddings_model_id: Modelo con el que se generaron los embeddings.
+    :return: Rutas de los archivos escritos.
+    """
+    os.makedirs(directory, exist_ok=True)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    encoded = [json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for record in records]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded])
+
+    np.save(os.path.join(directory, VECTORS_FILE), matrix)
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+    with open(os.path.join(directory, TEXTS_FILE), "wb") as file:
+        file.write(b"".join(encoded))
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as file:
+        json.dump({
+            "format_version": VECTOR_INDEX_FORMAT_VERSION,
+            "embeddings_model_id": embeddings_model_id,
+            "count": int(matrix.shape[0]),
+            "dimension": int(matrix.shape[1]) if matrix.ndim == 2 else 0
+        }, file)
+    return [os.path.join(directory, name) for name in INDEX_FILES]
+
+
+class LocalVectorIndex:
+    """Índice de un recurso mapeado en memoria; la búsqueda es exacta (producto punto)."""
+
+    def __init__(self, directory: str) -> None:
+        """
+        :param directory: Carpeta con los archivos del índice.
+        """
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as file:
+            self.manifest = json.load(file)
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self._texts_file = open(os.path.join(directory, TEXTS_FILE), "rb")
+        size = os.fstat(self._texts_file.fileno()).st_size
+        self._texts = mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @property
+    def count(self) -> int:
+        return int(self.manifest["count"])
+
+    def record(self, position: int) -> Dict[str, Any]:
+        """Metadata del vector en la posición indicada."""
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(self._texts[start:end].decode("utf-8"))
+
+    def search(self, query: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """
+        Los `top_k` vectores con mayor similitud coseno a la consulta normalizada.
+
+        :param query: Embedding de la consulta (normalizado).
+        :param top_k: Cantidad de resultados.
+        :return: Lista de (posición, similitud) de mayor a menor similitud.
+        """
+        if not self.count:
+            return []
+        scores = self.vectors @ query
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [(int(position), float(scores[position])) for position in ordered]
+
+
+class LocalVectorStore:
+    """
+    Alternativa a PineconeHelper.query para recursos con índice local exportado a S3.
+
+    Los índices se descargan a /tmp la primera vez que se usan y se conservan entre
+    invocaciones en caliente. `covers` indica si todos los recursos de una consulta tienen
+    índice local compatible y en conjunto no superan `max_vectors`; si no, se usa Pinecone.
+    """
+
+    def __init__(
+        self,
+        s3_client: Any,
+        bucket: str,
+        prefix: str,
+        embeddings_model_id: str,
+        max_vectors: int,
+        min_threshold: float,
+        max_retrieve_documents: int,
+        cache_dir: str = "/tmp/vector_index"
+    ) -> None:
+        """
+        :param s3_client: Cliente de S3.
+        :param bucket: Bucket donde add_resource exporta los índices.
+        :param prefix: Prefijo de los índices; cada recurso está en `<prefix>/<resource_id>/`.
+        :param embeddings_model_id: Modelo de embeddings de la consulta; debe coincidir con el del índice.
+        :param max_vectors: Máximo de vectores para resolver la consulta localmente.
+        :param min_threshold: Similitud mínima, como PINECONE_MIN_THRESHOLD.
+        :param max_retrieve_documents: `top_k` por defecto.
+        :param cache_dir: Carpeta local de los índices descargados.
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+        self.embeddings_model_id = embeddings_model_id
+        self.max_vectors = max_vectors
+        self.min_threshold = min_threshold
+        self.max_retrieve_documents = max_retrieve_documents
+        self.cache_dir = cache_dir
+        self._indexes: Dict[str, LocalVectorIndex] = {}
+        self._missing: Dict[str, float] = {}
+
+    def covers(self, resource_ids: Sequence[str]) -> bool:
+        """
+        Indica si la consulta de estos recursos puede resolverse con los índices locales.
+
+        :param resource_ids: Recursos del filtro de la consulta.
+        :return: True si todos tienen índice compatible y el total no supera `max_vectors`.
+        """
+        if not resource_ids:
+            return False
+        total = 0
+        for resource_id in resource_ids:
+            index = self._index(str(resource_id))
+            if index is None:
+                return False
+            total += index.count
+            if total > self.max_vectors:
+                logger.info(f"Índice local omitido: {total} vectores superan el máximo de {self.max_vectors}")
+                return False
+        return True
+
+    def query(
+        self,
+        embeddings: List[float],
+        filter_conditions: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        include_metadata: bool = True,
+        namespace: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Misma interfaz y formato de resultados que PineconeHelper.query.
+
+        Solo admite el filtro `{"resource_id": {"$in": [...]}}` que usan los handlers.
+
+        :param embeddings: Embedding de la consulta.
+        :param filter_conditions: Filtro por recursos.
+        :param top_k: Máximo de resultados.
+        :param include_metadata: Incluir la metadata de cada resultado.
+        :param namespace: No se usa; existe por compatibilidad con PineconeHelper.query.
+        :return: Coincidencias con `id`, `score` y `metadata`, sobre el umbral mínimo.
+        """
+        top_k = top_k or self.max_retrieve_documents
+        resource_ids = [str(resource_id) for resource_id in ((filter_conditions or {}).get("resource_id") or {}).get("$in", [])]
+        query = np.asarray(embeddings, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm > 0 else query
+
+        scored = []
+        for resource_id in resource_ids:
+            index = self._index(resource_id)
+            if index is None:
+                raise ValueError(f"El recurso {resource_id} no tiene índice local")
+            scored.extend((score, index, position) for position, score in index.search(query, top_k))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        matches = []
+        for score, index, position in scored[:top_k]:
+            if score < self.min_threshold:
+                break
+            record = index.record(position)
+            match = {"id": record.get("id"), "score": score}
+            if include_metadata:
+                match["metadata"] = record
+            matches.append(match)
+        logger.info(f"Índice local: {len(matches)} coincidencias sobre el umbral en {len(resource_ids)} recursos")
+        return matches
+
+    def _index(self, resource_id: str) -> Optional[LocalVectorIndex]:
+        if resource_id in self._indexes:
+            return self._indexes[resource_id]
+        if time.monotonic() - self._missing.get(resource_id, float("-inf")) < MISSING_INDEX_TTL_SECONDS:
+            return None
+
+        directory = os.path.join(self.cache_dir, resource_id)
+        try:
+            if not os.path.exists(os.path.join(directory, TEXTS_FILE)):
+                self._download(resource_id, directory)
+            index = LocalVectorIndex(directory)
+        except (ClientError, OSError, ValueError) as error:
+            logger.info(f"Recurso {resource_id} sin índice local utilizable: {error}")
+            self._missing[resource_id] = time.monotonic()
+            return None
+
+        manifest = index.manifest
+        if (
+            manifest.get("format_version") != VECTOR_INDEX_FORMAT_VERSION
+            or manifest.get("embeddings_model_id") != self.embeddings_model_id
+        ):
+            logger.info(f"Índice local del recurso {resource_id} incompatible: {manifest}")
+            self._missing[resource_id] = time.monotonic()
+            return None
+        self._indexes[resource_id] = index
+        return index
+
+    def _download(self, resource_id: str, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        # texts.bin se descarga al final: su presencia indica que el índice está completo
+        for name in INDEX_FILES:
+            self.s3_client.download_file(self.bucket, f"{self.prefix}/{resource_id}/{name}", os.path.join(directory, name))
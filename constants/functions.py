@@ -0,0 +1,233 @@
+import json
+import os
+from dataclasses import dataclass, field, fields, replace
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PerformanceProfile:
+    """Capacity settings of a Lambda function"""
+    architecture: str = "x86_64"
+    memory_size: int = 512
+    # Functions behind API Gateway: 29 s integration limit (Deadline) plus time to answer
+    timeout_seconds: int = 30
+    reserved_concurrency: Optional[int] = None
+    provisioned_concurrency: int = 0
+    ephemeral_storage_mb: int = 512
+    # Restores published versions from a snapshot of the initialized environment; ignored when
+    # the function has provisioned concurrency (fixed or scheduled), which Lambda does not combine
+    snap_start: bool = False
+
+
+# Base profiles; every endpoint starts from one of these and can be tuned per environment
+GENERATOR = PerformanceProfile(memory_size=1024, snap_start=True)
+INTERACTIVE = PerformanceProfile(memory_size=512, snap_start=True)
+WORKER = PerformanceProfile(memory_size=1024, timeout_seconds=120, snap_start=True)
+LIGHTWEIGHT = PerformanceProfile(memory_size=256, timeout_seconds=10)
+
+# Layer keys resolved by the stack (create_lambda_layers)
+BASE_LAYERS = ("powertools", "aje_libs", "aprendizaje_libs")
+
+# Permission keys resolved by the stack (create_lambda_functions)
+MODEL_POLICIES = ("bedrock", "ssm", "secrets")
+
+
+@dataclass(frozen=True)
+class FunctionSpec:
+    """Declarative definition of a zip-based Lambda function and everything wired to it"""
+    name: str
+    group: str
+    handler_name: str
+    profile: PerformanceProfile
+    entry: str = "lambda_handler"
+    layers: Tuple[str, ...] = BASE_LAYERS
+    policies: Tuple[str, ...] = MODEL_POLICIES
+    # Stack table attribute -> "read" or "read_write"
+    tables: Dict[str, str] = field(default_factory=dict)
+    # REST API routes under /api/v1 as (path, method)
+    routes: Tuple[Tuple[str, str], ...] = ()
+    # Route path -> handler list of required body fields; routes not listed use REQUIRED_FIELDS
+    request_fields: Dict[str, str] = field(default_factory=dict)
+    # Queue attribute the function sends asynchronous jobs to (GENERATION_JOBS_QUEUE_URL)
+    jobs_queue: Optional[str] = None
+    # Queue attribute the function consumes as SQS event source
+    event_queue: Optional[str] = None
+    # Receives WEBSOCKET_CALLBACK_URL to notify finished jobs
+    notifies_websocket: bool = False
+
+    @property
+    def attribute(self) -> str:
+        """Stack attribute holding the function, e.g. ruta_estandar_generar_ruta_lambda"""
+        return f"{self.name.replace('-', '_')}_lambda"
+
+
+FUNCTIONS = (
+    FunctionSpec(
+        name="ruta-estandar-generar_ruta",
+        group="ruta-estandar",
+        handler_name="generar_ruta",
+        profile=GENERATOR,
+        layers=("powertools", "aje_libs", "pinecone", "aprendizaje_libs", "numpy"),
+        policies=MODEL_POLICIES + ("vector_index",),
+        tables={"learning_path_history_table": "read_write", "bedrock_governor_table": "read_write", "idempotency_table": "read_write"},
+        routes=(("generar_ruta_estandar", "POST"),)
+    ),
+    FunctionSpec(
+        name="ruta-estandar-evaluar",
+        group="ruta-estandar",
+        handler_name="evaluar",
+        profile=INTERACTIVE,
+        layers=BASE_LAYERS + ("numpy",),
+        tables={"evaluation_history_table": "read_write", "bedrock_governor_table": "read_write", "idempotency_table": "read_write"},
+        routes=(("evaluar_reto_estandar", "POST"), ("evaluar_reto_estandar_lote", "POST")),
+        request_fields={"evaluar_reto_estandar_lote": "BATCH_REQUIRED_FIELDS"}
+    ),
+    FunctionSpec(
+        name="ruta-estandar-feedback",
+        group="ruta-estandar",
+        handler_name="feedback",
+        profile=INTERACTIVE,
+        tables={"bedrock_governor_table": "read_write", "idempotency_table": "read_write"},
+        routes=(("feedback_estandar", "POST"),)
+    ),
+    FunctionSpec(
+        name="ruta-estandar-regenerar_reto",
+        group="ruta-estandar",
+        handler_name="regenerar_reto",
+        profile=INTERACTIVE,
+        tables={"regenerated_challenges_history_table": "read_write", "bedrock_governor_table": "read_write", "idempotency_table": "read_write"},
+        routes=(("regenerar_reto_estandar", "POST"),)
+    ),
+    FunctionSpec(
+        name="metodo-caso-generar_caso",
+        group="metodo-caso",
+        handler_name="generar_caso",
+        profile=GENERATOR,
+        tables={
+            "case_history_table": "read_write",
+            "generation_jobs_table": "read_write",
+            "bedrock_governor_table": "read_write",
+            "idempotency_table": "read_write"
+        },
+        routes=(("generar_caso", "POST"),),
+        jobs_queue="generar_caso_jobs_queue"
+    ),
+    FunctionSpec(
+        name="metodo-caso-generar_caso-worker",
+        group="metodo-caso",
+        handler_name="generar_caso",
+        entry="worker_handler",
+        profile=WORKER,
+        tables={
+            "case_history_table": "read_write",
+            "generation_jobs_table": "read_write",
+            "bedrock_governor_table": "read_write"
+        },
+        event_queue="generar_caso_jobs_queue",
+        notifies_websocket=True
+    ),
+    FunctionSpec(
+        name="metodo-caso-generar_ruta",
+        group="metodo-caso",
+        handler_name="generar_ruta",
+        profile=GENERATOR,
+        tables={
+            "learning_path_history_table": "read_write",
+            "generation_jobs_table": "read_write",
+            "bedrock_governor_table": "read_write",
+            "idempotency_table": "read_write"
+        },
+        routes=(("generar_ruta_caso", "POST"),),
+        jobs_queue="generar_ruta_caso_jobs_queue"
+    ),
+    FunctionSpec(
+        name="metodo-caso-generar_ruta-worker",
+        group="metodo-caso",
+        handler_name="generar_ruta",
+        entry="worker_handler",
+        profile=WORKER,
+        tables={
+            "learning_path_history_table": "read_write",
+            "generation_jobs_table": "read_write",
+            "bedrock_governor_table": "read_write"
+        },
+        event_queue="generar_ruta_caso_jobs_queue",
+        notifies_websocket=True
+    ),
+    FunctionSpec(
+        name="metodo-caso-evaluar",
+        group="metodo-caso",
+        handler_name="evaluar",
+        profile=INTERACTIVE,
+        layers=BASE_LAYERS + ("numpy",),
+        tables={"evaluation_history_table": "read_write", "bedrock_governor_table": "read_write", "idempotency_table": "read_write"},
+        routes=(("evaluar_reto_caso", "POST"), ("evaluar_reto_caso_lote", "POST")),
+        request_fields={"evaluar_reto_caso_lote": "BATCH_REQUIRED_FIELDS"}
+    ),
+    FunctionSpec(
+        name="metodo-caso-feedback",
+        group="metodo-caso",
+        handler_name="feedback",
+        profile=INTERACTIVE,
+        tables={"bedrock_governor_table": "read_write", "idempotency_table": "read_write"},
+        routes=(("feedback_caso", "POST"),)
+    ),
+    FunctionSpec(
+        name="jobs-consultar",
+        group="jobs",
+        handler_name="consultar",
+        profile=LIGHTWEIGHT,
+        policies=(),
+        tables={"generation_jobs_table": "read"},
+        routes=(("jobs/{job_id}", "GET"),)
+    ),
+    FunctionSpec(
+        name="jobs-websocket",
+        group="jobs",
+        handler_name="websocket",
+        profile=LIGHTWEIGHT,
+        policies=(),
+        tables={"generation_jobs_table": "read_write"}
+    ),
+)
+
+PROFILE_FIELDS = frozenset(profile_field.name for profile_field in fields(PerformanceProfile))
+
+# Overrides measured by tools/tune_memory.py --update, in the format of app_config["function_profiles"]
+TUNED_PROFILES_PATH = os.path.join(os.path.dirname(__file__), "function_profiles.json")
+
+
+def load_tuned_profiles(path: str = TUNED_PROFILES_PATH) -> Dict[str, Dict[str, Dict]]:
+    """Measured overrides, or an empty mapping when the functions have not been tuned yet"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def merge_profile_overrides(base: Dict[str, Dict[str, Dict]], overrides: Dict[str, Dict[str, Dict]]) -> Dict[str, Dict[str, Dict]]:
+    """Merge two override mappings field by field; `overrides` wins on conflicts"""
+    merged = {environment: {name: dict(changes) for name, changes in functions.items()} for environment, functions in (base or {}).items()}
+    for environment, functions in (overrides or {}).items():
+        for name, changes in functions.items():
+            merged.setdefault(environment, {}).setdefault(name, {}).update(changes)
+    return merged
+
+
+def resolve_profile(spec: FunctionSpec, overrides: Dict[str, Dict[str, Dict]], environment: str) -> PerformanceProfile:
+    """
+    Apply the per-environment overrides of app_config["function_profiles"] to a function profile.
+
+    Overrides are keyed by environment and then by function name; "*" applies to every
+    function of the environment and is overridden by the function's own entry, e.g.
+    {"prod": {"*": {"architecture": "arm64"}, "ruta-estandar-generar_ruta": {"memory_size": 1536}}}
+    """
+    environment_overrides = (overrides or {}).get(environment.lower(), {})
+    changes = {**environment_overrides.get("*", {}), **environment_overrides.get(spec.name, {})}
+    unknown = set(changes) - PROFILE_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown performance profile fields for {spec.name}: {sorted(unknown)}")
+    profile = replace(spec.profile, **changes)
+    if profile.snap_start and profile.ephemeral_storage_mb > 512:
+        raise ValueError(f"{spec.name}: SnapStart requires ephemeral_storage_mb <= 512")
+    return profile
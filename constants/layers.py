@@ -1,10 +1,46 @@
-import os
-from aje_cdk_libs.constants.project_config import ProjectConfig
+from typing import Dict, List, Tuple
+
+# Layers imported by ARN: FunctionSpec.layers key -> app_config["artifacts"]["aws_lambda_layers"] key
+IMPORTED_LAYERS = {
+    "powertools": "layer_powertools",
+    "aje_libs": "layer_aje_libs",
+    "pinecone": "layer_pinecone",
+    "docs": "layer_docs",
+    "requests": "layer_requests",
+    "numpy": "layer_numpy"
+}
+
+# Imported layers are built outside this repo, so only x86_64 is assumed; other architectures
+# have to be declared in app_config["artifacts"]["aws_lambda_layer_compatibility"]
+DEFAULT_LAYER_ARCHITECTURES = ("x86_64",)
+
+
+def layer_compatibility(compatibility: Dict[str, Dict], layer_key: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Declared (architectures, runtimes) of an imported layer; no runtimes means they are not checked"""
+    declared = compatibility.get(layer_key, {})
+    return tuple(declared.get("architectures", DEFAULT_LAYER_ARCHITECTURES)), tuple(declared.get("runtimes", ()))
+
 
 class Layers:
     """Centralized path configurations for local and AWS assets"""
     def __init__(self, app_config: dict, region: str, account: str):
-        aws_lambda_layers = app_config.get("artifacts").get("aws_lambda_layers")
+        artifacts = app_config.get("artifacts")
+        aws_lambda_layers = artifacts.get("aws_lambda_layers")
+        missing = [key for key in IMPORTED_LAYERS.values() if not aws_lambda_layers.get(key)]
+        if missing:
+            raise ValueError(f"app_config.artifacts.aws_lambda_layers is missing {missing} (see README.md, Lambda layers)")
         for key in aws_lambda_layers:
             aws_lambda_layers[key] = aws_lambda_layers[key].replace("${region}", region).replace("${account}", account)
-        self.AWS_LAMBDA_LAYERS = aws_lambda_layers
\ No newline at end of file
+        self.AWS_LAMBDA_LAYERS = aws_lambda_layers
+        self.AWS_LAMBDA_LAYER_COMPATIBILITY = artifacts.get("aws_lambda_layer_compatibility", {})
+
+    def incompatible_layers(self, layers: Tuple[str, ...], runtime: str, architecture: str) -> List[str]:
+        """Imported layers among `layers` not declared compatible with the runtime and architecture"""
+        incompatible = []
+        for layer in layers:
+            if layer not in IMPORTED_LAYERS:
+                continue
+            architectures, runtimes = layer_compatibility(self.AWS_LAMBDA_LAYER_COMPATIBILITY, IMPORTED_LAYERS[layer])
+            if architecture not in architectures or (runtimes and runtime not in runtimes):
+                incompatible.append(IMPORTED_LAYERS[layer])
+        return incompatible
@@ -10,4 +10,6 @@ class Paths:
         self.LOCAL_ARTIFACTS_LAMBDA = f'{self.LOCAL_ARTIFACTS}/aws-lambda' 
         self.LOCAL_ARTIFACTS_LAMBDA_CODE = f'{self.LOCAL_ARTIFACTS_LAMBDA}/code'
         self.LOCAL_ARTIFACTS_LAMBDA_LAYER = f'{self.LOCAL_ARTIFACTS_LAMBDA}/layer' 
-        self.LOCAL_ARTIFACTS_LAMBDA_DOCKER = f'{self.LOCAL_ARTIFACTS_LAMBDA}/docker' 
\ No newline at end of file
+        self.LOCAL_ARTIFACTS_LAMBDA_DOCKER = f'{self.LOCAL_ARTIFACTS_LAMBDA}/docker' 
+        # Per-function packages generated at synth time (stacks/lambda_bundles.py)
+        self.LOCAL_ARTIFACTS_LAMBDA_BUNDLES = f'{self.LOCAL_ARTIFACTS_LAMBDA}/build'
\ No newline at end of file
@@ -0,0 +1,53 @@
+import ast
+import os
+from typing import Dict, List
+
+from constants.functions import FunctionSpec
+
+DEFAULT_REQUIRED_FIELDS = "REQUIRED_FIELDS"
+
+# Fields whose JSON type the handlers depend on; the rest only have to be present, since the
+# front end sends ids and thresholds either as numbers or as strings
+FIELD_TYPES = {"Temas": "array", "Respuestas": "array"}
+
+
+def handler_constants(source_path: str) -> Dict[str, List[str]]:
+    """Module-level lists of strings of a handler, read without importing it"""
+    with open(source_path, encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=source_path)
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.List):
+            values = [element.value for element in node.value.elts if isinstance(element, ast.Constant)]
+            if len(values) == len(node.value.elts) and all(isinstance(value, str) for value in values):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        constants[target.id] = values
+    return constants
+
+
+def required_fields(spec: FunctionSpec, path: str, code_dir: str) -> List[str]:
+    """Required body fields of a route, taken from the list the handler validates"""
+    constant = spec.request_fields.get(path, DEFAULT_REQUIRED_FIELDS)
+    source_path = os.path.join(code_dir, spec.group, spec.handler_name, "lambda_function.py")
+    constants = handler_constants(source_path)
+    if constant not in constants:
+        raise ValueError(f"{source_path} does not define {constant} for route {path}")
+    return constants[constant]
+
+
+def request_schema(spec: FunctionSpec, path: str, code_dir: str) -> Dict:
+    """JSON Schema (draft 4, as API Gateway expects) of the body of a POST route"""
+    fields = required_fields(spec, path, code_dir)
+    return {
+        "$schema": "http://json-schema.org/draft-04/schema#",
+        "title": model_name(path),
+        "type": "object",
+        "required": fields,
+        "properties": {name: {"type": FIELD_TYPES[name]} if name in FIELD_TYPES else {} for name in fields}
+    }
+
+
+def model_name(path: str) -> str:
+    """API Gateway model name of a route, e.g. evaluar_reto_estandar_lote -> EvaluarRetoEstandarLoteRequest"""
+    return "".join(part.capitalize() for part in path.replace("/", "_").split("_") if part.isalnum()) + "Request"
@@ -0,0 +1,99 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+WEEK_DAYS = ("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN")
+
+# Defaults of app_config["provisioned_schedule"]
+DEFAULT_TIME_ZONE = "America/Lima"
+DEFAULT_LEAD_MINUTES = 10
+DEFAULT_TARGET_UTILIZATION = 0.7
+
+
+@dataclass(frozen=True)
+class ScheduledCapacity:
+    """Scheduled action that sets the provisioned concurrency floor at a time of the week"""
+    week_days: Tuple[str, ...]
+    hour: int
+    minute: int
+    min_capacity: int
+
+    @property
+    def name(self) -> str:
+        return f"{'-'.join(self.week_days)}-{self.hour:02d}{self.minute:02d}-to-{self.min_capacity}"
+
+
+def _minute_of_day(value: str) -> int:
+    hour, minute = (int(part) for part in value.split(":"))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid time {value!r}, expected HH:MM")
+    return hour * 60 + minute
+
+
+def scheduled_functions(timetable: Dict) -> Dict[str, Dict]:
+    """Functions covered by the timetable and their settings ({"scale": 1.0, "max": None})"""
+    return {name: settings or {} for name, settings in (timetable or {}).get("functions", {}).items()}
+
+
+def capacity_timeline(timetable: Dict, function_name: str, baseline: int = 0) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Provisioned concurrency each function needs during the week.
+
+    Each session of app_config["provisioned_schedule"]["sessions"] ({"days": [...], "start": "HH:MM",
+    "end": "HH:MM", "concurrency": n}) asks for ceil(n * scale) environments from `lead_minutes`
+    before its start until its end; overlapping sessions take the largest value, and the rest of
+    the day falls back to `baseline`.
+
+    :return: For each day, the (minute of day, capacity) points where the capacity changes.
+    """
+    settings = scheduled_functions(timetable).get(function_name, {})
+    scale = float(settings.get("scale", 1.0))
+    lead_minutes = int(timetable.get("lead_minutes", DEFAULT_LEAD_MINUTES))
+
+    windows: Dict[str, List[Tuple[int, int, int]]] = {day: [] for day in WEEK_DAYS}
+    for session in timetable.get("sessions", []):
+        start, end = _minute_of_day(session["start"]), _minute_of_day(session["end"])
+        if end <= start:
+            raise ValueError(f"Session {session} must end after it starts on the same day")
+        capacity = max(baseline, math.ceil(int(session["concurrency"]) * scale))
+        for day in session["days"]:
+            if day not in windows:
+                raise ValueError(f"Invalid day {day!r}, expected one of {WEEK_DAYS}")
+            windows[day].append((max(0, start - lead_minutes), end, capacity))
+
+    timeline = {}
+    for day, day_windows in windows.items():
+        boundaries = sorted({point for start, end, _ in day_windows for point in (start, end)})
+        changes, current = [], baseline
+        for point in boundaries:
+            capacity = max([capacity for start, end, capacity in day_windows if start <= point < end], default=baseline)
+            if capacity != current:
+                changes.append((point, capacity))
+                current = capacity
+        timeline[day] = changes
+    return timeline
+
+
+def scheduled_actions(timetable: Dict, function_name: str, baseline: int = 0) -> List[ScheduledCapacity]:
+    """
+    Scheduled actions of a function, merging the days that change capacity at the same time.
+
+    :return: Actions ordered by time of day.
+    """
+    days_by_change: Dict[Tuple[int, int], List[str]] = {}
+    for day, changes in capacity_timeline(timetable, function_name, baseline).items():
+        for change in changes:
+            days_by_change.setdefault(change, []).append(day)
+    return [
+        ScheduledCapacity(week_days=tuple(days), hour=point // 60, minute=point % 60, min_capacity=capacity)
+        for (point, capacity), days in sorted(days_by_change.items())
+    ]
+
+
+def max_capacity(timetable: Dict, function_name: str, baseline: int = 0) -> int:
+    """Ceiling of the scalable target: explicit "max" or twice the largest scheduled floor"""
+    settings = scheduled_functions(timetable).get(function_name, {})
+    if settings.get("max") is not None:
+        return int(settings["max"])
+    peak = max([capacity for changes in capacity_timeline(timetable, function_name, baseline).values() for _, capacity in changes], default=baseline)
+    return max(1, 2 * peak)
@@ -2,6 +2,8 @@ from aws_cdk import (
     Stack,
     RemovalPolicy,
     Duration,
+    TimeZone,
+    aws_applicationautoscaling as appscaling,
     aws_lambda_event_sources as lambda_event_sources,
     aws_lambda as _lambda,
     aws_dynamodb as dynamodb,
@@ -11,6 +13,8 @@ from aws_cdk import (
     aws_secretsmanager as secretsmanager,
     aws_s3_notifications as s3n,
     aws_apigateway as apigw,
+    aws_apigatewayv2 as apigwv2,
+    aws_apigatewayv2_integrations as apigwv2_integrations,
     CfnOutput
 )
 from constructs import Construct
@@ -18,13 +22,34 @@ from aje_cdk_libs.builders.resource_builder import ResourceBuilder
 from aje_cdk_libs.models.configs import *
 from aje_cdk_libs.constants.environments import Environments
 from constants.paths import Paths
+from constants.functions import (
+    FUNCTIONS,
+    FunctionSpec,
+    PerformanceProfile,
+    load_tuned_profiles,
+    merge_profile_overrides,
+    resolve_profile
+)
 from constants.layers import Layers
+from constants.request_models import model_name, request_schema
+from constants.schedules import (
+    DEFAULT_TARGET_UTILIZATION,
+    DEFAULT_TIME_ZONE,
+    max_capacity,
+    scheduled_actions,
+    scheduled_functions
+)
+from stacks.lambda_bundles import build_lambda_bundle
 import os
 from dotenv import load_dotenv
 import urllib.parse
 from aje_cdk_libs.constants.project_config import ProjectConfig
 
 class CdkAprendizajeGuiadoStack(Stack):
+    LAMBDA_RUNTIME = _lambda.Runtime.PYTHON_3_12
+    # Deliveries of a job message before it moves to the DLQ; the worker fails the job on the last one
+    JOBS_MAX_RECEIVE_COUNT = 3
+
     def __init__(self, scope: Construct, construct_id: str, project_config: ProjectConfig, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)         
         self.PROJECT_CONFIG = project_config        
@@ -35,9 +60,11 @@ class CdkAprendizajeGuiadoStack(Stack):
         # Create all resources
         self.create_dynamodb_tables()
         # self.create_s3_buckets()
+        self.create_sqs_queues()
         self.create_lambda_layers()
         self.create_lambda_functions()
         self.create_api_gateway()
+        self.create_websocket_api()
         self.create_outputs()
     
     def create_dynamodb_tables(self):
@@ -85,6 +112,50 @@ class CdkAprendizajeGuiadoStack(Stack):
             removal_policy=RemovalPolicy.DESTROY
         )
         self.learning_path_history_table = self.builder.build_dynamodb_table(dynamodb_config)
+        
+        # Bedrock Governor State Table (límite AIMD y cupos de concurrencia compartidos)
+        dynamodb_config = DynamoDBConfig(
+            table_name="bedrock_governor_state",
+            partition_key="governor_key",
+            partition_key_type=dynamodb.AttributeType.STRING,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        self.bedrock_governor_table = self.builder.build_dynamodb_table(dynamodb_config)
+        # Slot leases carry a ttl so that those left by crashed invocations are deleted;
+        # the AIMD limit items have none and persist
+        self.bedrock_governor_table.node.default_child.time_to_live_specification = dynamodb.CfnTable.TimeToLiveSpecificationProperty(
+            attribute_name="ttl",
+            enabled=True
+        )
+        
+        # Generation Jobs Table (generaciones asíncronas)
+        dynamodb_config = DynamoDBConfig(
+            table_name="generation_jobs",
+            partition_key="job_id",
+            partition_key_type=dynamodb.AttributeType.STRING,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        self.generation_jobs_table = self.builder.build_dynamodb_table(dynamodb_config)
+        # JobsHelper sets a ttl on every job so finished jobs and their payloads are deleted
+        self.generation_jobs_table.node.default_child.time_to_live_specification = dynamodb.CfnTable.TimeToLiveSpecificationProperty(
+            attribute_name="ttl",
+            enabled=True
+        )
+
+        # Idempotency Table (retries of the API POST endpoints receive the original result)
+        dynamodb_config = DynamoDBConfig(
+            table_name="idempotency",
+            partition_key="idempotency_key",
+            partition_key_type=dynamodb.AttributeType.STRING,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        self.idempotency_table = self.builder.build_dynamodb_table(dynamodb_config)
+        # Completed records expire after IDEMPOTENCY_TTL_SECONDS; expired ones are also ignored
+        # by idempotency_helper until DynamoDB deletes them
+        self.idempotency_table.node.default_child.time_to_live_specification = dynamodb.CfnTable.TimeToLiveSpecificationProperty(
+            attribute_name="ttl",
+            enabled=True
+        )
 
     '''
     def create_s3_buckets(self):
@@ -98,6 +169,29 @@ class CdkAprendizajeGuiadoStack(Stack):
         self.resources_bucket = self.builder.build_s3_bucket(s3_config)
     '''
     
+    def create_sqs_queues(self):
+        """Create SQS queues for asynchronous generation jobs"""
+        # El visibility timeout cubre varias veces el timeout del worker, como recomienda AWS para SQS + Lambda
+        self.generation_jobs_dlq = sqs.Queue(
+            self,
+            "GenerationJobsDLQ",
+            retention_period=Duration.days(4)
+        )
+        
+        self.generar_caso_jobs_queue = sqs.Queue(
+            self,
+            "GenerarCasoJobsQueue",
+            visibility_timeout=Duration.seconds(720),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=self.JOBS_MAX_RECEIVE_COUNT, queue=self.generation_jobs_dlq)
+        )
+        
+        self.generar_ruta_caso_jobs_queue = sqs.Queue(
+            self,
+            "GenerarRutaCasoJobsQueue",
+            visibility_timeout=Duration.seconds(720),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=self.JOBS_MAX_RECEIVE_COUNT, queue=self.generation_jobs_dlq)
+        )
+    
     def create_lambda_layers(self):
         """Create or reference required Lambda layers"""
         self.lambda_layer_powertools = _lambda.LayerVersion.from_layer_version_arn(
@@ -129,9 +223,31 @@ class CdkAprendizajeGuiadoStack(Stack):
             "LambdaRequestsLayer",
             layer_version_arn=self.Layers.AWS_LAMBDA_LAYERS.get("layer_requests")
         )
+        
+        self.lambda_layer_numpy = _lambda.LayerVersion.from_layer_version_arn(
+            self,
+            "LambdaNumpyLayer",
+            layer_version_arn=self.Layers.AWS_LAMBDA_LAYERS.get("layer_numpy")
+        )
+        
+        self.lambda_layer_aprendizaje_libs = _lambda.LayerVersion(
+            self,
+            "LambdaAprendizajeLibsLayer",
+            code=_lambda.Code.from_asset(f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_LAYER}/aprendizaje_libs"),
+            compatible_runtimes=[self.LAMBDA_RUNTIME],
+            description="Utilidades compartidas de aprendizaje guiado"
+        )
+
+    def bundle_code(self, group: str, handler_name: str) -> str:
+        """Build the per-function package (handler code and bytecode only) and return its path"""
+        return build_lambda_bundle(
+            source_dir=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/{group}/{handler_name}",
+            output_dir=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_BUNDLES}/{group}-{handler_name}",
+            runtime_name=self.LAMBDA_RUNTIME.name
+        )
 
     def create_lambda_functions(self):
-        """Create all Lambda functions needed for the chatbot"""
+        """Create the Lambda functions declared in constants/functions.py"""
         
         # Common environment variables for all Lambda functions
         common_env_vars = {
@@ -141,198 +257,202 @@ class CdkAprendizajeGuiadoStack(Stack):
             "DYNAMO_CASE_HISTORY_TABLE": self.case_history_table.table_name,
             "DYNAMO_EVALUATION_HISTORY_TABLE": self.evaluation_history_table.table_name,
             "DYNAMO_REGENERATED_CHALLENGES_HISTORY_TABLE": self.regenerated_challenges_history_table.table_name,
-            "DYNAMO_LEARNING_PATH_HISTORY_TABLE": self.learning_path_history_table.table_name
+            "DYNAMO_LEARNING_PATH_HISTORY_TABLE": self.learning_path_history_table.table_name,
+            "DYNAMO_BEDROCK_GOVERNOR_TABLE": self.bedrock_governor_table.table_name,
+            "DYNAMO_GENERATION_JOBS_TABLE": self.generation_jobs_table.table_name,
+            "DYNAMO_IDEMPOTENCY_TABLE": self.idempotency_table.table_name,
+            # SSM and Secrets Manager are read during init, before Lambda opens the trace segment
+            "AWS_XRAY_CONTEXT_MISSING": "IGNORE_ERROR"
         }
-        
-        # Create generar_ruta Lambda function
-        function_name = "ruta-estandar-generar_ruta"
-        handler_name = "generar_ruta"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/ruta-estandar",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=1024,
-            timeout=Duration.seconds(60),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs, self.lambda_layer_pinecone]
-        )
-        self.ruta_estandar_generar_ruta_lambda = self.builder.build_lambda_function(lambda_config)
 
-        # Create evaluar Lambda function
-        function_name = "ruta-estandar-evaluar"
-        handler_name = "evaluar"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/ruta-estandar",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=512,
-            timeout=Duration.seconds(30),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.ruta_estandar_evaluar_lambda = self.builder.build_lambda_function(lambda_config)
-        
-        # Create feedback Lambda function
-        function_name = "ruta-estandar-feedback"
-        handler_name = "feedback"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/ruta-estandar",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=512,
-            timeout=Duration.seconds(30),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.ruta_estandar_feedback_lambda = self.builder.build_lambda_function(lambda_config)
-        
-        # Create regenerar_reto Lambda function
-        function_name = "ruta-estandar-regenerar_reto"
-        handler_name = "regenerar_reto"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/ruta-estandar",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=512,
-            timeout=Duration.seconds(30),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.ruta_estandar_regenerar_reto_lambda = self.builder.build_lambda_function(lambda_config)
+        layers = {
+            "powertools": self.lambda_layer_powertools,
+            "aje_libs": self.lambda_layer_aje_libs,
+            "pinecone": self.lambda_layer_pinecone,
+            "aprendizaje_libs": self.lambda_layer_aprendizaje_libs,
+            "numpy": self.lambda_layer_numpy
+        }
 
+        policies = {
+            "bedrock": iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "bedrock:InvokeModel",
+                    "bedrock:InvokeModelWithResponseStream",
+                    "bedrock:Converse"
+                ],
+                resources=["*"]
+            ),
+            "ssm": iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:GetParameter",
+                    "ssm:GetParameters"
+                ],
+                resources=["*"]
+            ),
+            "secrets": iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "secretsmanager:GetSecretValue"
+                ],
+                resources=["*"]
+            ),
+            # Lectura de los índices vectoriales locales que exporta add_resource
+            "vector_index": iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "s3:GetObject"
+                ],
+                resources=["*"]
+            ),
+            "tracing": iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "xray:PutTraceSegments",
+                    "xray:PutTelemetryRecords"
+                ],
+                resources=["*"]
+            )
+        }
+        tracing_enabled = self.PROJECT_CONFIG.app_config.get("tracing_enabled", True)
 
-        # Create generar_caso Lambda function
-        function_name = "metodo-caso-generar_caso"
-        handler_name = "generar_caso"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/metodo-caso",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=1024,
-            timeout=Duration.seconds(60),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.metodo_caso_generar_caso_lambda = self.builder.build_lambda_function(lambda_config)
+        # Per-environment tuning without editing the registry, see resolve_profile; the sizes
+        # measured with tools/tune_memory.py apply first and app_config can still override them
+        profile_overrides = merge_profile_overrides(
+            load_tuned_profiles(),
+            self.PROJECT_CONFIG.app_config.get("function_profiles", {})
+        )
+        # Los workers consumen de SQS; max_concurrency limita las generaciones simultáneas
+        # independientemente de la concurrencia de solicitudes del API
+        worker_max_concurrency = self.PROJECT_CONFIG.app_config.get("generation_worker_max_concurrency", 5)
 
-        # Create generar_ruta Lambda function
-        function_name = "metodo-caso-generar_ruta"
-        handler_name = "generar_ruta"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/metodo-caso",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=1024,
-            timeout=Duration.seconds(60),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.metodo_caso_generar_ruta_lambda = self.builder.build_lambda_function(lambda_config)
+        timetable = self.PROJECT_CONFIG.app_config.get("provisioned_schedule", {})
+        unknown_functions = set(scheduled_functions(timetable)) - {spec.name for spec in FUNCTIONS}
+        if unknown_functions:
+            raise ValueError(f"provisioned_schedule references unknown functions: {sorted(unknown_functions)}")
 
-        # Create evaluar Lambda function
-        function_name = "metodo-caso-evaluar"
-        handler_name = "evaluar"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/metodo-caso",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=512,
-            timeout=Duration.seconds(30),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.metodo_caso_evaluar_lambda = self.builder.build_lambda_function(lambda_config)
+        # Function (or provisioned alias) that API Gateway and SQS invoke, by function name
+        self.function_targets = {}
+        for spec in FUNCTIONS:
+            profile = resolve_profile(spec, profile_overrides, self.PROJECT_CONFIG.environment.value)
+            # Layers imported by ARN can carry native code (numpy); a runtime or architecture mismatch only
+            # shows up at import time, so fail the synth instead
+            incompatible = self.Layers.incompatible_layers(spec.layers, self.LAMBDA_RUNTIME.name, profile.architecture)
+            if incompatible:
+                raise ValueError(
+                    f"{spec.name}: layers {incompatible} are not declared compatible with "
+                    f"{self.LAMBDA_RUNTIME.name}/{profile.architecture} in aws_lambda_layer_compatibility"
+                )
+            environment = dict(common_env_vars)
+            if spec.jobs_queue:
+                environment["GENERATION_JOBS_QUEUE_URL"] = getattr(self, spec.jobs_queue).queue_url
+            if spec.event_queue:
+                environment["JOBS_MAX_RECEIVE_COUNT"] = str(self.JOBS_MAX_RECEIVE_COUNT)
 
-        # Create feedback Lambda function
-        function_name = "metodo-caso-feedback"
-        handler_name = "feedback"
-        lambda_config = LambdaConfig(
-            function_name=function_name,
-            handler=f"{handler_name}/lambda_function.lambda_handler",
-            code_path=f"{self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE}/metodo-caso",
-            runtime=_lambda.Runtime.PYTHON_3_11,
-            memory_size=512,
-            timeout=Duration.seconds(30),
-            environment=common_env_vars,
-            layers=[self.lambda_layer_powertools, self.lambda_layer_aje_libs]
-        )
-        self.metodo_caso_feedback_lambda = self.builder.build_lambda_function(lambda_config)
+            lambda_config = LambdaConfig(
+                function_name=spec.name,
+                handler=f"{spec.handler_name}/lambda_function.{spec.entry}",
+                code_path=self.bundle_code(spec.group, spec.handler_name),
+                runtime=self.LAMBDA_RUNTIME,
+                memory_size=profile.memory_size,
+                timeout=Duration.seconds(profile.timeout_seconds),
+                environment=environment,
+                layers=[layers[layer] for layer in spec.layers]
+            )
+            function = self.builder.build_lambda_function(lambda_config)
+            setattr(self, spec.attribute, function)
+            self.function_targets[spec.name] = self.apply_performance_profile(spec, function, profile)
 
-        
-        # Grant permissions
-        self.learning_path_history_table.grant_read_write_data(self.ruta_estandar_generar_ruta_lambda)
-        self.learning_path_history_table.grant_read_write_data(self.metodo_caso_generar_ruta_lambda)
+            for table_attribute, access in spec.tables.items():
+                table = getattr(self, table_attribute)
+                if access == "read":
+                    table.grant_read_data(function)
+                else:
+                    table.grant_read_write_data(function)
+            for policy in spec.policies:
+                function.add_to_role_policy(policies[policy])
+            if tracing_enabled:
+                # Active tracing: Lambda samples the invocation segment and tracing_helper adds
+                # the stage, Bedrock, Pinecone and DynamoDB subsegments
+                function.node.default_child.tracing_config = _lambda.CfnFunction.TracingConfigProperty(mode="Active")
+                function.add_to_role_policy(policies["tracing"])
 
-        self.evaluation_history_table.grant_read_write_data(self.ruta_estandar_evaluar_lambda)
-        self.evaluation_history_table.grant_read_write_data(self.metodo_caso_evaluar_lambda)
+            if spec.jobs_queue:
+                getattr(self, spec.jobs_queue).grant_send_messages(function)
+            if spec.event_queue:
+                self.function_targets[spec.name].add_event_source(
+                    lambda_event_sources.SqsEventSource(
+                        getattr(self, spec.event_queue),
+                        batch_size=1,
+                        max_concurrency=worker_max_concurrency
+                    )
+                )
 
-        self.regenerated_challenges_history_table.grant_read_write_data(self.ruta_estandar_regenerar_reto_lambda)
+    def apply_performance_profile(self, spec: FunctionSpec, function: _lambda.Function, profile: PerformanceProfile) -> _lambda.IFunction:
+        """
+        Apply the profile settings LambdaConfig does not expose and return the invocation target:
+        a "live" alias when the function has provisioned concurrency (fixed or scheduled) or
+        SnapStart (only published versions are restored from the snapshot), the function otherwise.
+        """
+        cfn_function = function.node.default_child
+        cfn_function.architectures = [profile.architecture]
+        if profile.reserved_concurrency is not None:
+            cfn_function.reserved_concurrent_executions = profile.reserved_concurrency
+        if profile.ephemeral_storage_mb != 512:
+            cfn_function.ephemeral_storage = _lambda.CfnFunction.EphemeralStorageProperty(size=profile.ephemeral_storage_mb)
 
-        self.case_history_table.grant_read_write_data(self.metodo_caso_generar_caso_lambda)
-        
-        # Grant Bedrock permissions to Lambda functions
-        bedrock_policy = iam.PolicyStatement(
-            effect=iam.Effect.ALLOW,
-            actions=[
-                "bedrock:InvokeModel",
-                "bedrock:InvokeModelWithResponseStream",
-                "bedrock:Converse"
-            ],
-            resources=["*"]
+        timetable = self.PROJECT_CONFIG.app_config.get("provisioned_schedule", {})
+        scheduled = spec.name in scheduled_functions(timetable)
+        provisioned = bool(profile.provisioned_concurrency) or scheduled
+        # Lambda rejects SnapStart together with provisioned concurrency; the latter wins
+        snap_start = profile.snap_start and not provisioned
+        if snap_start:
+            cfn_function.snap_start = _lambda.CfnFunction.SnapStartProperty(apply_on="PublishedVersions")
+        if not provisioned and not snap_start:
+            return function
+        alias = _lambda.Alias(
+            self,
+            f"{spec.name}-live",
+            alias_name="live",
+            version=function.current_version,
+            # With a timetable the provisioned concurrency is managed by Application Auto Scaling
+            provisioned_concurrent_executions=None if scheduled else profile.provisioned_concurrency or None
         )
-        
-        # Grant Bedrock permissions to Lambda functions
-        ssm_policy = iam.PolicyStatement(
-            effect=iam.Effect.ALLOW,
-            actions=[
-                "ssm:GetParameter",
-                "ssm:GetParameters"
-            ],
-            resources=["*"]
+        if scheduled:
+            self.schedule_provisioned_concurrency(spec, alias, profile.provisioned_concurrency, timetable)
+        return alias
+
+    def schedule_provisioned_concurrency(self, spec: FunctionSpec, alias: _lambda.Alias, baseline: int, timetable: dict):
+        """
+        Follow the academic timetable of app_config["provisioned_schedule"] with provisioned concurrency:
+        scheduled actions raise the floor before each session and lower it after, and a target-tracking
+        policy on utilization absorbs bursts above the floor. Example:
+
+        {"time_zone": "America/Lima", "lead_minutes": 10, "target_utilization": 0.7,
+         "functions": {"ruta-estandar-evaluar": {"scale": 1.0}, "ruta-estandar-generar_ruta": {"scale": 0.5, "max": 40}},
+         "sessions": [{"days": ["MON", "WED", "FRI"], "start": "08:00", "end": "10:00", "concurrency": 20}]}
+        """
+        scaling = alias.add_auto_scaling(
+            min_capacity=baseline,
+            max_capacity=max_capacity(timetable, spec.name, baseline)
         )
-        
-        secrets_policy = iam.PolicyStatement(
-            effect=iam.Effect.ALLOW,
-            actions=[
-                "secretsmanager:GetSecretValue"                
-            ],
-            resources=["*"]
+        time_zone = TimeZone.of(timetable.get("time_zone", DEFAULT_TIME_ZONE))
+        for action in scheduled_actions(timetable, spec.name, baseline):
+            scaling.scale_on_schedule(
+                action.name,
+                schedule=appscaling.Schedule.cron(
+                    minute=str(action.minute),
+                    hour=str(action.hour),
+                    week_day=",".join(action.week_days)
+                ),
+                min_capacity=action.min_capacity,
+                time_zone=time_zone
+            )
+        scaling.scale_on_utilization(
+            utilization_target=timetable.get("target_utilization", DEFAULT_TARGET_UTILIZATION)
         )
         
-        self.ruta_estandar_generar_ruta_lambda.add_to_role_policy(bedrock_policy)
-        self.ruta_estandar_evaluar_lambda.add_to_role_policy(bedrock_policy)
-        self.ruta_estandar_feedback_lambda.add_to_role_policy(bedrock_policy)
-        self.ruta_estandar_regenerar_reto_lambda.add_to_role_policy(bedrock_policy)
-        self.metodo_caso_generar_caso_lambda.add_to_role_policy(bedrock_policy)
-        self.metodo_caso_generar_ruta_lambda.add_to_role_policy(bedrock_policy)
-        self.metodo_caso_evaluar_lambda.add_to_role_policy(bedrock_policy)
-        self.metodo_caso_feedback_lambda.add_to_role_policy(bedrock_policy)
-        
-        self.ruta_estandar_generar_ruta_lambda.add_to_role_policy(ssm_policy)
-        self.ruta_estandar_evaluar_lambda.add_to_role_policy(ssm_policy)
-        self.ruta_estandar_feedback_lambda.add_to_role_policy(ssm_policy)
-        self.ruta_estandar_regenerar_reto_lambda.add_to_role_policy(ssm_policy)
-        self.metodo_caso_generar_caso_lambda.add_to_role_policy(ssm_policy)
-        self.metodo_caso_generar_ruta_lambda.add_to_role_policy(ssm_policy)
-        self.metodo_caso_evaluar_lambda.add_to_role_policy(ssm_policy)
-        self.metodo_caso_feedback_lambda.add_to_role_policy(ssm_policy)
-
-        self.ruta_estandar_generar_ruta_lambda.add_to_role_policy(secrets_policy)
-        self.ruta_estandar_evaluar_lambda.add_to_role_policy(secrets_policy)
-        self.ruta_estandar_feedback_lambda.add_to_role_policy(secrets_policy)
-        self.ruta_estandar_regenerar_reto_lambda.add_to_role_policy(secrets_policy)
-        self.metodo_caso_generar_caso_lambda.add_to_role_policy(secrets_policy)
-        self.metodo_caso_generar_ruta_lambda.add_to_role_policy(secrets_policy)
-        self.metodo_caso_evaluar_lambda.add_to_role_policy(secrets_policy)
-        self.metodo_caso_feedback_lambda.add_to_role_policy(secrets_policy)
-        
     def create_api_gateway(self):
         """
         Method to create the REST-API Gateway for exposing the chatbot
@@ -347,6 +467,8 @@ class CdkAprendizajeGuiadoStack(Stack):
                 stage_name=self.PROJECT_CONFIG.environment.value.lower(),
                 description=f"REST API for {self.PROJECT_CONFIG.project_name}",
                 metrics_enabled=True,
+                # Starts the trace that the Lambda integrations continue
+                tracing_enabled=self.PROJECT_CONFIG.app_config.get("tracing_enabled", True),
             ),    
             default_method_options=apigw.MethodOptions(
                 api_key_required=False,
@@ -356,35 +478,91 @@ class CdkAprendizajeGuiadoStack(Stack):
             cloud_watch_role=False,
         )
         
-        # Define REST-API resources
-        root_agent_api = self.api_ruta_estandar.root.add_resource("api")
-        root_agent_v1 = root_agent_api.add_resource("v1")
-
-        # Endpoints for the main functionalities
-        root_agent_generar_ruta_estandar = root_agent_v1.add_resource("generar_ruta_estandar")
-        root_agent_evaluar_reto_estandar = root_agent_v1.add_resource("evaluar_reto_estandar")
-        root_agent_feedback_estandar = root_agent_v1.add_resource("feedback_estandar")
-        root_agent_regenerar_reto_estandar = root_agent_v1.add_resource("regenerar_reto_estandar")
-
-        root_agent_generar_caso = root_agent_v1.add_resource("generar_caso")
-        root_agent_generar_ruta_caso = root_agent_v1.add_resource("generar_ruta_caso")
-        root_agent_evaluar_reto_caso = root_agent_v1.add_resource("evaluar_reto_caso")
-        root_agent_feedback_caso = root_agent_v1.add_resource("feedback_caso")
-
-        # Define all API-Lambda integrations for the API methods
-        root_agent_generar_ruta_estandar.add_method("POST", apigw.LambdaIntegration(self.ruta_estandar_generar_ruta_lambda))
-        root_agent_evaluar_reto_estandar.add_method("POST", apigw.LambdaIntegration(self.ruta_estandar_evaluar_lambda))
-        root_agent_feedback_estandar.add_method("POST", apigw.LambdaIntegration(self.ruta_estandar_feedback_lambda))
-        root_agent_regenerar_reto_estandar.add_method("POST", apigw.LambdaIntegration(self.ruta_estandar_regenerar_reto_lambda))
-
-        root_agent_generar_caso.add_method("POST", apigw.LambdaIntegration(self.metodo_caso_generar_caso_lambda))
-        root_agent_generar_ruta_caso.add_method("POST", apigw.LambdaIntegration(self.metodo_caso_generar_ruta_lambda))
-        root_agent_evaluar_reto_caso.add_method("POST", apigw.LambdaIntegration(self.metodo_caso_evaluar_lambda))
-        root_agent_feedback_caso.add_method("POST", apigw.LambdaIntegration(self.metodo_caso_feedback_lambda))
+        # Malformed bodies are rejected by the gateway without invoking (or cold starting) the Lambda
+        body_validator = self.api_ruta_estandar.add_request_validator(
+            "RequestBodyValidator",
+            request_validator_name="request-body",
+            validate_request_body=True
+        )
+        # Same body as validation_helper.bad_request_response in the handlers
+        self.api_ruta_estandar.add_gateway_response(
+            "BadRequestBodyResponse",
+            type=apigw.ResponseType.BAD_REQUEST_BODY,
+            status_code="400",
+            templates={
+                "application/json": (
+                    '{"success": false, "message": "Cuerpo de la solicitud inválido", '
+                    '"error": {"code": "INVALID_REQUEST", "details": "$util.escapeJavaScript($context.error.validationErrorString)"}}'
+                )
+            }
+        )
+        
+        # Define REST-API resources and Lambda integrations from the function registry
+        root_agent_v1 = self.api_ruta_estandar.root.add_resource("api").add_resource("v1")
+        for spec in FUNCTIONS:
+            for path, method in spec.routes:
+                method_options = {}
+                if method == "POST":
+                    # Model generated from the required fields list the handler validates
+                    model = self.api_ruta_estandar.add_model(
+                        model_name(path),
+                        model_name=model_name(path),
+                        content_type="application/json",
+                        schema=self.json_schema(request_schema(spec, path, self.Paths.LOCAL_ARTIFACTS_LAMBDA_CODE))
+                    )
+                    method_options = {"request_validator": body_validator, "request_models": {"application/json": model}}
+                root_agent_v1.resource_for_path(path).add_method(
+                    method,
+                    apigw.LambdaIntegration(self.function_targets[spec.name]),
+                    **method_options
+                )
         
         # Store the deployment stage for use in outputs
         self.deployment_stage = self.PROJECT_CONFIG.environment.value.lower()
         
+    @staticmethod
+    def json_schema(schema: dict) -> apigw.JsonSchema:
+        """Convert a request model dict (constants/request_models.py) into an API Gateway JsonSchema"""
+        return apigw.JsonSchema(
+            schema=apigw.JsonSchemaVersion.DRAFT4,
+            title=schema["title"],
+            type=apigw.JsonSchemaType.OBJECT,
+            required=schema["required"],
+            properties={
+                name: apigw.JsonSchema(type=apigw.JsonSchemaType[definition["type"].upper()]) if "type" in definition else apigw.JsonSchema()
+                for name, definition in schema["properties"].items()
+            }
+        )
+        
+    def create_websocket_api(self):
+        """
+        Method to create the WebSocket API used to push asynchronous job results.
+        """
+        jobs_websocket_integration = apigwv2_integrations.WebSocketLambdaIntegration(
+            "JobsWebSocketIntegration",
+            self.function_targets["jobs-websocket"]
+        )
+        self.api_jobs_websocket = apigwv2.WebSocketApi(
+            self,
+            f"{self.PROJECT_CONFIG.app_config['api_gw_name']}-jobs-ws-{self.PROJECT_CONFIG.environment.value.lower()}",
+            description=f"WebSocket API for {self.PROJECT_CONFIG.project_name} job notifications",
+            connect_route_options=apigwv2.WebSocketRouteOptions(integration=jobs_websocket_integration),
+            disconnect_route_options=apigwv2.WebSocketRouteOptions(integration=jobs_websocket_integration)
+        )
+        self.api_jobs_websocket_stage = apigwv2.WebSocketStage(
+            self,
+            "JobsWebSocketStage",
+            web_socket_api=self.api_jobs_websocket,
+            stage_name=self.PROJECT_CONFIG.environment.value.lower(),
+            auto_deploy=True
+        )
+        
+        for spec in FUNCTIONS:
+            if spec.notifies_websocket:
+                worker_lambda = getattr(self, spec.attribute)
+                worker_lambda.add_environment("WEBSOCKET_CALLBACK_URL", self.api_jobs_websocket_stage.callback_url)
+                self.api_jobs_websocket.grant_manage_connections(worker_lambda)
+        
     def create_outputs(self):
         """Create CloudFormation outputs for important resources"""
         
@@ -397,4 +575,8 @@ class CdkAprendizajeGuiadoStack(Stack):
         CfnOutput(self, "ApiGatewayUrl", 
                 value=f"https://{self.api_ruta_estandar.rest_api_id}.execute-api.{self.region}.amazonaws.com/{self.deployment_stage}/",
                 description="API Gateway URL")
+        
+        CfnOutput(self, "JobsWebSocketUrl", 
+                value=self.api_jobs_websocket_stage.url,
+                description="WebSocket URL for asynchronous job notifications")
          
\ No newline at end of file
@@ -0,0 +1,41 @@
+import compileall
+import os
+import py_compile
+import shutil
+import sys
+
+# Files that never belong in a function package
+EXCLUDED_PATTERNS = ("__pycache__", "*.pyc", "tests", "test_*.py", ".pytest_cache")
+
+
+def build_lambda_bundle(source_dir: str, output_dir: str, runtime_name: str) -> str:
+    """
+    Build the deployment package of a single zip-based Lambda function.
+
+    The package holds only the handler directory (so `<handler>/lambda_function.<entry>` keeps
+    working as the handler path) instead of every sibling handler of its group. When the local
+    interpreter matches the function runtime the sources are precompiled with unchecked-hash
+    .pyc files: /var/task is read-only, so without them every cold start compiles the handler,
+    and hash-based .pyc files keep the asset hash stable across builds.
+
+    :param source_dir: Handler directory, e.g. artifacts/aws-lambda/code/ruta-estandar/generar_ruta.
+    :param output_dir: Directory of the bundle; it is rebuilt on every synth.
+    :param runtime_name: Lambda runtime name, e.g. "python3.12".
+    :return: Path of the bundle, to be used as the function code_path.
+    """
+    handler_name = os.path.basename(os.path.normpath(source_dir))
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    target_dir = os.path.join(output_dir, handler_name)
+    shutil.copytree(source_dir, target_dir, ignore=shutil.ignore_patterns(*EXCLUDED_PATTERNS))
+
+    local_runtime = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    if local_runtime == runtime_name:
+        compileall.compile_dir(
+            target_dir,
+            quiet=1,
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+        )
+    else:
+        print(f"Skipping bytecode for {handler_name}: local {local_runtime} does not match {runtime_name}", file=sys.stderr)
+    return output_dir
@@ -0,0 +1,23 @@
+import boto3
+import pytest
+
+from aprendizaje_libs.helpers import client_helper, snapstart_helper
+from tools.lambda_harness import FakeAws, fake_services, load_handler
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture
+def fake_aws(monkeypatch):
+    """AWS y Pinecone simulados; restaura la sesión de boto3 y los hooks de SnapStart al terminar."""
+    monkeypatch.setattr(boto3, "DEFAULT_SESSION", None)
+    monkeypatch.setattr(client_helper, "_client_factory", None)
+    monkeypatch.setattr(snapstart_helper, "_hooks", {"before_snapshot": [], "after_restore": []})
+    with fake_services(FakeAws()) as fake:
+        yield fake
+
+
+@pytest.fixture
+def handler_loader(fake_aws):
+    """Carga un handler (grupo, nombre) dentro de los servicios simulados."""
+    return load_handler
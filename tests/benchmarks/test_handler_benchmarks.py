@@ -0,0 +1,85 @@
+"""
+Línea base del costo Python de los handlers, sin latencia de red ni del modelo.
+
+Ejecución y publicación de resultados (JSON de pytest-benchmark, con commit y máquina):
+    python -m pytest tests/benchmarks --benchmark-json=benchmark-results.json
+    python -m pytest tests/benchmarks --benchmark-autosave   # historial en .benchmarks/ para comparar con --benchmark-compare
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from constants.functions import FUNCTIONS
+from tools.lambda_harness import ROOT, FakeContext, build_event, load_corpus
+
+CORPUS_DIR = os.path.join(ROOT, "tools", "corpus")
+
+# Los ocho handlers que llaman al modelo, con la entrada del corpus que se invoca
+API_FUNCTIONS = [
+    spec for spec in FUNCTIONS
+    if spec.routes and spec.group != "jobs" and os.path.exists(os.path.join(CORPUS_DIR, f"{spec.name}.jsonl"))
+]
+
+COLD_START_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+from tools.lambda_harness import fake_services, load_handler
+with fake_services():
+    load_handler({group!r}, {handler_name!r})
+"""
+
+
+def corpus_entries(name):
+    return load_corpus(os.path.join(CORPUS_DIR, f"{name}.jsonl"))
+
+
+@pytest.mark.parametrize("spec", API_FUNCTIONS, ids=lambda spec: spec.name)
+def test_cold_start(benchmark, spec):
+    """Arranque en frío completo: intérprete nuevo, importaciones e inicialización del módulo."""
+    script = COLD_START_SCRIPT.format(root=ROOT, group=spec.group, handler_name=spec.handler_name)
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", script],),
+        kwargs={"check": True, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL},
+        rounds=3,
+        iterations=1
+    )
+
+
+@pytest.mark.parametrize("spec", API_FUNCTIONS, ids=lambda spec: spec.name)
+def test_module_init(benchmark, handler_loader, spec):
+    """Inicialización del módulo con las dependencias ya importadas (lo que SnapStart guarda en el snapshot)."""
+    benchmark(handler_loader, spec.group, spec.handler_name)
+
+
+@pytest.mark.parametrize(
+    "spec, entry",
+    [(spec, entry) for spec in API_FUNCTIONS for entry in corpus_entries(spec.name)],
+    ids=lambda value: value.name if hasattr(value, "name") else value.get("label")
+)
+def test_invocation_overhead(benchmark, fake_aws, handler_loader, spec, entry):
+    """Costo de una invocación con respuestas del modelo instantáneas."""
+    handler = getattr(handler_loader(spec.group, spec.handler_name), spec.entry)
+    event = build_event(entry)
+
+    def invoke():
+        fake_aws.model_outputs.extend(entry.get("model_outputs", []))
+        return handler(event, FakeContext(spec.name, timeout_seconds=spec.profile.timeout_seconds))
+
+    # Una invocación previa valida la respuesta y registra las llamadas al modelo que hace
+    response = invoke()
+    assert response.get("statusCode", 200) == 200, json.dumps(response, ensure_ascii=False)[:500]
+    benchmark.extra_info["model_calls"] = fake_aws.model_calls
+
+    benchmark(invoke)
+
+
+def test_invocation_overhead_of_job_status(benchmark, handler_loader):
+    """Consulta de trabajos: solo DynamoDB, sin modelo."""
+    handler = handler_loader("jobs", "consultar").lambda_handler
+    event = build_event(corpus_entries("jobs-consultar")[0])
+
+    benchmark(handler, event, FakeContext("jobs-consultar", timeout_seconds=10))
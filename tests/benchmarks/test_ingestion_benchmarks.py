@@ -0,0 +1,59 @@
+"""
+Etapas de ingesta de add_resource sobre documentos sintéticos: partición en chunks, hash del
+archivo y construcción de vectores (embeddings simulados, upsert e índice local exportado).
+"""
+import io
+import json
+import random
+import uuid
+
+import pytest
+from botocore.response import StreamingBody
+
+from tools.lambda_harness import EMBEDDING_DIMENSION, fake_embedding
+
+pytest.importorskip("requests")
+
+# Palabras por documento: una guía corta y un libro de curso
+DOCUMENT_WORDS = {"10k": 10_000, "100k": 100_000}
+VOCABULARY = "indicador eficiencia proceso mejora continua almacén inventario rotación demanda calidad costo servicio".split()
+
+
+def synthetic_text(words, seed=7):
+    generator = random.Random(seed)
+    return " ".join(generator.choice(VOCABULARY) for _ in range(words))
+
+
+@pytest.fixture
+def add_resource(fake_aws, handler_loader):
+    # Un embedding fijo: el costo de generarlo no es parte de add_resource
+    payload = json.dumps({"embedding": fake_embedding("chunk", EMBEDDING_DIMENSION)}).encode("utf-8")
+    fake_aws.responses[("bedrock-runtime", "InvokeModel")] = lambda params: {"body": StreamingBody(io.BytesIO(payload), len(payload))}
+    return handler_loader("chatbot", "add_resource")
+
+
+@pytest.mark.parametrize("size", DOCUMENT_WORDS)
+def test_chunk_text(benchmark, add_resource, size):
+    text = synthetic_text(DOCUMENT_WORDS[size])
+    chunks = benchmark(add_resource.chunk_text, text)
+    assert chunks
+
+
+@pytest.mark.parametrize("size", DOCUMENT_WORDS)
+def test_file_hash(benchmark, add_resource, tmp_path, size):
+    path = tmp_path / "documento.txt"
+    path.write_text(synthetic_text(DOCUMENT_WORDS[size]), encoding="utf-8")
+    benchmark.extra_info["bytes"] = path.stat().st_size
+    benchmark(add_resource.generate_file_hash, str(path))
+
+
+@pytest.mark.parametrize("size", DOCUMENT_WORDS)
+def test_vector_building(benchmark, add_resource, monkeypatch, tmp_path, size):
+    text = synthetic_text(DOCUMENT_WORDS[size])
+    monkeypatch.setattr(add_resource.document_processor, "process_document", lambda file_path: text)
+    monkeypatch.setattr(add_resource, "DOWNLOAD_FOLDER", str(tmp_path))
+    metadata = {"resource_id": str(uuid.uuid4()), "resource_title": "Documento", "drive_id": "drive", "file_hash": "hash", "s3_path": "s3://bucket/key", "pinecone_ids": []}
+
+    ids = benchmark.pedantic(add_resource.process_document_to_pinecone, args=(str(tmp_path / "documento.pdf"), metadata), rounds=3, iterations=1)
+    benchmark.extra_info["chunks"] = len(ids)
+    assert ids
@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+LAMBDA_ARTIFACTS = ROOT / "artifacts" / "aws-lambda"
+
+# aje_libs se distribuye como wheel (importable directamente desde el zip) y
+# aprendizaje_libs como capa local; ambos se agregan al path para las pruebas.
+for path in (
+    LAMBDA_ARTIFACTS / "layer" / "aprendizaje_libs" / "python",
+    LAMBDA_ARTIFACTS / "docker" / "chatbot" / "add_resource" / "aje_libs-0.1.0-py3-none-any.whl",
+):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
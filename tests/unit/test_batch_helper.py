@@ -0,0 +1,50 @@
+import threading
+import time
+
+from aprendizaje_libs.helpers.batch_helper import error_details, map_bounded, save_batch_history
+from aprendizaje_libs.helpers.deadline_helper import DeadlineExceededError
+
+
+def test_map_bounded_keeps_order_and_isolates_failures():
+    def score(item):
+        if item == 2:
+            raise DeadlineExceededError("bedrock")
+        return item * 10
+
+    results = map_bounded(score, [1, 2, 3], max_concurrency=2)
+
+    assert [result.value for result in results] == [10, None, 30]
+    assert error_details(results[1].error)["code"] == "DEADLINE_EXCEEDED"
+
+
+def test_map_bounded_respects_max_concurrency():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def work(_):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    map_bounded(work, list(range(12)), max_concurrency=3)
+    assert peak[0] <= 3
+
+
+def test_failed_history_write_marks_the_items_as_failed():
+    results = [{"UsuarioId": 1, "success": True, "score": 0.8}, {"UsuarioId": 2, "success": False, "error": {"code": "DEADLINE_EXCEEDED"}}]
+    written = []
+
+    assert save_batch_history(written.append, {0: {"usuario_id": 1}}, results) is True
+    assert written == [[{"usuario_id": 1}]] and results[0]["success"] is True
+
+    def failing_table(put_items):
+        raise RuntimeError("ProvisionedThroughputExceededException")
+
+    assert save_batch_history(failing_table, {0: {"usuario_id": 1}}, results) is False
+    assert results[0]["success"] is False and results[0]["error"]["code"] == "HISTORY_WRITE_FAILED"
+    assert results[1]["error"]["code"] == "DEADLINE_EXCEEDED"
+    assert save_batch_history(failing_table, {}, results) is True
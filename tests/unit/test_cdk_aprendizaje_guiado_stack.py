@@ -0,0 +1,100 @@
+import pytest
+
+core = pytest.importorskip("aws_cdk")
+pytest.importorskip("aje_cdk_libs")
+
+import aws_cdk.assertions as assertions  # noqa: E402
+from aje_cdk_libs.constants.project_config import ProjectConfig  # noqa: E402
+
+from constants.functions import FUNCTIONS  # noqa: E402
+from stacks.cdk_aprendizaje_guiado_stack import CdkAprendizajeGuiadoStack  # noqa: E402
+from tools import check_layers  # noqa: E402
+
+LAYER_ARN = "arn:aws:lambda:${region}:${account}:layer:test:1"
+
+
+def synth_template(**app_config):
+    config = ProjectConfig.from_dict({
+        "project_name": "aprendizaje-guiado",
+        "author": "test",
+        "account_id": "123456789012",
+        "region_name": "us-east-1",
+        "environment": "DEV",
+        "separator": "-",
+        "app_config": {
+            "api_gw_name": "api-aprendizaje-guiado",
+            "artifacts": {
+                "local": "artifacts",
+                "aws_lambda_layers": {
+                    name: LAYER_ARN
+                    for name in ("layer_powertools", "layer_aje_libs", "layer_pinecone", "layer_docs", "layer_requests", "layer_numpy")
+                }
+            },
+            **app_config
+        }
+    })
+    app = core.App()
+    stack = CdkAprendizajeGuiadoStack(app, "cdk-aprendizaje-guiado", config, env=core.Environment(account="123456789012", region="us-east-1"))
+    return assertions.Template.from_stack(stack)
+
+
+def test_functions_from_the_registry_are_created():
+    template = synth_template()
+
+    functions = template.find_resources("AWS::Lambda::Function", {"Properties": {"Runtime": "python3.12"}})
+    assert len(functions) == len(FUNCTIONS)
+    handlers = sorted(resource["Properties"]["Handler"] for resource in functions.values())
+    assert handlers == sorted(f"{spec.handler_name}/lambda_function.{spec.entry}" for spec in FUNCTIONS)
+
+
+def test_tracing_is_enabled_on_functions_and_api():
+    template = synth_template()
+
+    traced = template.find_resources("AWS::Lambda::Function", {"Properties": {"TracingConfig": {"Mode": "Active"}}})
+    assert len(traced) == len(FUNCTIONS)
+    template.has_resource_properties("AWS::ApiGateway::Stage", {"TracingEnabled": True})
+
+
+def test_idempotency_table_expires_records():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
+        "TimeToLiveSpecification": {"AttributeName": "ttl", "Enabled": True}
+    })
+
+
+def test_governor_table_expires_slot_leases():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "governor_key", "KeyType": "HASH"}],
+        "TimeToLiveSpecification": {"AttributeName": "ttl", "Enabled": True}
+    })
+
+
+def test_generation_jobs_table_expires_jobs():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "job_id", "KeyType": "HASH"}],
+        "TimeToLiveSpecification": {"AttributeName": "ttl", "Enabled": True}
+    })
+
+
+def test_post_routes_validate_the_body_at_the_gateway():
+    template = synth_template()
+
+    post_routes = [route for spec in FUNCTIONS for route in spec.routes if route[1] == "POST"]
+    assert len(template.find_resources("AWS::ApiGateway::Model")) == len(post_routes)
+    template.has_resource_properties("AWS::ApiGateway::RequestValidator", {"ValidateRequestBody": True})
+    validated = template.find_resources("AWS::ApiGateway::Method", {"Properties": {"HttpMethod": "POST", "RequestValidatorId": assertions.Match.any_value()}})
+    assert len(validated) == len(post_routes)
+    template.has_resource_properties("AWS::ApiGateway::GatewayResponse", {"ResponseType": "BAD_REQUEST_BODY", "StatusCode": "400"})
+
+
+def test_arm64_requires_layers_declared_compatible():
+    assert check_layers.LAMBDA_RUNTIME == CdkAprendizajeGuiadoStack.LAMBDA_RUNTIME.name
+
+    with pytest.raises(ValueError, match="layer_powertools"):
+        synth_template(function_profiles={"dev": {"*": {"architecture": "arm64"}}})
@@ -0,0 +1,108 @@
+from aprendizaje_libs.helpers.challenge_helper import (
+    METODO_CASO_FORMAT,
+    RUTA_ESTANDAR_FORMAT,
+    parse_challenges,
+    render_challenges,
+    structure_challenges,
+)
+from aprendizaje_libs.helpers.deadline_helper import DeadlineExceededError
+
+RUTA = """@Titulo: Domina los Gráficos y Datos
+
+**@Reto:** Lectura de gráficos
+@Pregunta: ¿Qué muestra un histograma?
+@Respuesta Modelo: La distribución de frecuencias
+de una variable.
+@Conceptos Claves: Histograma, frecuencia, distribución.
+
+@Reto: Medidas de tendencia
+@Pregunta: ¿Cuándo conviene usar la mediana?
+@Respuesta Modelo: Cuando hay valores atípicos.
+@Conceptos Claves: Mediana, valores atípicos.
+"""
+
+
+def converse_response(text, input_tokens=100, output_tokens=50):
+    return {
+        "output": {"message": {"content": [{"text": text}]}},
+        "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens, "cacheReadInputTokens": 80}
+    }
+
+
+def test_parse_challenges_reads_sections_and_splits_concepts():
+    parsed = parse_challenges(RUTA)
+
+    assert parsed.titulo == "Domina los Gráficos y Datos"
+    assert len(parsed.retos) == 2
+    assert parsed.retos[0]["reto"] == "Lectura de gráficos"
+    assert parsed.retos[0]["respuesta_modelo"] == "La distribución de frecuencias\nde una variable."
+    assert parsed.retos[0]["conceptos_clave"] == ["Histograma", "frecuencia", "distribución"]
+
+    # Un reto sin su línea @Reto no se mezcla con el anterior
+    parsed = parse_challenges("@Reto: A\n@Pregunta: ¿x?\n@Pregunta: ¿y?\n@Respuesta Modelo: z")
+    assert parsed.retos == [{"reto": "A", "pregunta": "¿x?"}, {"pregunta": "¿y?", "respuesta_modelo": "z"}]
+
+
+def test_valid_output_is_not_repaired():
+    def repair(instructions):
+        raise AssertionError("no debe corregirse")
+
+    structured = structure_challenges(RUTA, RUTA_ESTANDAR_FORMAT, expected=2, repair=repair)
+
+    assert structured.valid
+    assert structured.repaired == []
+    assert parse_challenges(render_challenges(structured.titulo, structured.retos, RUTA_ESTANDAR_FORMAT)) == parse_challenges(RUTA)
+
+
+def test_single_malformed_challenge_is_repaired_with_one_small_call():
+    broken = RUTA.replace("@Respuesta Modelo: Cuando hay valores atípicos.\n", "")
+    calls = []
+
+    def repair(instructions):
+        calls.append(instructions)
+        return converse_response(
+            "@Reto: Medidas de tendencia\n@Pregunta: ¿Cuándo conviene usar la mediana?\n"
+            "@Respuesta Modelo: Cuando la distribución es asimétrica.\n@Conceptos Claves: Mediana, asimetría."
+        )
+
+    structured = structure_challenges(broken, RUTA_ESTANDAR_FORMAT, expected=2, repair=repair)
+
+    assert len(calls) == 1
+    assert "el reto 2 de 2" in calls[0]
+    assert "Lectura de gráficos" in calls[0]
+    assert structured.valid
+    assert structured.repaired == ["reto 2"]
+    assert structured.retos[1]["respuesta_modelo"] == "Cuando la distribución es asimétrica."
+    assert structured.usage == {"input_tokens": 100, "output_tokens": 50, "cache_read_tokens": 80, "cache_write_tokens": 0}
+
+
+def test_missing_challenge_count_and_too_many_defects_are_reported():
+    # Falta un reto de cinco: se genera solo ese reto
+    caso = "@Titulo: Caso\n\n" + "\n\n".join(
+        f"@Reto: R{i}\n@Contexto: C{i}\n@Pregunta: P{i}\n@Respuesta Modelo: M{i}\n@Conceptos Clave: T{i}, otro."
+        for i in range(4)
+    )
+    structured = structure_challenges(
+        caso,
+        METODO_CASO_FORMAT,
+        expected=5,
+        repair=lambda instructions: converse_response(
+            "@Reto: R4\n@Contexto: C4\n@Pregunta: P4\n@Respuesta Modelo: M4\n@Conceptos Clave: T4."
+        )
+    )
+    assert structured.valid
+    assert [reto["reto"] for reto in structured.retos] == ["R0", "R1", "R2", "R3", "R4"]
+    assert "@Conceptos Clave: T4." in render_challenges(structured.titulo, structured.retos, METODO_CASO_FORMAT)
+
+    # Más defectos que el máximo de correcciones: se devuelve con errores, sin llamadas
+    structured = structure_challenges("@Reto: Solo", RUTA_ESTANDAR_FORMAT, expected=3, repair=lambda _: 1 / 0)
+    assert not structured.valid
+    assert structured.errors[0] == "se esperaban 3 retos y se recibieron 1"
+
+    # Si el plazo se agota durante la corrección se devuelve la respuesta original con su error
+    def timeout(instructions):
+        raise DeadlineExceededError("repair")
+
+    structured = structure_challenges(RUTA.replace("@Titulo: Domina los Gráficos y Datos", ""), RUTA_ESTANDAR_FORMAT, expected=2, repair=timeout)
+    assert structured.errors == ["falta el título de la ruta"]
+    assert len(structured.retos) == 2
@@ -0,0 +1,32 @@
+import boto3
+from botocore.config import Config
+
+from aprendizaje_libs.helpers import client_helper
+from aprendizaje_libs.helpers.client_helper import ClientFactory, install_client_factory
+
+
+def test_clients_are_shared_and_tuned_per_service():
+    factory = ClientFactory(region_name="us-east-1")
+
+    dynamodb = factory.client("dynamodb")
+    assert factory.client("dynamodb") is dynamodb
+    assert dynamodb.meta.config.tcp_keepalive is True
+    assert dynamodb.meta.config.read_timeout == 5
+    assert dynamodb.meta.config.max_pool_connections == client_helper.MAX_POOL_CONNECTIONS
+    assert dynamodb.meta.config.retries["mode"] == "standard"
+
+    # La Config del llamador tiene prioridad y el cliente no se guarda en caché
+    bedrock = factory.client("bedrock-runtime", config=Config(read_timeout=7))
+    assert bedrock is not factory.client("bedrock-runtime", config=Config(read_timeout=7))
+    assert bedrock.meta.config.read_timeout == 7
+    assert bedrock.meta.config.retries["mode"] == "adaptive"
+
+
+def test_install_replaces_default_session(monkeypatch):
+    monkeypatch.setattr(client_helper, "_client_factory", None)
+    monkeypatch.setattr(boto3, "DEFAULT_SESSION", None)
+
+    factory = install_client_factory()
+
+    assert boto3.DEFAULT_SESSION is factory
+    assert install_client_factory() is factory
@@ -0,0 +1,37 @@
+from aprendizaje_libs.helpers.context_helper import assemble_context, chunks_from_matches, merge_adjacent
+from aprendizaje_libs.helpers.prompt_helper import estimate_tokens
+
+WORDS = [f"palabra{i}" for i in range(60)]
+
+
+def match(text, score, **metadata):
+    return {"score": score, "metadata": {"resource_id": "10", "text": text, **metadata}}
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    # Mismo solapamiento de 20 palabras que chunk_text de add_resource
+    first = " ".join(WORDS[:40])
+    second = " ".join(WORDS[20:60])
+
+    merged = merge_adjacent(chunks_from_matches([match(second, 0.7), match(first, 0.9)]))
+
+    assert len(merged) == 1
+    assert merged[0].text == " ".join(WORDS)
+    assert merged[0].score == 0.9
+
+
+def test_near_duplicates_are_dropped_and_budget_is_respected():
+    base = "La fotosíntesis convierte la energía luminosa en energía química dentro de los cloroplastos de la hoja"
+    other = "El ciclo del agua incluye evaporación condensación precipitación e infiltración en el suelo"
+    matches = [
+        match(base, 0.9, chunk_index=0),
+        match(base + " verde", 0.88, resource_id="11", chunk_index=5),
+        match(other, 0.6, resource_id="12", chunk_index=3),
+    ]
+
+    context = assemble_context(matches, max_tokens=200)
+    assert context == base + "\n\n" + other
+
+    long_text = " ".join(f"concepto{i}" for i in range(400))
+    context = assemble_context([match(long_text, 0.9)], max_tokens=100)
+    assert estimate_tokens(context) <= 100
@@ -0,0 +1,55 @@
+import boto3
+import pytest
+
+from aprendizaje_libs.helpers.deadline_helper import Deadline, DeadlineExceededError, TimeoutClientPool, deadline_client_config
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_deadline_is_capped_by_api_gateway_limit():
+    deadline = Deadline.from_context(FakeContext(60000), safety_margin_ms=1000)
+    assert 27000 <= deadline.remaining_ms() <= 28000
+
+
+def test_max_tokens_shrinks_and_raises_when_too_short():
+    now = [0.0]
+    deadline = Deadline(10500, safety_margin_ms=500, clock=lambda: now[0])
+
+    assert deadline.max_tokens(2000, ms_per_token=10, overhead_ms=0) == 1000
+    assert deadline.max_tokens(500, ms_per_token=10, overhead_ms=0) == 500
+
+    now[0] = 9.99
+    with pytest.raises(DeadlineExceededError):
+        deadline.max_tokens(2000, ms_per_token=10, min_tokens=64, overhead_ms=0)
+
+
+def test_timeout_client_pool_reuses_buckets():
+    created = []
+    pool = TimeoutClientPool(lambda timeout: created.append(timeout) or timeout, step_seconds=5)
+
+    assert pool.get(27) == 25
+    assert pool.get(26) == 25
+    assert pool.get(3) == 3
+    assert created == [25, 3]
+
+
+def test_pooled_clients_do_not_retry_read_timeouts():
+    pool = TimeoutClientPool(
+        lambda read_timeout: boto3.client(
+            "bedrock-runtime",
+            region_name="us-east-1",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            config=deadline_client_config(read_timeout)
+        )
+    )
+
+    client = pool.get(12)
+    assert client.meta.config.read_timeout == 10
+    assert client.meta.config.retries == {"total_max_attempts": 1, "mode": "standard"}
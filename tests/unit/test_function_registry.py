@@ -0,0 +1,63 @@
+import ast
+from pathlib import Path
+
+import pytest
+
+from constants.functions import FUNCTIONS, GENERATOR, load_tuned_profiles, merge_profile_overrides, resolve_profile
+
+LAMBDA_CODE = Path(__file__).resolve().parents[2] / "artifacts" / "aws-lambda" / "code"
+
+
+def test_every_function_points_to_an_existing_entry_point():
+    for spec in FUNCTIONS:
+        source = LAMBDA_CODE / spec.group / spec.handler_name / "lambda_function.py"
+        functions = {node.name for node in ast.parse(source.read_text(encoding="utf-8")).body if isinstance(node, ast.FunctionDef)}
+        assert spec.entry in functions, spec.name
+
+    names = [spec.name for spec in FUNCTIONS]
+    routes = [route for spec in FUNCTIONS for route in spec.routes]
+    assert len(names) == len(set(names))
+    assert len(routes) == len(set(routes))
+
+
+def test_profile_overrides_apply_per_environment():
+    spec = next(spec for spec in FUNCTIONS if spec.name == "ruta-estandar-generar_ruta")
+    overrides = {
+        "prod": {"*": {"architecture": "arm64", "memory_size": 768}, spec.name: {"memory_size": 1536, "provisioned_concurrency": 2}}
+    }
+
+    profile = resolve_profile(spec, overrides, "PROD")
+    assert (profile.architecture, profile.memory_size, profile.provisioned_concurrency) == ("arm64", 1536, 2)
+    assert resolve_profile(spec, overrides, "dev") == GENERATOR
+
+    with pytest.raises(ValueError):
+        resolve_profile(spec, {"dev": {spec.name: {"memory": 1024}}}, "dev")
+
+
+def test_snap_start_rejects_large_ephemeral_storage():
+    spec = next(spec for spec in FUNCTIONS if spec.name == "ruta-estandar-evaluar")
+    assert resolve_profile(spec, {}, "dev").snap_start
+
+    with pytest.raises(ValueError):
+        resolve_profile(spec, {"dev": {spec.name: {"ephemeral_storage_mb": 1024}}}, "dev")
+    assert not resolve_profile(spec, {"dev": {spec.name: {"ephemeral_storage_mb": 1024, "snap_start": False}}}, "dev").snap_start
+
+
+def test_tuned_profiles_are_overridden_by_app_config(tmp_path):
+    path = tmp_path / "function_profiles.json"
+    assert load_tuned_profiles(str(path)) == {}
+
+    path.write_text('{"dev": {"ruta-estandar-evaluar": {"memory_size": 640}, "jobs-consultar": {"memory_size": 384}}}')
+    merged = merge_profile_overrides(load_tuned_profiles(str(path)), {"dev": {"ruta-estandar-evaluar": {"memory_size": 1024, "architecture": "arm64"}}})
+
+    assert merged["dev"]["ruta-estandar-evaluar"] == {"memory_size": 1024, "architecture": "arm64"}
+    assert merged["dev"]["jobs-consultar"] == {"memory_size": 384}
+
+
+def test_api_post_functions_are_idempotent():
+    for spec in FUNCTIONS:
+        if not any(method == "POST" for _, method in spec.routes):
+            continue
+        source = (LAMBDA_CODE / spec.group / spec.handler_name / "lambda_function.py").read_text(encoding="utf-8")
+        assert spec.tables.get("idempotency_table") == "read_write", spec.name
+        assert "@idempotent(idempotency_store)\ndef lambda_handler" in source, spec.name
@@ -0,0 +1,166 @@
+import json
+import threading
+import types
+
+from botocore.exceptions import ClientError
+
+from aprendizaje_libs.helpers.idempotency_helper import (
+    IDEMPOTENCY_STATUS_COMPLETED,
+    IdempotencyStore,
+    idempotent
+)
+
+
+def conditional_check_failed(operation):
+    return ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, operation)
+
+
+class FakeTable:
+    """Tabla en memoria con las condiciones que usa IdempotencyStore."""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        with self.lock:
+            current = self.items.get(Item["idempotency_key"])
+            values = ExpressionAttributeValues
+            free = (
+                current is None
+                or current["ttl"] < values[":now"]
+                or (current["status"] == values[":in_progress"] and current["lease_expires"] < values[":now_ms"])
+            )
+            if not free:
+                raise conditional_check_failed("PutItem")
+            self.items[Item["idempotency_key"]] = dict(Item)
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.items.get(Key["idempotency_key"])
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        with self.lock:
+            item = self.items.get(Key["idempotency_key"])
+            if not item or item["claim_id"] != ExpressionAttributeValues[":claim_id"]:
+                raise conditional_check_failed("UpdateItem")
+            item.update({"status": ExpressionAttributeValues[":completed"], "response": ExpressionAttributeValues[":response"], "ttl": ExpressionAttributeValues[":ttl"]})
+
+    def delete_item(self, Key, ConditionExpression, ExpressionAttributeValues):
+        with self.lock:
+            item = self.items.get(Key["idempotency_key"])
+            if not item or item["claim_id"] != ExpressionAttributeValues[":claim_id"]:
+                raise conditional_check_failed("DeleteItem")
+            del self.items[Key["idempotency_key"]]
+
+
+class FakeTableHelper:
+    def __init__(self):
+        self.table = FakeTable()
+
+    def get_table(self):
+        return self.table
+
+
+CONTEXT = types.SimpleNamespace(get_remaining_time_in_millis=lambda: 30000)
+
+
+def api_event(body, headers=None, resource="/api/v1/evaluar_reto_caso"):
+    return {"resource": resource, "httpMethod": "POST", "headers": headers, "body": json.dumps(body)}
+
+
+def test_completed_requests_are_replayed_and_failures_released():
+    store = IdempotencyStore(FakeTableHelper(), sleep=lambda _: None)
+    calls = []
+
+    @idempotent(store)
+    def handler(event, context):
+        calls.append(event)
+        body = json.loads(event["body"])
+        return {"statusCode": body.get("status", 200), "body": json.dumps({"score": len(calls)})}
+
+    body = {"RetoEjecucionId": 7, "RespuestaUsuario": "Uso indicadores"}
+    first = handler(api_event(body), CONTEXT)
+    retry = handler(api_event(dict(reversed(list(body.items())))), CONTEXT)
+
+    assert json.loads(retry["body"]) == json.loads(first["body"]) == {"score": 1}
+    assert retry["headers"]["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+    # Los errores no se guardan: el reintento vuelve a ejecutar la solicitud
+    failing = {"RetoEjecucionId": 8, "status": 504}
+    handler(api_event(failing), CONTEXT)
+    handler(api_event(failing), CONTEXT)
+    assert len(calls) == 3
+    assert len(store.table.items) == 1
+
+
+def test_concurrent_duplicate_waits_for_the_first_result():
+    store = IdempotencyStore(FakeTableHelper(), poll_seconds=0.01)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @idempotent(store)
+    def handler(event, context):
+        calls.append(event)
+        started.set()
+        release.wait(5)
+        return {"statusCode": 200, "body": json.dumps({"learning_path": "ruta"})}
+
+    headers = {"Idempotency-Key": "abc-123"}
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault("first", handler(api_event({"UsuarioId": 1}, headers), CONTEXT)))
+    first.start()
+    started.wait(5)
+    duplicate = threading.Thread(target=lambda: results.setdefault("duplicate", handler(api_event({"UsuarioId": 1}, {"idempotency-key": "abc-123"}), CONTEXT)))
+    duplicate.start()
+    release.set()
+    first.join(5)
+    duplicate.join(5)
+
+    assert len(calls) == 1
+    assert results["duplicate"]["body"] == results["first"]["body"]
+    [item] = store.table.items.values()
+    assert item["status"] == IDEMPOTENCY_STATUS_COMPLETED
+
+
+def test_key_reused_with_another_payload_is_rejected():
+    store = IdempotencyStore(FakeTableHelper())
+
+    @idempotent(store)
+    def handler(event, context):
+        return {"statusCode": 200, "body": "{}"}
+
+    headers = {"Idempotency-Key": "abc-123"}
+    handler(api_event({"UsuarioId": 1}, headers), CONTEXT)
+    response = handler(api_event({"UsuarioId": 2}, headers), CONTEXT)
+
+    assert response["statusCode"] == 422
+    assert json.loads(response["body"])["error"]["code"] == "IDEMPOTENCY_KEY_REUSED"
+
+
+def test_abandoned_claim_expires_with_the_lease():
+    now = [1000.0]
+    store = IdempotencyStore(FakeTableHelper(), clock=lambda: now[0])
+
+    assert store.claim("k", "hash", lease_ms=30000) is not None
+    assert store.claim("k", "hash", lease_ms=30000) is None
+    now[0] += 31
+    assert store.claim("k", "hash", lease_ms=30000) is not None
+
+
+def test_requests_without_key_or_execution_id_are_not_deduplicated():
+    store = IdempotencyStore(FakeTableHelper())
+    calls = []
+
+    @idempotent(store)
+    def handler(event, context):
+        calls.append(event)
+        return {"statusCode": 200, "body": json.dumps({"reto": f"version {len(calls)}"})}
+
+    body = {"UsuarioId": 1, "TituloReto": "Indicadores", "Indicaciones": "Más práctico"}
+    first = handler(api_event(body, resource="/api/v1/regenerar_reto_estandar"), CONTEXT)
+    second = handler(api_event(body, resource="/api/v1/regenerar_reto_estandar"), CONTEXT)
+
+    assert len(calls) == 2 and first["body"] != second["body"]
+    assert "headers" not in second and store.table.items == {}
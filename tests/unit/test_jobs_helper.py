@@ -0,0 +1,146 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from aprendizaje_libs.helpers.jobs_helper import (
+    JobsHelper,
+    JOB_FINAL_STATUSES,
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_PENDING,
+    JOB_STATUS_RUNNING,
+    job_messages
+)
+from aprendizaje_libs.helpers.throttling_helper import BedrockThrottledError
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ExpressionAttributeNames=None, ConditionExpression=None, ReturnValues=None):
+        item = self.items.setdefault(Key["job_id"], dict(Key))
+        values = ExpressionAttributeValues
+        if ConditionExpression and ConditionExpression.startswith("#status = :expected"):
+            allowed = item.get("status") == values[":expected"]
+            if "lease_expires < :now_ms" in ConditionExpression:
+                allowed = allowed or (item.get("status") == values[":running"] and item["lease_expires"] < values[":now_ms"])
+            if not allowed:
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        names = ExpressionAttributeNames or {}
+        for assignment in UpdateExpression[len("SET "):].split(", "):
+            field, value = assignment.split(" = ")
+            item[names.get(field, field)] = ExpressionAttributeValues[value]
+        return {"Attributes": dict(item)} if ReturnValues == "ALL_NEW" else {}
+
+
+class FakeTableHelper:
+    def __init__(self):
+        self.table = FakeTable()
+
+    def get_table(self):
+        return self.table
+
+    def put_item(self, data):
+        self.table.items[data["job_id"]] = dict(data)
+
+    def get_item(self, job_id):
+        return self.table.items.get(job_id)
+
+
+class FakeSQS:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody):
+        self.messages.append(json.loads(MessageBody))
+
+
+def test_job_lifecycle_discards_duplicate_deliveries():
+    helper = JobsHelper(FakeTableHelper(), queue_url="https://sqs/queue")
+    helper._sqs_client = FakeSQS()
+
+    job_id = helper.submit("generar_caso", {"UsuarioId": 1}, usuario_id=1)
+    assert helper._sqs_client.messages[0]["job_id"] == job_id
+
+    assert helper.mark_running(job_id, lease_ms=60000) is True
+    assert helper.mark_running(job_id, lease_ms=60000) is False
+    assert helper.get(job_id)["status"] == JOB_STATUS_RUNNING
+
+    helper.complete(job_id, {"success": True})
+    public = JobsHelper.to_public(helper.get(job_id))
+    assert public["status"] == JOB_STATUS_COMPLETED
+    assert public["result"] == {"success": True}
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.posts = []
+
+    def post_to_connection(self, ConnectionId, Data):
+        self.posts.append((ConnectionId, json.loads(Data)))
+
+
+def test_connection_after_the_job_finished_sees_the_final_status():
+    helper = JobsHelper(FakeTableHelper(), queue_url="https://sqs/queue")
+    helper._sqs_client = FakeSQS()
+    helper._ws_clients["https://ws/dev"] = FakeWebSocket()
+
+    # Conexión a tiempo: queda asociada y el worker la notifica al terminar
+    on_time = helper.submit("generar_caso", {"UsuarioId": 1}, usuario_id=1)
+    assert helper.attach_connection(on_time, "conn-1")["status"] == JOB_STATUS_PENDING
+    helper.complete(on_time, {"success": True})
+    helper.notify(on_time, "https://ws/dev")
+    assert helper._ws_clients["https://ws/dev"].posts[0][0] == "conn-1"
+
+    # El worker termina primero: notify no encuentra conexión y attach_connection devuelve el estado final
+    late = helper.submit("generar_caso", {"UsuarioId": 1}, usuario_id=1)
+    helper.mark_running(late, lease_ms=60000)
+    helper.fail(late, "Bedrock no disponible")
+    helper.notify(late, "https://ws/dev")
+    assert len(helper._ws_clients["https://ws/dev"].posts) == 1
+    assert helper.attach_connection(late, "conn-2")["status"] in JOB_FINAL_STATUSES
+
+
+def sqs_event(job_id, receive_count):
+    return {"Records": [{"body": json.dumps({"job_id": job_id, "payload": {}}), "attributes": {"ApproximateReceiveCount": str(receive_count)}}]}
+
+
+def test_throttled_job_fails_on_the_last_delivery():
+    helper = JobsHelper(FakeTableHelper(), queue_url="https://sqs/queue")
+    helper._sqs_client = FakeSQS()
+    job_id = helper.submit("generar_caso", {}, usuario_id=1)
+
+    def throttled(payload):
+        raise BedrockThrottledError("Bedrock saturado")
+
+    for receive_count in (1, 2):
+        [message] = job_messages(sqs_event(job_id, receive_count))
+        with pytest.raises(BedrockThrottledError):
+            helper.process(message, throttled, lease_ms=60000, callback_url=None, max_receive_count=3)
+        assert helper.get(job_id)["status"] == JOB_STATUS_PENDING
+
+    # Después de esta entrega SQS mueve el mensaje a la DLQ: el trabajo no puede quedar PENDING
+    [message] = job_messages(sqs_event(job_id, 3))
+    helper.process(message, throttled, lease_ms=60000, callback_url=None, max_receive_count=3)
+    assert helper.get(job_id)["status"] == JOB_STATUS_FAILED
+
+
+def test_redelivery_reclaims_a_job_whose_worker_died():
+    helper = JobsHelper(FakeTableHelper(), queue_url="https://sqs/queue")
+    helper._sqs_client = FakeSQS()
+    job_id = helper.submit("generar_caso", {}, usuario_id=1)
+
+    # El primer worker marca el trabajo y muere sin terminarlo; su plazo vence
+    assert helper.mark_running(job_id, lease_ms=-1) is True
+    [message] = job_messages(sqs_event(job_id, 2))
+    helper.process(message, lambda payload: {"success": True}, lease_ms=60000, callback_url=None)
+    assert helper.get(job_id)["status"] == JOB_STATUS_COMPLETED
+
+    # Un duplicado mientras otro worker tiene el plazo vigente se descarta
+    other = helper.submit("generar_caso", {}, usuario_id=1)
+    helper.mark_running(other, lease_ms=60000)
+    [message] = job_messages(sqs_event(other, 2))
+    helper.process(message, lambda payload: pytest.fail("el trabajo ya está en curso"), lease_ms=60000, callback_url=None)
+    assert helper.get(other)["status"] == JOB_STATUS_RUNNING
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+from stacks.lambda_bundles import build_lambda_bundle
+
+LAMBDA_CODE = Path(__file__).resolve().parents[2] / "artifacts" / "aws-lambda" / "code"
+
+
+def test_bundle_contains_only_its_handler_with_bytecode(tmp_path):
+    runtime = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    (tmp_path / "bundle" / "stale.py").parent.mkdir()
+    (tmp_path / "bundle" / "stale.py").write_text("")
+
+    bundle = Path(build_lambda_bundle(str(LAMBDA_CODE / "ruta-estandar" / "generar_ruta"), str(tmp_path / "bundle"), runtime))
+
+    assert sorted(path.name for path in bundle.iterdir()) == ["generar_ruta"]
+    assert (bundle / "generar_ruta" / "lambda_function.py").is_file()
+    pyc = list((bundle / "generar_ruta" / "__pycache__").glob("lambda_function.*.pyc"))
+    assert len(pyc) == 1
+    # Bytecode con hash sin verificar: flags = 0b01 en la cabecera (PEP 552)
+    assert int.from_bytes(pyc[0].read_bytes()[4:8], "little") == 0b01
+
+    bundle = Path(build_lambda_bundle(str(LAMBDA_CODE / "jobs" / "consultar"), str(tmp_path / "other"), "python0.0"))
+    assert not (bundle / "consultar" / "__pycache__").exists()
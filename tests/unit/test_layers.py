@@ -0,0 +1,50 @@
+import pytest
+
+from constants.layers import IMPORTED_LAYERS, Layers
+from tools import check_layers
+
+LAYER_ARN = "arn:aws:lambda:${region}:${account}:layer:test:1"
+
+
+def app_config(compatibility=None, without=()):
+    artifacts = {"aws_lambda_layers": {key: LAYER_ARN for key in IMPORTED_LAYERS.values() if key not in without}}
+    if compatibility is not None:
+        artifacts["aws_lambda_layer_compatibility"] = compatibility
+    return {"artifacts": artifacts}
+
+
+def test_missing_layer_keys_fail_with_the_key_names():
+    with pytest.raises(ValueError, match="layer_numpy"):
+        Layers(app_config(without=("layer_numpy",)), "us-east-1", "123456789012")
+
+    layers = Layers(app_config(), "us-east-1", "123456789012")
+    assert layers.AWS_LAMBDA_LAYERS["layer_numpy"] == "arn:aws:lambda:us-east-1:123456789012:layer:test:1"
+
+
+def test_imported_layers_are_x86_64_only_unless_declared():
+    layers = Layers(app_config(), "us-east-1", "123456789012")
+    used = ("powertools", "aje_libs", "aprendizaje_libs", "numpy")
+    assert layers.incompatible_layers(used, "python3.12", "x86_64") == []
+    assert layers.incompatible_layers(used, "python3.12", "arm64") == ["layer_powertools", "layer_aje_libs", "layer_numpy"]
+
+    declared = Layers(app_config({
+        "layer_powertools": {"architectures": ["x86_64", "arm64"]},
+        "layer_aje_libs": {"architectures": ["x86_64", "arm64"]},
+        "layer_numpy": {"architectures": ["x86_64", "arm64"], "runtimes": ["python3.11"]}
+    }), "us-east-1", "123456789012")
+    assert declared.incompatible_layers(used, "python3.11", "arm64") == []
+    assert declared.incompatible_layers(used, "python3.12", "arm64") == ["layer_numpy"]
+
+
+def test_check_layers_compares_published_compatibility():
+    numpy_version = {"CompatibleRuntimes": ["python3.11", "python3.12"], "CompatibleArchitectures": ["x86_64"]}
+    assert check_layers.layer_problems("layer_numpy", numpy_version, "python3.12", {"x86_64"}) == []
+    assert check_layers.layer_problems("layer_numpy", numpy_version, "python3.12", {"x86_64", "arm64"}) == [
+        "layer_numpy: arm64 no está entre sus arquitecturas compatibles ['x86_64']"
+    ]
+    assert check_layers.layer_problems("layer_pinecone", {}, "python3.12", {"x86_64"}) == [
+        "layer_pinecone: python3.12 no está entre sus runtimes compatibles []"
+    ]
+
+    required = check_layers.required_architectures({"function_profiles": {"prod": {"*": {"architecture": "arm64"}}}}, "prod")
+    assert required["layer_numpy"] == {"arm64"} and "layer_docs" not in required
@@ -0,0 +1,74 @@
+import logging
+
+import pytest
+
+from aprendizaje_libs.helpers import logging_helper
+from aprendizaje_libs.helpers.logging_helper import BoundedMessageFilter, configure_logging, describe_payload, log_payload, payload_logging
+
+
+class RecordingLogger(logging.Logger):
+    def __init__(self, level=logging.INFO):
+        super().__init__("test_logging_helper", level)
+        self.records = []
+
+    def handle(self, record):
+        if self.filter(record):
+            self.records.append(record)
+
+    @property
+    def messages(self):
+        return [record.getMessage() for record in self.records]
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(logging_helper, "_policy", dict(logging_helper.DEFAULT_POLICY))
+    monkeypatch.setattr(logging_helper, "_invocation", {"sampled": False, "deferred": logging_helper.deque(maxlen=20)})
+    monkeypatch.setattr(logging_helper.random, "random", lambda: 0.5)
+
+
+def test_payloads_are_summarized_and_logged_in_full_on_failure():
+    target = RecordingLogger()
+    prompt = {"role": "user", "content": "x" * 5000}
+
+    @payload_logging
+    def handler(event, context):
+        log_payload(target, "Prompt", prompt)
+        return {"statusCode": event["status"]}
+
+    handler({"status": 200}, None)
+    [summary] = target.messages
+    assert summary == f"Prompt: {describe_payload(prompt)}" and len(summary) < 300
+
+    handler({"status": 500}, None)
+    assert target.messages[-1].startswith("Prompt (completo): {")
+    assert target.records[-1].levelno == logging.ERROR and len(target.messages[-1]) > 5000
+
+
+def test_sampled_invocations_and_debug_log_full_payloads():
+    configure_logging({"LOG_PAYLOAD_SAMPLE_RATE": 1.0})
+    target = RecordingLogger()
+
+    @payload_logging
+    def handler(event, context):
+        log_payload(target, "Elemento", {"ai_msg": "respuesta"})
+
+    handler({}, None)
+    target.setLevel(logging.DEBUG)
+    log_payload(target, "Contexto", "documentos")
+
+    assert target.messages == ['Elemento: {"ai_msg": "respuesta"}', "Contexto: documentos"]
+
+
+def test_level_and_message_limit_come_from_parameters():
+    target = RecordingLogger()
+    configure_logging({"LOG_LEVEL": "warning", "LOG_MAX_MESSAGE_CHARS": 20}, target)
+
+    log_payload(target, "Prompt", {"texto": "no se serializa"})
+    target.warning("kwargs: %s", [0.1] * 1024)
+
+    assert target.level == logging.WARNING
+    assert sum(isinstance(existing, BoundedMessageFilter) for existing in target.filters) == 1
+    assert target.messages == [f"kwargs: [0.1, 0.1, 0... [{len('kwargs: ' + str([0.1] * 1024))} caracteres]"]
+    configure_logging({}, target)
+    assert sum(isinstance(existing, BoundedMessageFilter) for existing in target.filters) == 1
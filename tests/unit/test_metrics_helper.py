@@ -0,0 +1,69 @@
+import json
+import types
+
+import pytest
+
+from aprendizaje_libs.helpers import metrics_helper
+from aprendizaje_libs.helpers.metrics_helper import endpoint_of, instrument, mark_init, record_model_call, stage
+
+CONTEXT = types.SimpleNamespace(aws_request_id="req-1")
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(metrics_helper, "emit", emitted.extend)
+    monkeypatch.setattr(metrics_helper, "_init", {"last": 0.0, "stages": {}, "emitted": False})
+    return emitted
+
+
+def test_stages_and_model_calls_are_emitted_per_invocation(documents):
+    mark_init("config")
+
+    @instrument("ruta-estandar-generar_ruta")
+    def handler(event, context):
+        with stage("embedding"):
+            pass
+        with stage("embedding"):
+            pass
+        record_model_call("model-a", {"stopReason": "end_turn", "usage": {"inputTokens": 100, "outputTokens": 50}}, 500)
+        record_model_call("model-a", {"stopReason": "max_tokens", "usage": {"inputTokens": 80, "outputTokens": 200}}, 1000)
+        return {"statusCode": 200}
+
+    handler({"resource": "/api/v1/generar_ruta_estandar"}, CONTEXT)
+    handler({"Records": []}, CONTEXT)
+
+    cold, end_turn, max_tokens, warm = documents[:4]
+    assert cold["Endpoint"] == "generar_ruta_estandar" and cold["Start"] == "cold"
+    assert {"embedding_ms", "init_config_ms", "total_ms"} <= set(cold)
+    assert cold["errors"] == 0
+    assert cold["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Endpoint", "Start"], ["Endpoint"]]
+
+    assert (end_turn["StopReason"], end_turn["tokens_per_second"], end_turn["output_tokens"]) == ("end_turn", [100.0], 50)
+    assert (max_tokens["StopReason"], max_tokens["model_latency_ms"]) == ("max_tokens", [1000])
+    assert ["Endpoint", "Model", "StopReason"] in max_tokens["_aws"]["CloudWatchMetrics"][0]["Dimensions"]
+
+    # Sin ruta se usa el nombre de la función y la inicialización ya no se reporta
+    assert warm["Endpoint"] == "ruta-estandar-generar_ruta" and warm["Start"] == "warm"
+    assert "init_config_ms" not in warm and "embedding_ms" in warm
+    json.dumps(documents)
+
+
+def test_failed_invocation_counts_as_error(documents):
+    @instrument("jobs-consultar")
+    def handler(event, context):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        handler({}, CONTEXT)
+
+    assert documents[0]["errors"] == 1
+    assert metrics_helper.current() is None
+
+
+def test_stage_outside_invocation_is_ignored():
+    with stage("prompt"):
+        pass
+    record_model_call("model-a", {"usage": {}}, 10)
+    assert metrics_helper.current() is None
+    assert endpoint_of({"resource": "/api/v1/jobs/{job_id}"}, "x") == "jobs/{job_id}"
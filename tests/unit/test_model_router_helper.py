@@ -0,0 +1,146 @@
+import json
+import threading
+
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+from aprendizaje_libs.helpers.deadline_helper import Deadline, DeadlineExceededError, TimeoutClientPool
+from aprendizaje_libs.helpers.model_router_helper import CACHE_POINT, ModelRouter, bedrock_client_pool, build_routes, cache_usage
+from aprendizaje_libs.helpers.throttling_helper import BedrockGovernor, BedrockThrottledError, InMemoryStateStore
+
+
+class FakeBedrockClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.requests = []
+
+    def converse(self, **request):
+        self.requests.append(request)
+        failure = self.failures.get(request["modelId"])
+        if failure == "throttle":
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "Converse")
+        if failure == "timeout":
+            raise ReadTimeoutError(endpoint_url="https://bedrock")
+        return {"output": {"message": {"content": [{"text": "0.80"}]}}, "usage": {"inputTokens": 1, "outputTokens": 1}}
+
+
+def make_router(client, routes_config, cache_models=None):
+    return ModelRouter(
+        routes=build_routes(
+            routes_config,
+            defaults={"score": {"max_tokens": 10, "temperature": 0.0}},
+            default_model_id="large-model"
+        ),
+        client_pool=TimeoutClientPool(lambda _: client),
+        governor_factory=lambda model_id: BedrockGovernor(
+            store=InMemoryStateStore(), key=f"bedrock#{model_id}", sleep=lambda _: None
+        ),
+        ms_per_output_token=25,
+        min_output_tokens=256,
+        cache_models=cache_models
+    )
+
+
+def test_route_uses_configured_model_and_parameters():
+    client = FakeBedrockClient({})
+    router = make_router(client, {"score": {"model_id": "small-model", "temperature": 0.1}})
+
+    response = router.converse("score", "prompt")
+
+    assert response["modelId"] == "small-model"
+    assert client.requests[0]["inferenceConfig"] == {"maxTokens": 10, "temperature": 0.1, "topP": 0.2}
+
+
+def test_fallback_chain_skips_throttled_and_slow_models():
+    client = FakeBedrockClient({"small-model": "throttle", "medium-model": "timeout"})
+    router = make_router(client, {"score": {"model_id": "small-model", "fallbacks": ["medium-model", "large-model"]}})
+
+    response = router.converse("score", "prompt")
+
+    assert response["modelId"] == "large-model"
+    assert [request["modelId"] for request in client.requests] == ["small-model", "medium-model", "large-model"]
+
+
+def test_last_model_errors_are_raised():
+    router = make_router(FakeBedrockClient({"large-model": "timeout"}), {})
+    with pytest.raises(DeadlineExceededError):
+        router.converse("score", "prompt")
+
+    router = make_router(FakeBedrockClient({"small-model": "throttle"}), {"score": {"model_id": "small-model"}})
+    with pytest.raises(BedrockThrottledError):
+        router.converse("score", "prompt")
+
+
+def test_system_prompt_gets_cache_point_only_for_cache_models():
+    client = FakeBedrockClient({})
+    router = make_router(client, {}, cache_models=["large-model"])
+    router.converse("score", "prompt", system="instrucciones")
+
+    router = make_router(client, {"score": {"model_id": "small-model"}}, cache_models=["large-model"])
+    router.converse("score", "prompt", system="instrucciones")
+
+    assert client.requests[0]["system"] == [{"text": "instrucciones"}, CACHE_POINT]
+    assert client.requests[1]["system"] == [{"text": "instrucciones"}]
+    assert cache_usage({"usage": {"cacheReadInputTokens": 120}}) == (120, 0)
+
+
+def test_concurrent_calls_use_the_client_of_their_own_deadline():
+    clients, governors = {}, []
+    barrier = threading.Barrier(2)
+
+    class BarrierClient(FakeBedrockClient):
+        def converse(self, **request):
+            barrier.wait(5)
+            return super().converse(**request)
+
+    router = make_router(None, {})
+    router.client_pool = TimeoutClientPool(lambda read_timeout: clients.setdefault(read_timeout, BarrierClient({})))
+    factory = router.governor_factory
+    router.governor_factory = lambda model_id: governors.append(model_id) or factory(model_id)
+
+    # Dos respuestas del lote en paralelo con plazos distintos (tramos de 5 s y 25 s)
+    threads = [threading.Thread(target=router.converse, args=("score", prompt), kwargs={"deadline": Deadline(budget)}) for prompt, budget in (("corta", 9000), ("larga", 28000))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(clients) == [5, 25]
+    assert [request["messages"][0]["content"][0]["text"] for request in clients[5].requests] == ["corta"]
+    assert [request["messages"][0]["content"][0]["text"] for request in clients[25].requests] == ["larga"]
+    assert governors == ["large-model"]
+
+
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def test_read_timeout_falls_back_after_a_single_attempt(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    pool = bedrock_client_pool("us-east-1")
+    attempts = []
+
+    # Se reemplaza el envío HTTP: el modelo principal agota el read_timeout y el de respaldo responde
+    def send(request, **kwargs):
+        attempts.append("small-model" if "small-model" in request.url else "large-model")
+        if attempts[-1] == "small-model":
+            raise ReadTimeoutError(endpoint_url=request.url)
+        body = {"output": {"message": {"role": "assistant", "content": [{"text": "0.80"}]}}, "stopReason": "end_turn", "usage": {"inputTokens": 1, "outputTokens": 1, "totalTokens": 2}, "metrics": {"latencyMs": 1}}
+        return AWSResponse(request.url, 200, {"Content-Type": "application/json"}, RawBody(json.dumps(body).encode()))
+
+    router = make_router(None, {"score": {"model_id": "small-model", "fallbacks": ["large-model"], "timeout_seconds": 5}})
+    router.client_pool = pool
+    # Tramo del timeout de la ruta (modelo principal) y tramo por defecto (último modelo, sin plazo)
+    for read_timeout in (5, 60):
+        pool.get(read_timeout).meta.events.register("before-send.bedrock-runtime.Converse", send)
+
+    response = router.converse("score", "prompt")
+
+    assert response["modelId"] == "large-model"
+    assert attempts == ["small-model", "large-model"]
@@ -0,0 +1,80 @@
+import numpy as np
+
+from aprendizaje_libs.helpers.prescoring_helper import (
+    PreScorer,
+    calibrate_bands,
+    cosine_similarities,
+)
+
+MODELO = "La fotosíntesis transforma la energía luminosa en energía química dentro de los cloroplastos."
+
+EMBEDDINGS = {
+    MODELO: [1.0, 0.0],
+    "Las plantas convierten la luz en energía química usando cloroplastos": [0.99, 0.05],
+    "Los mamíferos regulan su temperatura corporal": [0.0, 1.0],
+    "Las plantas producen algo con el sol y agua": [0.7, 0.7],
+}
+
+
+def make_scorer(enabled=True, **bands):
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return EMBEDDINGS[text]
+
+    return PreScorer(embed=embed, bands={"low_similarity": 0.3, "high_similarity": 0.95, "high_score": 0.9, **bands}, enabled=enabled), calls
+
+
+def test_lexical_checks_skip_embeddings():
+    scorer, calls = make_scorer()
+    reference = scorer.reference(MODELO)
+
+    assert scorer.prescore(reference, "  \n").reason == "empty"
+    assert scorer.prescore(reference, MODELO.upper() + "!!").score == 1.0
+    assert calls == [MODELO]
+
+
+def test_short_answers_and_disabled_switch_go_to_the_model():
+    scorer, _ = make_scorer()
+    # "Usar un índice" tiene dos palabras de más de dos letras; ya no se califica con 0
+    assert scorer.prescore(scorer.reference(MODELO), "Usar un índice").score is None
+
+    disabled, calls = make_scorer(enabled=False)
+    reference = disabled.reference(MODELO)
+    assert disabled.prescore(reference, "Usar un índice") == (None, "llm", None)
+    assert disabled.prescore(reference, MODELO).score is None
+    assert calls == []
+
+
+def test_similarity_bands_and_reference_cache():
+    scorer, calls = make_scorer()
+    reference = scorer.reference(MODELO)
+
+    high = scorer.prescore(reference, "Las plantas convierten la luz en energía química usando cloroplastos")
+    low = scorer.prescore(reference, "Los mamíferos regulan su temperatura corporal")
+    middle = scorer.prescore(reference, "Las plantas producen algo con el sol y agua")
+
+    assert (high.score, high.reason) == (0.9, "high_band")
+    assert (low.score, low.reason) == (0.0, "low_band")
+    assert middle.score is None and 0.6 < middle.similarity < 0.8
+
+    scorer.reference(MODELO)
+    assert calls.count(MODELO) == 1
+
+
+def test_cosine_similarities_is_vectorized():
+    similarities = cosine_similarities([[1, 0], [0, 2], [0, 0]], [3, 0])
+    assert np.allclose(similarities, [1.0, 0.0, 0.0])
+
+
+def test_calibrate_bands_finds_stable_extremes():
+    rng = np.random.default_rng(0)
+    similarities = np.concatenate([rng.uniform(0.0, 0.3, 50), rng.uniform(0.4, 0.8, 50), rng.uniform(0.9, 1.0, 50)])
+    scores = np.concatenate([np.zeros(50), rng.uniform(0.0, 1.0, 50), np.ones(50)])
+
+    bands = calibrate_bands(similarities, scores, tolerance=0.05, min_samples=20)
+
+    assert 0.25 <= bands["low_similarity"] < 0.5 and bands["low_score"] == 0.0
+    assert 0.7 < bands["high_similarity"] <= 0.92 and bands["high_score"] == 1.0
+    assert bands["coverage"] >= 0.6
@@ -0,0 +1,59 @@
+import ast
+import json
+from pathlib import Path
+
+import pytest
+
+from aprendizaje_libs.helpers.prompt_helper import PromptTemplate, PromptTemplateError, compact_prompt
+
+CODE = Path(__file__).resolve().parents[2] / "artifacts" / "aws-lambda" / "code"
+BUDGETS = Path(__file__).with_name("prompt_token_budget.json")
+
+
+def handler_templates():
+    """Plantillas `NOMBRE = PromptTemplate("...")` de cada handler, sin importar el handler."""
+    templates = {}
+    for path in sorted(CODE.glob("*/*/lambda_function.py")):
+        handler = path.parent.relative_to(CODE).as_posix()
+        for node in ast.parse(path.read_text(encoding="utf-8")).body:
+            if (
+                isinstance(node, ast.Assign)
+                and isinstance(node.value, ast.Call)
+                and getattr(node.value.func, "id", None) == "PromptTemplate"
+            ):
+                name = node.targets[0].id
+                templates[f"{handler}:{name}"] = PromptTemplate(node.value.args[0].value, name=name)
+    return templates
+
+
+def test_compact_prompt_removes_non_semantic_whitespace():
+    text = """
+        ## Tarea
+        Evalúa   la respuesta.  
+
+
+        - Criterio:
+            - Precisión.
+    """
+    assert compact_prompt(text) == "## Tarea\nEvalúa la respuesta.\n\n- Criterio:\n    - Precisión."
+
+
+def test_render_validates_fields():
+    template = PromptTemplate("Curso: {nombre_curso}\nTemas: {temas} {{literal}}", name="TEST")
+
+    assert template.fields == {"nombre_curso", "temas"}
+    assert template.render(nombre_curso="Física", temas="ondas") == "Curso: Física\nTemas: ondas {literal}"
+    with pytest.raises(PromptTemplateError):
+        template.render(nombre_curso="Física")
+    with pytest.raises(PromptTemplateError):
+        PromptTemplate("Pregunta: {}")
+
+
+def test_prompt_token_budget():
+    """Falla si una plantilla cuesta más tokens que su presupuesto; al reducirla, actualizar el JSON."""
+    budgets = json.loads(BUDGETS.read_text(encoding="utf-8"))
+    estimates = {key: template.token_estimate for key, template in handler_templates().items()}
+
+    assert sorted(estimates) == sorted(budgets), "Plantillas sin presupuesto en prompt_token_budget.json"
+    regressions = {key: (estimates[key], budgets[key]) for key in estimates if estimates[key] > budgets[key]}
+    assert not regressions, f"Plantillas sobre su presupuesto de tokens (estimado, presupuesto): {regressions}"
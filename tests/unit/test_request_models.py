@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from constants.functions import FUNCTIONS
+from constants.request_models import handler_constants, model_name, request_schema
+
+ROOT = Path(__file__).resolve().parents[2]
+LAMBDA_CODE = ROOT / "artifacts" / "aws-lambda" / "code"
+CORPUS = ROOT / "tools" / "corpus"
+
+JSON_TYPES = {"array": list, "object": dict, "string": str}
+
+
+def post_routes():
+    return [(spec, path) for spec in FUNCTIONS for path, method in spec.routes if method == "POST"]
+
+
+def schema_errors(schema, body):
+    """Reglas required/type del modelo, como las aplica el validador de API Gateway"""
+    errors = [f"missing {name}" for name in schema["required"] if name not in body]
+    for name, definition in schema["properties"].items():
+        if name in body and "type" in definition and not isinstance(body[name], JSON_TYPES[definition["type"]]):
+            errors.append(f"{name} is not {definition['type']}")
+    return errors
+
+
+def test_every_post_route_has_a_model_from_the_handler_fields():
+    routes = post_routes()
+    assert len({model_name(path) for _, path in routes}) == len(routes)
+
+    for spec, path in routes:
+        schema = request_schema(spec, path, str(LAMBDA_CODE))
+        constants = handler_constants(str(LAMBDA_CODE / spec.group / spec.handler_name / "lambda_function.py"))
+        assert schema["required"] == constants[spec.request_fields.get(path, "REQUIRED_FIELDS")], path
+        assert set(schema["properties"]) == set(schema["required"])
+
+    spec = next(spec for spec in FUNCTIONS if spec.name == "ruta-estandar-evaluar")
+    schema = request_schema(spec, "evaluar_reto_estandar_lote", str(LAMBDA_CODE))
+    assert model_name("evaluar_reto_estandar_lote") == "EvaluarRetoEstandarLoteRequest"
+    assert schema["properties"]["Respuestas"] == {"type": "array"} and "RetoEjecucionId" not in schema["required"]
+
+
+def test_corpus_requests_pass_the_gateway_models():
+    for spec, path in post_routes():
+        schema = request_schema(spec, path, str(LAMBDA_CODE))
+        lote = path.endswith("_lote")
+        for line in (CORPUS / f"{spec.name}.jsonl").read_text(encoding="utf-8").splitlines():
+            body = json.loads(line)["body"]
+            if ("Respuestas" in body) == lote:
+                assert schema_errors(schema, body) == [], (path, json.loads(line)["label"])
+                assert schema_errors(schema, {**body, "Temas": "indicadores"}) == ["Temas is not array"]
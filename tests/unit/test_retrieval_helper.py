@@ -0,0 +1,31 @@
+from aprendizaje_libs.helpers.retrieval_helper import bm25_scores, hybrid_rerank, reciprocal_rank_fusion
+
+
+def match(text, score):
+    return {"score": score, "metadata": {"text": text}}
+
+
+def test_bm25_prefers_exact_terms():
+    scores = bm25_scores("modelado datamart", [
+        "El almacén de datos organiza la información del negocio",
+        "Un datamart aplica modelado dimensional con hechos y dimensiones",
+        "La normalización reduce la redundancia",
+    ])
+    assert scores.argmax() == 1
+    assert scores[2] == 0
+
+
+def test_rrf_and_hybrid_rerank_promote_lexical_matches():
+    fused = reciprocal_rank_fusion([[0.9, 0.8, 0.7], [0.0, 0.0, 5.0]])
+    assert fused[2] > fused[1]
+
+    matches = [
+        match("Sistemas de información y bases de datos en la empresa", 0.82),
+        match("Procesos de negocio y reportes gerenciales", 0.81),
+        match("Diseño de un datamart con tablas de hechos", 0.74),
+    ]
+    reranked = hybrid_rerank(matches, query="datamart tablas de hechos", top_n=2)
+
+    assert [item["metadata"]["text"] for item in reranked][0] == matches[2]["metadata"]["text"]
+    assert len(reranked) == 2
+    assert reranked[0]["score"] == 1.0
@@ -0,0 +1,38 @@
+import pytest
+
+from constants.schedules import ScheduledCapacity, capacity_timeline, max_capacity, scheduled_actions
+
+TIMETABLE = {
+    "lead_minutes": 10,
+    "functions": {"ruta-estandar-evaluar": {}, "ruta-estandar-generar_ruta": {"scale": 0.5}},
+    "sessions": [
+        {"days": ["MON", "WED"], "start": "08:00", "end": "10:00", "concurrency": 20},
+        {"days": ["MON"], "start": "09:30", "end": "11:00", "concurrency": 30},
+    ],
+}
+
+
+def test_overlapping_sessions_take_the_largest_capacity():
+    timeline = capacity_timeline(TIMETABLE, "ruta-estandar-evaluar")
+
+    assert timeline["MON"] == [(470, 20), (560, 30), (660, 0)]
+    assert timeline["WED"] == [(470, 20), (600, 0)]
+    assert timeline["SUN"] == []
+
+
+def test_days_with_the_same_change_share_one_action():
+    actions = scheduled_actions(TIMETABLE, "ruta-estandar-generar_ruta", baseline=1)
+
+    assert actions[0] == ScheduledCapacity(week_days=("MON", "WED"), hour=7, minute=50, min_capacity=10)
+    assert actions[0].name == "MON-WED-0750-to-10"
+    assert [(action.week_days, action.hour, action.minute, action.min_capacity) for action in actions[1:]] == [
+        (("MON",), 9, 20, 15),
+        (("WED",), 10, 0, 1),
+        (("MON",), 11, 0, 1),
+    ]
+    assert max_capacity(TIMETABLE, "ruta-estandar-generar_ruta", baseline=1) == 30
+
+
+def test_sessions_crossing_midnight_are_rejected():
+    with pytest.raises(ValueError):
+        capacity_timeline({"functions": {"f": {}}, "sessions": [{"days": ["MON"], "start": "22:00", "end": "01:00", "concurrency": 1}]}, "f")
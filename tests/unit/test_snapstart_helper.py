@@ -0,0 +1,73 @@
+import random
+
+import boto3
+
+from aprendizaje_libs.helpers import client_helper, snapstart_helper
+from aprendizaje_libs.helpers.client_helper import ClientFactory, install_client_factory
+from aprendizaje_libs.helpers.deadline_helper import TimeoutClientPool
+from aprendizaje_libs.helpers.snapstart_helper import after_restore, before_snapshot, restored, run_hooks
+
+
+def fresh_hooks(monkeypatch):
+    monkeypatch.setattr(snapstart_helper, "_hooks", {"before_snapshot": [], "after_restore": []})
+    monkeypatch.setattr(snapstart_helper, "_state", {"restored": False})
+
+
+def test_hooks_run_in_order_and_failures_do_not_stop_the_phase(monkeypatch):
+    fresh_hooks(monkeypatch)
+    calls = []
+    before_snapshot(lambda: calls.append("last"), order=100)
+
+    @before_snapshot
+    def failing():
+        raise RuntimeError("sin red")
+
+    before_snapshot(lambda: calls.append("first"))
+
+    run_hooks("before_snapshot")
+    assert calls == ["first", "last"]
+
+
+def test_restore_reseeds_random_and_marks_environment(monkeypatch):
+    fresh_hooks(monkeypatch)
+    after_restore(snapstart_helper._mark_restored, order=-1)
+
+    random.seed(7)
+    snapshot_state = random.getstate()
+    run_hooks("after_restore")
+
+    assert restored()
+    assert random.getstate() != snapshot_state
+
+
+def test_factory_warms_before_snapshot_and_resets_after_restore(monkeypatch):
+    fresh_hooks(monkeypatch)
+    monkeypatch.setattr(client_helper, "_client_factory", None)
+    monkeypatch.setattr(boto3, "DEFAULT_SESSION", None)
+    factory = install_client_factory()
+
+    warmed = []
+    monkeypatch.setattr(client_helper, "warm_operations", lambda client, operations: warmed.append(client.meta.service_model.service_name))
+
+    # El handler registra su pool después de instalar la fábrica; sus clientes igual se precalientan
+    pool = TimeoutClientPool(
+        lambda timeout: boto3.client("bedrock-runtime", region_name="us-east-1", config=client_helper.Config(read_timeout=timeout)),
+        step_seconds=10
+    )
+    before_snapshot(pool.warm)
+    run_hooks("before_snapshot")
+
+    assert len(pool._clients) == 2
+    assert warmed == ["bedrock-runtime", "bedrock-runtime"]
+
+
+def test_warm_clients_and_reset_connections():
+    factory = ClientFactory(region_name="us-east-1")
+    dynamodb = factory.client("dynamodb")
+    factory.resource("s3")
+    factory.client("sts")
+
+    assert factory.warm_clients() == 2
+    assert factory.reset_connections() == 3
+    # Un cliente cerrado vuelve a abrir conexiones en la siguiente llamada
+    assert dynamodb.meta.service_model.operation_model("GetItem").name == "GetItem"
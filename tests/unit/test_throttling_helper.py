@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import ANY, Stubber
+
+from aprendizaje_libs.helpers.throttling_helper import (
+    BedrockGovernor,
+    BedrockThrottledError,
+    DynamoDBStateStore,
+    InMemoryStateStore,
+)
+
+KEY = "bedrock#test-model"
+
+
+def throttling_error():
+    return ClientError({"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "Converse")
+
+
+def make_governor(store, **kwargs):
+    defaults = dict(store=store, key=KEY, max_limit=8, increase_interval_seconds=0, sleep=lambda _: None)
+    defaults.update(kwargs)
+    return BedrockGovernor(**defaults)
+
+
+def test_success_releases_slot_and_increases_limit():
+    store = InMemoryStateStore()
+    store.compare_and_set_limit(KEY, 4, None)
+    governor = make_governor(store)
+
+    assert governor.call(lambda value: value * 2, 21) == 42
+    assert store.get_limit(KEY) == 5
+    assert all(store.try_acquire(KEY, slot, 60) for slot in range(5))
+
+
+def test_throttle_decreases_limit_and_retries():
+    store = InMemoryStateStore()
+    governor = make_governor(store, limit_cache_seconds=0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise throttling_error()
+        return "ok"
+
+    assert governor.call(flaky) == "ok"
+    assert len(calls) == 3
+    # 8 -> 4 -> 2 por las limitaciones y +1 tras el éxito
+    assert store.get_limit(KEY) == 3
+
+
+def test_budget_exhausted_raises_throttled_error():
+    governor = make_governor(InMemoryStateStore(), max_attempts=2)
+
+    def always_throttled():
+        raise throttling_error()
+
+    with pytest.raises(BedrockThrottledError):
+        governor.call(always_throttled)
+
+
+def test_retries_stop_when_lambda_time_runs_out():
+    governor = make_governor(InMemoryStateStore(), max_attempts=10, safety_margin_ms=1000)
+    calls = []
+
+    def always_throttled():
+        calls.append(1)
+        raise throttling_error()
+
+    with pytest.raises(BedrockThrottledError):
+        governor.call(always_throttled, remaining_time_ms=lambda: 500)
+    assert len(calls) == 1
+
+
+def test_non_throttling_errors_propagate():
+    governor = make_governor(InMemoryStateStore())
+
+    def broken():
+        raise ClientError({"Error": {"Code": "ValidationException", "Message": "bad"}}, "Converse")
+
+    with pytest.raises(ClientError):
+        governor.call(broken)
+
+
+def test_dynamodb_store_uses_the_thread_safe_client():
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("governor")
+    store = DynamoDBStateStore(SimpleNamespace(get_table=lambda: table))
+    assert store.client is table.meta.client
+
+    slot_key = {"governor_key": f"{KEY}#slot#0"}
+    with Stubber(store.client) as stubber:
+        stubber.add_response("get_item", {"Item": {"concurrency_limit": {"N": "4"}}}, {
+            "TableName": "governor", "Key": {"governor_key": f"{KEY}#limit"}
+        })
+        stubber.add_response("put_item", {}, {
+            "TableName": "governor",
+            "Item": {**slot_key, "lease_expires": ANY, "ttl": ANY},
+            "ConditionExpression": "attribute_not_exists(#k) OR lease_expires < :now",
+            "ExpressionAttributeNames": {"#k": "governor_key"},
+            "ExpressionAttributeValues": {":now": ANY}
+        })
+        stubber.add_client_error("put_item", "ConditionalCheckFailedException")
+        stubber.add_response("delete_item", {}, {"TableName": "governor", "Key": slot_key})
+
+        assert store.get_limit(KEY) == 4
+        assert store.try_acquire(KEY, 0, 90) is True
+        assert store.compare_and_set_limit(KEY, 2, 4) is False
+        store.release(KEY, 0)
+        stubber.assert_no_pending_responses()
@@ -0,0 +1,67 @@
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aprendizaje_libs.helpers import metrics_helper, tracing_helper
+from aprendizaje_libs.helpers.metrics_helper import instrument, stage
+from aprendizaje_libs.helpers.tracing_helper import InMemoryExporter, annotate, bind_context, item_size, set_exporter, subsegment
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    monkeypatch.setattr(metrics_helper, "emit", lambda documents: None)
+    exporter = InMemoryExporter()
+    previous = set_exporter(exporter)
+    yield exporter
+    set_exporter(previous)
+
+
+def test_handler_stages_and_calls_are_nested_spans(exporter):
+    @instrument("ruta-estandar-evaluar")
+    def handler(event, context):
+        with stage("prompt"):
+            pass
+        with subsegment("converse", model_id="model-a") as span:
+            span.annotate(output_tokens=42)
+        annotate(table="historial")
+        return {"statusCode": 200}
+
+    handler({"resource": "/api/v1/evaluar_reto_estandar"}, types.SimpleNamespace(aws_request_id="req-1"))
+
+    [root] = exporter.find("handler")
+    [prompt] = exporter.find("prompt")
+    [converse] = exporter.find("converse")
+    assert root.annotations["endpoint"] == "evaluar_reto_estandar" and root.annotations["table"] == "historial"
+    assert prompt.parent is root and converse.parent is root
+    assert converse.annotations == {"model_id": "model-a", "output_tokens": 42}
+    assert exporter.current() is None
+
+
+def test_errors_are_recorded_on_the_span(exporter):
+    with pytest.raises(ValueError):
+        with subsegment("history_write"):
+            raise ValueError("sin tabla")
+
+    assert exporter.find("history_write")[0].error == "ValueError"
+
+
+def test_bind_context_propagates_the_parent_to_worker_threads(exporter):
+    def run(item):
+        with subsegment("item", index=item):
+            return item
+
+    with subsegment("batch") as batch:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            assert list(executor.map(bind_context(run), range(3))) == [0, 1, 2]
+
+    items = exporter.find("item")
+    assert len(items) == 3 and all(span.parent is batch for span in items)
+
+
+def test_default_exporter_is_noop():
+    assert isinstance(tracing_helper._exporter["current"], tracing_helper.NoopExporter)
+    with subsegment("embedding", top_k=5) as span:
+        span.annotate(matches=3)
+    assert bind_context(len) is len
+    assert item_size({"id": "á"}) == len('{"id": "á"}'.encode("utf-8"))
@@ -0,0 +1,114 @@
+import json
+import random
+
+import boto3
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from aprendizaje_libs.helpers.traffic_helper import (
+    LatencyModel,
+    ReplayIndex,
+    TrafficNotRecordedError,
+    TrafficRecorder,
+    TrafficReplayer,
+    bedrock_keys
+)
+
+SYSTEM = [{"text": "Eres un evaluador de retos."}]
+
+
+def bedrock_client():
+    session = boto3.session.Session(aws_access_key_id="test", aws_secret_access_key="test", region_name="us-east-1")
+    return session, session.client("bedrock-runtime")
+
+
+def converse_request(answer):
+    return {"modelId": "model-a", "system": SYSTEM, "messages": [{"role": "user", "content": [{"text": answer}]}]}
+
+
+def test_recorded_converse_is_replayed_for_the_same_task(tmp_path):
+    session, client = bedrock_client()
+    recorder = TrafficRecorder(str(tmp_path))
+
+    def network(**kwargs):
+        response = {
+            "output": {"message": {"role": "assistant", "content": [{"text": "0.80"}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": 12, "outputTokens": 2, "totalTokens": 14},
+            "metrics": {"latencyMs": 900}
+        }
+        return AWSResponse(None, 200, {}, None), response
+
+    client.meta.events.register("before-parameter-build.bedrock-runtime", recorder.before_parameter_build)
+    client.meta.events.register("before-call.bedrock-runtime", network)
+    client.meta.events.register("after-call.bedrock-runtime", recorder.after_call)
+    client.converse(**converse_request("respuesta grabada"))
+
+    [record] = [json.loads(line) for line in (tmp_path / "bedrock-runtime.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert record["usage"]["outputTokens"] == 2
+    assert record["keys"] == bedrock_keys("Converse", converse_request("respuesta grabada"))
+
+    sleeps = []
+    replayer = TrafficReplayer(str(tmp_path), latency=LatencyModel("fixed:250"), sleep=sleeps.append)
+    _, replay_client = bedrock_client()
+    replay_client.meta.events.register("before-parameter-build.bedrock-runtime", replayer.before_parameter_build)
+    replay_client.meta.events.register("before-call.bedrock-runtime", replayer.before_call)
+
+    # Otra respuesta del alumno para la misma tarea recibe la grabación de la tarea
+    response = replay_client.converse(**converse_request("otra respuesta"))
+
+    assert response["output"]["message"]["content"][0]["text"] == "0.80"
+    assert sleeps == [0.25]
+    assert replayer.stats == {"fallback": 1}
+
+
+def test_replay_injects_throttling_and_serves_embeddings(tmp_path):
+    body = json.dumps({"embedding": [0.1, 0.2]})
+    (tmp_path / "bedrock-runtime.jsonl").write_text(json.dumps({
+        "operation": "InvokeModel",
+        "keys": ["InvokeModel"],
+        "status": 200,
+        "latency_ms": 40,
+        "response": {"body": body, "contentType": "application/json"}
+    }) + "\n", encoding="utf-8")
+    replayer = TrafficReplayer(str(tmp_path), throttle_rate=0.5, rng=random.Random(3), sleep=lambda _: None)
+    _, client = bedrock_client()
+    client.meta.events.register("before-parameter-build.bedrock-runtime", replayer.before_parameter_build)
+    client.meta.events.register("before-call.bedrock-runtime", replayer.before_call)
+
+    outcomes = []
+    for _ in range(20):
+        try:
+            response = client.invoke_model(modelId="embed", body=json.dumps({"inputText": "hola"}))
+            outcomes.append(json.loads(response["body"].read())["embedding"])
+        except ClientError as error:
+            outcomes.append(error.response["Error"]["Code"])
+
+    assert "ThrottlingException" in outcomes
+    assert [0.1, 0.2] in outcomes
+    assert replayer.stats["throttled"] == outcomes.count("ThrottlingException")
+
+
+def test_replay_index_and_missing_recordings(tmp_path):
+    (tmp_path / "pinecone.jsonl").write_text(json.dumps({
+        "operation": "query",
+        "keys": ["query|5"],
+        "latency_ms": 30,
+        "response": {"matches": [{"id": "doc-1", "score": 0.9, "metadata": {"text": "indicadores"}}]}
+    }) + "\n", encoding="utf-8")
+    index = ReplayIndex(TrafficReplayer(str(tmp_path), sleep=lambda _: None))
+
+    assert index.query(vector=[0.3, 0.4], top_k=5, include_metadata=True)["matches"][0]["id"] == "doc-1"
+    assert index.upsert(vectors=[{"id": "a"}, {"id": "b"}]) == {"upserted_count": 2}
+    with pytest.raises(TrafficNotRecordedError):
+        index.query(vector=[0.3, 0.4], top_k=3)
+
+
+def test_latency_model_specs():
+    assert LatencyModel("recorded", scale=2.0).sample(100) == 200
+    assert LatencyModel("fixed:50").sample(1000) == 50
+    samples = [LatencyModel("lognormal:1000:0.3", rng=random.Random(1)).sample() for _ in range(5)]
+    assert all(samples) and len(set(samples)) == 1
+    with pytest.raises(ValueError):
+        LatencyModel("uniform:1:2")
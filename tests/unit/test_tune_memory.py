@@ -0,0 +1,37 @@
+import json
+
+from tools import tune_memory
+
+
+def measurement(cpu_ms, wall_ms, model_calls=1, init_cpu_ms=200, peak_rss_mb=70):
+    return {
+        "init": {"wall_ms": init_cpu_ms + 20, "cpu_ms": init_cpu_ms, "rss_mb": peak_rss_mb - 5},
+        "invocations": [{"label": "a", "cpu_ms": cpu_ms, "wall_ms": wall_ms, "model_calls": model_calls}],
+        "peak_rss_mb": peak_rss_mb
+    }
+
+
+def test_model_latency_keeps_io_bound_handlers_small():
+    recommendation = tune_memory.recommend(measurement(cpu_ms=10, wall_ms=12), headroom=1.3, max_slowdown=0.1, model_latency_ms=1500, cpu_scale=1.0)
+    # Limitado por el arranque en frío: 200 ms de CPU de inicialización son ~940 ms con 384 MB
+    assert recommendation["memory_size"] == 384
+
+    no_init_limit = tune_memory.recommend(measurement(cpu_ms=10, wall_ms=12), 1.3, 0.1, 1500, 1.0, max_init_ms=10_000)
+    assert no_init_limit["memory_size"] == 128
+
+
+def test_cpu_bound_handlers_and_memory_floor_raise_the_size():
+    cpu_bound = tune_memory.recommend(measurement(cpu_ms=800, wall_ms=800, model_calls=0), 1.3, 0.1, 1500, 1.0, max_init_ms=10_000)
+    assert cpu_bound["memory_size"] == 1769
+
+    large = tune_memory.recommend(measurement(cpu_ms=10, wall_ms=12, peak_rss_mb=700), 1.3, 0.1, 1500, 1.0)
+    assert large["memory_size"] == 1024
+
+
+def test_update_profiles_keeps_other_settings(tmp_path):
+    path = tmp_path / "function_profiles.json"
+    path.write_text(json.dumps({"prod": {"ruta-estandar-evaluar": {"memory_size": 768, "architecture": "arm64"}}}))
+
+    tune_memory.update_profiles(str(path), "prod", {"ruta-estandar-evaluar": 640, "chatbot-add_resource": 2048})
+
+    assert json.loads(path.read_text()) == {"prod": {"ruta-estandar-evaluar": {"architecture": "arm64", "memory_size": 640}}}
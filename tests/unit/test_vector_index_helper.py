@@ -0,0 +1,52 @@
+import numpy as np
+
+from aprendizaje_libs.helpers.vector_index_helper import INDEX_FILES, LocalVectorStore, write_vector_index
+
+
+class FakeS3Client:
+    def __init__(self, root):
+        self.root = root
+        self.downloads = []
+
+    def download_file(self, bucket, key, path):
+        self.downloads.append(key)
+        with open(self.root / key, "rb") as source, open(path, "wb") as target:
+            target.write(source.read())
+
+
+def make_store(tmp_path, max_vectors=100):
+    exported = tmp_path / "s3" / "indices"
+    vectors = [[1.0, 0.0], [0.6, 0.8], [0.0, 1.0]]
+    records = [{"id": f"v{i}", "resource_id": "10", "chunk_index": i, "text": f"chunk {i} ñandú"} for i in range(3)]
+    write_vector_index(str(exported / "10"), vectors, records, "titan-v2")
+    client = FakeS3Client(tmp_path / "s3")
+    store = LocalVectorStore(
+        s3_client=client, bucket="bucket", prefix="indices", embeddings_model_id="titan-v2",
+        max_vectors=max_vectors, min_threshold=0.5, max_retrieve_documents=5, cache_dir=str(tmp_path / "cache")
+    )
+    return store, client
+
+
+def test_local_store_matches_pinecone_query_format(tmp_path):
+    store, client = make_store(tmp_path)
+
+    assert store.covers(["10"])
+    matches = store.query(embeddings=[2.0, 0.1], filter_conditions={"resource_id": {"$in": ["10"]}}, top_k=3)
+
+    assert [match["id"] for match in matches] == ["v0", "v1"]
+    assert matches[0]["metadata"]["text"] == "chunk 0 ñandú"
+    assert np.isclose(matches[0]["score"], 2.0 / np.hypot(2.0, 0.1))
+
+    # El índice queda en caché entre consultas
+    store.query(embeddings=[0.0, 1.0], filter_conditions={"resource_id": {"$in": ["10"]}})
+    assert len(client.downloads) == len(INDEX_FILES)
+
+
+def test_falls_back_when_index_missing_large_or_incompatible(tmp_path):
+    store, _ = make_store(tmp_path, max_vectors=2)
+    assert not store.covers(["10"])
+    assert not store.covers(["10", "99"])
+
+    store, _ = make_store(tmp_path)
+    store.embeddings_model_id = "otro-modelo"
+    assert not store.covers(["10"])
@@ -0,0 +1,70 @@
+"""
+Calibra las bandas del pre-puntaje de evaluar contra el historial de evaluaciones.
+
+Lee de la tabla de historial las evaluaciones cuyo puntaje asignó el modelo y que guardaron la
+similitud del pre-puntaje (`prescore_reason` llm o audit), y calcula las bandas de similitud
+en las que el puntaje es estable. El resultado se copia en `PRESCORE_BANDS` del parámetro
+`/<environment>/<project>/agent`.
+
+Uso:
+    python tools/calibrate_prescore.py --table <evaluation_history> [--region us-east-1] [--tolerance 0.1]
+"""
+import argparse
+import json
+import os
+import sys
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "artifacts", "aws-lambda", "layer", "aprendizaje_libs", "python"))
+
+from aprendizaje_libs.helpers.prescoring_helper import MODEL_SCORED_REASONS, calibrate_bands  # noqa: E402
+
+
+def load_samples(table_name: str, region_name: str, tipo_metodo_id: int = None):
+    """Devuelve las similitudes y puntajes de las evaluaciones puntuadas por el modelo."""
+    table = boto3.resource("dynamodb", region_name=region_name).Table(table_name)
+    filter_expression = Attr("prescore_reason").is_in(list(MODEL_SCORED_REASONS)) & Attr("prescore_similarity").exists()
+    if tipo_metodo_id is not None:
+        filter_expression = filter_expression & Attr("tipo_metodo_id").eq(tipo_metodo_id)
+
+    similarities, scores = [], []
+    kwargs = {"FilterExpression": filter_expression, "ProjectionExpression": "prescore_similarity, score"}
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get("Items", []):
+            if item.get("prescore_similarity") is None:
+                continue
+            similarities.append(float(item["prescore_similarity"]))
+            scores.append(float(item["score"]))
+        if "LastEvaluatedKey" not in response:
+            return similarities, scores
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", required=True, help="Nombre de la tabla de historial de evaluaciones")
+    parser.add_argument("--region", default=os.getenv("REGION_NAME"), help="Región de la tabla")
+    parser.add_argument("--tipo-metodo-id", type=int, default=None, help="Filtra por tipo de método")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Error absoluto medio aceptado por banda")
+    parser.add_argument("--min-samples", type=int, default=30, help="Mínimo de evaluaciones por banda")
+    parser.add_argument("--audit-rate", type=float, default=0.05, help="Fracción de respuestas en banda que se siguen puntuando con el modelo")
+    args = parser.parse_args()
+
+    similarities, scores = load_samples(args.table, args.region, args.tipo_metodo_id)
+    if not similarities:
+        sys.exit("No hay evaluaciones con similitud registrada; active PRESCORE_BANDS.enabled para recolectarlas")
+
+    result = calibrate_bands(similarities, scores, tolerance=args.tolerance, min_samples=args.min_samples)
+    coverage = result.pop("coverage")
+    samples = result.pop("samples")
+    bands = {"enabled": True, **{key: value for key, value in result.items() if value is not None}, "audit_rate": args.audit_rate}
+
+    print(f"Evaluaciones: {samples} | Cobertura de las bandas: {coverage:.1%}", file=sys.stderr)
+    print(json.dumps({"PRESCORE_BANDS": bands}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Comprueba que las layers importadas por ARN sirven al runtime y a las arquitecturas del stack.
+
+El stack solo conoce lo declarado en app_config["artifacts"]["aws_lambda_layer_compatibility"]
+(sin declaración se asume x86_64). Este script consulta en Lambda los CompatibleRuntimes y
+CompatibleArchitectures publicados de cada versión de layer y los compara con lo que necesitan
+las funciones del entorno (perfiles resueltos como en el stack). Conviene correrlo antes de
+cambiar LAMBDA_RUNTIME, apuntar una layer a otro ARN o pasar funciones a arm64.
+
+Uso:
+    python tools/check_layers.py --environment prod [--config cdk.json] [--region us-east-1] [--account 123456789012]
+
+Termina con código 1 si alguna layer no declara el runtime o una arquitectura que se usa.
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from constants.functions import FUNCTIONS, load_tuned_profiles, merge_profile_overrides, resolve_profile  # noqa: E402
+from constants.layers import IMPORTED_LAYERS  # noqa: E402
+
+# Debe coincidir con CdkAprendizajeGuiadoStack.LAMBDA_RUNTIME
+LAMBDA_RUNTIME = "python3.12"
+
+
+def required_architectures(app_config, environment):
+    """Arquitecturas que necesita cada layer importada (clave de aws_lambda_layers) en el entorno"""
+    overrides = merge_profile_overrides(load_tuned_profiles(), app_config.get("function_profiles", {}))
+    required = {}
+    for spec in FUNCTIONS:
+        architecture = resolve_profile(spec, overrides, environment).architecture
+        for layer in spec.layers:
+            if layer in IMPORTED_LAYERS:
+                required.setdefault(IMPORTED_LAYERS[layer], set()).add(architecture)
+    return required
+
+
+def layer_problems(layer_key, layer_version, runtime, architectures):
+    """
+    Diferencias entre una versión de layer (respuesta de get_layer_version_by_arn) y lo requerido.
+
+    Una layer publicada sin CompatibleArchitectures se toma como x86_64, igual que en el stack.
+    """
+    problems = []
+    runtimes = layer_version.get("CompatibleRuntimes", [])
+    if runtime not in runtimes:
+        problems.append(f"{layer_key}: {runtime} no está entre sus runtimes compatibles {runtimes}")
+    published = layer_version.get("CompatibleArchitectures") or ["x86_64"]
+    for architecture in sorted(set(architectures) - set(published)):
+        problems.append(f"{layer_key}: {architecture} no está entre sus arquitecturas compatibles {published}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--environment", default=os.getenv("ENVIRONMENT"), required=os.getenv("ENVIRONMENT") is None)
+    parser.add_argument("--config", default=os.path.join(ROOT, "cdk.json"), help="cdk.json con context.project_config")
+    parser.add_argument("--region", default=os.getenv("REGION_NAME"))
+    parser.add_argument("--account", default=os.getenv("ACCOUNT_ID"))
+    args = parser.parse_args()
+
+    import boto3
+
+    with open(args.config, encoding="utf-8") as file:
+        app_config = json.load(file)["context"]["project_config"]["app_config"]
+    arns = app_config["artifacts"]["aws_lambda_layers"]
+    lambda_client = boto3.client("lambda", region_name=args.region)
+
+    problems = []
+    for layer_key, architectures in sorted(required_architectures(app_config, args.environment).items()):
+        arn = arns[layer_key].replace("${region}", args.region or "").replace("${account}", args.account or "")
+        layer_version = lambda_client.get_layer_version_by_arn(Arn=arn)
+        problems.extend(layer_problems(layer_key, layer_version, LAMBDA_RUNTIME, architectures))
+
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("Todas las layers importadas son compatibles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Ejecución local de los handlers con AWS y Pinecone simulados.
+
+Carga el lambda_function.py de un handler como lo haría el runtime (importación del módulo =
+fase de inicialización) y lo invoca con eventos grabados. Todas las llamadas a AWS pasan por
+FakeAws, que responde en memoria según el servicio y la operación: Parameter Store devuelve
+la configuración de AGENT_PARAMETERS, Bedrock responde con textos de ejemplo o con los
+`model_outputs` del evento, y DynamoDB, S3, SQS y API Gateway aceptan las escrituras sin
+persistirlas. El módulo `pinecone` se reemplaza por un índice en memoria.
+
+Lo usan tools/tune_memory.py y las pruebas de rendimiento; no sirve para verificar la lógica
+de negocio contra datos reales.
+"""
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import time
+import types
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import botocore.client
+import botocore.exceptions
+from botocore.response import StreamingBody
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LAMBDA_CODE = os.path.join(ROOT, "artifacts", "aws-lambda", "code")
+ADD_RESOURCE_DIR = os.path.join(ROOT, "artifacts", "aws-lambda", "docker", "chatbot", "add_resource")
+LAYER_PATHS = [
+    os.path.join(ROOT, "artifacts", "aws-lambda", "layer", "aprendizaje_libs", "python"),
+    os.path.join(ADD_RESOURCE_DIR, "aje_libs-0.1.0-py3-none-any.whl"),
+]
+
+# Función de la imagen de add_resource; no está en constants/functions.py porque se despliega aparte
+ADD_RESOURCE_FUNCTION = "chatbot-add_resource"
+
+HANDLER_ENVIRONMENT = {
+    "ENVIRONMENT": "dev",
+    "PROJECT_NAME": "aprendizaje-guiado",
+    "OWNER": "harness",
+    "DYNAMO_CASE_HISTORY_TABLE": "case-history",
+    "DYNAMO_EVALUATION_HISTORY_TABLE": "evaluation-history",
+    "DYNAMO_REGENERATED_CHALLENGES_HISTORY_TABLE": "regenerated-challenges-history",
+    "DYNAMO_LEARNING_PATH_HISTORY_TABLE": "learning-path-history",
+    "DYNAMO_BEDROCK_GOVERNOR_TABLE": "bedrock-governor",
+    "DYNAMO_GENERATION_JOBS_TABLE": "generation-jobs",
+    "DYNAMO_IDEMPOTENCY_TABLE": "idempotency",
+    "DYNAMO_RESOURCES_TABLE": "resources",
+    "DYNAMO_RESOURCES_HASH_TABLE": "resources-hash",
+    "DYNAMO_LIBRARY_TABLE": "library",
+    "S3_RESOURCES_BUCKET": "resources-bucket",
+    "GENERATION_JOBS_QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/000000000000/generation-jobs",
+    "WEBSOCKET_CALLBACK_URL": "https://example.execute-api.us-east-1.amazonaws.com/dev",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "harness",
+    "AWS_SECRET_ACCESS_KEY": "harness",
+}
+
+# Parámetro /<environment>/<project>/agent; los opcionales quedan con sus valores por defecto
+AGENT_PARAMETERS = {
+    "CHATBOT_MODEL_ID": "anthropic.claude-3-5-sonnet-20240620-v1:0",
+    "CHATBOT_REGION": "us-east-1",
+    "CHATBOT_LLM_MAX_TOKENS": 2000,
+    "CHATBOT_HISTORY_ELEMENTS": 4,
+    "PINECONE_MAX_RETRIEVE_DOCUMENTS": 5,
+    "PINECONE_MIN_THRESHOLD": 0.3,
+    "EMBEDDINGS_MODEL_ID": "amazon.titan-embed-text-v2:0",
+    "EMBEDDINGS_REGION": "us-east-1",
+}
+
+# Parámetro /<environment>/<project>/chatbot de add_resource
+CHATBOT_PARAMETERS = {
+    "EMBEDDINGS_MODEL_ID": AGENT_PARAMETERS["EMBEDDINGS_MODEL_ID"],
+    "EMBEDDINGS_REGION": AGENT_PARAMETERS["EMBEDDINGS_REGION"],
+}
+
+EMBEDDING_DIMENSION = 1024
+
+
+def sample_model_output(retos=5):
+    """
+    Respuesta de ejemplo que sirve a todos los handlers: la primera línea es un puntaje
+    (evaluar) y el resto trae retroalimentación y una ruta con título y `retos` retos completos.
+    """
+    blocks = ["0.85", "@Retroalimentacion: Identificaste el concepto central; revisa cómo se aplica en otro contexto.", "@Titulo: Ruta de práctica"]
+    for number in range(1, retos + 1):
+        blocks.append("\n".join([
+            f"@Reto: Reto {number}",
+            f"@Contexto: Una empresa de distribución necesita ordenar sus procesos del área {number}.",
+            f"@Pregunta: ¿Qué indicador propondrías para medir el avance del área {number} y por qué?",
+            "@Respuesta Modelo: Un indicador de eficiencia con meta trimestral, porque permite comparar periodos y decidir acciones.",
+            "@Conceptos Claves: indicadores, eficiencia, mejora continua.",
+        ]))
+    return "\n\n".join(blocks)
+
+
+def fake_embedding(text, dimension=EMBEDDING_DIMENSION):
+    """Vector unitario determinista por texto, para que las similitudes sean estables entre corridas."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    generator = random.Random(seed)
+    values = [generator.gauss(0.0, 1.0) for _ in range(dimension)]
+    norm = math.sqrt(sum(value * value for value in values)) or 1.0
+    return [value / norm for value in values]
+
+
+class FakeAws:
+    """
+    Reemplazo de BaseClient._make_api_call que responde en memoria.
+
+    Las respuestas no pasan por la validación ni el parseo de botocore, de modo que el costo
+    medido es el del handler y no el de la red. `responses[(servicio, operación)]` permite fijar
+    una respuesta o una función `(params) -> respuesta`; `calls` cuenta las llamadas hechas.
+    Los servicios de `passthrough` usan el camino real de botocore (p. ej. bedrock-runtime en
+    modo TRAFFIC_MODE=replay, o dynamodb contra DynamoDB Local).
+    """
+
+    def __init__(self, model_outputs=None, responses=None, passthrough=()):
+        self.model_outputs = deque(model_outputs or [])
+        self.responses = dict(responses or {})
+        self.passthrough = frozenset(passthrough)
+        self.calls = Counter()
+        self.default_model_output = sample_model_output()
+
+    def __call__(self, client, operation_name, api_params):
+        service_name = client.meta.service_model.service_name
+        self.calls[(service_name, operation_name)] += 1
+        override = self.responses.get((service_name, operation_name))
+        if override is not None:
+            return override(api_params) if callable(override) else override
+        handler = getattr(self, f"_{service_name.replace('-', '_')}", None)
+        return handler(operation_name, api_params) if handler else {}
+
+    @property
+    def model_calls(self):
+        return sum(count for (service, operation), count in self.calls.items() if service == "bedrock-runtime" and operation.startswith("Converse"))
+
+    def _ssm(self, operation_name, params):
+        values = CHATBOT_PARAMETERS if params.get("Name", "").endswith("/chatbot") else AGENT_PARAMETERS
+        return {"Parameter": {"Name": params.get("Name"), "Type": "String", "Value": json.dumps(values)}}
+
+    def _secretsmanager(self, operation_name, params):
+        return {"SecretString": json.dumps({"PINECONE_INDEX_NAME": "harness", "PINECONE_API_KEY": "harness"})}
+
+    def _dynamodb(self, operation_name, params):
+        if operation_name == "DescribeTable":
+            return {"Table": {"TableName": params["TableName"], "TableStatus": "ACTIVE"}}
+        if operation_name in ("Query", "Scan"):
+            return {"Items": [], "Count": 0, "ScannedCount": 0}
+        if operation_name == "BatchWriteItem":
+            return {"UnprocessedItems": {}}
+        if operation_name == "BatchGetItem":
+            return {"Responses": {}, "UnprocessedKeys": {}}
+        return {}
+
+    def _bedrock_runtime(self, operation_name, params):
+        if operation_name == "InvokeModel":
+            text = json.loads(params["body"]).get("inputText", "")
+            payload = json.dumps({"embedding": fake_embedding(text), "inputTextTokenCount": len(text.split())}).encode("utf-8")
+            return {"body": StreamingBody(io.BytesIO(payload), len(payload)), "contentType": "application/json"}
+        text = self.model_outputs.popleft() if self.model_outputs else self.default_model_output
+        input_tokens = sum(len(block.get("text", "").split()) for message in params.get("messages", []) for block in message.get("content", []))
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": input_tokens, "outputTokens": len(text.split()), "totalTokens": input_tokens + len(text.split())},
+            "metrics": {"latencyMs": 0}
+        }
+
+    def _s3(self, operation_name, params):
+        if operation_name == "GetObject":
+            raise botocore.exceptions.ClientError({"Error": {"Code": "NoSuchKey", "Message": "harness"}}, operation_name)
+        if operation_name == "PutObject":
+            return {"ETag": '"harness"'}
+        return {}
+
+    def _sqs(self, operation_name, params):
+        return {"MessageId": str(uuid.uuid4())}
+
+
+class FakeIndex:
+    """Índice de Pinecone en memoria con la interfaz que usa PineconeHelper."""
+
+    def __init__(self, name):
+        self.name = name
+        self.vectors = {}
+
+    def describe_index_stats(self):
+        return {"dimension": EMBEDDING_DIMENSION, "total_vector_count": len(self.vectors)}
+
+    def upsert(self, vectors, namespace=None):
+        for vector in vectors:
+            self.vectors[vector["id"]] = vector
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids=None, delete_all=False, namespace=None):
+        if delete_all:
+            self.vectors.clear()
+        for vector_id in ids or []:
+            self.vectors.pop(vector_id, None)
+        return {}
+
+    def query(self, vector, top_k=10, include_metadata=True, filter=None, namespace=None):
+        stored = list(self.vectors.values()) or [
+            {
+                "id": f"doc-{index}",
+                "values": fake_embedding(f"doc-{index}"),
+                "metadata": {"resource_id": "1", "chunk_index": index, "text": f"Fragmento de ejemplo {index} sobre indicadores y mejora continua. " * 20}
+            }
+            for index in range(top_k)
+        ]
+        matches = [
+            {"id": item["id"], "score": sum(a * b for a, b in zip(vector, item["values"])) * 0.5 + 0.5, "metadata": item["metadata"] if include_metadata else {}}
+            for item in stored
+        ]
+        matches.sort(key=lambda match: match["score"], reverse=True)
+        return {"matches": matches[:top_k], "namespace": namespace or ""}
+
+
+def fake_pinecone_module():
+    """Módulo `pinecone` con un índice en memoria por nombre."""
+    module = types.ModuleType("pinecone")
+    indexes = {}
+
+    class Pinecone:
+        def __init__(self, api_key=None, **kwargs):
+            self.api_key = api_key
+
+        def Index(self, name):
+            return indexes.setdefault(name, FakeIndex(name))
+
+    module.Pinecone = Pinecone
+    module.indexes = indexes
+    return module
+
+
+class FakeContext:
+    """Contexto de Lambda con el plazo restante calculado desde la invocación."""
+
+    def __init__(self, function_name, memory_limit_in_mb=512, timeout_seconds=30):
+        self.function_name = function_name
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:000000000000:function:{function_name}"
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+@contextmanager
+def fake_services(fake_aws=None):
+    """
+    Instala FakeAws, el módulo `pinecone` simulado y las variables de entorno de los handlers.
+
+    :param fake_aws: Instancia a usar; por defecto una nueva.
+    :return: La instancia de FakeAws instalada.
+    """
+    fake_aws = fake_aws or FakeAws()
+    original_call = botocore.client.BaseClient._make_api_call
+    original_pinecone = sys.modules.get("pinecone")
+    original_environ = dict(os.environ)
+    original_path = list(sys.path)
+
+    def make_api_call(client, operation_name, api_params):
+        if client.meta.service_model.service_name in fake_aws.passthrough:
+            fake_aws.calls[(client.meta.service_model.service_name, operation_name)] += 1
+            return original_call(client, operation_name, api_params)
+        return fake_aws(client, operation_name, api_params)
+
+    botocore.client.BaseClient._make_api_call = make_api_call
+    sys.modules["pinecone"] = fake_pinecone_module()
+    os.environ.update(HANDLER_ENVIRONMENT)
+    for path in reversed(LAYER_PATHS):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    try:
+        yield fake_aws
+    finally:
+        botocore.client.BaseClient._make_api_call = original_call
+        if original_pinecone is None:
+            sys.modules.pop("pinecone", None)
+        else:
+            sys.modules["pinecone"] = original_pinecone
+        os.environ.clear()
+        os.environ.update(original_environ)
+        sys.path[:] = original_path
+
+
+def handler_path(group, handler_name):
+    """Ruta del lambda_function.py de un handler (`add_resource` para la imagen de add_resource)."""
+    if handler_name == "add_resource":
+        return os.path.join(ADD_RESOURCE_DIR, "lambda_function.py")
+    return os.path.join(LAMBDA_CODE, group, handler_name, "lambda_function.py")
+
+
+def load_handler(group, handler_name):
+    """
+    Importa el módulo de un handler con un nombre único, ejecutando su inicialización.
+
+    Debe llamarse dentro de fake_services(); cada llamada crea un módulo nuevo.
+    """
+    path = handler_path(group, handler_name)
+    module_name = f"harness_{group}_{handler_name}_{uuid.uuid4().hex[:8]}".replace("-", "_")
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve_documents(module, documents):
+    """
+    Reemplaza la descarga de Google Drive de add_resource por copias de archivos locales.
+
+    :param module: Módulo de add_resource cargado con load_handler.
+    :param documents: DriveId -> ruta local del documento.
+    """
+    def download_file_from_gdrive(file_name, gdrive_id):
+        os.makedirs(module.DOWNLOAD_FOLDER, exist_ok=True)
+        file_path = os.path.join(module.DOWNLOAD_FOLDER, file_name)
+        shutil.copyfile(documents[gdrive_id], file_path)
+        return file_path
+
+    module.download_file_from_gdrive = download_file_from_gdrive
+
+
+def build_event(entry):
+    """
+    Evento de Lambda de una entrada del corpus.
+
+    Las entradas traen `event` (evento completo, p. ej. SQS o pathParameters) o `body`
+    (cuerpo de una solicitud de API Gateway).
+    """
+    if "event" in entry:
+        return entry["event"]
+    return {"body": json.dumps(entry["body"], ensure_ascii=False), "headers": {"Content-Type": "application/json"}}
+
+
+def load_corpus(path):
+    """Entradas de un archivo JSON Lines del corpus, ignorando líneas vacías y comentarios (#)."""
+    entries = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entries.append(json.loads(line))
+    return entries
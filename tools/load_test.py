@@ -0,0 +1,148 @@
+"""
+Pruebas de carga de los handlers con Bedrock y Pinecone grabados (traffic_helper).
+
+Grabación (--record): ejecuta el corpus de tools/corpus/<función>.jsonl contra los servicios
+reales con TRAFFIC_MODE=record y guarda en --traffic-dir las respuestas de Bedrock y Pinecone
+con su uso de tokens y latencia. Requiere credenciales de AWS, el paquete pinecone y las
+variables de entorno del handler (ENVIRONMENT, PROJECT_NAME, tablas...) como en la función
+desplegada.
+
+Reproducción (por defecto): simula `--concurrency` contenedores, cada uno con su propia carga
+del handler, que atienden `--requests` solicitudes del corpus en paralelo. Bedrock y Pinecone
+responden desde las grabaciones con la latencia de --latency y el throttling de
+--throttle-rate, sin red; el resto del handler (cachés, BedrockGovernor, escrituras en
+DynamoDB) sigue su camino normal. DynamoDB y los demás servicios se simulan en memoria
+(tools/lambda_harness.py) salvo que se indique --dynamodb-endpoint (p. ej. DynamoDB Local con
+las tablas creadas), en cuyo caso las escrituras y el estado compartido de BedrockGovernor son
+reales.
+
+Uso:
+    python tools/load_test.py --function ruta-estandar-evaluar --record --traffic-dir traffic/
+    python tools/load_test.py --function ruta-estandar-evaluar --traffic-dir traffic/ --concurrency 20 --requests 400 \\
+        [--latency lognormal:1800:0.5] [--throttle-rate 0.05] [--dynamodb-endpoint http://localhost:8000] [--output report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from tools.lambda_harness import LAYER_PATHS, FakeAws, FakeContext, build_event, fake_services, load_corpus, load_handler  # noqa: E402
+from tools.tune_memory import CORPUS_DIR, percentile, targets  # noqa: E402
+
+
+def record(name, corpus, traffic_dir):
+    """Ejecuta cada entrada del corpus una vez contra los servicios reales, grabando el tráfico."""
+    _, group, handler_name, entry, timeout_seconds = targets()[name]
+    os.environ.update({"TRAFFIC_MODE": "record", "TRAFFIC_DIR": traffic_dir})
+    for path in reversed(LAYER_PATHS):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    handler = getattr(load_handler(group, handler_name), entry)
+    statuses = Counter()
+    for entry_data in corpus:
+        response = handler(build_event(entry_data), FakeContext(name, timeout_seconds=timeout_seconds))
+        statuses[str(response.get("statusCode"))] += 1
+    return {"function": name, "recorded": len(corpus), "status_codes": dict(statuses)}
+
+
+def replay(name, corpus, traffic_dir, concurrency, requests, latency, throttle_rate, dynamodb_endpoint=None):
+    """
+    Atiende `requests` solicitudes con `concurrency` contenedores simulados en paralelo.
+
+    :return: Reporte con códigos de estado, percentiles de duración y estadísticas de la reproducción.
+    """
+    _, group, handler_name, entry, timeout_seconds = targets()[name]
+    passthrough = {"bedrock-runtime"} | ({"dynamodb"} if dynamodb_endpoint else set())
+    with fake_services(FakeAws(passthrough=passthrough)) as fake_aws:
+        os.environ.update({
+            "TRAFFIC_MODE": "replay",
+            "TRAFFIC_DIR": traffic_dir,
+            "TRAFFIC_LATENCY": latency,
+            "TRAFFIC_THROTTLE_RATE": str(throttle_rate)
+        })
+        if dynamodb_endpoint:
+            os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = dynamodb_endpoint
+
+        from aprendizaje_libs.helpers.traffic_helper import _installed
+
+        # Un contenedor por hilo: como en Lambda, cada uno atiende una solicitud a la vez
+        containers = threading.local()
+        lock = threading.Lock()
+
+        def invoke(index):
+            if not hasattr(containers, "handler"):
+                with lock:
+                    containers.handler = getattr(load_handler(group, handler_name), entry)
+            entry_data = corpus[index % len(corpus)]
+            event = dict(build_event(entry_data))
+            # Cada solicitud es distinta para idempotency_helper: el corpus se repite y, con
+            # DynamoDB Local, los duplicados recibirían la respuesta guardada sin ejecutar el handler
+            event["headers"] = {**(event.get("headers") or {}), "Idempotency-Key": str(uuid.uuid4())}
+            started = time.perf_counter()
+            try:
+                status = str(containers.handler(event, FakeContext(name, timeout_seconds=timeout_seconds)).get("statusCode"))
+            except Exception as error:
+                status = type(error).__name__
+            return status, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(invoke, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        durations = [duration for _, duration in results]
+        replayer = _installed.get("handler")
+        return {
+            "function": name,
+            "concurrency": concurrency,
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 2),
+            "status_codes": dict(Counter(status for status, _ in results)),
+            "duration_ms": {label: round(percentile(durations, fraction), 1) for label, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "bedrock_calls": sum(count for (service, _), count in fake_aws.calls.items() if service == "bedrock-runtime"),
+            "replay": dict(replayer.stats) if replayer is not None else {}
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--function", required=True, help="Función del registro (constants/functions.py)")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directorio con un <función>.jsonl por función")
+    parser.add_argument("--traffic-dir", required=True, help="Carpeta de las grabaciones")
+    parser.add_argument("--record", action="store_true", help="Graba el tráfico real en lugar de reproducirlo")
+    parser.add_argument("--concurrency", type=int, default=10, help="Contenedores simulados en paralelo")
+    parser.add_argument("--requests", type=int, default=100, help="Solicitudes totales")
+    parser.add_argument("--latency", default="recorded", help="recorded | fixed:<ms> | lognormal:<mediana_ms>:<sigma>")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fracción de llamadas a Bedrock con ThrottlingException")
+    parser.add_argument("--dynamodb-endpoint", help="Endpoint de DynamoDB Local; sin él DynamoDB se simula en memoria")
+    parser.add_argument("--output", help="Archivo JSON donde guardar el reporte")
+    args = parser.parse_args()
+
+    if args.function not in targets():
+        sys.exit(f"Función desconocida: {args.function}")
+    corpus = load_corpus(os.path.join(args.corpus, f"{args.function}.jsonl"))
+    traffic_dir = os.path.abspath(args.traffic_dir)
+    if args.record:
+        report = record(args.function, corpus, traffic_dir)
+    else:
+        report = replay(
+            args.function, corpus, traffic_dir, args.concurrency, args.requests,
+            args.latency, args.throttle_rate, dynamodb_endpoint=args.dynamodb_endpoint
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Perfil del tiempo de importación de cada handler, con el formato de `python -X importtime`.
+
+Ejecuta en un proceso nuevo solo las sentencias import de nivel de módulo de cada
+lambda_function.py (no la inicialización con SSM, Secrets o DynamoDB) y reporta el tiempo
+total y los paquetes más costosos. Sirve para comparar el arranque en frío antes y después de
+cambiar las dependencias de un handler; el JSON se guarda como referencia con --output.
+
+Uso:
+    python tools/profile_imports.py [--handler ruta-estandar/generar_ruta] [--top 15] [--output import_profile.json]
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LAMBDA_CODE = os.path.join(ROOT, "artifacts", "aws-lambda", "code")
+LAYER_PATHS = [
+    os.path.join(ROOT, "artifacts", "aws-lambda", "layer", "aprendizaje_libs", "python"),
+    os.path.join(ROOT, "artifacts", "aws-lambda", "docker", "chatbot", "add_resource", "aje_libs-0.1.0-py3-none-any.whl"),
+]
+
+# Separa en stderr las importaciones del intérprete de las del handler
+MARKER = "--- handler imports ---"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def find_handlers():
+    """Handlers como `<grupo>/<handler>` con su lambda_function.py."""
+    handlers = []
+    for group in sorted(os.listdir(LAMBDA_CODE)):
+        group_dir = os.path.join(LAMBDA_CODE, group)
+        if not os.path.isdir(group_dir):
+            continue
+        for handler in sorted(os.listdir(group_dir)):
+            if os.path.isfile(os.path.join(group_dir, handler, "lambda_function.py")):
+                handlers.append(f"{group}/{handler}")
+    return handlers
+
+
+def import_statements(path):
+    """Sentencias import de nivel de módulo del handler, en orden."""
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def profile_handler(handler):
+    """
+    Importa las dependencias del handler con -X importtime en un proceso nuevo.
+
+    :param handler: Handler como `<grupo>/<handler>`.
+    :return: Registros (self_us, cumulative_us, profundidad, módulo) y módulos que no se pudieron importar.
+    """
+    lines = ["import sys", f"sys.stderr.write({MARKER!r} + '\\n')", "missing = []"]
+    for statement in import_statements(os.path.join(LAMBDA_CODE, handler, "lambda_function.py")):
+        lines += ["try:", f"    {statement}", "except ImportError as error:", "    missing.append(str(error.name))"]
+    lines.append("print(repr(missing))")
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(LAMBDA_CODE, handler), *LAYER_PATHS]))
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(lines)],
+        capture_output=True, text=True, env=env, check=True
+    )
+
+    records = []
+    stderr = result.stderr.split(MARKER, 1)[-1]
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append((int(self_us), int(cumulative_us), len(indent) // 2, module))
+    missing = ast.literal_eval(result.stdout.strip().splitlines()[-1]) if result.stdout.strip() else []
+    return records, missing
+
+
+def summarize(records, missing, top):
+    """Tiempo total (suma de los paquetes de primer nivel) y los `top` paquetes más costosos."""
+    roots = [record for record in records if record[2] == 0]
+    ranked = sorted(roots, key=lambda record: record[1], reverse=True)[:top]
+    return {
+        "total_ms": round(sum(record[1] for record in roots) / 1000, 1),
+        "modules_loaded": len(records),
+        "slowest": [
+            {"module": module, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(self_us / 1000, 1)}
+            for self_us, cumulative, _, module in ranked
+        ],
+        "missing": sorted(set(missing))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handler", action="append", help="Handler a perfilar (grupo/handler); por defecto todos")
+    parser.add_argument("--top", type=int, default=10, help="Paquetes más costosos por handler")
+    parser.add_argument("--output", help="Archivo JSON donde guardar el reporte")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "handlers": {}}
+    for handler in args.handler or find_handlers():
+        summary = summarize(*profile_handler(handler), top=args.top)
+        report["handlers"][handler] = summary
+        slowest = ", ".join(f"{item['module']} {item['cumulative_ms']} ms" for item in summary["slowest"][:3])
+        print(f"{handler:32} {summary['total_ms']:8.1f} ms  {summary['modules_loaded']:5} módulos  [{slowest}]", file=sys.stderr)
+        if summary["missing"]:
+            print(f"{'':32} sin instalar: {', '.join(summary['missing'])}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Recomienda el memory_size de cada Lambda a partir de solicitudes grabadas.
+
+Para cada función reproduce en un proceso nuevo las entradas de tools/corpus/<función>.jsonl
+contra su handler (tools/lambda_harness.py simula AWS y Pinecone) y mide:
+  - inicialización: tiempo y CPU de importar el módulo, y RSS al terminar;
+  - invocaciones: tiempo, CPU, llamadas al modelo y pico de memoria de Python (tracemalloc);
+  - pico de RSS del proceso (ru_maxrss).
+
+Lambda asigna CPU en proporción a la memoria (1 vCPU completa a 1769 MB) y el código de los
+handlers corre en un solo hilo, así que la duración estimada con M MB es
+espera + cpu / min(M / 1769, 1), donde la espera suma el tiempo no-CPU medido y
+--model-latency-ms por cada llamada al modelo. La recomendación es el menor tamaño que cubre
+el pico de RSS con --headroom, cuya duración p95 no supera en más de --max-slowdown (o de
+--slowdown-floor-ms, lo que sea mayor) a la de una vCPU completa y cuya inicialización
+estimada (el arranque en frío) no pasa de --max-init-ms.
+
+Con --update las recomendaciones se escriben en constants/function_profiles.json para el
+entorno indicado; el stack las aplica antes de app_config["function_profiles"], que sigue
+teniendo prioridad.
+
+Uso:
+    python tools/tune_memory.py [--function ruta-estandar-evaluar] [--repeat 5] [--environment dev] [--update] [--output report.json]
+
+Formato del corpus (una entrada JSON por línea):
+    {"label": "lote-3", "body": {...}, "model_outputs": ["0.80", "@Retroalimentacion: ..."]}
+    {"label": "sqs", "event": {"Records": [...]}}
+    {"label": "pdf-40p", "body": {...}, "documents": {"<DriveId>": "ruta/al/archivo.pdf"}}   (add_resource)
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from constants.functions import FUNCTIONS, TUNED_PROFILES_PATH  # noqa: E402
+from tools.lambda_harness import (  # noqa: E402
+    ADD_RESOURCE_FUNCTION,
+    FakeContext,
+    build_event,
+    fake_services,
+    load_corpus,
+    load_handler,
+    serve_documents
+)
+
+CORPUS_DIR = os.path.join(ROOT, "tools", "corpus")
+
+# Modelo de CPU de Lambda: la memoria que corresponde a una vCPU completa
+LAMBDA_MB_PER_VCPU = 1769
+MEMORY_SIZES = (128, 256, 384, 512, 640, 768, 1024, 1280, 1536, 1769, 2048, 3008)
+
+
+def targets():
+    """Funciones medibles: (nombre, grupo, handler, entry, timeout) del registro más add_resource."""
+    functions = [(spec.name, spec.group, spec.handler_name, spec.entry, spec.profile.timeout_seconds) for spec in FUNCTIONS]
+    functions.append((ADD_RESOURCE_FUNCTION, "chatbot", "add_resource", "lambda_handler", 900))
+    return {function[0]: function for function in functions}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(name, corpus_path, repeat):
+    """
+    Mide una función en el proceso actual; se ejecuta en un proceso nuevo por función para que
+    el pico de RSS y los módulos importados no se mezclen entre handlers.
+    """
+    _, group, handler_name, entry, timeout_seconds = targets()[name]
+    corpus = load_corpus(corpus_path)
+    result = {"function": name, "invocations": [], "memory": [], "errors": []}
+
+    with fake_services() as fake_aws:
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            module = load_handler(group, handler_name)
+        except ImportError as error:
+            result["missing"] = error.name
+            return result
+        result["init"] = {
+            "wall_ms": (time.perf_counter() - wall) * 1000,
+            "cpu_ms": (time.process_time() - cpu) * 1000,
+            "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        }
+        handler = getattr(module, entry)
+
+        # Primera pasada sin tracemalloc (tiempos), segunda con tracemalloc (memoria por entrada)
+        for traced in (False, True):
+            for entry_data in corpus:
+                for _ in range(1 if traced else repeat):
+                    if "documents" in entry_data:
+                        serve_documents(module, entry_data["documents"])
+                    fake_aws.model_outputs.extend(entry_data.get("model_outputs", []))
+                    model_calls = fake_aws.model_calls
+                    if traced:
+                        tracemalloc.start()
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    try:
+                        handler(build_event(entry_data), FakeContext(name, timeout_seconds=timeout_seconds))
+                    except Exception as error:
+                        result["errors"].append(f"{entry_data.get('label')}: {error!r}")
+                    wall_ms, cpu_ms = (time.perf_counter() - wall) * 1000, (time.process_time() - cpu) * 1000
+                    fake_aws.model_outputs.clear()
+                    if traced:
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+                        result["memory"].append({"label": entry_data.get("label"), "traced_peak_mb": peak / 2 ** 20})
+                    else:
+                        result["invocations"].append({
+                            "label": entry_data.get("label"),
+                            "wall_ms": wall_ms,
+                            "cpu_ms": cpu_ms,
+                            "model_calls": fake_aws.model_calls - model_calls
+                        })
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def measure_in_subprocess(name, corpus_path, repeat):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as file:
+        result_path = file.name
+    try:
+        # Los logs de los handlers van a /dev/null: escribirlos es parte del costo medido
+        subprocess.run(
+            [sys.executable, __file__, "--measure", name, "--corpus-file", corpus_path, "--repeat", str(repeat), "--result-file", result_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+        )
+        with open(result_path, encoding="utf-8") as file:
+            return json.load(file)
+    finally:
+        os.remove(result_path)
+
+
+def estimate_duration_ms(cpu_ms, wait_ms, memory_mb, cpu_scale=1.0):
+    """Duración estimada en Lambda: la espera no cambia y la CPU escala con la fracción de vCPU."""
+    return wait_ms + cpu_ms * cpu_scale / min(memory_mb / LAMBDA_MB_PER_VCPU, 1.0)
+
+
+def recommend(result, headroom, max_slowdown, model_latency_ms, cpu_scale, slowdown_floor_ms=20.0, max_init_ms=1000.0):
+    """
+    Memoria recomendada y estimaciones por tamaño.
+
+    :return: Diccionario con memory_size (None sin mediciones), piso de memoria y la tabla de tamaños.
+    """
+    timed = result["invocations"]
+    if not timed:
+        return {"memory_size": None}
+    cpu_p95 = percentile([invocation["cpu_ms"] for invocation in timed], 0.95)
+    wait_p95 = percentile([
+        max(0.0, invocation["wall_ms"] - invocation["cpu_ms"]) + invocation["model_calls"] * model_latency_ms
+        for invocation in timed
+    ], 0.95)
+    floor_mb = result["peak_rss_mb"] * headroom
+    full_vcpu_ms = estimate_duration_ms(cpu_p95, wait_p95, LAMBDA_MB_PER_VCPU, cpu_scale)
+    max_duration_ms = full_vcpu_ms + max(full_vcpu_ms * max_slowdown, slowdown_floor_ms)
+    init_wait_ms = max(0.0, result["init"]["wall_ms"] - result["init"]["cpu_ms"])
+
+    sizes, candidates = [], []
+    for memory_mb in MEMORY_SIZES:
+        duration_ms = estimate_duration_ms(cpu_p95, wait_p95, memory_mb, cpu_scale)
+        init_ms = estimate_duration_ms(result["init"]["cpu_ms"], init_wait_ms, memory_mb, cpu_scale)
+        sizes.append({
+            "memory_size": memory_mb,
+            "p95_duration_ms": round(duration_ms, 1),
+            "init_ms": round(init_ms, 1),
+            "gb_seconds": round(memory_mb / 1024 * duration_ms / 1000, 4),
+            "fits": memory_mb >= floor_mb
+        })
+        if memory_mb >= floor_mb and duration_ms <= max_duration_ms and init_ms <= max_init_ms:
+            candidates.append(memory_mb)
+    return {
+        "memory_size": candidates[0] if candidates else MEMORY_SIZES[-1],
+        "floor_mb": round(floor_mb, 1),
+        "cpu_p95_ms": round(cpu_p95, 1),
+        "wait_p95_ms": round(wait_p95, 1),
+        "sizes": sizes
+    }
+
+
+def update_profiles(path, environment, recommendations):
+    """Escribe memory_size por función en el archivo de perfiles medidos, conservando el resto."""
+    profiles = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            profiles = json.load(file)
+    registered = {spec.name for spec in FUNCTIONS}
+    for name, memory_size in recommendations.items():
+        if name in registered and memory_size:
+            profiles.setdefault(environment, {}).setdefault(name, {})["memory_size"] = memory_size
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(profiles, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--function", action="append", help="Función a medir; por defecto las que tienen corpus")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directorio con un <función>.jsonl por función")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones de cada entrada del corpus")
+    parser.add_argument("--headroom", type=float, default=1.3, help="Margen sobre el pico de RSS")
+    parser.add_argument("--max-slowdown", type=float, default=0.1, help="Lentitud aceptada frente a una vCPU completa")
+    parser.add_argument("--slowdown-floor-ms", type=float, default=20, help="Lentitud absoluta aceptada aunque supere --max-slowdown")
+    parser.add_argument("--max-init-ms", type=float, default=1000, help="Inicialización estimada máxima (arranque en frío)")
+    parser.add_argument("--model-latency-ms", type=float, default=1500, help="Latencia supuesta de cada llamada al modelo")
+    parser.add_argument("--cpu-scale", type=float, default=1.0, help="Relación entre la CPU de Lambda y la local (>1 si Lambda es más lenta)")
+    parser.add_argument("--environment", default="dev", help="Entorno de constants/function_profiles.json a actualizar")
+    parser.add_argument("--update", action="store_true", help="Escribe las recomendaciones en constants/function_profiles.json")
+    parser.add_argument("--output", help="Archivo JSON donde guardar el reporte completo")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus-file", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        with open(args.result_file, "w", encoding="utf-8") as file:
+            json.dump(measure(args.measure, args.corpus_file, args.repeat), file)
+        return
+
+    available = targets()
+    names = args.function or [name for name in available if os.path.exists(os.path.join(args.corpus, f"{name}.jsonl"))]
+    report, recommendations = {"python": sys.version.split()[0], "functions": {}}, {}
+    for name in names:
+        if name not in available:
+            sys.exit(f"Función desconocida: {name}")
+        result = measure_in_subprocess(name, os.path.join(args.corpus, f"{name}.jsonl"), args.repeat)
+        if result.get("missing"):
+            print(f"{name:36} sin medir: falta el paquete {result['missing']}", file=sys.stderr)
+            continue
+        recommendation = recommend(
+            result, args.headroom, args.max_slowdown, args.model_latency_ms, args.cpu_scale,
+            slowdown_floor_ms=args.slowdown_floor_ms, max_init_ms=args.max_init_ms
+        )
+        report["functions"][name] = {**result, "recommendation": recommendation}
+        recommendations[name] = recommendation["memory_size"]
+        print(
+            f"{name:36} init {result['init']['wall_ms']:7.1f} ms  cpu p95 {recommendation.get('cpu_p95_ms', 0):7.1f} ms  "
+            f"rss {result['peak_rss_mb']:6.1f} MB  -> {recommendation['memory_size']} MB",
+            file=sys.stderr
+        )
+        for error in result["errors"][:3]:
+            print(f"{'':36} error: {error}", file=sys.stderr)
+
+    if args.update:
+        update_profiles(TUNED_PROFILES_PATH, args.environment.lower(), recommendations)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps({name: memory_size for name, memory_size in recommendations.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()